@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+App Routing Load Analysis
+
+Reports how apps and queries would be spread over the fdm-lb load
+balancers of an app zone under first-character routing (app_routes) and
+under weighted rendezvous hashing (lb_weights, see app_routing.py), and how
+many apps move when a load balancer is removed or added.
+
+Input is either a list of app names (one per line, a bare name or a name
+inside the zone, optionally followed by a query count) or PowerDNS query
+logs (see pdns_querylog.py), in which case each app is weighted by the
+queries it received.
+
+Usage:
+  ./analyze_app_routing.py apps.txt
+  ./analyze_app_routing.py --logs /var/log/pdns/pdns.log*
+  ./analyze_app_routing.py apps.txt --zone app2.runonflux.io --weights fdm-lb-2-1.runonflux.io=2
+  ./analyze_app_routing.py apps.txt --add-lb fdm-lb-1-5.runonflux.io --json
+"""
+
+import argparse
+import json
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import yaml
+
+from app_routing import AppTable, RendezvousTable, RoutingTable
+from pdns_querylog import iter_queries
+
+
+def read_app_names(paths: Iterable[Path], zone: str) -> Counter:
+    """Query count per app name (relative to the zone) from "name [count]" lines."""
+    apps: Counter = Counter()
+    suffix = "." + zone
+    for path in paths:
+        with open(path, "r") as f:
+            for line in f:
+                fields = line.split()
+                if not fields or fields[0].startswith("#"):
+                    continue
+                name = fields[0].rstrip(".").lower()
+                if name.endswith(suffix):
+                    name = name[: -len(suffix)]
+                apps[name] += int(fields[1]) if len(fields) > 1 else 1
+    return apps
+
+
+def read_query_logs(paths: Iterable[Path], zone: str) -> Counter:
+    """Query count per app name in the zone from PowerDNS query logs."""
+    apps: Counter = Counter()
+    suffix = "." + zone
+    for entry in iter_queries(paths):
+        name = entry.qname.rstrip(".").lower()
+        if name.endswith(suffix):
+            app = name[: -len(suffix)]
+            if not app.startswith("_"):
+                apps[app] += 1
+    return apps
+
+
+def load_share(table: AppTable, zone: str, apps: Counter) -> Dict[str, Dict[str, Any]]:
+    """Apps and queries per load balancer."""
+    app_counts: Counter = Counter()
+    query_counts: Counter = Counter()
+    for app, queries in apps.items():
+        target = table.route(f"{app}.{zone}")
+        app_counts[target] += 1
+        query_counts[target] += queries
+
+    total_apps = sum(app_counts.values()) or 1
+    total_queries = sum(query_counts.values()) or 1
+    return {
+        target: {
+            "apps": app_counts[target],
+            "apps_pct": round(app_counts[target] / total_apps * 100, 2),
+            "queries": query_counts[target],
+            "queries_pct": round(query_counts[target] / total_queries * 100, 2),
+        }
+        for target in sorted(set(table.targets) | set(app_counts))
+    }
+
+
+def imbalance(share: Dict[str, Dict[str, Any]], expected: Dict[str, float]) -> float:
+    """Largest query share relative to the share the load balancer should get."""
+    return round(
+        max(share[t]["queries_pct"] / (expected[t] * 100) for t in expected if expected[t] > 0), 3
+    )
+
+
+def moved_fraction(before: AppTable, after: AppTable, zone: str, apps: Counter) -> Dict[str, float]:
+    """Share of apps and queries routed differently by two tables."""
+    moved_apps = moved_queries = 0
+    for app, queries in apps.items():
+        qname = f"{app}.{zone}"
+        if before.route(qname) != after.route(qname):
+            moved_apps += 1
+            moved_queries += queries
+    return {
+        "apps_pct": round(moved_apps / (len(apps) or 1) * 100, 2),
+        "queries_pct": round(moved_queries / (sum(apps.values()) or 1) * 100, 2),
+    }
+
+
+def parse_weights(items: Optional[List[str]]) -> Dict[str, float]:
+    weights = {}
+    for item in items or []:
+        target, _, weight = item.partition("=")
+        weights[target] = float(weight) if weight else 1.0
+    return weights
+
+
+def analyze(
+    zone_config: Dict[str, Any],
+    environment: str,
+    apps: Counter,
+    weight_overrides: Dict[str, float],
+    add_lbs: Dict[str, float],
+) -> Dict[str, Any]:
+    template_vars = zone_config["template_vars"]
+    zone = zone_config["domain"]
+    routes = template_vars.get("app_routes", [])
+    weights = dict(template_vars.get("lb_weights") or {route["target"]: 1 for route in routes})
+    weights.update(weight_overrides)
+    default_target = template_vars.get("default_target", sorted(weights)[0])
+
+    report: Dict[str, Any] = {
+        "zone": zone,
+        "routing_mode": template_vars.get("routing_mode", "first-char"),
+        "apps": len(apps),
+        "queries": sum(apps.values()),
+    }
+
+    if routes:
+        first_char = RoutingTable(zone, environment, routes, default_target)
+        share = load_share(first_char, zone, apps)
+        even = {target: 1 / len(first_char.targets) for target in first_char.targets}
+        report["first-char"] = {"load": share, "imbalance": imbalance(share, even)}
+
+    rendezvous = RendezvousTable(zone, environment, weights, default_target)
+    total_weight = sum(weight for _, _, weight in rendezvous.lbs)
+    expected = {target: weight / total_weight for target, _, weight in rendezvous.lbs}
+    share = load_share(rendezvous, zone, apps)
+    for target, pct in expected.items():
+        share[target]["expected_pct"] = round(pct * 100, 2)
+    report["rendezvous"] = {
+        "weights": {target: weight for target, _, weight in rendezvous.lbs},
+        "load": share,
+        "imbalance": imbalance(share, expected),
+        "remove": {},
+        "add": {},
+    }
+
+    # Remapping when the pool changes: only apps of the removed/added LB move
+    if len(rendezvous.lbs) > 1:
+        for target, _, _ in rendezvous.lbs:
+            smaller = {t: w for t, w in weights.items() if t != target}
+            after = RendezvousTable(zone, environment, smaller, default_target)
+            report["rendezvous"]["remove"][target] = moved_fraction(rendezvous, after, zone, apps)
+    for target, weight in add_lbs.items():
+        after = RendezvousTable(zone, environment, {**weights, target: weight}, default_target)
+        report["rendezvous"]["add"][target] = moved_fraction(rendezvous, after, zone, apps)
+    return report
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"Zone {report['zone']} (routing_mode: {report['routing_mode']})")
+    print(f"{report['apps']} apps, {report['queries']} queries")
+    for scheme in ("first-char", "rendezvous"):
+        if scheme not in report:
+            continue
+        result = report[scheme]
+        print()
+        print(f"{scheme}: imbalance {result['imbalance']} (largest query share / its target share)")
+        print(f"  {'Load balancer':<28} {'Apps':>8} {'Apps %':>8} {'Queries':>10} {'Queries %':>10} {'Target %':>9}")
+        for target, row in result["load"].items():
+            expected = row.get("expected_pct", "")
+            print(
+                f"  {target:<28} {row['apps']:>8} {row['apps_pct']:>8} "
+                f"{row['queries']:>10} {row['queries_pct']:>10} {expected:>9}"
+            )
+    for action in ("remove", "add"):
+        for target, moved in report["rendezvous"][action].items():
+            print(
+                f"  {action} {target}: {moved['apps_pct']}% of apps, "
+                f"{moved['queries_pct']}% of queries move"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Compare per-LB load of first-character and rendezvous app routing"
+    )
+    parser.add_argument("names", nargs="*", type=Path, help="App name files ('name [count]' per line)")
+    parser.add_argument("--logs", nargs="+", type=Path, help="PowerDNS query logs (plain or .gz) instead of names")
+    parser.add_argument("--zone", help="App zone (default: the production app zone)")
+    parser.add_argument(
+        "--weights",
+        nargs="+",
+        metavar="LB=WEIGHT",
+        help="Override rendezvous weights (default: lb_weights, or 1 per app_routes target)",
+    )
+    parser.add_argument(
+        "--add-lb",
+        nargs="+",
+        metavar="LB[=WEIGHT]",
+        help="Also report the apps that move when these load balancers are added",
+    )
+    parser.add_argument("--json", action="store_true", help="Output JSON")
+    parser.add_argument(
+        "-c",
+        "--config",
+        help="Configuration file path (default: ../vars.yaml from script location)",
+    )
+    args = parser.parse_args()
+    if not args.names and not args.logs:
+        parser.error("give app name files or --logs")
+
+    config_path = args.config or Path(__file__).parent.parent / "vars.yaml"
+    with open(config_path, "r") as f:
+        config = yaml.safe_load(f)
+
+    app_zones = [
+        (environment, zone_config)
+        for environment in ("production", "staging")
+        for zone_config in config["powerdns"][environment].get("zone_configs", [])
+        if zone_config.get("type") == "app"
+    ]
+    matches = [z for z in app_zones if args.zone in (None, z[1]["domain"])]
+    if not matches:
+        print(f"Error: app zone {args.zone} not found in {config_path}")
+        sys.exit(1)
+    environment, zone_config = matches[0]
+
+    if args.logs:
+        apps = read_query_logs(args.logs, zone_config["domain"])
+    else:
+        apps = read_app_names(args.names, zone_config["domain"])
+    if not apps:
+        print("Error: no app names found")
+        sys.exit(1)
+
+    report = analyze(
+        zone_config, environment, apps, parse_weights(args.weights), parse_weights(args.add_lb)
+    )
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
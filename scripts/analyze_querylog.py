@@ -0,0 +1,491 @@
+#!/usr/bin/env python3
+"""
+PowerDNS Query Log Analyzer
+
+Streams the query logs PowerDNS writes with ``log-dns-queries=yes`` (see
+templates/pdns.conf.j2 and pdns_querylog.py) and reports:
+
+  - queries per second over time (average, peak second, per --interval)
+  - top query names, query types and clients
+  - NXDOMAIN rate and queries for names outside our zones
+  - per-first-character and per-load-balancer share of app zone queries
+  - how often an EDNS Client Subnet was present
+
+The query log lines carry no response code, so NXDOMAIN is inferred from
+the zones vars.yaml renders: a name in one of our zones that has no
+records, is not an empty non-terminal and is not covered by a wildcard
+is counted as NXDOMAIN; names outside every zone as out-of-zone (REFUSED).
+
+Plain files are mmapped and split into line-aligned ranges, gzip files are
+decompressed in blocks (nothing is loaded whole), and with --jobs N the
+files and ranges are scanned by N processes whose counts are merged.
+Distinct query names and clients are capped at --max-keys per process:
+past that the rarest are dropped and their counts become approximate.
+
+Usage:
+  ./analyze_querylog.py /var/log/pdns/pdns.log*
+  ./analyze_querylog.py /var/log/pdns/pdns.log* --jobs 8 --top 50
+  ./analyze_querylog.py pdns.log.1 --interval 60 --timeline
+  ./analyze_querylog.py /var/log/pdns/pdns.log* --year 2026 --json > report.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import yaml
+
+from app_routing import load_routing_tables
+from generate_zone import ENVIRONMENTS, build_db_zone
+from pdns_querylog import (
+    QUERY_RE,
+    TIMESTAMP_BYTES,
+    TimestampParser,
+    iter_log_buffers,
+    sort_rotated,
+    split_log,
+)
+
+# Name classes
+EXISTS, NXDOMAIN, OUT_OF_ZONE = "exists", "nxdomain", "out-of-zone"
+# Answer classes (ZoneIndex.lookup)
+ANSWER, NODATA = "answer", "nodata"
+
+# Timestamp bytes that identify the second a line was logged in
+SECOND_KEY_BYTES = 19
+# Classified query names kept per process before the cache is cleared
+CLASSIFY_CACHE_SIZE = 1 << 18
+DEFAULT_SPLIT_SIZE = 256 << 20
+DEFAULT_MAX_KEYS = 1_000_000
+
+Task = Tuple[str, int, Optional[int]]
+
+
+class ZoneIndex:
+    """Classifies query names against the zones rendered from vars.yaml."""
+
+    def __init__(self, config: Dict[str, Any]):
+        self.zones: Dict[str, Tuple[Set[str], Set[str]]] = {}
+        # {owner: {answered type: (ttl, is a LUA record)}}; LUA records under their generated type
+        self.rrsets: Dict[str, Dict[str, Tuple[int, bool]]] = {}
+        # Negative answer TTL per zone: min(SOA TTL, SOA minimum)
+        self.negative_ttls: Dict[str, int] = {}
+        for environment in ENVIRONMENTS:
+            env_config = config["powerdns"].get(environment) or {}
+            for zone_config in env_config.get("zone_configs", []):
+                names: Set[str] = set()
+                wildcards: Set[str] = set()
+                zone = build_db_zone(zone_config, environment, config, "master")
+                for record in zone.records:
+                    rtype, lua = record.type, record.type == "LUA"
+                    if lua:
+                        rtype = record.content.split(None, 1)[0]
+                    elif rtype == "SOA":
+                        minimum = int(record.content.split()[6])
+                        self.negative_ttls[zone.name] = min(record.ttl, minimum)
+                    self.rrsets.setdefault(record.name, {})[rtype] = (record.ttl, lua)
+                    name = record.name
+                    if name.startswith("*."):
+                        wildcards.add(name[2:])
+                        name = name[2:]
+                    # Owner names and the empty non-terminals above them
+                    while name not in names:
+                        names.add(name)
+                        if name == zone.name or "." not in name:
+                            break
+                        name = name.split(".", 1)[1]
+                self.zones[zone.name] = (names, wildcards)
+        # Most specific zone first
+        self.order = sorted(self.zones, key=len, reverse=True)
+        self.tables = load_routing_tables(config)
+
+    def find_zone(self, name: str) -> Optional[str]:
+        for zone in self.order:
+            if name == zone or name.endswith("." + zone):
+                return zone
+        return None
+
+    def classify(self, name: str) -> Tuple[str, Optional[str], str, str]:
+        """(name class, app zone, first character, load balancer) of a lower-case name."""
+        zone = self.find_zone(name)
+        if zone is None:
+            return OUT_OF_ZONE, None, "", ""
+        names, wildcards = self.zones[zone]
+        status = NXDOMAIN
+        if name in names:
+            status = EXISTS
+        else:
+            parent = name
+            while parent != zone:
+                parent = parent.split(".", 1)[1]
+                if parent in wildcards:
+                    status = EXISTS
+                    break
+
+        table = self.tables.get(zone)
+        if table is None or name == zone or name.startswith("_"):
+            return status, None, "", ""
+        return status, zone, name[0], table.route(name)
+
+    def lookup(self, name: str, qtype: str) -> Tuple[str, int, bool]:
+        """
+        (answer class, TTL, answered by a LUA record) of a query for a lower-case name.
+
+        Answers found through a CNAME (the app zone wildcard) count as answers.
+        """
+        zone = self.find_zone(name)
+        if zone is None:
+            return OUT_OF_ZONE, 0, False
+        names, wildcards = self.zones[zone]
+        rrsets = self.rrsets.get(name)
+        if rrsets is None and name not in names:
+            parent = name
+            while parent != zone:
+                parent = parent.split(".", 1)[1]
+                if parent in wildcards:
+                    rrsets = self.rrsets["*." + parent]
+                    break
+        negative_ttl = self.negative_ttls.get(zone, 0)
+        if rrsets is None:
+            return (NXDOMAIN if name not in names else NODATA), negative_ttl, False
+        rrset = rrsets.get(qtype) or rrsets.get("CNAME")
+        if rrset is None:
+            return NODATA, negative_ttl, False
+        return ANSWER, rrset[0], rrset[1]
+
+
+class QueryStats:
+    """Mergeable counters for one or more scanned log ranges."""
+
+    def __init__(self) -> None:
+        self.queries = 0
+        self.ecs = 0
+        self.bytes = 0
+        self.approximate = False
+        self.per_second: Counter = Counter()
+        self.qnames: Counter = Counter()
+        self.qtypes: Counter = Counter()
+        self.clients: Counter = Counter()
+        # (name class, app zone, first character, load balancer) from ZoneIndex.classify
+        self.classes: Counter = Counter()
+
+    def prune(self, max_keys: int) -> None:
+        """Drop the rarest names and clients once a counter holds max_keys keys."""
+        for counter in (self.qnames, self.clients):
+            if len(counter) >= max_keys:
+                kept = dict(counter.most_common(max_keys // 2))
+                counter.clear()
+                counter.update(kept)
+                self.approximate = True
+
+    def merge(self, other: "QueryStats") -> None:
+        self.queries += other.queries
+        self.ecs += other.ecs
+        self.bytes += other.bytes
+        self.approximate |= other.approximate
+        for name in (
+            "per_second",
+            "qnames",
+            "qtypes",
+            "clients",
+            "classes",
+        ):
+            getattr(self, name).update(getattr(other, name))
+
+
+_index: Optional[ZoneIndex] = None
+_year: Optional[int] = None
+_max_keys = DEFAULT_MAX_KEYS
+
+
+def init_worker(config: Dict[str, Any], year: Optional[int], max_keys: int) -> None:
+    """Build the per-process zone index (also used without --jobs)."""
+    global _index, _year, _max_keys
+    _index = ZoneIndex(config)
+    _year = year
+    _max_keys = max_keys
+
+
+def scan(task: Task) -> QueryStats:
+    """Count the queries in one file or byte range of a file."""
+    path, start, end = task
+    stats = QueryStats()
+    parse_timestamp = TimestampParser(_year)
+    classify = _index.classify
+    cache: Dict[bytes, Tuple[str, Optional[str], str, str]] = {}
+
+    per_second = stats.per_second
+    qnames = stats.qnames
+    qtypes = stats.qtypes
+    clients = stats.clients
+    classes = stats.classes
+    last_key = None
+    second = 0
+    queries = ecs_count = 0
+
+    for buffer, pos, endpos in iter_log_buffers(Path(path), start, end):
+        stats.bytes += endpos - pos
+        for match in QUERY_RE.finditer(buffer, pos, endpos):
+            begin = buffer.rfind(b"\n", pos, match.start()) + 1 or pos
+            key = buffer[begin : begin + SECOND_KEY_BYTES]
+            if key != last_key:
+                last_key = key
+                second = int(parse_timestamp(buffer[begin : begin + TIMESTAMP_BYTES]))
+            per_second[second] += 1
+
+            remote, ecs, qname, qtype = match.groups()
+            qname = qname.rstrip(b".").lower()
+            qnames[qname] += 1
+            qtypes[qtype] += 1
+            clients[remote] += 1
+            if ecs:
+                ecs_count += 1
+
+            info = cache.get(qname)
+            if info is None:
+                if len(cache) >= CLASSIFY_CACHE_SIZE:
+                    cache.clear()
+                info = cache[qname] = classify(qname.decode("ascii", "replace"))
+            classes[info] += 1
+
+            queries += 1
+            if queries & 0xFFFF == 0 and len(qnames) >= _max_keys:
+                stats.prune(_max_keys)
+
+    stats.queries = queries
+    stats.ecs = ecs_count
+    stats.prune(_max_keys)
+    return stats
+
+
+def plan_tasks(paths: List[Path], split_size: int) -> List[Task]:
+    """One task per gzip file and per split_size range of a plain file."""
+    return [
+        (str(path), start, end)
+        for path in sort_rotated(paths)
+        for start, end in split_log(path, split_size)
+    ]
+
+
+def analyze(tasks: List[Task], config: Dict[str, Any], jobs: int, year: Optional[int], max_keys: int) -> QueryStats:
+    total = QueryStats()
+    if jobs > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(
+            max_workers=jobs, initializer=init_worker, initargs=(config, year, max_keys)
+        ) as pool:
+            for stats in pool.map(scan, tasks):
+                total.merge(stats)
+    else:
+        init_worker(config, year, max_keys)
+        for task in tasks:
+            total.merge(scan(task))
+    return total
+
+
+def _iso(second: int) -> str:
+    return datetime.fromtimestamp(second, timezone.utc).isoformat()
+
+
+def _pct(count: int, total: int) -> float:
+    return round(count / (total or 1) * 100, 2)
+
+
+def _top(counter: Counter, total: int, top: int) -> List[Dict[str, Any]]:
+    return [
+        {"name": key.decode("ascii", "replace"), "queries": count, "pct": _pct(count, total)}
+        for key, count in counter.most_common(top)
+    ]
+
+
+def build_report(stats: QueryStats, top: int, interval: int) -> Dict[str, Any]:
+    total = stats.queries
+    seconds = sorted(s for s in stats.per_second if s > 0)
+    report: Dict[str, Any] = {
+        "queries": total,
+        "bytes": stats.bytes,
+        "approximate": stats.approximate,
+    }
+    if seconds:
+        duration = seconds[-1] - seconds[0] + 1
+        peak_second, peak = max(stats.per_second.items(), key=lambda item: (item[1], -item[0]))
+        buckets: Counter = Counter()
+        for second, count in stats.per_second.items():
+            if second > 0:
+                buckets[second - second % interval] += count
+        report.update(
+            {
+                "start": _iso(seconds[0]),
+                "end": _iso(seconds[-1]),
+                "duration_s": duration,
+                "qps": {
+                    "average": round(total / duration, 2),
+                    "peak": peak,
+                    "peak_at": _iso(peak_second),
+                },
+                "interval_s": interval,
+                "timeline": [
+                    {
+                        "time": _iso(bucket),
+                        "queries": buckets[bucket],
+                        "qps": round(buckets[bucket] / interval, 2),
+                    }
+                    for bucket in sorted(buckets)
+                ],
+            }
+        )
+
+    report["top_qnames"] = _top(stats.qnames, total, top)
+    report["top_qtypes"] = _top(stats.qtypes, total, top)
+    report["top_clients"] = _top(stats.clients, total, top)
+    classes: Counter = Counter()
+    app_zones: Dict[str, Any] = {}
+    for (status, zone, char, target), count in sorted(
+        stats.classes.items(), key=lambda item: tuple(str(field) for field in item[0])
+    ):
+        classes[status] += count
+        if zone is None:
+            continue
+        zone_report = app_zones.setdefault(
+            zone, {"queries": 0, "first_char": Counter(), "load_balancers": Counter()}
+        )
+        zone_report["queries"] += count
+        zone_report["first_char"][char] += count
+        zone_report["load_balancers"][target] += count
+
+    report["nxdomain"] = {"queries": classes[NXDOMAIN], "pct": _pct(classes[NXDOMAIN], total)}
+    report["out_of_zone"] = {
+        "queries": classes[OUT_OF_ZONE],
+        "pct": _pct(classes[OUT_OF_ZONE], total),
+    }
+    report["ecs"] = {"queries": stats.ecs, "pct": _pct(stats.ecs, total)}
+
+    for zone_report in app_zones.values():
+        zone_total = zone_report["queries"]
+        for key in ("first_char", "load_balancers"):
+            zone_report[key] = {
+                name: {"queries": count, "pct": _pct(count, zone_total)}
+                for name, count in sorted(zone_report[key].items())
+            }
+    report["app_zones"] = app_zones
+    return report
+
+
+def print_report(report: Dict[str, Any], timeline: bool) -> None:
+    total = report["queries"]
+    print(f"{total} queries in {report['bytes'] / 1e6:.1f} MB of logs")
+    if total == 0:
+        return
+    if "qps" in report:
+        qps = report["qps"]
+        print(f"{report['start']} .. {report['end']} ({report['duration_s']}s)")
+        print(f"QPS: average {qps['average']}, peak {qps['peak']} at {qps['peak_at']}")
+    print(
+        f"NXDOMAIN (inferred): {report['nxdomain']['pct']}%, "
+        f"out of zone: {report['out_of_zone']['pct']}%, "
+        f"with ECS: {report['ecs']['pct']}%"
+    )
+    if report["approximate"]:
+        print("(name and client counts are approximate: --max-keys was reached)")
+
+    for key, title in (
+        ("top_qnames", "Query name"),
+        ("top_qtypes", "Query type"),
+        ("top_clients", "Client"),
+    ):
+        print()
+        print(f"  {title:<50} {'Queries':>10} {'%':>7}")
+        for row in report[key]:
+            print(f"  {row['name']:<50} {row['queries']:>10} {row['pct']:>7}")
+
+    for zone, zone_report in report["app_zones"].items():
+        print()
+        print(f"{zone}: {zone_report['queries']} app queries")
+        print(f"  {'Load balancer':<50} {'Queries':>10} {'%':>7}")
+        for target, row in zone_report["load_balancers"].items():
+            print(f"  {target:<50} {row['queries']:>10} {row['pct']:>7}")
+        print("  First character: " + ", ".join(
+            f"{char} {row['pct']}%" for char, row in zone_report["first_char"].items()
+        ))
+
+    if timeline and "timeline" in report:
+        print()
+        print(f"  {'Time':<26} {'Queries':>10} {'QPS':>10}")
+        for row in report["timeline"]:
+            print(f"  {row['time']:<26} {row['queries']:>10} {row['qps']:>10}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Analyze PowerDNS query logs")
+    parser.add_argument("logs", nargs="+", type=Path, help="Query logs (plain or .gz, rotated)")
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Parallel processes (0: one per CPU; default: 1)",
+    )
+    parser.add_argument("--top", type=int, default=20, help="Entries in each top list (default: 20)")
+    parser.add_argument(
+        "--interval", type=int, default=300, help="Timeline bucket in seconds (default: 300)"
+    )
+    parser.add_argument("--timeline", action="store_true", help="Print the QPS timeline")
+    parser.add_argument(
+        "--year",
+        type=int,
+        help="Year of traditional syslog timestamps (default: current year)",
+    )
+    parser.add_argument(
+        "--split-size",
+        type=int,
+        default=DEFAULT_SPLIT_SIZE >> 20,
+        help="Scan plain files in ranges of this many MB (default: 256)",
+    )
+    parser.add_argument(
+        "--max-keys",
+        type=int,
+        default=DEFAULT_MAX_KEYS,
+        help="Distinct names/clients kept per process (default: 1000000)",
+    )
+    parser.add_argument("--json", action="store_true", help="Output JSON")
+    parser.add_argument(
+        "-c",
+        "--config",
+        help="Configuration file path (default: ../vars.yaml from script location)",
+    )
+    args = parser.parse_args()
+
+    missing = [str(path) for path in args.logs if not path.is_file()]
+    if missing:
+        print(f"Error: log file(s) not found: {', '.join(missing)}")
+        sys.exit(1)
+
+    config_path = args.config or Path(__file__).parent.parent / "vars.yaml"
+    with open(config_path, "r") as f:
+        config = yaml.safe_load(f)
+
+    jobs = args.jobs or os.cpu_count() or 1
+    tasks = plan_tasks(args.logs, args.split_size << 20)
+    started = time.perf_counter()
+    stats = analyze(tasks, config, jobs, args.year, args.max_keys)
+    elapsed = time.perf_counter() - started
+
+    report = build_report(stats, args.top, args.interval)
+    report["files"] = len(args.logs)
+    report["elapsed_s"] = round(elapsed, 2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report, args.timeline)
+        print()
+        print(f"Scanned {len(tasks)} range(s) with {min(jobs, len(tasks))} process(es) in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
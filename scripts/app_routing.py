@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+App Routing Table for *.app.runonflux.io / *.app2.runonflux.io
+
+Compiles the first-character load balancer ranges (``app_routes`` in the
+``template_vars`` of every ``type: app`` zone in vars.yaml) into a
+byte-indexed lookup table. This is the Python side of the per-zone Lua
+modules generate_zone.py --routing compiles from the same configuration.
+
+Zones with ``routing_mode: "rendezvous"`` instead pick the load balancer
+with the highest weighted rendezvous (highest random weight) score for the
+app name, using ``lb_weights`` (default: weight 1 for every app_routes
+target). Adding or removing a load balancer only remaps the apps that move
+to or from it. The hash uses nothing but integer arithmetic below 2^53 so
+the compiled Lua module (templates/app_routing.lua.j2) computes exactly
+the same result with Lua 5.1, LuaJIT and Lua 5.4.
+
+Usage:
+  ./app_routing.py                          # Print the compiled tables
+  ./app_routing.py myapp.app.runonflux.io   # Show the routing decision
+"""
+
+import argparse
+import math
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import yaml
+
+ENVIRONMENTS = ("staging", "production")
+ROUTING_MODES = ("first-char", "rendezvous")
+
+HASH_PRIME = 2147483647  # 2^31 - 1
+
+
+def expand_chars(spec: str) -> str:
+    """Expand a character range spec such as "0-9a-g" into "0123456789abcdefg"."""
+    chars = []
+    i = 0
+    while i < len(spec):
+        if i + 2 < len(spec) and spec[i + 1] == "-":
+            start, end = spec[i], spec[i + 2]
+            if ord(start) > ord(end):
+                raise ValueError(f"Invalid character range {start}-{end} in '{spec}'")
+            chars.extend(chr(c) for c in range(ord(start), ord(end) + 1))
+            i += 3
+        else:
+            chars.append(spec[i])
+            i += 1
+    return "".join(chars).lower()
+
+
+class RoutingTable:
+    """
+    First-character routing table for one app zone.
+
+    The table has one slot per byte value, so a lookup is a single index
+    operation. Upper-case slots are filled in at build time, which means
+    queries never need to be lower-cased.
+    """
+
+    def __init__(
+        self,
+        zone: str,
+        environment: str,
+        routes: List[Dict[str, str]],
+        default_target: str,
+    ):
+        self.zone = zone.rstrip(".").lower()
+        self.environment = environment
+        self.routes = routes
+        self.default_target = default_target
+
+        table = [default_target] * 256
+        for route in routes:
+            for char in expand_chars(route["chars"]):
+                table[ord(char)] = route["target"]
+                table[ord(char.upper())] = route["target"]
+        self.table: Tuple[str, ...] = tuple(table)
+        self.targets = sorted(set(table))
+        self.mode = "first-char"
+
+    def route(self, qname: str) -> str:
+        """Return the load balancer for a query name (mirrors appRoute)."""
+        if not qname:
+            return self.default_target
+        code = ord(qname[0])
+        return self.table[code] if code < 256 else self.default_target
+
+    def debug(self, qname: str) -> str:
+        """Return the routing explanation (mirrors appRouteDebug)."""
+        domain = qname.lower()
+        return "Domain: %s, First char: %s, Env: %s, Target: %s" % (
+            domain,
+            domain[:1],
+            self.environment,
+            self.route(qname),
+        )
+
+    def char_map(self) -> Dict[str, str]:
+        """Return the explicit character -> target mapping."""
+        return {
+            char: route["target"]
+            for route in self.routes
+            for char in expand_chars(route["chars"])
+        }
+
+    def fixture_map(self) -> Dict[str, str]:
+        """Expected target of "<char>test.<zone>" per first character, for test fixtures."""
+        return self.char_map()
+
+
+def _mulmod(a: int, b: int) -> int:
+    """a * b mod HASH_PRIME with every intermediate below 2^53 (exact as a Lua double)."""
+    hi = b // 65536
+    return ((a * hi) % HASH_PRIME * 65536 + a * (b - hi * 65536)) % HASH_PRIME
+
+
+def label_hash(label: bytes) -> int:
+    """Polynomial hash of a lower-cased DNS label."""
+    h = 0
+    for byte in label:
+        h = (h * 257 + byte) % HASH_PRIME
+    return h
+
+
+def rendezvous_score(label_h: int, seed: int, weight: float) -> float:
+    """Weighted rendezvous score of one load balancer (seed = its label_hash) for an app."""
+    x = _mulmod((label_h + seed) % HASH_PRIME, 48271)
+    x = _mulmod(x, (x + seed) % HASH_PRIME)
+    x = _mulmod((x + 12345) % HASH_PRIME, 16807)
+    x = _mulmod(x, (x + 1) % HASH_PRIME)
+    return -weight / math.log((x + 1) / (HASH_PRIME + 1))
+
+
+class RendezvousTable:
+    """
+    Weighted rendezvous hashing of the app name for one app zone.
+
+    Each load balancer scores every app name; the highest score wins, so a
+    load balancer's expected share is its weight over the total weight.
+    Load balancers with weight 0 are drained and never chosen.
+    """
+
+    def __init__(
+        self,
+        zone: str,
+        environment: str,
+        weights: Dict[str, float],
+        default_target: str,
+    ):
+        self.zone = zone.rstrip(".").lower()
+        self.environment = environment
+        self.weights = weights
+        self.default_target = default_target
+        self.mode = "rendezvous"
+
+        for target, weight in weights.items():
+            if weight < 0:
+                raise ValueError(f"Negative weight {weight} for {target} in {zone}")
+        # (target, seed, weight) in a fixed order: ties go to the first one
+        self.lbs: List[Tuple[str, int, float]] = [
+            (target, label_hash(target.lower().encode()), weight)
+            for target, weight in sorted(weights.items())
+            if weight > 0
+        ]
+        if not self.lbs:
+            raise ValueError(f"No load balancer with a positive weight in {zone}")
+        self.targets = [target for target, _, _ in self.lbs]
+
+    @staticmethod
+    def app_label(qname: str) -> bytes:
+        """The lower-cased first label of a query name (the app name)."""
+        return qname.encode().split(b".", 1)[0].lower()
+
+    def route(self, qname: str) -> str:
+        """Return the load balancer with the highest score for the app name."""
+        h = label_hash(self.app_label(qname))
+        best, best_score = self.default_target, -math.inf
+        for target, seed, weight in self.lbs:
+            score = rendezvous_score(h, seed, weight)
+            if score > best_score:
+                best, best_score = target, score
+        return best
+
+    def debug(self, qname: str) -> str:
+        """Return the routing explanation (mirrors appRouteDebug in rendezvous mode)."""
+        domain = qname.lower()
+        return "Domain: %s, App: %s, Env: %s, Target: %s" % (
+            domain,
+            self.app_label(domain).decode("ascii", "replace"),
+            self.environment,
+            self.route(qname),
+        )
+
+    def fixture_map(self) -> Dict[str, str]:
+        """Expected target of "<char>test.<zone>" per first character, for test fixtures."""
+        return {
+            char: self.route(f"{char}test.{self.zone}")
+            for char in "0123456789abcdefghijklmnopqrstuvwxyz"
+        }
+
+
+def build_routing_table(
+    zone_config: Dict[str, Any], environment: str
+) -> Union[RoutingTable, RendezvousTable]:
+    """Build the routing table a zone's template_vars select."""
+    template_vars = zone_config.get("template_vars", {})
+    routes = template_vars.get("app_routes", [])
+    mode = template_vars.get("routing_mode", "first-char")
+    if mode not in ROUTING_MODES:
+        raise ValueError(f"Unknown routing_mode '{mode}' for {zone_config['domain']}")
+
+    if mode == "rendezvous":
+        weights = template_vars.get("lb_weights") or {
+            route["target"]: 1 for route in routes
+        }
+        return RendezvousTable(
+            zone_config["domain"],
+            environment,
+            weights,
+            template_vars.get("default_target", sorted(weights)[0]),
+        )
+    return RoutingTable(
+        zone_config["domain"],
+        environment,
+        routes,
+        template_vars.get("default_target", routes[0]["target"]),
+    )
+
+
+AppTable = Union[RoutingTable, RendezvousTable]
+
+
+def load_routing_tables(
+    config: Dict[str, Any], environments: Optional[List[str]] = None
+) -> Dict[str, AppTable]:
+    """Build the routing table of every app zone in vars.yaml, keyed by zone name."""
+    tables: Dict[str, AppTable] = {}
+    for environment in environments or ENVIRONMENTS:
+        env_config = config["powerdns"].get(environment) or {}
+        for zone_config in env_config.get("zone_configs", []):
+            template_vars = zone_config.get("template_vars", {})
+            if zone_config.get("type") != "app" or not (
+                "app_routes" in template_vars or "lb_weights" in template_vars
+            ):
+                continue
+            table = build_routing_table(zone_config, environment)
+            tables[table.zone] = table
+    return tables
+
+
+def find_table(tables: Dict[str, AppTable], qname: str) -> Optional[AppTable]:
+    """Return the routing table whose zone contains qname, if any."""
+    name = qname.rstrip(".").lower()
+    for zone, table in tables.items():
+        if name.endswith("." + zone):
+            return table
+    return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Show the app routing tables compiled from vars.yaml"
+    )
+    parser.add_argument("qnames", nargs="*", help="Query names to route")
+    parser.add_argument(
+        "-c",
+        "--config",
+        help="Configuration file path (default: ../vars.yaml from script location)",
+    )
+    args = parser.parse_args()
+
+    config_path = args.config or Path(__file__).parent.parent / "vars.yaml"
+    with open(config_path, "r") as f:
+        tables = load_routing_tables(yaml.safe_load(f))
+
+    if not args.qnames:
+        for zone, table in tables.items():
+            print(f"{zone} ({table.environment}, {table.mode}), default {table.default_target}")
+            if isinstance(table, RendezvousTable):
+                for target, _, weight in table.lbs:
+                    print(f"  weight {weight:<5} -> {target}")
+            else:
+                for route in table.routes:
+                    print(f"  {route['chars']:<10} -> {route['target']}")
+        return
+
+    for qname in args.qnames:
+        table = find_table(tables, qname)
+        if table is None:
+            print(f"{qname}: not in any app zone")
+            sys.exit(1)
+        print(table.debug(qname))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+#!/usr/bin/env -S uv run --script
+# /// script
+# requires-python = ">=3.8"
+# dependencies = [
+#     "jinja2>=3.0",
+#     "lupa>=2.0",
+#     "pyyaml>=6.0",
+# ]
+# ///
+"""
+App Routing Benchmark: remote backend vs. appRouteCname
+
+Compares queries per second and latency percentiles of three ways of
+answering *.app.runonflux.io wildcard queries, with PowerDNS replaced by
+a local stand-in driver:
+
+  lua             appRouteCname() from the per-zone modules compiled by
+                  generate_zone.py --routing, called the way the LUA
+                  record does for every query (needs lupa)
+  backend         AppRoutingBackend.handle() called in-process, i.e. the
+                  cost of the remote backend without any IPC
+  backend-socket  pdns_remote_backend.py as a separate process, driven over
+                  its unix socket by --connections synchronous clients, the
+                  way PowerDNS's backend threads use the remote connector
+
+It also reports the per-query cost inside Lua (a loop timed with
+os.clock(), without the Python call overhead) of the compiled modules
+("lua_ns_per_query", per zone and weighted by the zones' shares of the
+query names), next to the hand-written script they replaced
+(fixtures/app_routing.lua, "handwritten").
+
+Usage with uv (recommended):
+  uv run bench_app_routing.py
+  uv run bench_app_routing.py --queries 500000 --names 20000 --connections 3
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import string
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import yaml
+
+from app_routing import find_table, load_routing_tables
+from generate_zone import render_routing_module
+from pdns_remote_backend import AppRoutingBackend
+
+SCRIPT_DIR = Path(__file__).parent
+# The hand-written script the compiled modules replaced, kept as the baseline
+HANDWRITTEN_SCRIPT = SCRIPT_DIR / "fixtures" / "app_routing.lua"
+FIRST_CHARS = string.digits + string.ascii_lowercase
+ZONES = ("app.runonflux.io", "app2.runonflux.io")
+
+
+def make_qnames(count: int, seed: int) -> List[str]:
+    """Random app names spread over every first character and both zones."""
+    rng = random.Random(seed)
+    names = []
+    for _ in range(count):
+        label = rng.choice(FIRST_CHARS) + "".join(
+            rng.choice(FIRST_CHARS) for _ in range(rng.randint(3, 11))
+        )
+        names.append(f"{label}.{rng.choice(ZONES)}")
+    return names
+
+
+def summarize(latencies_ns: List[int], elapsed: float) -> Dict[str, Any]:
+    """QPS and latency percentiles (microseconds) for one run."""
+    latencies_ns.sort()
+    count = len(latencies_ns)
+
+    def pct(p: float) -> float:
+        return round(latencies_ns[min(count - 1, int(count * p))] / 1000, 2)
+
+    return {
+        "queries": count,
+        "elapsed_s": round(elapsed, 3),
+        "qps": round(count / elapsed) if elapsed else 0,
+        "p50_us": pct(0.50),
+        "p99_us": pct(0.99),
+        "max_us": round(latencies_ns[-1] / 1000, 2),
+    }
+
+
+def bench_lua(config: Dict[str, Any], qnames: List[str], queries: int) -> Dict[str, Any]:
+    """Call appRouteCname() for every query through an embedded Lua runtime per zone."""
+    from lupa import LuaRuntime  # type: ignore[import-not-found]
+
+    # Like PowerDNS, each zone runs its own module; resolve it up front
+    tables = load_routing_tables(config)
+    routes = {}
+    for zone, table in tables.items():
+        lua = LuaRuntime()
+        lua.execute(render_routing_module(table))
+        routes[zone] = lua.globals().appRouteCname
+    calls = [(routes[find_table(tables, q).zone], q) for q in qnames]
+
+    clock = time.perf_counter_ns
+    latencies = []
+    n = len(calls)
+    start = time.perf_counter()
+    for i in range(queries):
+        route, qname = calls[i % n]
+        t0 = clock()
+        route(qname)
+        latencies.append(clock() - t0)
+    return summarize(latencies, time.perf_counter() - start)
+
+
+LUA_LOOP = """
+function(names, n, queries)
+    local route = appRouteCname
+    local start = os.clock()
+    for i = 1, queries do
+        route(names[(i - 1) % n + 1])
+    end
+    return os.clock() - start
+end
+"""
+
+
+def lua_ns_per_query(source: str, qnames: List[str], queries: int) -> float:
+    """Nanoseconds per appRouteCname() call, timed inside Lua."""
+    from lupa import LuaRuntime  # type: ignore[import-not-found]
+
+    lua = LuaRuntime()
+    lua.execute(source)
+    run = lua.eval(LUA_LOOP)
+    elapsed = run(lua.table_from([q + "." for q in qnames]), len(qnames), queries)
+    return elapsed / queries * 1e9
+
+
+def bench_lua_compiled(config: Dict[str, Any], qnames: List[str], queries: int) -> Dict[str, Any]:
+    """Per-query Lua cost of each compiled per-zone module, weighted by the zones' shares, vs. the baseline."""
+    results: Dict[str, Any] = {}
+    weighted = 0.0
+    for zone, table in load_routing_tables(config).items():
+        zone_names = [q for q in qnames if q.endswith("." + zone)]
+        if zone_names:
+            share = len(zone_names) / len(qnames)
+            ns = lua_ns_per_query(render_routing_module(table), zone_names, max(1, int(queries * share)))
+            results[zone] = round(ns, 1)
+            weighted += share * ns
+    results["weighted"] = round(weighted, 1)
+    handwritten = lua_ns_per_query(HANDWRITTEN_SCRIPT.read_text(), qnames, queries)
+    results["handwritten"] = round(handwritten, 1)
+    results["speedup"] = round(handwritten / weighted, 2) if weighted else None
+    return results
+
+
+def bench_backend(backend: AppRoutingBackend, qnames: List[str], queries: int) -> Dict[str, Any]:
+    """Call the remote backend handler in-process with encoded lookup requests."""
+    requests = [lookup_request(q) for q in qnames]
+    handle = backend.handle
+
+    clock = time.perf_counter_ns
+    latencies = []
+    n = len(requests)
+    start = time.perf_counter()
+    for i in range(queries):
+        raw = requests[i % n]
+        t0 = clock()
+        handle(raw)
+        latencies.append(clock() - t0)
+    return summarize(latencies, time.perf_counter() - start)
+
+
+def lookup_request(qname: str) -> bytes:
+    """The lookup message PowerDNS sends for a wildcard query."""
+    return (
+        json.dumps(
+            {
+                "method": "lookup",
+                "parameters": {
+                    "qtype": "ANY",
+                    "qname": qname + ".",
+                    "remote": "192.0.2.1",
+                    "local": "0.0.0.0",
+                    "real-remote": "192.0.2.1/32",
+                    "zone-id": -1,
+                },
+            }
+        ).encode()
+        + b"\n"
+    )
+
+
+async def bench_socket(
+    socket_path: str, qnames: List[str], queries: int, connections: int
+) -> Dict[str, Any]:
+    """Drive the backend process over its unix socket, one request in flight per connection."""
+    requests = [lookup_request(q) for q in qnames]
+    per_connection = queries // connections
+    clock = time.perf_counter_ns
+    latencies: List[int] = []
+
+    async def client(offset: int) -> None:
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+        n = len(requests)
+        for i in range(per_connection):
+            t0 = clock()
+            writer.write(requests[(offset + i) % n])
+            await reader.readline()
+            latencies.append(clock() - t0)
+        writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(c * 7919) for c in range(connections)))
+    return summarize(latencies, time.perf_counter() - start)
+
+
+def run_backend_process(config_path: Path, socket_path: str, cache_size: int) -> subprocess.Popen:
+    """Start pdns_remote_backend.py and wait for its socket to appear."""
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            str(SCRIPT_DIR / "pdns_remote_backend.py"),
+            "--socket",
+            socket_path,
+            "--config",
+            str(config_path),
+            "--cache-size",
+            str(cache_size),
+        ],
+        stdout=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 10
+    while not os.path.exists(socket_path):
+        if process.poll() is not None or time.time() > deadline:
+            process.kill()
+            print("Error: remote backend did not start")
+            sys.exit(1)
+        time.sleep(0.05)
+    return process
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the app routing remote backend against appRouteCname"
+    )
+    parser.add_argument("--queries", type=int, default=200000, help="Queries per run (default: 200000)")
+    parser.add_argument("--names", type=int, default=10000, help="Distinct app names (default: 10000)")
+    parser.add_argument(
+        "--connections",
+        type=int,
+        default=3,
+        help="Stand-in PowerDNS backend connections (default: 3, like distributor-threads)",
+    )
+    parser.add_argument("--cache-size", type=int, default=100000, help="Backend LRU size (default: 100000)")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for app names")
+    parser.add_argument(
+        "-c",
+        "--config",
+        help="Configuration file path (default: ../vars.yaml from script location)",
+    )
+    args = parser.parse_args()
+
+    config_path = Path(args.config) if args.config else SCRIPT_DIR.parent / "vars.yaml"
+    with open(config_path, "r") as f:
+        config = yaml.safe_load(f)
+
+    qnames = make_qnames(args.names, args.seed)
+    results: Dict[str, Any] = {
+        "queries": args.queries,
+        "distinct_names": args.names,
+        "connections": args.connections,
+    }
+
+    try:
+        results["lua"] = bench_lua(config, qnames, args.queries)
+        results["lua_ns_per_query"] = bench_lua_compiled(config, qnames, args.queries * 10)
+    except ImportError:
+        results["lua"] = {"error": "lupa not installed (pip install lupa)"}
+
+    backend = AppRoutingBackend(config, ["staging", "production"], args.cache_size)
+    results["backend"] = bench_backend(backend, qnames, args.queries)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        socket_path = os.path.join(tmp, "backend.sock")
+        process = run_backend_process(config_path, socket_path, args.cache_size)
+        try:
+            results["backend-socket"] = asyncio.run(
+                bench_socket(socket_path, qnames, args.queries, args.connections)
+            )
+        finally:
+            process.terminate()
+            process.wait()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
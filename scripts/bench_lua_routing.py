@@ -0,0 +1,614 @@
+#!/usr/bin/env -S uv run --script
+# /// script
+# requires-python = ">=3.8"
+# dependencies = [
+#     "jinja2>=3.0",
+#     "lupa>=2.0",
+#     "pyyaml>=6.0",
+# ]
+# ///
+"""
+Offline Benchmark and Conformance Harness for the Lua Routing Scripts
+
+Loads the routing scripts PowerDNS runs into an embedded Lua interpreter
+(lupa), with PowerDNS's ifportup / pickclosest / pickwrandom replaced by
+deterministic stubs, so they can be measured and regression-tested
+without a deployed server:
+
+  app_routing.<zone>.lua     appRouteCname, appRouteDebug, compiled by
+                             generate_zone.py --routing (first-character
+                             or rendezvous mode)
+  fixtures/app_routing.lua   the same, hand-written for both app zones:
+                             the baseline the compiled modules replaced
+                             (--app-script takes another one)
+  geo_routing.lua            geoRoute, getServerStatus, rendered from
+                             templates/geo_routing.lua.j2 per environment,
+                             and geoRouteWeighted for a fixture of located
+                             regions with capacities (vars.yaml has none)
+
+Benchmark: every function is called --queries times from a Lua loop over
+synthetic query names; the report gives ns/query (os.clock, so the Python
+call overhead is excluded) and bytes allocated per query (collectgarbage
+with the collector stopped). Query names are passed as strings, whereas
+PowerDNS passes a DNSName userdata that tostring() converts. The geo
+records run include('_config') before the function on every query: the
+"include+" entries add that, compiling the _config chunk of
+templates/zone.template.j2 each time and running it, so whatever it
+dofile()s from a temporary file is read and compiled too. --geo-template
+benchmarks an earlier revision of the template next to the current one,
+e.g. git show HEAD~1:templates/geo_routing.lua.j2, with the _config
+chunk of --zone-template (default: the current zone template).
+
+Conformance: app routing results are compared with app_routing.py and geo
+results with a Python model of the stubs for every health scenario (all
+up, each server down, all down) and every "closest" server; weighted
+results also for several client locations, radii and random draws.
+
+The script exits non-zero on a conformance mismatch, or with --baseline
+when a function got slower than --max-regression times the baseline.
+
+Usage with uv (recommended):
+  uv run bench_lua_routing.py
+  uv run bench_lua_routing.py --queries 5000000 --output baseline.json
+  uv run bench_lua_routing.py --baseline baseline.json --max-regression 1.25
+  git show HEAD~1:templates/geo_routing.lua.j2 > before.lua.j2
+  git show HEAD~1:templates/zone.template.j2 > before.zone.j2
+  uv run bench_lua_routing.py --geo-template before.lua.j2 --zone-template before.zone.j2
+"""
+
+import argparse
+import itertools
+import json
+import math
+import random
+import re
+import string
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Set, Tuple
+
+import yaml
+
+from app_routing import AppTable, find_table, load_routing_tables
+from generate_zone import TEMPLATE_DIR, get_template, render_routing_module
+
+SCRIPT_DIR = Path(__file__).parent
+# The hand-written app routing script the compiled modules replaced
+HANDWRITTEN_APP_SCRIPT = SCRIPT_DIR / "fixtures" / "app_routing.lua"
+ENVIRONMENTS = ["staging", "production"]
+NAME_CHARS = string.digits + string.ascii_lowercase
+EARTH_DIAMETER_KM = 12742
+GEO_SCRIPT_PATH = "/opt/pdns/scripts/geo_routing.lua"
+
+# Located regions with capacities for geoRouteWeighted(): two close EU
+# nodes, a drained one and one without coordinates
+WEIGHTED_FIXTURE = [
+    {"name": "eu-central", "server": "cdn-1.example", "ip": "192.0.2.1", "latitude": 49.45, "longitude": 11.08, "capacity": 3},
+    {"name": "eu-west", "server": "cdn-2.example", "ip": "192.0.2.2", "latitude": 50.11, "longitude": 8.68, "capacity": 1},
+    {"name": "us-east", "server": "cdn-3.example", "ip": "192.0.2.3", "latitude": 42.89, "longitude": -78.88, "capacity": 2},
+    {"name": "as-east", "server": "cdn-4.example", "ip": "192.0.2.4", "latitude": 22.28, "longitude": 114.16, "capacity": 0},
+    {"name": "as-south", "server": "cdn-5.example", "ip": "192.0.2.5"},
+]
+# (latitude, longitude) of the clients in the weighted scenarios; 0,0 is
+# what latlon() returns when the client is not in the database
+WEIGHTED_CLIENTS = [(48.14, 11.58), (40.71, -74.01), (1.29, 103.85), (0.0, 0.0)]
+WEIGHTED_RADII = [0, 500, 20000]
+WEIGHTED_DRAWS = [0.0, 0.5, 0.99]
+
+# Stand-ins for the PowerDNS LUA record functions. Health state and client
+# position are set from Python through __down (ip -> true), __closest
+# (ip -> rank, lower is closer) and __latlon (what latlon() returns).
+# Selectors that are random in PowerDNS pick the first candidate so results
+# are reproducible; pickwrandom() draws __random (0 <= __random < 1).
+LUA_STUBS = """
+__down = {}
+__closest = {}
+__latlon = "0.000000 0.000000"
+__random = 0
+
+function latlon()
+    return __latlon
+end
+
+function pickclosest(ips)
+    local best, best_rank = ips[1], math.huge
+    for _, ip in ipairs(ips) do
+        local rank = __closest[ip] or math.huge
+        if rank < best_rank then
+            best, best_rank = ip, rank
+        end
+    end
+    return best
+end
+
+function pickwrandom(items)
+    local total = 0
+    for _, item in ipairs(items) do
+        total = total + item[1]
+    end
+    local target = __random * total
+    for _, item in ipairs(items) do
+        target = target - item[1]
+        if target < 0 then
+            return item[2]
+        end
+    end
+    return items[#items][2]
+end
+
+function ifportup(port, ips, options)
+    options = options or {}
+    local up = {}
+    for _, ip in ipairs(ips) do
+        if not __down[ip] then
+            up[#up + 1] = ip
+        end
+    end
+    local selector = options.selector or "random"
+    if #up == 0 then
+        up = ips
+        selector = options.backupSelector or "random"
+    end
+    if selector == "all" then
+        return up
+    elseif selector == "pickclosest" then
+        return {pickclosest(up)}
+    end
+    return {up[1]}
+end
+"""
+
+# One query: the function, or with include also the _config record's chunk
+# first, compiled each time as include() does
+QUERY = "fn(names[(i - 1) % n + 1])"
+INCLUDE_QUERY = "load(config)(); fn(names[(i - 1) % n + 1])"
+
+BENCH_LOOP = """
+function(fn, names, n, queries, config)
+    local clock = os.clock
+    local start = clock()
+    for i = 1, queries do
+        %s
+    end
+    return clock() - start
+end
+"""
+
+ALLOC_LOOP = """
+function(fn, names, n, queries, config)
+    collectgarbage("collect")
+    collectgarbage("stop")
+    local before = collectgarbage("count")
+    for i = 1, queries do
+        %s
+    end
+    local used = collectgarbage("count") - before
+    collectgarbage("restart")
+    collectgarbage("collect")
+    return used * 1024
+end
+"""
+
+
+def make_qnames(zones: List[str], count: int, seed: int) -> List[str]:
+    """Synthetic app names: every first character, some upper case, some odd labels."""
+    rng = random.Random(seed)
+    names = []
+    for i in range(count):
+        first = rng.choice(NAME_CHARS)
+        label = first + "".join(rng.choice(NAME_CHARS) for _ in range(rng.randint(3, 11)))
+        if i % 17 == 0:
+            label = label.upper()
+        elif i % 29 == 0:
+            label = "_" + label
+        names.append(f"{label}.{rng.choice(zones)}.")
+    return names
+
+
+class LuaScript:
+    """One routing script loaded into its own Lua runtime with the stubs."""
+
+    def __init__(self, name: str, source: str, config: str = "dofile(%r)"):
+        from lupa import LuaRuntime  # type: ignore[import-not-found]
+
+        self.name = name
+        self.lua = LuaRuntime()
+        self.lua.execute(LUA_STUBS)
+        # The file the _config record loads; config is its chunk, with %r for the path
+        self.script = tempfile.NamedTemporaryFile("w", prefix="bench-", suffix=".lua")
+        self.script.write(source)
+        self.script.flush()
+        self.config = config % self.script.name
+        # The first query's include, as in a fresh PowerDNS Lua state
+        self.lua.execute(self.config)
+        self.globals = self.lua.globals()
+        queries = {False: QUERY, True: INCLUDE_QUERY}
+        self._bench = {include: self.lua.eval(BENCH_LOOP % query) for include, query in queries.items()}
+        self._alloc = {include: self.lua.eval(ALLOC_LOOP % query) for include, query in queries.items()}
+
+    def function(self, name: str) -> Callable:
+        fn = self.globals[name]
+        if fn is None:
+            raise KeyError(f"{self.name} does not define {name}()")
+        return fn
+
+    def set_health(
+        self, down: Set[str], closest: List[str], client: Tuple[float, float] = (0.0, 0.0), draw: float = 0.0
+    ) -> None:
+        self.globals["__down"] = self.lua.table_from({ip: True for ip in down})
+        self.globals["__closest"] = self.lua.table_from({ip: rank for rank, ip in enumerate(closest)})
+        self.globals["__latlon"] = "%f %f" % client
+        self.globals["__random"] = draw
+
+    def measure(
+        self, function: str, args: List[Any], queries: int, alloc_queries: int, include: bool = False
+    ) -> Dict[str, float]:
+        fn = self.function(function)
+        table = self.lua.table_from(args)
+        elapsed = self._bench[include](fn, table, len(args), queries, self.config)
+        allocated = self._alloc[include](fn, table, len(args), alloc_queries, self.config)
+        return {
+            "ns_per_query": round(elapsed / queries * 1e9, 1),
+            "bytes_per_query": round(allocated / alloc_queries, 1),
+        }
+
+
+class GeoReference:
+    """Python model of geo_routing.lua on top of the stub semantics."""
+
+    def __init__(self, regions: List[Dict[str, Any]]):
+        self.regions = regions
+        self.ips = [region["ip"] for region in regions]
+        self.by_ip = {region["ip"]: region for region in regions}
+
+    def _ifportup(self, down: Set[str], closest: List[str], selector: str, backup: str) -> List[str]:
+        up = [ip for ip in self.ips if ip not in down]
+        if not up:
+            up, selector = self.ips, backup
+        if selector == "all":
+            return up
+        if selector == "pickclosest":
+            return [self._pickclosest(up, closest)]
+        return up[:1]
+
+    @staticmethod
+    def _pickclosest(ips: List[str], closest: List[str]) -> str:
+        rank = {ip: i for i, ip in enumerate(closest)}
+        return min(ips, key=lambda ip: rank.get(ip, len(rank)))
+
+    def geo_route(self, down: Set[str], closest: List[str]) -> List[str]:
+        return self._ifportup(down, closest, "pickclosest", "pickclosest")
+
+    def geo_route_weighted(
+        self, down: Set[str], closest: List[str], client: Tuple[float, float], draw: float, radius_km: float
+    ) -> List[str]:
+        available = self._ifportup(down, closest, "all", "all")
+        lat, lon = math.radians(client[0]), math.radians(client[1])
+        located = []
+        for ip in available:
+            region = self.by_ip[ip]
+            if "latitude" not in region:
+                continue
+            region_lat, region_lon = math.radians(region["latitude"]), math.radians(region["longitude"])
+            a = (
+                math.sin((region_lat - lat) / 2) ** 2
+                + math.cos(lat) * math.cos(region_lat) * math.sin((region_lon - lon) / 2) ** 2
+            )
+            located.append((EARTH_DIAMETER_KM * math.asin(math.sqrt(min(a, 1))), region))
+        if not located:
+            return [self._pickclosest(available, closest)]
+        nearest = min(km for km, _ in located)
+        candidates = [
+            (region.get("capacity", 1), region["ip"])
+            for km, region in located
+            if km <= nearest + radius_km and region.get("capacity", 1) > 0
+        ]
+        if not candidates:
+            # All drained in the radius: the nearest region that is not, else the closest one
+            live = [(km, region) for km, region in located if region.get("capacity", 1) > 0]
+            return [min(live or located, key=lambda item: item[0])[1]["ip"]]
+        target = draw * sum(weight for weight, _ in candidates)
+        for weight, ip in candidates:
+            target -= weight
+            if target < 0:
+                return [ip]
+        return [candidates[-1][1]]
+
+    def server_status(self, down: Set[str], closest: List[str]) -> str:
+        available = set(self._ifportup(down, closest, "all", "random"))
+        parts = [
+            f"{region['name']}:{'UP' if region['ip'] in available else 'DOWN'}"
+            for region in self.regions
+        ]
+        up_count = sum(1 for region in self.regions if region["ip"] in available)
+        return f"UP:{up_count} DOWN:{len(self.regions) - up_count} " + ",".join(parts)
+
+
+def geo_regions(config: Dict[str, Any], environment: str) -> List[Dict[str, str]]:
+    """The regions geo_routing.lua.j2 collects for an environment, in template order."""
+    return [
+        region
+        for zone_config in config["powerdns"][environment].get("zone_configs", [])
+        if zone_config.get("template_vars", {}).get("geo_routing", False)
+        for region in zone_config["template_vars"].get("geo_regions", [])
+    ]
+
+
+def render_geo_script(config: Dict[str, Any], environment: str, template: Path = TEMPLATE_DIR / "geo_routing.lua.j2") -> str:
+    return get_template(template.parent, template.name).render(DEPLOY_ENV=environment, powerdns=config["powerdns"])
+
+
+def geo_config_chunk(zone_template: Path = TEMPLATE_DIR / "zone.template.j2") -> str:
+    """The geo zones' _config record chunk from a zone template, with %r for the script path."""
+    for line in zone_template.read_text().splitlines():
+        match = re.match(r'_config\s+IN\s+LUA\s+LUA\s+"(.*)"$', line)
+        if match and GEO_SCRIPT_PATH in match.group(1):
+            return match.group(1).replace(repr(GEO_SCRIPT_PATH), "%r")
+    raise ValueError(f"{zone_template} has no geo_routing.lua _config record")
+
+
+def weighted_fixture_config(config: Dict[str, Any]) -> Dict[str, Any]:
+    """A config whose production geo zone has the WEIGHTED_FIXTURE regions, with config's health checks."""
+    zone = {"domain": "cdn-geo.example", "template_vars": {"geo_routing": True, "geo_regions": WEIGHTED_FIXTURE}}
+    return {
+        "powerdns": {
+            "lua_health_checks": config["powerdns"]["lua_health_checks"],
+            "production": {"zone_configs": [zone]},
+        }
+    }
+
+
+def check_app(
+    script: LuaScript,
+    tables: Dict[str, AppTable],
+    qnames: List[str],
+    mismatches: List[Dict[str, Any]],
+) -> int:
+    """Compare appRouteCname/appRouteDebug with app_routing.py; returns checks run."""
+    cname = script.function("appRouteCname")
+    debug = script.function("appRouteDebug")
+    checks = 0
+    for qname in qnames:
+        table = find_table(tables, qname)
+        if table is None:
+            continue
+        for function, got, expected in (
+            ("appRouteCname", cname(qname), table.route(qname)),
+            ("appRouteDebug", debug(qname), table.debug(qname)),
+        ):
+            checks += 1
+            if got != expected:
+                mismatches.append(
+                    {"script": script.name, "function": function, "qname": qname, "got": got, "expected": expected}
+                )
+    return checks
+
+
+def health_scenarios(ips: List[str]) -> List[Tuple[str, Set[str], List[str]]]:
+    """(label, down set, closest order) for all-up, each-down and all-down, per closest server."""
+    states = [("all-up", set())]
+    states += [(f"{ip}-down", {ip}) for ip in ips]
+    states.append(("all-down", set(ips)))
+    scenarios = []
+    for label, down in states:
+        for i in range(len(ips)):
+            closest = ips[i:] + ips[:i]
+            scenarios.append((f"{label},closest={closest[0]}", down, closest))
+    return scenarios
+
+
+def check_geo(
+    script: LuaScript, reference: GeoReference, mismatches: List[Dict[str, Any]], weighted: bool = True
+) -> int:
+    """Compare geoRoute/getServerStatus (and geoRouteWeighted) with GeoReference in every scenario."""
+    geo_route = script.function("geoRoute")
+    status = script.function("getServerStatus")
+    geo_route_weighted = script.function("geoRouteWeighted") if weighted else None
+    checks = 0
+    for label, down, closest in health_scenarios(reference.ips):
+        script.set_health(down, closest)
+        results = [
+            ("geoRoute", label, list(geo_route().values()), reference.geo_route(down, closest)),
+            ("getServerStatus", label, status(), reference.server_status(down, closest)),
+        ]
+        if geo_route_weighted is not None:
+            for client, draw, radius in itertools.product(WEIGHTED_CLIENTS, WEIGHTED_DRAWS, WEIGHTED_RADII):
+                script.set_health(down, closest, client, draw)
+                results.append((
+                    "geoRouteWeighted",
+                    f"{label},client={client[0]} {client[1]},random={draw},radius={radius}",
+                    list(geo_route_weighted(radius).values()),
+                    reference.geo_route_weighted(down, closest, client, draw, radius),
+                ))
+        for function, scenario, got, expected in results:
+            checks += 1
+            if got != expected:
+                mismatches.append(
+                    {"script": script.name, "function": function, "scenario": scenario, "got": got, "expected": expected}
+                )
+    script.set_health(set(), reference.ips)
+    return checks
+
+
+def check_reload(
+    script: LuaScript, source: str, reference: GeoReference, mismatches: List[Dict[str, Any]]
+) -> int:
+    """Running the script with other regions in an already loaded Lua state must replace the tables."""
+    script.lua.execute(source)
+    script.set_health(set(), reference.ips)
+    got = list(script.function("getAllServerIPs")().values())
+    if got != reference.ips:
+        mismatches.append(
+            {"script": script.name, "function": "getAllServerIPs", "scenario": "reload", "got": got, "expected": reference.ips}
+        )
+    return 1
+
+
+def compare_baseline(
+    results: Dict[str, Dict[str, float]], baseline_path: Path, max_regression: float
+) -> List[str]:
+    """Functions whose ns/query exceeds the baseline by more than max_regression."""
+    with open(baseline_path, "r") as f:
+        baseline = json.load(f).get("benchmarks", {})
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if previous and current["ns_per_query"] > previous["ns_per_query"] * max_regression:
+            regressions.append(
+                f"{key}: {current['ns_per_query']} ns/query vs baseline {previous['ns_per_query']}"
+            )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark and conformance-check the Lua routing scripts offline"
+    )
+    parser.add_argument("--queries", type=int, default=1000000, help="Calls per function (default: 1000000)")
+    parser.add_argument("--names", type=int, default=100000, help="Distinct query names (default: 100000)")
+    parser.add_argument(
+        "--alloc-queries",
+        type=int,
+        default=100000,
+        help="Calls per function for the allocation count (default: 100000)",
+    )
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for query names")
+    parser.add_argument(
+        "--app-script",
+        type=Path,
+        default=HANDWRITTEN_APP_SCRIPT,
+        help="Hand-written first-character app routing script to check and benchmark as the baseline "
+        "(default: fixtures/app_routing.lua, the script the compiled modules replaced)",
+    )
+    parser.add_argument(
+        "--geo-template",
+        type=Path,
+        help="Also benchmark this geo_routing.lua.j2 (e.g. an earlier revision) and compare it with the current one",
+    )
+    parser.add_argument(
+        "--zone-template",
+        type=Path,
+        help="zone.template.j2 whose geo _config record the --geo-template include+ entries run "
+        "(default: the current one)",
+    )
+    parser.add_argument("--baseline", type=Path, help="Earlier --output report to compare ns/query against")
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=1.25,
+        help="Allowed ns/query ratio to the baseline (default: 1.25)",
+    )
+    parser.add_argument("--output", type=Path, help="Also write the JSON report to this file")
+    parser.add_argument(
+        "-c",
+        "--config",
+        help="Configuration file path (default: ../vars.yaml from script location)",
+    )
+    args = parser.parse_args()
+
+    config_path = args.config or SCRIPT_DIR.parent / "vars.yaml"
+    with open(config_path, "r") as f:
+        config = yaml.safe_load(f)
+
+    try:
+        import lupa  # type: ignore[import-not-found]  # noqa: F401
+    except ImportError:
+        print("Error: lupa is required (pip install lupa, or run with uv)")
+        sys.exit(1)
+
+    tables = load_routing_tables(config)
+    qnames = make_qnames(list(tables), args.names, args.seed)
+
+    benchmarks: Dict[str, Dict[str, float]] = {}
+    mismatches: List[Dict[str, Any]] = []
+    checks = 0
+
+    def bench(script: LuaScript, function: str, names: List[Any], include: bool = False) -> None:
+        benchmarks[f"{script.name}:{'include+' if include else ''}{function}"] = script.measure(
+            function, names, args.queries, args.alloc_queries, include
+        )
+
+    if args.app_script:
+        # A hand-written script only implements first-character routing
+        app_script = LuaScript(args.app_script.name, args.app_script.read_text())
+        first_char = {zone: t for zone, t in tables.items() if t.mode == "first-char"}
+        checks += check_app(app_script, first_char, qnames, mismatches)
+        bench(app_script, "appRouteCname", qnames)
+        bench(app_script, "appRouteDebug", qnames)
+
+    for zone, table in tables.items():
+        script = LuaScript(f"app_routing.{zone}.lua", render_routing_module(table))
+        zone_names = [q for q in qnames if find_table(tables, q) is table]
+        checks += check_app(script, {zone: table}, zone_names, mismatches)
+        bench(script, "appRouteCname", zone_names)
+        bench(script, "appRouteDebug", zone_names)
+
+    # The geo functions ignore the query name; geoRouteWeighted() takes the radius
+    radii = [500]
+    geo_config = geo_config_chunk()
+    geo_scripts = [("geo_routing.lua", TEMPLATE_DIR / "geo_routing.lua.j2", geo_config)]
+    if args.geo_template:
+        geo_scripts.append((
+            f"geo_routing.lua@{args.geo_template.name}",
+            args.geo_template,
+            geo_config_chunk(args.zone_template) if args.zone_template else geo_config,
+        ))
+    comparison: Dict[str, Dict[str, Any]] = {}
+    for environment in ENVIRONMENTS:
+        regions = geo_regions(config, environment)
+        if not regions:
+            continue
+        for name, template, chunk in geo_scripts:
+            script = LuaScript(f"{name}[{environment}]", render_geo_script(config, environment, template), chunk)
+            # Earlier revisions may not have a working geoRouteWeighted()
+            current = template == geo_scripts[0][1]
+            checks += check_geo(script, GeoReference(regions), mismatches, weighted=current)
+            for include in (False, True):
+                bench(script, "geoRoute", qnames, include)
+                bench(script, "getServerStatus", qnames, include)
+        if args.geo_template:
+            for function in ("geoRoute", "getServerStatus", "include+geoRoute", "include+getServerStatus"):
+                after = benchmarks[f"geo_routing.lua[{environment}]:{function}"]["ns_per_query"]
+                before = benchmarks[f"{geo_scripts[1][0]}[{environment}]:{function}"]["ns_per_query"]
+                comparison[f"{environment}:{function}"] = {
+                    "before_ns": before,
+                    "after_ns": after,
+                    "speedup": round(before / after, 2) if after else None,
+                }
+
+    fixture = weighted_fixture_config(config)
+    fixture_source = render_geo_script(fixture, "production")
+    if geo_regions(config, "production"):
+        script = LuaScript("geo_routing.lua[production]", render_geo_script(config, "production"), geo_config)
+        checks += check_reload(script, fixture_source, GeoReference(WEIGHTED_FIXTURE), mismatches)
+    script = LuaScript("geo_routing.lua[weighted-fixture]", fixture_source, geo_config)
+    checks += check_geo(script, GeoReference(WEIGHTED_FIXTURE), mismatches)
+    script.set_health(set(), [region["ip"] for region in WEIGHTED_FIXTURE], WEIGHTED_CLIENTS[0], 0.5)
+    for include in (False, True):
+        bench(script, "geoRoute", qnames, include)
+        bench(script, "geoRouteWeighted", radii, include)
+
+    report: Dict[str, Any] = {
+        "queries": args.queries,
+        "distinct_names": args.names,
+        "benchmarks": benchmarks,
+        **({"geo_template_comparison": comparison} if args.geo_template else {}),
+        "conformance": {"checks": checks, "mismatches": len(mismatches), "examples": mismatches[:10]},
+    }
+    regressions: List[str] = []
+    if args.baseline:
+        regressions = compare_baseline(benchmarks, args.baseline, args.max_regression)
+        report["regressions"] = regressions
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if mismatches or regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,513 @@
+#!/usr/bin/env -S uv run --script
+# /// script
+# requires-python = ">=3.8"
+# dependencies = [
+#     "aiodns>=3.0.0",
+#     "aiohttp>=3.8.0",
+#     "prometheus-client>=0.17.0",
+#     "pyyaml>=6.0",
+# ]
+# ///
+"""
+CDN Health Aggregator
+
+One monitor_cdn_health.py only sees the CDN nodes from where it runs, while
+pickclosest answers, and the paths to the nodes, depend on where the client
+is. Agents on several continents run the usual checks and push compact
+batches of results (health_wire.py) here:
+
+  uv run monitor_cdn_health.py --push udp://aggregator:9109 --vantage eu-west --interval 1
+
+The aggregator merges them into a per-node, per-vantage matrix: last state,
+consecutive failures, availability and latency EWMAs, and connect-time
+percentiles over the last samples. Per node, the verdict is up, down,
+partial (only some vantages see it up) or stale. UDP frames that arrive
+after a newer one are still applied if they are at most REORDER_WINDOW
+frames behind; they then no longer count as lost, and only move a cell's
+state if their probes are newer than its last one. Repeated frames and
+older ones are dropped. Ingest only updates a few counters per probe; percentiles, JSON and metrics are computed when asked
+for, so dozens of agents at 1 s intervals cost very little CPU.
+
+The same port takes frames over UDP and over HTTP (POST /ingest), and
+serves GET /matrix (JSON) and GET /metrics (Prometheus). With --key (or
+$CDN_HEALTH_KEY) frames must carry an HMAC with the shared key.
+
+Usage:
+  uv run cdn_health_aggregator.py                      # UDP+HTTP on :9109, table every 5s
+  uv run cdn_health_aggregator.py --port 9200 --print-interval 0
+  uv run cdn_health_aggregator.py --duration 30 --json # Matrix after 30s, as JSON
+  curl -s localhost:9109/matrix | jq .
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import time
+from array import array
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from aiohttp import web  # type: ignore[import-not-found]
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, generate_latest  # type: ignore[import-not-found]
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily  # type: ignore[import-not-found]
+
+from health_wire import FLAG_DEGRADED, FLAG_UP, NO_VALUE, Frame, decode_frame, unpack_address
+from monitor_cdn_health import DEFAULT_CONFIG, load_cdn_servers
+
+DEFAULT_PORT = 9109
+# A sequence jump larger than this is an agent restart, not lost frames
+RESTART_GAP = 100_000
+# Frames applied when they arrive after a newer one, at most this many behind
+REORDER_WINDOW = 64
+
+
+class Cell:
+    """One node as seen from one vantage."""
+
+    __slots__ = (
+        "port",
+        "up",
+        "degraded",
+        "last_probe",
+        "failures",
+        "probes",
+        "availability",
+        "connect",
+        "ttfb",
+        "samples",
+        "next_sample",
+    )
+
+    def __init__(self, port: int, ring: int):
+        self.port = port
+        self.up = False
+        self.degraded = False
+        self.last_probe = 0.0
+        self.failures = 0
+        self.probes = 0
+        self.availability: Optional[float] = None
+        self.connect: Optional[float] = None
+        self.ttfb: Optional[float] = None
+        # Last connect times (seconds), for percentiles
+        self.samples = array("d", [math.nan] * ring)
+        self.next_sample = 0
+
+    def add(self, up: bool, degraded: bool, when: float, connect: Optional[float], ttfb: Optional[float], alpha: float) -> None:
+        """Count a probe; one older than the last (from a late frame) only feeds the averages."""
+        self.probes += 1
+        if when >= self.last_probe:
+            self.up = up
+            self.degraded = degraded
+            self.last_probe = when
+            self.failures = 0 if up else self.failures + 1
+        value = 1.0 if up else 0.0
+        self.availability = value if self.availability is None else self.availability + alpha * (value - self.availability)
+        if connect is not None:
+            self.connect = connect if self.connect is None else self.connect + alpha * (connect - self.connect)
+            self.samples[self.next_sample % len(self.samples)] = connect
+            self.next_sample += 1
+        if ttfb is not None:
+            self.ttfb = ttfb if self.ttfb is None else self.ttfb + alpha * (ttfb - self.ttfb)
+
+    def state(self, now: float, stale_after: float) -> str:
+        if now - self.last_probe > stale_after:
+            return "stale"
+        if not self.up:
+            return "down"
+        return "degraded" if self.degraded else "up"
+
+    def percentiles(self) -> Dict[str, float]:
+        values = sorted(value for value in self.samples if not math.isnan(value))
+        if not values:
+            return {}
+        return {
+            name: round(values[min(len(values) - 1, int(len(values) * p))] * 1000, 3)
+            for name, p in (("p50", 0.50), ("p95", 0.95))
+        }
+
+
+class Vantage:
+    """Frame accounting for one agent."""
+
+    __slots__ = (
+        "address", "last_seen", "sequence", "received", "frames", "probes", "lost", "late", "dropped",
+        "restarts", "clock_offset",
+    )
+
+    def __init__(self) -> None:
+        self.address = ""
+        self.last_seen = 0.0
+        # Highest sequence, and a bitmask of the REORDER_WINDOW sequences up
+        # to it that were received (bit n: sequence - n)
+        self.sequence: Optional[int] = None
+        self.received = 0
+        self.frames = 0
+        self.probes = 0
+        self.lost = 0
+        # Frames applied after a newer one, and repeated or too old frames
+        self.late = 0
+        self.dropped = 0
+        self.restarts = 0
+        self.clock_offset = 0.0
+
+
+class HealthMatrix:
+    """Per-node, per-vantage health and latency, updated from agent frames."""
+
+    def __init__(
+        self,
+        names: Optional[Dict[str, str]] = None,
+        stale_after: float = 10.0,
+        alpha: float = 0.2,
+        ring: int = 128,
+    ):
+        # ip -> node name, from vars.yaml; unknown nodes are shown by IP
+        self.names = dict(names or {})
+        self.stale_after = stale_after
+        self.alpha = alpha
+        self.ring = ring
+        self.cells: Dict[Tuple[str, str], Cell] = {}
+        self.vantages: Dict[str, Vantage] = {}
+        self._addresses: Dict[bytes, str] = {}
+
+    def ingest(self, frame: Frame, source: str = "", received: Optional[float] = None) -> bool:
+        """Apply one frame; False if it was a repeat or more than REORDER_WINDOW frames late."""
+        received = time.time() if received is None else received
+        vantage = self.vantages.get(frame.vantage)
+        if vantage is None:
+            vantage = self.vantages[frame.vantage] = Vantage()
+        gap = 1 if vantage.sequence is None else frame.sequence - vantage.sequence
+        if gap <= 0:
+            behind = -gap
+            if behind >= REORDER_WINDOW or vantage.received >> behind & 1:
+                vantage.dropped += 1
+                return False
+            # A frame counted as lost when a newer one came in
+            vantage.received |= 1 << behind
+            vantage.lost -= 1
+            vantage.late += 1
+        else:
+            window = (1 << REORDER_WINDOW) - 1
+            if vantage.sequence is None or gap > RESTART_GAP:
+                # Nothing before the first frame (of this agent run) was lost
+                if vantage.sequence is not None:
+                    vantage.restarts += 1
+                vantage.received = window
+            else:
+                vantage.lost += gap - 1
+                vantage.received = 1 if gap >= REORDER_WINDOW else (vantage.received << gap | 1) & window
+            vantage.sequence = frame.sequence
+            vantage.clock_offset = received - frame.sent
+        vantage.address = source
+        vantage.last_seen = received
+        vantage.frames += 1
+        vantage.probes += len(frame.probes)
+
+        cells = self.cells
+        addresses = self._addresses
+        alpha = self.alpha
+        for raw, port, flags, age_ms, connect_us, ttfb_us in frame.probes:
+            ip = addresses.get(raw)
+            if ip is None:
+                ip = addresses[raw] = unpack_address(raw)
+            cell = cells.get((ip, frame.vantage))
+            if cell is None:
+                cell = cells[(ip, frame.vantage)] = Cell(port, self.ring)
+            cell.add(
+                bool(flags & FLAG_UP),
+                bool(flags & FLAG_DEGRADED),
+                received - age_ms / 1000,
+                None if connect_us == NO_VALUE else connect_us / 1_000_000,
+                None if ttfb_us == NO_VALUE else ttfb_us / 1_000_000,
+                alpha,
+            )
+        return True
+
+    def nodes(self) -> List[str]:
+        """Configured nodes first, then any other address an agent reported."""
+        seen = {ip for ip, _ in self.cells}
+        return list(self.names) + sorted(seen - set(self.names))
+
+    def snapshot(self, now: Optional[float] = None) -> Dict[str, Any]:
+        now = time.time() if now is None else now
+        vantage_names = sorted(self.vantages)
+        nodes = []
+        for ip in self.nodes():
+            counts = {"up": 0, "down": 0, "stale": 0}
+            cells: Dict[str, Any] = {}
+            for name in vantage_names:
+                cell = self.cells.get((ip, name))
+                if cell is None:
+                    continue
+                state = cell.state(now, self.stale_after)
+                counts["stale" if state == "stale" else "down" if state == "down" else "up"] += 1
+                cells[name] = {
+                    "state": state,
+                    "age_s": round(now - cell.last_probe, 1),
+                    "port": cell.port,
+                    "consecutive_failures": cell.failures,
+                    "probes": cell.probes,
+                    "availability": round(cell.availability, 4) if cell.availability is not None else None,
+                    "connect_ms": {
+                        "ewma": round(cell.connect * 1000, 3) if cell.connect is not None else None,
+                        **cell.percentiles(),
+                    },
+                    "ttfb_ms": round(cell.ttfb * 1000, 3) if cell.ttfb is not None else None,
+                }
+            if not counts["up"] and not counts["down"]:
+                verdict = "stale"
+            elif not counts["down"]:
+                verdict = "up"
+            elif not counts["up"]:
+                verdict = "down"
+            else:
+                verdict = "partial"
+            nodes.append({"name": self.names.get(ip, ip), "ip": ip, "verdict": verdict, **counts, "vantages": cells})
+        return {
+            "generated": datetime.fromtimestamp(now).isoformat(),
+            "stale_after_s": self.stale_after,
+            "vantages": {
+                name: {
+                    "address": vantage.address,
+                    "age_s": round(now - vantage.last_seen, 1),
+                    "stale": now - vantage.last_seen > self.stale_after,
+                    "frames": vantage.frames,
+                    "probes": vantage.probes,
+                    "lost": vantage.lost,
+                    "late": vantage.late,
+                    "dropped": vantage.dropped,
+                    "restarts": vantage.restarts,
+                    "clock_offset_ms": round(vantage.clock_offset * 1000, 1),
+                }
+                for name, vantage in sorted(self.vantages.items())
+            },
+            "nodes": nodes,
+        }
+
+
+class MatrixCollector:
+    """Prometheus collector that reads the matrix at scrape time, so ingest never touches metrics."""
+
+    def __init__(self, aggregator: "Aggregator"):
+        self.aggregator = aggregator
+
+    def collect(self) -> Iterator[Any]:
+        matrix = self.aggregator.matrix
+        now = time.time()
+        labels = ["node", "ip", "vantage"]
+        up = GaugeMetricFamily("cdn_vantage_up", "1 if the node's last probe from this vantage succeeded (fresh cells only)", labels=labels)
+        availability = GaugeMetricFamily("cdn_vantage_availability", "EWMA of probe success from this vantage", labels=labels)
+        connect = GaugeMetricFamily("cdn_vantage_connect_seconds", "EWMA of the TCP connect time from this vantage", labels=labels)
+        ttfb = GaugeMetricFamily("cdn_vantage_ttfb_seconds", "EWMA of the HTTPS time to first byte from this vantage", labels=labels)
+        age = GaugeMetricFamily("cdn_vantage_probe_age_seconds", "Seconds since the node's last probe from this vantage", labels=labels)
+        vantages_up = GaugeMetricFamily("cdn_node_vantages_up", "Vantages with a fresh, successful probe of the node", labels=["node", "ip"])
+        vantages_down = GaugeMetricFamily("cdn_node_vantages_down", "Vantages with a fresh, failed probe of the node", labels=["node", "ip"])
+        counts: Dict[str, List[int]] = {}
+        for (ip, vantage), cell in matrix.cells.items():
+            node = matrix.names.get(ip, ip)
+            values = [node, ip, vantage]
+            age.add_metric(values, now - cell.last_probe)
+            if cell.availability is not None:
+                availability.add_metric(values, cell.availability)
+            if cell.connect is not None:
+                connect.add_metric(values, cell.connect)
+            if cell.ttfb is not None:
+                ttfb.add_metric(values, cell.ttfb)
+            state = cell.state(now, matrix.stale_after)
+            count = counts.setdefault(ip, [0, 0])
+            if state != "stale":
+                up.add_metric(values, 0 if state == "down" else 1)
+                count[0 if state != "down" else 1] += 1
+        for ip, (n_up, n_down) in counts.items():
+            vantages_up.add_metric([matrix.names.get(ip, ip), ip], n_up)
+            vantages_down.add_metric([matrix.names.get(ip, ip), ip], n_down)
+        yield from (up, availability, connect, ttfb, age, vantages_up, vantages_down)
+
+        frames = CounterMetricFamily("cdn_aggregator_frames", "Frames accepted per vantage", labels=["vantage"])
+        lost = CounterMetricFamily("cdn_aggregator_lost_frames", "Frames missing from a vantage's sequence", labels=["vantage"])
+        for name, vantage in matrix.vantages.items():
+            frames.add_metric([name], vantage.frames)
+            lost.add_metric([name], vantage.lost)
+        rejected = CounterMetricFamily("cdn_aggregator_rejected_frames", "Frames that failed to parse or authenticate", labels=["reason"])
+        for reason, count in self.aggregator.rejected.items():
+            rejected.add_metric([reason], count)
+        yield from (frames, lost, rejected)
+
+
+class _IngestProtocol(asyncio.DatagramProtocol):
+    def __init__(self, aggregator: "Aggregator"):
+        self.aggregator = aggregator
+
+    def datagram_received(self, data: bytes, addr: Tuple[str, int]) -> None:
+        self.aggregator.receive(data, addr[0])
+
+
+class Aggregator:
+    """Receives agent frames over UDP and HTTP and serves the matrix."""
+
+    def __init__(self, matrix: HealthMatrix, key: Optional[bytes] = None):
+        self.matrix = matrix
+        self.key = key
+        self.rejected: Dict[str, int] = {}
+        self.registry = CollectorRegistry(auto_describe=False)
+        self.registry.register(MatrixCollector(self))  # type: ignore[arg-type]
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self.runner: Optional[web.AppRunner] = None
+
+    def receive(self, data: bytes, source: str) -> Optional[str]:
+        """Ingest one frame; returns the reason it was rejected, if it was."""
+        try:
+            frame = decode_frame(data, self.key)
+        except ValueError as e:
+            reason = str(e)
+            self.rejected[reason] = self.rejected.get(reason, 0) + 1
+            return reason
+        self.matrix.ingest(frame, source)
+        return None
+
+    async def handle_ingest(self, request: web.Request) -> web.Response:
+        reason = self.receive(await request.read(), request.remote or "")
+        if reason:
+            return web.Response(status=400, text=reason + "\n")
+        return web.Response(status=204)
+
+    async def handle_matrix(self, _request: web.Request) -> web.Response:
+        return web.json_response(self.matrix.snapshot())
+
+    async def handle_metrics(self, _request: web.Request) -> web.Response:
+        return web.Response(body=generate_latest(self.registry), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
+    async def start(self, host: str, port: int) -> None:
+        self.transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+            lambda: _IngestProtocol(self), local_addr=(host, port)
+        )
+        app = web.Application()
+        app.router.add_post("/ingest", self.handle_ingest)
+        app.router.add_get("/matrix", self.handle_matrix)
+        app.router.add_get("/metrics", self.handle_metrics)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, host, port).start()
+
+    async def stop(self) -> None:
+        if self.transport:
+            self.transport.close()
+        if self.runner:
+            await self.runner.cleanup()
+
+
+def print_table(headers: List[str], rows: List[List[str]]) -> None:
+    widths = [len(h) for h in headers]
+    for row in rows:
+        for i, cell in enumerate(row):
+            widths[i] = max(widths[i], len(str(cell)))
+    header_line = " | ".join(h.ljust(w) for h, w in zip(headers, widths))
+    print(header_line)
+    print("-" * len(header_line))
+    for row in rows:
+        print(" | ".join(str(cell).ljust(w) for cell, w in zip(row, widths)))
+
+
+def print_matrix(snapshot: Dict[str, Any]) -> None:
+    vantages = list(snapshot["vantages"])
+    print(f"\n[{snapshot['generated'][:19]}] {len(snapshot['nodes'])} node(s) x {len(vantages)} vantage(s)")
+    rows = []
+    for node in snapshot["nodes"]:
+        row = [node["name"], node["verdict"].upper()]
+        for name in vantages:
+            cell = node["vantages"].get(name)
+            if cell is None or cell["state"] == "stale":
+                row.append("-")
+            elif cell["state"] == "down":
+                row.append(f"DOWN x{cell['consecutive_failures']}")
+            else:
+                ewma = cell["connect_ms"]["ewma"]
+                latency = f" {ewma:.0f}ms" if ewma is not None else ""
+                row.append(("UP" if cell["state"] == "up" else "DEGRADED") + latency)
+        rows.append(row)
+    print_table(["Node", "Verdict"] + vantages, rows)
+    for name, vantage in snapshot["vantages"].items():
+        state = "STALE" if vantage["stale"] else "ok"
+        print(
+            f"  {name} ({vantage['address']}): {state}, last frame {vantage['age_s']}s ago, "
+            f"{vantage['frames']} frames, {vantage['lost']} lost, clock offset {vantage['clock_offset_ms']}ms"
+        )
+
+
+async def run(args: argparse.Namespace, matrix: HealthMatrix, key: Optional[bytes]) -> Dict[str, Any]:
+    aggregator = Aggregator(matrix, key)
+    try:
+        await aggregator.start(args.listen, args.port)
+    except OSError as e:
+        print(f"Error: cannot listen on {args.listen}:{args.port}: {e}")
+        sys.exit(1)
+    print(f"Aggregating on udp+http://{args.listen}:{args.port} (/ingest, /matrix, /metrics)", file=sys.stderr)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    try:
+        while args.duration is None or loop.time() - started < args.duration:
+            step = args.print_interval or 1.0
+            if args.duration is not None:
+                step = min(step, max(0.0, args.duration - (loop.time() - started)))
+            await asyncio.sleep(step)
+            if args.print_interval and not args.json:
+                print_matrix(matrix.snapshot())
+    finally:
+        await aggregator.stop()
+    return matrix.snapshot()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Merge results from monitor_cdn_health.py --push agents")
+    parser.add_argument("--listen", default="0.0.0.0", help="Address to listen on (default: 0.0.0.0)")
+    parser.add_argument(
+        "--port", type=int, default=DEFAULT_PORT, help=f"UDP and HTTP port (default: {DEFAULT_PORT})"
+    )
+    parser.add_argument("--key", help="Shared HMAC key agents sign frames with (default: $CDN_HEALTH_KEY)")
+    parser.add_argument(
+        "--stale-after",
+        type=float,
+        default=10.0,
+        help="Seconds without a probe before a cell or vantage is stale (default: 10)",
+    )
+    parser.add_argument(
+        "--alpha", type=float, default=0.2, help="EWMA weight of a new probe (default: 0.2)"
+    )
+    parser.add_argument(
+        "--print-interval",
+        type=float,
+        default=5.0,
+        help="Print the matrix every this many seconds, 0 for never (default: 5)",
+    )
+    parser.add_argument("--duration", type=float, help="Stop after this many seconds (default: run forever)")
+    parser.add_argument("--json", action="store_true", help="Print the final matrix as JSON on exit")
+    parser.add_argument(
+        "--config",
+        type=Path,
+        default=DEFAULT_CONFIG,
+        help="vars.yaml to name nodes from (default: ../vars.yaml)",
+    )
+    parser.add_argument(
+        "--environment",
+        choices=["staging", "production"],
+        help="Only list this environment's geo_regions (default: all)",
+    )
+    args = parser.parse_args()
+
+    servers = load_cdn_servers(args.config, [args.environment] if args.environment else None)
+    matrix = HealthMatrix({server["ip"]: server["name"] for server in servers}, args.stale_after, args.alpha)
+    key_text = args.key or os.environ.get("CDN_HEALTH_KEY")
+    try:
+        snapshot = asyncio.run(run(args, matrix, key_text.encode() if key_text else None))
+    except KeyboardInterrupt:
+        snapshot = matrix.snapshot()
+    if args.json:
+        print(json.dumps(snapshot, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+DNS Baseline Capture and Compare
+
+Concurrent replacement for capture_production_baseline.sh. Queries every
+domain x qtype x server combination with a bounded number of queries in
+flight and streams one JSON object per response to a JSONL file, then
+diffs two captures (or a capture against live servers) with
+order-insensitive RRset comparison.
+
+Usage:
+  ./dns_baseline.py capture --server 5.39.57.38 -o before.jsonl
+  ./dns_baseline.py capture --server 10.0.0.1 --server 10.0.0.2 \\
+      --domains-file names.txt --qtypes A,CNAME,SOA -o after.jsonl
+  ./dns_baseline.py compare before.jsonl after.jsonl
+  ./dns_baseline.py compare before.jsonl --live 10.0.0.1 --ignore-soa-serial
+
+Each capture line looks like:
+  {"server": "10.0.0.1:53", "domain": "myapp.app.runonflux.io", "type": "A",
+   "rcode": "NOERROR", "answers": [["CNAME", 3600, "fdm-lb-1-2.runonflux.io."]],
+   "latency_ms": 0.41, "timestamp": "..."}
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import IO, Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from dns_wire import TCPClient, UDPClient, build_query, parse_response, qtype_code
+
+# Same set as capture_production_baseline.sh
+DEFAULT_DOMAINS = [
+    "0test.app.runonflux.io",
+    "1test.app.runonflux.io",
+    "9test.app.runonflux.io",
+    "atest.app.runonflux.io",
+    "btest.app.runonflux.io",
+    "gtest.app.runonflux.io",
+    "htest.app.runonflux.io",
+    "itest.app.runonflux.io",
+    "ntest.app.runonflux.io",
+    "otest.app.runonflux.io",
+    "ptest.app.runonflux.io",
+    "utest.app.runonflux.io",
+    "vtest.app.runonflux.io",
+    "wtest.app.runonflux.io",
+    "ztest.app.runonflux.io",
+    "0test.app2.runonflux.io",
+    "atest.app2.runonflux.io",
+    "mtest.app2.runonflux.io",
+    "ntest.app2.runonflux.io",
+    "ztest.app2.runonflux.io",
+    "myapp.app.runonflux.io",
+    "testapp.app.runonflux.io",
+    "hello.app.runonflux.io",
+    "world.app.runonflux.io",
+    "production.app.runonflux.io",
+    "staging.app2.runonflux.io",
+    "a.app.runonflux.io",
+    "z.app.runonflux.io",
+    "0.app.runonflux.io",
+]
+DEFAULT_QTYPES = "A,CNAME,SOA,ANY"
+
+Key = Tuple[str, str, str]
+
+
+def split_server(server: str) -> Tuple[str, int]:
+    """Parse "host" or "host:port"."""
+    host, sep, port = server.rpartition(":")
+    if sep and port.isdigit() and host.count(":") == 0:
+        return host, int(port)
+    return server, 53
+
+
+class BaselineCapture:
+    """Queries domains x qtypes x servers concurrently over pipelined sockets."""
+
+    def __init__(self, servers: List[str], concurrency: int = 256, timeout: float = 2.0, retries: int = 1):
+        self.servers = [split_server(s) for s in servers]
+        self.timeout = timeout
+        self.retries = retries
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.clients: Dict[Tuple[str, int], UDPClient] = {}
+
+    async def __aenter__(self) -> "BaselineCapture":
+        """Async context manager entry"""
+        for host, port in self.servers:
+            self.clients[(host, port)] = await UDPClient.connect(host, port)
+        return self
+
+    async def __aexit__(self, exc_type: Any, exc_val: Any, exc_tb: Any) -> None:
+        """Async context manager exit"""
+        for client in self.clients.values():
+            client.close()
+
+    async def capture_one(self, server: Tuple[str, int], domain: str, qtype: str) -> Dict[str, Any]:
+        """Query one (server, domain, qtype) and describe the response."""
+        host, port = server
+        result: Dict[str, Any] = {"server": f"{host}:{port}", "domain": domain, "type": qtype}
+        packet = build_query(domain, qtype)
+        async with self.semaphore:
+            start = time.perf_counter()
+            for attempt in range(self.retries + 1):
+                try:
+                    data = await self.clients[server].send(packet, self.timeout)
+                    if data[2] & 0x02:
+                        tcp = await TCPClient.connect(host, port, self.timeout)
+                        try:
+                            data = await tcp.send(packet, self.timeout)
+                        finally:
+                            tcp.close()
+                    response = parse_response(data)
+                    result["rcode"] = response.rcode
+                    result["answers"] = sorted(
+                        [r.rtype, r.ttl, r.data] for r in response.answers
+                    )
+                    break
+                except (asyncio.TimeoutError, ConnectionError, OSError, ValueError) as e:
+                    if attempt == self.retries:
+                        result["error"] = type(e).__name__
+            result["latency_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        result["timestamp"] = datetime.now().isoformat()
+        return result
+
+    async def capture(self, domains: List[str], qtypes: List[str], out: IO[str]) -> Dict[str, int]:
+        """Capture everything, writing each result as soon as it arrives."""
+        counts = {"total": 0, "answered": 0, "failed": 0}
+        tasks = [
+            asyncio.ensure_future(self.capture_one(server, domain, qtype))
+            for domain in domains
+            for qtype in qtypes
+            for server in self.servers
+        ]
+        for finished in asyncio.as_completed(tasks):
+            result = await finished
+            counts["total"] += 1
+            counts["failed" if "error" in result else "answered"] += 1
+            out.write(json.dumps(result) + "\n")
+        return counts
+
+
+def read_capture(path: Path) -> Iterator[Dict[str, Any]]:
+    """Stream the records of a JSONL capture."""
+    with open(path, "r") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def rrset(result: Dict[str, Any], compare_ttl: bool, ignore_soa_serial: bool) -> Optional[Set[Tuple[Any, ...]]]:
+    """Order-insensitive view of a captured response (None if it failed)."""
+    if "error" in result:
+        return None
+    records: Set[Tuple[Any, ...]] = {("RCODE", result.get("rcode"))}
+    for rtype, ttl, data in result.get("answers", []):
+        if ignore_soa_serial and rtype == "SOA":
+            fields = data.split()
+            data = " ".join(fields[:2] + fields[3:])
+        records.add((rtype, ttl, data) if compare_ttl else (rtype, data))
+    return records
+
+
+def compare_captures(
+    baseline: Iterator[Dict[str, Any]],
+    candidate: Iterator[Dict[str, Any]],
+    by_server: bool,
+    compare_ttl: bool,
+    ignore_soa_serial: bool,
+    out: IO[str],
+) -> Dict[str, int]:
+    """Diff two captures, writing one JSON line per difference."""
+
+    def key(result: Dict[str, Any]) -> Key:
+        return (result["server"] if by_server else "", result["domain"].lower(), result["type"])
+
+    expected: Dict[Key, Dict[str, Any]] = {key(r): r for r in baseline}
+    seen: Set[Key] = set()
+    counts = {"compared": 0, "matched": 0, "different": 0, "failed": 0, "missing": 0, "extra": 0}
+
+    for result in candidate:
+        k = key(result)
+        before = expected.get(k)
+        if before is None:
+            counts["extra"] += 1
+            out.write(json.dumps({"status": "extra", "after": result}) + "\n")
+            continue
+        seen.add(k)
+        counts["compared"] += 1
+        old = rrset(before, compare_ttl, ignore_soa_serial)
+        new = rrset(result, compare_ttl, ignore_soa_serial)
+        if old is None or new is None:
+            counts["failed"] += 1
+            status = "failed"
+        elif old == new:
+            counts["matched"] += 1
+            continue
+        else:
+            counts["different"] += 1
+            status = "different"
+        out.write(
+            json.dumps(
+                {
+                    "status": status,
+                    "domain": result["domain"],
+                    "type": result["type"],
+                    "server": [before["server"], result["server"]],
+                    "removed": sorted(old - new) if old and new else None,
+                    "added": sorted(new - old) if old and new else None,
+                    "before": before.get("answers", before.get("error")),
+                    "after": result.get("answers", result.get("error")),
+                }
+            )
+            + "\n"
+        )
+
+    for k in expected.keys() - seen:
+        before = expected[k]
+        counts["missing"] += 1
+        out.write(json.dumps({"status": "missing", "before": before}) + "\n")
+    return counts
+
+
+def load_domains(domains_file: Optional[str]) -> List[str]:
+    if not domains_file:
+        return DEFAULT_DOMAINS
+    with open(domains_file, "r") as f:
+        return [line.split("#")[0].strip() for line in f if line.split("#")[0].strip()]
+
+
+async def run_capture(args: argparse.Namespace) -> int:
+    domains = load_domains(args.domains_file)
+    qtypes = args.qtypes.split(",")
+    for qtype in qtypes:
+        try:
+            qtype_code(qtype)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return 1
+    out = open(args.output, "w") if args.output else sys.stdout
+    start = time.perf_counter()
+    try:
+        async with BaselineCapture(args.server, args.concurrency, args.timeout, args.retries) as capture:
+            counts = await capture.capture(domains, qtypes, out)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    counts["elapsed_ms"] = round((time.perf_counter() - start) * 1000)
+    print(json.dumps(counts), file=sys.stderr)
+    return 0 if counts["failed"] == 0 else 1
+
+
+async def run_compare(args: argparse.Namespace) -> int:
+    # One pass for the names, qtypes and servers; the diff streams the capture again
+    servers: Set[str] = set()
+    domains: Set[str] = set()
+    qtypes: Set[str] = set()
+    for r in read_capture(args.baseline):
+        servers.add(r["server"])
+        domains.add(r["domain"])
+        qtypes.add(r["type"])
+    # Without --by-server the results of several baseline servers would
+    # collapse into one per name and type, hiding their differences
+    if len(servers) > 1 and (args.live or not args.by_server):
+        print(
+            f"Error: the baseline holds {len(servers)} servers ({', '.join(sorted(servers))}); "
+            + ("--live compares against a single-server baseline" if args.live else "use --by-server")
+        )
+        return 2
+    if not args.live and not args.candidate:
+        print("Error: give a second capture or --live SERVER")
+        return 2
+    out = open(args.output, "w") if args.output else sys.stdout
+    try:
+        if args.live:
+            # Re-query the baseline's names/qtypes against the live servers
+            live_path = Path(args.live_output) if args.live_output else None
+            with open(live_path, "w+") if live_path else tempfile.TemporaryFile("w+") as live_out:
+                async with BaselineCapture(args.live, args.concurrency, args.timeout, args.retries) as capture:
+                    await capture.capture(sorted(domains), sorted(qtypes), live_out)
+                live_out.seek(0)
+                counts = compare_captures(
+                    read_capture(args.baseline),
+                    (json.loads(line) for line in live_out),
+                    False,
+                    args.ttl,
+                    args.ignore_soa_serial,
+                    out,
+                )
+        else:
+            counts = compare_captures(
+                read_capture(args.baseline),
+                read_capture(args.candidate),
+                args.by_server,
+                args.ttl,
+                args.ignore_soa_serial,
+                out,
+            )
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(json.dumps(counts), file=sys.stderr)
+    return 0 if counts["compared"] == counts["matched"] and not counts["missing"] else 1
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Capture and compare DNS baselines")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_query_options(p: argparse.ArgumentParser) -> None:
+        p.add_argument("--concurrency", type=int, default=256, help="Queries in flight (default: 256)")
+        p.add_argument("--timeout", type=float, default=2.0, help="Per-query timeout in seconds (default: 2)")
+        p.add_argument("--retries", type=int, default=1, help="Retries after a timeout (default: 1)")
+
+    capture = subparsers.add_parser("capture", help="Capture responses to JSONL")
+    capture.add_argument("--server", action="append", required=True, help="DNS server[:port] (repeatable)")
+    capture.add_argument("--domains-file", help="File with one domain per line (default: built-in test set)")
+    capture.add_argument("--qtypes", default=DEFAULT_QTYPES, help=f"Comma-separated qtypes (default: {DEFAULT_QTYPES})")
+    capture.add_argument("-o", "--output", help="JSONL output file (default: stdout)")
+    add_query_options(capture)
+
+    compare = subparsers.add_parser("compare", help="Diff two captures or a capture against live servers")
+    compare.add_argument("baseline", type=Path, help="Baseline capture (JSONL)")
+    compare.add_argument("candidate", type=Path, nargs="?", help="Capture to compare against")
+    compare.add_argument("--live", action="append", help="Compare against these live server[:port]s instead")
+    compare.add_argument("--live-output", help="Also save the live capture to this JSONL file")
+    compare.add_argument("--by-server", action="store_true", help="Match records per server, not just domain/type (required when the baseline has several servers)")
+    compare.add_argument("--ttl", action="store_true", help="Treat TTL differences as differences")
+    compare.add_argument("--ignore-soa-serial", action="store_true", help="Ignore SOA serial changes")
+    compare.add_argument("-o", "--output", help="JSONL file for the differences (default: stdout)")
+    add_query_options(compare)
+
+    args = parser.parse_args()
+    runner = run_capture if args.command == "capture" else run_compare
+    sys.exit(asyncio.run(runner(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+DNS Load Generator for PowerDNS
+
+Sends raw UDP or TCP DNS queries from a single asyncio event loop to find
+where the PowerDNS thread and queue settings in templates/pdns.conf.j2
+(distributor-threads, receiver-threads, max-queue-length) saturate.
+
+Load models:
+  open-loop    --rate QPS: queries are sent on schedule whether or not
+               earlier ones have been answered (several comma-separated
+               rates run as consecutive steps)
+  closed-loop  --concurrency N: N queries are kept in flight at all times
+
+Query sources:
+  synthetic    a weighted mix of random app names over every first
+               character, the geo zone apex, _debug TXT and NXDOMAIN names,
+               with zone names taken from vars.yaml (--mix app=85,geo=10,...)
+  replay       --replay pdns.log.2.gz pdns.log.1 pdns.log: re-sends the
+               logged queries with their original spacing, optionally
+               sped up (--speed 4), oldest rotated file first
+
+The report (JSON on stdout) contains achieved QPS, p50/p95/p99/p999
+latency, timeouts and RCODE counts.
+
+Usage:
+  ./dns_loadgen.py --server 127.0.0.1 --rate 2000 --duration 30
+  ./dns_loadgen.py --server 127.0.0.1 --rate 1000,5000,10000,20000 --duration 20
+  ./dns_loadgen.py --server 127.0.0.1 --concurrency 200 --protocol tcp
+  ./dns_loadgen.py --server 127.0.0.1 --replay /var/log/pdns/pdns.log* --speed 2
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import string
+import sys
+import time
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+import yaml
+
+from dns_wire import RCODES, TCPClient, UDPClient, build_query, parse_header, qtype_code
+from pdns_querylog import iter_queries
+
+FIRST_CHARS = string.digits + string.ascii_lowercase
+DEFAULT_MIX = "app=85,geo=10,debug=1,nxdomain=4"
+
+Query = Tuple[str, str]
+
+
+def percentiles(samples: array) -> Dict[str, float]:
+    """Latency percentiles in milliseconds."""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    count = len(ordered)
+
+    def pct(p: float) -> float:
+        return round(ordered[min(count - 1, int(count * p))] * 1000, 3)
+
+    return {
+        "p50": pct(0.50),
+        "p95": pct(0.95),
+        "p99": pct(0.99),
+        "p999": pct(0.999),
+        "max": round(ordered[-1] * 1000, 3),
+        "mean": round(sum(ordered) / count * 1000, 3),
+    }
+
+
+class NameMix:
+    """Synthetic query names drawn from the zones in vars.yaml."""
+
+    def __init__(self, config: Dict[str, Any], environment: str, mix: str, seed: Optional[int]):
+        zones = config["powerdns"][environment]["zone_configs"]
+        self.app_zone = next(z["domain"] for z in zones if z["type"] == "app")
+        self.geo_zone = next(z["domain"] for z in zones if z["type"] == "geo")
+        self.rng = random.Random(seed)
+
+        weights = dict(
+            (kind, float(weight))
+            for kind, weight in (item.split("=") for item in mix.split(","))
+        )
+        unknown = set(weights) - {"app", "geo", "debug", "nxdomain"}
+        if unknown:
+            raise ValueError(f"Unknown mix kinds: {', '.join(sorted(unknown))}")
+        self.kinds = list(weights)
+        self.cum_weights = list(itertools.accumulate(weights.values()))
+
+    def _label(self, first: str) -> str:
+        rng = self.rng
+        return first + "".join(rng.choice(FIRST_CHARS) for _ in range(rng.randint(3, 11)))
+
+    def __iter__(self) -> Iterator[Query]:
+        rng = self.rng
+        while True:
+            for kind in rng.choices(self.kinds, cum_weights=self.cum_weights, k=1024):
+                if kind == "app":
+                    yield f"{self._label(rng.choice(FIRST_CHARS))}.{self.app_zone}", "A"
+                elif kind == "geo":
+                    yield self.geo_zone, "A"
+                elif kind == "debug":
+                    yield f"_debug.{self.app_zone}", "TXT"
+                else:
+                    yield f"{self._label('nx')}.{self.geo_zone}", "A"
+
+
+class LoadGenerator:
+    """
+    Asynchronous DNS load generator.
+
+    Queries are spread round-robin over several pipelined UDP sockets (or
+    TCP connections), so different source ports reach different PowerDNS
+    receiver threads.
+    """
+
+    def __init__(
+        self,
+        server: str,
+        port: int = 53,
+        protocol: str = "udp",
+        sockets: int = 4,
+        timeout: float = 2.0,
+    ):
+        self.server = server
+        self.port = port
+        self.protocol = protocol
+        self.socket_count = sockets
+        self.timeout = timeout
+        self.clients: List[Union[UDPClient, TCPClient]] = []
+        self._next_client: Iterator[Union[UDPClient, TCPClient]] = iter(())
+        self.reset()
+
+    async def __aenter__(self) -> "LoadGenerator":
+        """Async context manager entry"""
+        client_class = TCPClient if self.protocol == "tcp" else UDPClient
+        self.clients = [
+            await client_class.connect(self.server, self.port)
+            for _ in range(self.socket_count)
+        ]
+        self._next_client = itertools.cycle(self.clients)
+        return self
+
+    async def __aexit__(self, exc_type: Any, exc_val: Any, exc_tb: Any) -> None:
+        """Async context manager exit"""
+        for client in self.clients:
+            client.close()
+
+    def reset(self) -> None:
+        """Clear the counters before a run or step."""
+        self.latencies = array("d")
+        self.rcodes: Counter = Counter()
+        self.sent = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    async def send_query(self, qname: str, qtype: str) -> None:
+        """Send one query and record its outcome."""
+        packet = build_query(qname, qtype)
+        client = next(self._next_client)
+        self.sent += 1
+        start = time.perf_counter()
+        try:
+            reply = await client.send(packet, self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            return
+        except (ConnectionError, OSError, RuntimeError):
+            self.errors += 1
+            return
+        self.latencies.append(time.perf_counter() - start)
+        rcode = parse_header(reply)[1]
+        self.rcodes[RCODES.get(rcode, f"RCODE{rcode}")] += 1
+
+    async def run_open_loop(self, queries: Iterator[Query], rate: float, duration: float) -> float:
+        """Send at a fixed rate regardless of outstanding replies."""
+        loop = asyncio.get_running_loop()
+        in_flight: set = set()
+        start = loop.time()
+        scheduled = 0
+        while True:
+            elapsed = loop.time() - start
+            if elapsed >= duration:
+                break
+            due = int(elapsed * rate) + 1 - scheduled
+            for qname, qtype in itertools.islice(queries, due):
+                task = loop.create_task(self.send_query(qname, qtype))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+            scheduled += due
+            await asyncio.sleep(min(1.0 / rate, 0.001))
+        if in_flight:
+            await asyncio.wait(in_flight)
+        return loop.time() - start
+
+    async def run_closed_loop(
+        self, queries: Iterator[Query], concurrency: int, duration: Optional[float]
+    ) -> float:
+        """Keep a fixed number of queries in flight."""
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        deadline = start + duration if duration else None
+
+        async def worker() -> None:
+            for qname, qtype in queries:
+                if deadline and loop.time() >= deadline:
+                    break
+                await self.send_query(qname, qtype)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return loop.time() - start
+
+    async def run_replay(
+        self, paths: List[Path], speed: float, duration: Optional[float]
+    ) -> float:
+        """
+        Re-send logged queries with their original spacing divided by speed,
+        for the whole log or its first duration seconds. A query type
+        dns_wire cannot encode raises ValueError rather than being sent
+        as something else.
+        """
+        loop = asyncio.get_running_loop()
+        in_flight: set = set()
+        start = loop.time()
+        first_ts: Optional[float] = None
+        for entry in iter_queries(paths):
+            if first_ts is None:
+                first_ts = entry.timestamp
+            offset = (entry.timestamp - first_ts) / speed
+            if duration and offset >= duration:
+                break
+            qtype_code(entry.qtype)
+            delay = start + offset - loop.time()
+            if delay > 0.001:
+                await asyncio.sleep(delay)
+            task = loop.create_task(self.send_query(entry.qname, entry.qtype))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        if in_flight:
+            await asyncio.wait(in_flight)
+        return loop.time() - start
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        """Summarize the current counters."""
+        answered = len(self.latencies)
+        return {
+            "elapsed_s": round(elapsed, 3),
+            "sent": self.sent,
+            "answered": answered,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "sent_qps": round(self.sent / elapsed, 1) if elapsed else 0,
+            "answered_qps": round(answered / elapsed, 1) if elapsed else 0,
+            "latency_ms": percentiles(self.latencies),
+            "rcodes": dict(self.rcodes),
+        }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Asyncio DNS load generator for PowerDNS capacity testing"
+    )
+    parser.add_argument("--server", default="127.0.0.1", help="DNS server (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=53, help="DNS port (default: 53)")
+    parser.add_argument("--protocol", choices=["udp", "tcp"], default="udp", help="Transport (default: udp)")
+    parser.add_argument(
+        "--sockets",
+        type=int,
+        default=4,
+        help="UDP sockets / TCP connections to spread queries over (default: 4)",
+    )
+    parser.add_argument("--timeout", type=float, default=2.0, help="Per-query timeout in seconds (default: 2)")
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument("--rate", help="Open-loop target QPS; comma-separated for steps (default: 1000)")
+    load.add_argument("--concurrency", type=int, help="Closed-loop: queries kept in flight")
+    parser.add_argument(
+        "--duration",
+        type=float,
+        help="Seconds per run or step (default: 10; with --replay: the whole log)",
+    )
+    parser.add_argument(
+        "--environment",
+        choices=["staging", "production"],
+        default="production",
+        help="Environment whose zones the synthetic mix uses (default: production)",
+    )
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Synthetic mix weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--seed", type=int, help="Random seed for synthetic names")
+    parser.add_argument("--replay", nargs="+", type=Path, help="PowerDNS query logs to replay (plain or .gz)")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed multiplier (default: 1.0)")
+    parser.add_argument(
+        "-c",
+        "--config",
+        help="Configuration file path (default: ../vars.yaml from script location)",
+    )
+    args = parser.parse_args()
+
+    config_path = args.config or Path(__file__).parent.parent / "vars.yaml"
+    with open(config_path, "r") as f:
+        config = yaml.safe_load(f)
+
+    header: Dict[str, Any] = {
+        "server": f"{args.server}:{args.port}",
+        "protocol": args.protocol,
+        "sockets": args.sockets,
+    }
+
+    async with LoadGenerator(
+        args.server, args.port, args.protocol, args.sockets, args.timeout
+    ) as generator:
+        if args.replay:
+            header.update({"mode": "replay", "speed": args.speed})
+            try:
+                elapsed = await generator.run_replay(args.replay, args.speed, args.duration)
+            except ValueError as e:
+                print(f"Error: {e}")
+                sys.exit(1)
+            result: Dict[str, Any] = {**header, **generator.report(elapsed)}
+        else:
+            duration = args.duration or 10
+            queries = iter(NameMix(config, args.environment, args.mix, args.seed))
+            header["mix"] = args.mix
+            if args.concurrency:
+                header.update({"mode": "closed-loop", "concurrency": args.concurrency})
+                elapsed = await generator.run_closed_loop(queries, args.concurrency, duration)
+                result = {**header, **generator.report(elapsed)}
+            else:
+                header["mode"] = "open-loop"
+                steps = []
+                for rate in [float(r) for r in (args.rate or "1000").split(",")]:
+                    generator.reset()
+                    elapsed = await generator.run_open_loop(queries, rate, duration)
+                    steps.append({"target_qps": rate, **generator.report(elapsed)})
+                result = {**header, **steps[0]} if len(steps) == 1 else {**header, "steps": steps}
+
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        sys.exit(130)
@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+"""
+Minimal DNS wire format and asyncio transports for the test tooling
+
+Builds queries (with optional EDNS Client Subnet) and parses responses
+without third-party dependencies, and provides pipelined UDP and TCP
+clients that keep many queries in flight on a single socket, matching
+replies to queries by message ID. parse_query() and build_response()
+cover the other side for stand-in servers (A, AAAA, NS, CNAME, TXT and
+SOA answers only).
+
+This is NOT a general purpose DNS library; it covers what the load,
+capture and monitoring scripts in this directory need.
+"""
+
+import asyncio
+import ipaddress
+import random
+import re
+import struct
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+QTYPES: Dict[str, int] = {
+    "A": 1,
+    "NS": 2,
+    "CNAME": 5,
+    "SOA": 6,
+    "PTR": 12,
+    "MX": 15,
+    "TXT": 16,
+    "AAAA": 28,
+    "SRV": 33,
+    "NAPTR": 35,
+    "DNAME": 39,
+    "OPT": 41,
+    "DS": 43,
+    "SSHFP": 44,
+    "RRSIG": 46,
+    "NSEC": 47,
+    "DNSKEY": 48,
+    "NSEC3": 50,
+    "NSEC3PARAM": 51,
+    "TLSA": 52,
+    "CDS": 59,
+    "CDNSKEY": 60,
+    "SVCB": 64,
+    "HTTPS": 65,
+    "IXFR": 251,
+    "AXFR": 252,
+    "ANY": 255,
+    "CAA": 257,
+}
+QTYPE_NAMES: Dict[int, str] = {v: k for k, v in QTYPES.items()}
+
+RCODES: Dict[int, str] = {
+    0: "NOERROR",
+    1: "FORMERR",
+    2: "SERVFAIL",
+    3: "NXDOMAIN",
+    4: "NOTIMP",
+    5: "REFUSED",
+}
+
+EDNS_CLIENT_SUBNET = 8
+
+_HEADER = struct.Struct("!HHHHHH")
+_RR = struct.Struct("!HHIH")
+
+
+class Record(NamedTuple):
+    name: str
+    rtype: str
+    ttl: int
+    data: str
+
+
+class Response(NamedTuple):
+    id: int
+    rcode: str
+    flags: int
+    answers: List[Record]
+    authority: List[Record]
+    ecs_scope: Optional[int]
+
+
+def encode_name(name: str) -> bytes:
+    """Encode a domain name as uncompressed wire labels."""
+    out = bytearray()
+    for label in name.rstrip(".").split("."):
+        if label:
+            raw = label.encode("idna") if not label.isascii() else label.encode()
+            out.append(len(raw))
+            out += raw
+    out.append(0)
+    return bytes(out)
+
+
+def ecs_option(subnet: str) -> bytes:
+    """Encode an EDNS Client Subnet option for a prefix such as 198.51.100.0/24."""
+    network = ipaddress.ip_network(subnet, strict=False)
+    family = 1 if network.version == 4 else 2
+    prefix = network.prefixlen
+    address = network.network_address.packed[: (prefix + 7) // 8]
+    payload = struct.pack("!HBB", family, prefix, 0) + address
+    return struct.pack("!HH", EDNS_CLIENT_SUBNET, len(payload)) + payload
+
+
+def qtype_code(qtype: str) -> int:
+    """Numeric value of a query type name, including the RFC 3597 TYPEnnn form."""
+    code = QTYPES.get(qtype.upper())
+    if code is not None:
+        return code
+    match = re.fullmatch(r"TYPE(\d+)", qtype, re.I)
+    if match and int(match.group(1)) < 65536:
+        return int(match.group(1))
+    raise ValueError(f"unknown query type {qtype!r}")
+
+
+def build_query(
+    qname: str,
+    qtype: str = "A",
+    msg_id: int = 0,
+    recursion: bool = False,
+    ecs: Optional[str] = None,
+    udp_size: int = 1232,
+    edns: bool = True,
+) -> bytes:
+    """Build a DNS query message; unknown query types raise ValueError."""
+    flags = 0x0100 if recursion else 0
+    additional = 1 if edns or ecs else 0
+    packet = _HEADER.pack(msg_id, flags, 1, 0, 0, additional)
+    packet += encode_name(qname) + struct.pack("!HH", qtype_code(qtype), 1)
+    if additional:
+        options = ecs_option(ecs) if ecs else b""
+        packet += b"\x00" + struct.pack("!HHIH", QTYPES["OPT"], udp_size, 0, len(options))
+        packet += options
+    return packet
+
+
+def with_id(packet: bytes, msg_id: int) -> bytes:
+    """Return a copy of a built query with a different message ID."""
+    return struct.pack("!H", msg_id) + packet[2:]
+
+
+def parse_header(data: bytes) -> Tuple[int, int]:
+    """Return (message id, rcode) without parsing the rest of the message."""
+    return (data[0] << 8) | data[1], data[3] & 0x0F
+
+
+def _read_name(data: bytes, offset: int) -> Tuple[str, int]:
+    labels = []
+    end = -1
+    jumps = 0
+    while True:
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            if end < 0:
+                end = offset + 2
+            offset = ((length & 0x3F) << 8) | data[offset + 1]
+            jumps += 1
+            if jumps > 64:
+                raise ValueError("compression loop")
+            continue
+        offset += 1
+        if length == 0:
+            break
+        labels.append(data[offset : offset + length].decode("ascii", "backslashreplace"))
+        offset += length
+    return ".".join(labels) + ".", (end if end >= 0 else offset)
+
+
+def _rdata_text(data: bytes, rtype: int, offset: int, length: int) -> str:
+    rdata = data[offset : offset + length]
+    if rtype == 1 and length == 4:
+        return str(ipaddress.IPv4Address(rdata))
+    if rtype == 28 and length == 16:
+        return str(ipaddress.IPv6Address(rdata))
+    if rtype in (2, 5, 12):
+        return _read_name(data, offset)[0]
+    if rtype == 15:
+        return "%d %s" % (struct.unpack("!H", rdata[:2])[0], _read_name(data, offset + 2)[0])
+    if rtype == 16:
+        parts = []
+        i = 0
+        while i < length:
+            n = rdata[i]
+            parts.append('"%s"' % rdata[i + 1 : i + 1 + n].decode("utf-8", "replace"))
+            i += 1 + n
+        return " ".join(parts)
+    if rtype == 6:
+        mname, pos = _read_name(data, offset)
+        rname, pos = _read_name(data, pos)
+        numbers = struct.unpack("!IIIII", data[pos : pos + 20])
+        return "%s %s %s" % (mname, rname, " ".join(str(n) for n in numbers))
+    return "\\# %d %s" % (length, rdata.hex())
+
+
+def parse_response(data: bytes) -> Response:
+    """Parse a DNS response into answer and authority records."""
+    msg_id, flags, qdcount, ancount, nscount, arcount = _HEADER.unpack_from(data)
+    offset = _HEADER.size
+    for _ in range(qdcount):
+        _, offset = _read_name(data, offset)
+        offset += 4
+
+    sections: List[List[Record]] = [[], [], []]
+    ecs_scope = None
+    for section, count in enumerate((ancount, nscount, arcount)):
+        for _ in range(count):
+            name, offset = _read_name(data, offset)
+            rtype, _rclass, ttl, rdlength = _RR.unpack_from(data, offset)
+            offset += _RR.size
+            if rtype == QTYPES["OPT"]:
+                pos = offset
+                while pos + 4 <= offset + rdlength:
+                    code, length = struct.unpack_from("!HH", data, pos)
+                    if code == EDNS_CLIENT_SUBNET and length >= 4:
+                        ecs_scope = data[pos + 7]
+                    pos += 4 + length
+            else:
+                sections[section].append(
+                    Record(
+                        name,
+                        QTYPE_NAMES.get(rtype, "TYPE%d" % rtype),
+                        ttl,
+                        _rdata_text(data, rtype, offset, rdlength),
+                    )
+                )
+            offset += rdlength
+
+    return Response(
+        msg_id,
+        RCODES.get(flags & 0x0F, "RCODE%d" % (flags & 0x0F)),
+        flags,
+        sections[0],
+        sections[1],
+        ecs_scope,
+    )
+
+
+def parse_query(data: bytes) -> Tuple[int, int, str, str, int]:
+    """Return (message id, flags, qname, qtype, end of question) of a query."""
+    msg_id, flags, qdcount = struct.unpack_from("!HHH", data)
+    if qdcount != 1:
+        raise ValueError("expected one question")
+    qname, offset = _read_name(data, _HEADER.size)
+    qtype = struct.unpack_from("!H", data, offset)[0]
+    return msg_id, flags, qname, QTYPE_NAMES.get(qtype, "TYPE%d" % qtype), offset + 4
+
+
+def encode_rdata(rtype: str, text: str) -> bytes:
+    """Wire rdata of a record in presentation format."""
+    if rtype == "A":
+        return ipaddress.IPv4Address(text).packed
+    if rtype == "AAAA":
+        return ipaddress.IPv6Address(text).packed
+    if rtype in ("NS", "CNAME", "PTR"):
+        return encode_name(text)
+    if rtype == "TXT":
+        out = bytearray()
+        for part in re.findall(r'"((?:[^"\\]|\\.)*)"', text) or [text]:
+            raw = part.encode()
+            for i in range(0, max(len(raw), 1), 255):
+                chunk = raw[i : i + 255]
+                out.append(len(chunk))
+                out += chunk
+        return bytes(out)
+    if rtype == "SOA":
+        mname, rname, *numbers = text.split()
+        return encode_name(mname) + encode_name(rname) + struct.pack("!IIIII", *map(int, numbers))
+    raise ValueError("cannot encode %s records" % rtype)
+
+
+def build_response(
+    query: bytes, rcode: int = 0, answers: Optional[List[Record]] = None, authoritative: bool = True
+) -> bytes:
+    """Answer a query, echoing its question; answers are (name, rtype, ttl, text) records."""
+    msg_id, flags, _, _, end = parse_query(query)
+    answers = answers or []
+    flags = 0x8000 | (flags & 0x0100) | (0x0400 if authoritative else 0) | rcode
+    packet = bytearray(_HEADER.pack(msg_id, flags, 1, len(answers), 0, 0))
+    packet += query[_HEADER.size : end]
+    for record in answers:
+        rdata = encode_rdata(record.rtype, record.data)
+        packet += encode_name(record.name)
+        packet += _RR.pack(QTYPES[record.rtype], 1, record.ttl, len(rdata)) + rdata
+    return bytes(packet)
+
+
+class _Pipeline:
+    """Message ID bookkeeping shared by the UDP and TCP clients."""
+
+    def __init__(self) -> None:
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.loop = asyncio.get_running_loop()
+
+    def _allocate(self) -> Tuple[int, asyncio.Future]:
+        if len(self.pending) >= 65000:
+            raise RuntimeError("too many queries in flight on one socket")
+        msg_id = random.getrandbits(16)
+        while msg_id in self.pending:
+            msg_id = random.getrandbits(16)
+        future = self.loop.create_future()
+        self.pending[msg_id] = future
+        return msg_id, future
+
+    def _resolve(self, data: bytes) -> None:
+        if len(data) < 12:
+            return
+        future = self.pending.pop((data[0] << 8) | data[1], None)
+        if future is not None and not future.done():
+            future.set_result(data)
+
+    def _fail_all(self, exc: BaseException) -> None:
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(exc)
+        self.pending.clear()
+
+    async def _wait(self, msg_id: int, future: asyncio.Future, timeout: float) -> bytes:
+        handle = self.loop.call_later(timeout, self._expire, msg_id, future)
+        try:
+            return await future
+        finally:
+            handle.cancel()
+
+    def _expire(self, msg_id: int, future: asyncio.Future) -> None:
+        if self.pending.get(msg_id) is future:
+            del self.pending[msg_id]
+        if not future.done():
+            future.set_exception(asyncio.TimeoutError())
+
+
+class UDPClient(_Pipeline, asyncio.DatagramProtocol):
+    """Pipelined UDP client: many queries in flight on one socket."""
+
+    def __init__(self) -> None:
+        _Pipeline.__init__(self)
+        self.transport: Optional[asyncio.DatagramTransport] = None
+
+    @classmethod
+    async def connect(cls, server: str, port: int = 53) -> "UDPClient":
+        loop = asyncio.get_running_loop()
+        _, protocol = await loop.create_datagram_endpoint(
+            cls, remote_addr=(server, port)
+        )
+        return protocol
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        self.transport = transport  # type: ignore[assignment]
+
+    def datagram_received(self, data: bytes, addr: Tuple[str, int]) -> None:
+        self._resolve(data)
+
+    def error_received(self, exc: Exception) -> None:
+        # ICMP errors cannot be attributed to a single query; let them time out
+        pass
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        self._fail_all(exc or ConnectionError("socket closed"))
+
+    async def send(self, packet: bytes, timeout: float = 2.0) -> bytes:
+        """Send a built query (its ID is replaced) and return the raw reply."""
+        msg_id, future = self._allocate()
+        assert self.transport is not None
+        self.transport.sendto(with_id(packet, msg_id))
+        return await self._wait(msg_id, future, timeout)
+
+    def close(self) -> None:
+        if self.transport:
+            self.transport.close()
+
+
+class TCPClient(_Pipeline):
+    """Pipelined TCP client (RFC 7766): queries share one connection."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        super().__init__()
+        self.reader = reader
+        self.writer = writer
+        self.read_task = self.loop.create_task(self._read_loop())
+
+    @classmethod
+    async def connect(cls, server: str, port: int = 53, timeout: float = 2.0) -> "TCPClient":
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(server, port), timeout=timeout
+        )
+        return cls(reader, writer)
+
+    async def _read_loop(self) -> None:
+        try:
+            while True:
+                length = struct.unpack("!H", await self.reader.readexactly(2))[0]
+                self._resolve(await self.reader.readexactly(length))
+        except (asyncio.IncompleteReadError, ConnectionError, OSError) as e:
+            self._fail_all(ConnectionError(f"connection closed: {e}"))
+
+    async def send(self, packet: bytes, timeout: float = 2.0) -> bytes:
+        """Send a built query (its ID is replaced) and return the raw reply."""
+        if self.read_task.done():
+            raise ConnectionError("connection closed")
+        msg_id, future = self._allocate()
+        self.writer.write(struct.pack("!H", len(packet)) + with_id(packet, msg_id))
+        return await self._wait(msg_id, future, timeout)
+
+    def close(self) -> None:
+        self.read_task.cancel()
+        self.writer.close()
+
+
+async def query(
+    server: str,
+    qname: str,
+    qtype: str = "A",
+    port: int = 53,
+    timeout: float = 2.0,
+    ecs: Optional[str] = None,
+) -> Response:
+    """One-shot UDP query, retried over TCP if the answer is truncated."""
+    packet = build_query(qname, qtype, ecs=ecs)
+    client = await UDPClient.connect(server, port)
+    try:
+        data = await client.send(packet, timeout)
+    finally:
+        client.close()
+    if data[2] & 0x02:
+        tcp = await TCPClient.connect(server, port, timeout)
+        try:
+            data = await tcp.send(packet, timeout)
+        finally:
+            tcp.close()
+    return parse_response(data)
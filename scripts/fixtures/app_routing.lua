@@ -1,3 +1,9 @@
+-- Benchmark baseline, not deployed: the hand-written app routing script as
+-- it was before generate_zone.py --routing compiled per-zone modules from
+-- vars.yaml. bench_lua_routing.py and bench_app_routing.py measure it as
+-- the "before" side and check it against app_routing.py. Its tables are a
+-- frozen copy; do not edit them to follow vars.yaml.
+
 -- PowerDNS Lua script for app routing
 -- This script replicates the logic from the Python pipe backend
 -- Routes subdomains based on first character to specific load balancers
@@ -2,15 +2,92 @@
 """
 Zone Generation Script for PowerDNS
 Generates DNS zone files from templates with environment-specific configurations
+
+Zones are rendered from templates/zone.template.j2 with the same context the
+Ansible playbook uses (item, DEPLOY_ENV, powerdns, zone_serial, ...), so the
+zone_configs in vars.yaml are the single source of truth.
+
+Batch mode (--all) renders every zone_configs entry of every environment in
+one run with one compiled template, and only rewrites zone files whose
+content changed since the last run (tracked in <output-dir>/.zone-hashes.json).
+
+With --sqlite the rendered zones are written straight into a PowerDNS
+gsqlite3 database in one transaction (see pdns_sqlite.py), together with
+the domain metadata powerdns_setup.yaml would set for the server role.
+
+With --api the rendered zones are compared with the live zones on the
+master through the PowerDNS API and only the RRsets that differ are
+PATCHed, with the serial bumped past the live one (see pdns_api.py).
+Zone files, --sqlite and --api all keep serials monotonic: a changed zone
+gets today's YYYYMMDD00 or the previous serial + 1, whichever is higher.
+
+With --routing the app_routes of every app zone are compiled into a Lua
+module per zone (templates/app_routing.lua.j2: one table index per query,
+environment fixed at load time) and into Python and shell test fixtures.
+
+With --records the zone's custom records are streamed from JSONL, CSV or
+SQLite files (see zone_records.py): sorted into RRsets in bounded memory
+and written straight to the zone file in place of a placeholder record, so
+even a zone with millions of records is never held in memory. Records of
+RRsets the template writes itself (SOA, NS, the LUA routing records) are
+skipped.
 """
 
 import argparse
+import hashlib
+import json
 import os
+import re
+import sqlite3
 import sys
+from collections import Counter
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
 import yaml
-from jinja2 import Environment, FileSystemLoader, Template
+from jinja2 import Environment, FileSystemLoader
+
+from app_routing import load_routing_tables
+from pdns_api import PowerDNSAPI, PowerDNSAPIError, ZonePublisher
+from pdns_sqlite import STOCK_SCHEMA, Zone, ZoneDatabase, next_serial, parse_zone
+from zone_records import SORT_CHUNK, relative_name, stream_records, write_records
+
+TEMPLATE_DIR = Path(__file__).parent.parent / "templates"
+ZONE_TEMPLATE = "zone.template.j2"
+ROUTING_TEMPLATE = "app_routing.lua.j2"
+ROUTING_DIR = Path(__file__).parent.parent / "generated"
+HASH_MANIFEST = ".zone-hashes.json"
+# Manifest entry holding the last serial written per zone
+SERIALS_KEY = "serials"
+ENVIRONMENTS = ["staging", "production"]
+
+# Fixed-width stand-ins rendered in place of the values that change on every
+# run, so the content hash only reflects real changes
+SERIAL_PLACEHOLDER = "@SERIAL@@@"
+GENERATED_PLACEHOLDER = "@GENERATED@"
+# Owner name of the custom record whose line streamed records replace
+RECORDS_PLACEHOLDER = "@RECORDS@"
+
+# Template variables for zones that are not listed in vars.yaml
+ZONE_TYPE_DEFAULTS = {
+    "app": {
+        "default_ttl": "3600",
+        "lua_routing": True,
+        "geo_routing": False,
+        "routing_function": "appRouteCname",
+        "debug_function": "appRouteDebug",
+    },
+    "geo": {
+        "default_ttl": "300",
+        "lua_routing": False,
+        "geo_routing": True,
+    },
+    "simple": {
+        "default_ttl": "3600",
+        "lua_routing": False,
+        "geo_routing": False,
+    },
+}
 
 
 def load_config(config_file):
@@ -31,94 +108,438 @@ def get_serial():
     return datetime.now().strftime("%Y%m%d00")
 
 
-def generate_zone(zone_name, environment, zone_type, output_dir, config):
-    """Generate a zone file from template"""
+@lru_cache(maxsize=None)
+def get_template(template_dir=TEMPLATE_DIR, name=ZONE_TEMPLATE):
+    """Build the Jinja2 environment and compile the zone template once per process"""
+    # trim_blocks matches the Ansible template module, so both produce the same file
+    env = Environment(
+        loader=FileSystemLoader(str(template_dir)),
+        trim_blocks=True,
+        auto_reload=False,
+    )
+    return env.get_template(name)
 
-    # Setup Jinja2 environment
-    template_dir = Path(__file__).parent.parent / "templates"
-    env = Environment(loader=FileSystemLoader(template_dir))
-    template = env.get_template("zone.template.j2")
 
-    # Get environment-specific config
-    env_config = config["powerdns"][environment]
+def find_zone_config(zone_name, environment, config):
+    """Return the vars.yaml zone_configs entry for a zone, if there is one"""
+    for zone_config in config["powerdns"][environment].get("zone_configs", []):
+        if zone_config["domain"] == zone_name:
+            return zone_config
+    return None
 
-    # Base template variables
-    nameserver_host = "pdns2" if environment == "staging" else "pdns1"
-    template_vars = {
-        "zone_name": zone_name,
-        "environment": environment,
-        "serial": get_serial(),
-        "soa_nameserver": f"{nameserver_host}.runonflux.io.",
-        "nameservers": [f"{nameserver_host}.runonflux.io."],
-        "ansible_date_time": {"iso8601": datetime.now().isoformat()},
-    }
 
-    # Zone type specific configurations
+def build_zone_config(zone_name, environment, zone_type, config):
+    """Zone config for a zone from vars.yaml, or from the zone type defaults"""
+    zone_config = find_zone_config(zone_name, environment, config)
+    if zone_config is not None:
+        return zone_config
+
+    template_vars = dict(ZONE_TYPE_DEFAULTS[zone_type])
     if zone_type == "app":
-        template_vars.update(
-            {
-                "default_ttl": "3600",
-                "lua_routing": True,
-                "routing_script": "app_routing.lua",
-                "routing_function": "appRouteCname",
-                "debug_function": "appRouteDebug",
-            }
-        )
+        # The module --routing compiles once the zone has app_routes in vars.yaml
+        template_vars["routing_script"] = routing_module_name(zone_name)
+    if zone_type == "geo":
+        # Use the environment's configured CDN regions
+        template_vars["geo_regions"] = [
+            region
+            for other in config["powerdns"][environment].get("zone_configs", [])
+            if other.get("template_vars", {}).get("geo_routing", False)
+            for region in other["template_vars"].get("geo_regions", [])
+        ]
+    return {"domain": zone_name, "type": zone_type, "template_vars": template_vars}
 
-    elif zone_type == "geo":
-        template_vars.update(
-            {
-                "default_ttl": "300",
-                "geo_routing": True,
-                "geo_regions": [
-                    {
-                        "name": "us-west",
-                        "description": "West Coast USA",
-                        "server": "cdn-6.runonflux.io",
-                        "ip": "107.152.47.137",
-                    },
-                    {
-                        "name": "eu-west",
-                        "description": "France EU",
-                        "server": "cdn-1.runonflux.io",
-                        "ip": "5.39.57.50",
-                    },
-                    {
-                        "name": "asia-east",
-                        "description": "Hong Kong Asia",
-                        "server": "cdn-12.runonflux.io",
-                        "ip": "114.29.237.116",
-                    },
-                ],
-            }
-        )
 
-    elif zone_type == "simple":
-        template_vars.update(
-            {
-                "default_ttl": "3600",
-                "lua_routing": False,
-                "geo_routing": False,
-            }
-        )
+def render_zone(zone_config, environment, config, custom_records=None):
+    """
+    Render a zone with placeholder serial and timestamp.
 
-    # Render template
+    Returns the text to hash; fill_placeholders() turns it into the zone file.
+    """
+    template_vars = {
+        "item": zone_config,
+        "DEPLOY_ENV": environment,
+        "env": environment,
+        "powerdns": config["powerdns"],
+        "zone_serial": SERIAL_PLACEHOLDER,
+        "ansible_date_time": {"iso8601": GENERATED_PLACEHOLDER},
+    }
+    if custom_records is not None:
+        template_vars["custom_records"] = custom_records
     try:
-        zone_content = template.render(**template_vars)
+        return get_template().render(**template_vars)
     except Exception as e:
-        print(f"Error rendering template: {e}")
+        print(f"Error rendering template for {zone_config['domain']}: {e}")
         sys.exit(1)
 
-    # Write zone file
+
+def fill_placeholders(content, serial=None, generated=None):
+    """Replace the serial and timestamp placeholders with real values"""
+    return content.replace(SERIAL_PLACEHOLDER, serial or get_serial()).replace(
+        GENERATED_PLACEHOLDER, generated or datetime.now().isoformat()
+    )
+
+
+def content_hash(content):
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def load_manifest(output_dir):
+    try:
+        with open(Path(output_dir) / HASH_MANIFEST, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_manifest(output_dir, manifest):
+    path = Path(output_dir) / HASH_MANIFEST
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def write_zone(zone_config, environment, config, output_dir, manifest, force=False):
+    """
+    Render a zone and write it if its content changed.
+
+    Returns (output_file, changed).
+    """
+    zone_name = zone_config["domain"]
+    content = render_zone(zone_config, environment, config)
+    digest = content_hash(content)
     output_file = Path(output_dir) / f"{zone_name}.zone"
+
+    if not force and manifest.get(output_file.name) == digest and output_file.exists():
+        return output_file, False
+
+    serials = manifest.setdefault(SERIALS_KEY, {})
+    serial = next_serial(serials.get(zone_name))
     try:
-        with open(output_file, "w") as f:
-            f.write(zone_content)
-        print(f"Zone file generated: {output_file}")
-        return output_file
+        tmp = output_file.with_suffix(".zone.tmp")
+        with open(tmp, "w") as f:
+            f.write(fill_placeholders(content, str(serial)))
+        os.replace(tmp, output_file)
     except IOError as e:
         print(f"Error writing zone file: {e}")
         sys.exit(1)
+    manifest[output_file.name] = digest
+    serials[zone_name] = serial
+    return output_file, True
+
+
+def render_zone_around_records(zone_config, environment, config):
+    """
+    Render a zone with a placeholder line in the custom records section.
+
+    Returns (head, tail), the text before and after the streamed records.
+    """
+    content = render_zone(
+        zone_config, environment, config,
+        [{"name": RECORDS_PLACEHOLDER, "type": "", "value": ""}],
+    )
+    head, _, tail = content.partition(RECORDS_PLACEHOLDER)
+    return head, tail.split("\n", 1)[1]
+
+
+def template_rrsets(zone_config, head, tail):
+    """(owner as written in the zone, type) of every RRset the template writes itself"""
+    zone_name = zone_config["domain"]
+    records = parse_zone(fill_placeholders(head + tail), zone_name)
+    return {(relative_name(record.name + ".", zone_name), record.type) for record in records}
+
+
+def streamed_records(zone_config, head, tail, sources, chunk_size):
+    """Sorted records of the sources, reporting those the template already has"""
+    skipped = Counter()
+    yield from stream_records(
+        sources, zone_config["domain"], chunk_size,
+        template_rrsets(zone_config, head, tail), skipped,
+    )
+    if skipped:
+        rrsets = ", ".join(f"{name} {rtype}" for name, rtype in sorted(skipped))
+        print(
+            f"{sum(skipped.values())} record(s) skipped, the template writes their RRsets: {rrsets}",
+            file=sys.stderr,
+        )
+
+
+def write_streamed_zone(
+    zone_config, environment, config, output_dir, manifest, sources,
+    force=False, chunk_size=SORT_CHUNK,
+):
+    """
+    Render a zone with its custom records streamed from files, like write_zone.
+
+    The file is written and hashed as the sorted records come in, and only
+    replaces the existing one if the hash changed.
+    Returns (output_file, changed, record_count).
+    """
+    zone_name = zone_config["domain"]
+    head, tail = render_zone_around_records(zone_config, environment, config)
+    output_file = Path(output_dir) / f"{zone_name}.zone"
+    serials = manifest.setdefault(SERIALS_KEY, {})
+    serial = next_serial(serials.get(zone_name))
+    hasher = hashlib.sha256(head.encode())
+    tmp = output_file.with_suffix(".zone.tmp")
+    try:
+        with open(tmp, "w") as f:
+            f.write(fill_placeholders(head, str(serial)))
+            records = streamed_records(zone_config, head, tail, sources, chunk_size)
+            count = write_records(records, f, hasher)
+            f.write(tail)
+        hasher.update(tail.encode())
+    except ValueError as e:
+        tmp.unlink(missing_ok=True)
+        print(f"Error reading records for {zone_name}: {e}")
+        sys.exit(1)
+    except IOError as e:
+        tmp.unlink(missing_ok=True)
+        print(f"Error writing zone file: {e}")
+        sys.exit(1)
+
+    digest = hasher.hexdigest()
+    if not force and manifest.get(output_file.name) == digest and output_file.exists():
+        tmp.unlink()
+        return output_file, False, count
+    os.replace(tmp, output_file)
+    manifest[output_file.name] = digest
+    serials[zone_name] = serial
+    return output_file, True, count
+
+
+def generate_zone(
+    zone_name, environment, zone_type, output_dir, config,
+    sources=None, chunk_size=SORT_CHUNK,
+):
+    """Generate a zone file from template"""
+    zone_config = build_zone_config(zone_name, environment, zone_type, config)
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest(output_dir)
+    if sources:
+        output_file, changed, count = write_streamed_zone(
+            zone_config, environment, config, output_dir, manifest, sources,
+            chunk_size=chunk_size,
+        )
+        print(f"{count} streamed record(s)")
+    else:
+        output_file, changed = write_zone(
+            zone_config, environment, config, output_dir, manifest
+        )
+    if changed:
+        save_manifest(output_dir, manifest)
+        print(f"Zone file generated: {output_file}")
+    else:
+        print(f"Zone file unchanged: {output_file}")
+    return output_file
+
+
+def generate_all_zones(output_dir, config, environments=None, force=False):
+    """Generate every zone_configs entry of every environment in one pass"""
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest(output_dir)
+    changed_files = []
+
+    for environment in environments or ENVIRONMENTS:
+        env_config = config["powerdns"].get(environment) or {}
+        for zone_config in env_config.get("zone_configs", []):
+            output_file, changed = write_zone(
+                zone_config, environment, config, output_dir, manifest, force
+            )
+            if changed:
+                changed_files.append(output_file)
+                print(f"Zone file generated: {output_file}")
+            else:
+                print(f"Zone file unchanged: {output_file}")
+
+    if changed_files:
+        save_manifest(output_dir, manifest)
+    print(f"{len(changed_files)} zone file(s) changed")
+    return changed_files
+
+
+def routing_module_name(zone_name):
+    """File name of the compiled routing module for an app zone"""
+    return f"app_routing.{zone_name}.lua"
+
+
+def write_if_changed(path, content):
+    """Write a generated file unless it already has this content"""
+    path = Path(path)
+    if path.exists() and path.read_text() == content:
+        return False
+    path.write_text(content)
+    return True
+
+
+def render_routing_module(table):
+    """Render the Lua routing module for one app routing table"""
+    if table.mode == "rendezvous":
+        return get_template(TEMPLATE_DIR, ROUTING_TEMPLATE).render(
+            zone=table.zone,
+            environment=table.environment,
+            mode=table.mode,
+            default_target=table.default_target,
+            lbs=table.lbs,
+        )
+    slots = sorted(
+        {
+            (ord(variant), variant, target)
+            for char, target in table.char_map().items()
+            for variant in (char, char.upper())
+        }
+    )
+    return get_template(TEMPLATE_DIR, ROUTING_TEMPLATE).render(
+        zone=table.zone,
+        environment=table.environment,
+        mode=table.mode,
+        default_target=table.default_target,
+        slots=slots,
+    )
+
+
+def render_python_fixture(tables):
+    routes = {
+        zone: {
+            "environment": table.environment,
+            "mode": table.mode,
+            "default_target": table.default_target,
+            "mappings": table.fixture_map(),
+        }
+        for zone, table in tables.items()
+    }
+    return (
+        '"""App routing fixtures generated by generate_zone.py --routing '
+        'from vars.yaml; do not edit"""\n\n'
+        f"ROUTES = {json.dumps(routes, indent=4)}\n"
+    )
+
+
+def shell_name(zone_name):
+    """Shell variable name for a zone's mappings, e.g. APP2_RUNONFLUX_IO_MAPPINGS"""
+    return re.sub(r"[^A-Za-z0-9]", "_", zone_name).upper() + "_MAPPINGS"
+
+
+def render_shell_fixture(tables):
+    lines = [
+        "# App routing fixtures generated by generate_zone.py --routing from vars.yaml; do not edit",
+        "# shellcheck disable=SC2034",
+        "",
+        "APP_ZONES=(%s)" % " ".join(f'"{zone}"' for zone in tables),
+        "declare -A ZONE_ENVIRONMENTS=(%s)"
+        % " ".join(f'["{zone}"]="{table.environment}"' for zone, table in tables.items()),
+        "declare -A ZONE_DEFAULT_TARGETS=(%s)"
+        % " ".join(f'["{zone}"]="{table.default_target}"' for zone, table in tables.items()),
+        "declare -A ZONE_MAPPINGS=(%s)"
+        % " ".join(f'["{zone}"]="{shell_name(zone)}"' for zone in tables),
+    ]
+    for zone, table in tables.items():
+        lines.append("")
+        lines.append(f"declare -A {shell_name(zone)}=(")
+        lines.extend(f'    ["{char}"]="{target}"' for char, target in table.fixture_map().items())
+        lines.append(")")
+    return "\n".join(lines) + "\n"
+
+
+def compile_routing(config, output_dir=ROUTING_DIR):
+    """Compile the app routing tables into Lua modules and test fixtures"""
+    tables = load_routing_tables(config)
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+
+    outputs = {
+        routing_module_name(zone): render_routing_module(table)
+        for zone, table in tables.items()
+    }
+    outputs["app_routing_fixtures.py"] = render_python_fixture(tables)
+    outputs["app_routing_fixtures.sh"] = render_shell_fixture(tables)
+
+    for name, content in outputs.items():
+        path = Path(output_dir) / name
+        if write_if_changed(path, content):
+            print(f"Routing file generated: {path}")
+        else:
+            print(f"Routing file unchanged: {path}")
+    return list(outputs)
+
+
+def domain_settings(environment, config, role):
+    """domains.type/master and domainmetadata as powerdns_setup.yaml configures them"""
+    env_config = config["powerdns"][environment]
+    if role == "slave":
+        return "SLAVE", ",".join(env_config["master_ips"]), {
+            "AXFR-MASTER-TSIG": ["zone-transfer"],
+        }
+    return "MASTER", None, {
+        "TSIG-ALLOW-AXFR": ["zone-transfer"],
+        "NOTIFY-DNSUPDATE": ["zone-transfer"],
+        "ALSO-NOTIFY": [",".join(env_config["slave_ips"])],
+        "SOA-EDIT": ["NONE"],
+        "SOA-EDIT-API": ["DEFAULT"],
+    }
+
+
+def build_db_zone(zone_config, environment, config, role, serial=None):
+    """Render a zone and turn it into database rows"""
+    content = fill_placeholders(render_zone(zone_config, environment, config), serial)
+    kind, master, metadata = domain_settings(environment, config, role)
+    records = parse_zone(
+        content,
+        zone_config["domain"],
+        int(zone_config["template_vars"].get("default_ttl", 3600)),
+    )
+    return Zone(zone_config["domain"], records, kind, master, metadata)
+
+
+def load_sqlite(db_path, zones, changed_only=False, schema=STOCK_SCHEMA, prune=False):
+    """Write zones into a PowerDNS SQLite database in one transaction"""
+    try:
+        with ZoneDatabase(db_path, schema) as db:
+            stats = db.load(zones, changed_only, prune)
+    except (sqlite3.Error, OSError) as e:
+        print(f"Error writing {db_path}: {e}")
+        sys.exit(1)
+
+    for zone_name, counts in stats.items():
+        if changed_only:
+            print(
+                f"{zone_name}: {counts['rrsets_changed']} RRset(s) replaced "
+                f"({counts['deleted']} deleted, {counts['inserted']} inserted)"
+            )
+        else:
+            print(f"{zone_name}: {counts['inserted']} records loaded")
+    return stats
+
+
+def publish_api(url, api_key, zones, prune=False, dry_run=False):
+    """Push the RRsets that differ from the live zones through the PowerDNS API"""
+    results = {}
+    with PowerDNSAPI(url, api_key) as api:
+        publisher = ZonePublisher(api, prune)
+        for zone in zones:
+            try:
+                result = publisher.publish(zone, dry_run)
+            except (PowerDNSAPIError, OSError) as e:
+                print(f"Error publishing {zone.name} to {url}: {e}")
+                sys.exit(1)
+            results[zone.name] = result
+
+            if result["missing"]:
+                print(f"{zone.name}: not on the server, skipped (import it with pdnsutil load-zone)")
+                continue
+            changes = result["replaced"] + result["deleted"]
+            if changes:
+                action = "would change" if dry_run else "changed"
+                print(
+                    f"{zone.name}: {action} {changes} RRset(s) "
+                    f"({result['replaced']} replaced, {result['deleted']} deleted), serial {result['serial']}"
+                )
+                for change in result["changes"]:
+                    print(f"  {change}")
+            else:
+                print(f"{zone.name}: unchanged (serial {result['serial']})")
+            if result["unmanaged"]:
+                print(f"  {result['unmanaged']} RRset(s) not in the template kept (--prune deletes them)")
+    return results
 
 
 def main():
@@ -126,16 +547,33 @@ def main():
         description="Generate PowerDNS zone files from templates"
     )
     parser.add_argument(
-        "zone_name", help="Domain name for the zone (e.g., example.com)"
+        "zone_name", nargs="?", help="Domain name for the zone (e.g., example.com)"
     )
     parser.add_argument(
-        "environment", choices=["staging", "production"], help="Environment"
+        "environment", nargs="?", choices=ENVIRONMENTS, help="Environment"
     )
     parser.add_argument(
         "zone_type",
+        nargs="?",
         choices=["app", "geo", "simple"],
         help="Zone type: app=application routing, geo=geographic routing, simple=basic zone",
     )
+    parser.add_argument(
+        "--all",
+        action="store_true",
+        help="Generate every zone in vars.yaml (optionally limited with --env)",
+    )
+    parser.add_argument(
+        "--env",
+        action="append",
+        choices=ENVIRONMENTS,
+        help="With --all: only this environment (repeatable)",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Rewrite zone files even if their content is unchanged",
+    )
     parser.add_argument(
         "-o",
         "--output-dir",
@@ -151,8 +589,75 @@ def main():
         action="store_true",
         help="Show template output without writing file",
     )
+    parser.add_argument(
+        "--routing",
+        action="store_true",
+        help="Compile app_routes into per-zone Lua modules and test fixtures",
+    )
+    parser.add_argument(
+        "--routing-dir",
+        help="Output directory for --routing (default: ../generated from script location)",
+    )
+    parser.add_argument(
+        "--sqlite",
+        metavar="DB",
+        help="Write zones into this PowerDNS gsqlite3 database instead of zone files",
+    )
+    parser.add_argument(
+        "--changed-only",
+        action="store_true",
+        help="With --sqlite: replace only RRsets that changed",
+    )
+    parser.add_argument(
+        "--role",
+        choices=["master", "slave"],
+        default="master",
+        help="With --sqlite: server role for domain kind and metadata (default: master)",
+    )
+    parser.add_argument(
+        "--schema",
+        default=str(STOCK_SCHEMA),
+        help=f"Schema used if the database is empty (default: {STOCK_SCHEMA})",
+    )
+    parser.add_argument(
+        "--api",
+        metavar="URL",
+        help="Push changed RRsets to the PowerDNS API at this URL (e.g. http://127.0.0.1:8081)",
+    )
+    parser.add_argument(
+        "--api-key",
+        help="With --api: API key (default: $PDNS_API_KEY, then api_key from vars.yaml)",
+    )
+    parser.add_argument(
+        "--prune",
+        action="store_true",
+        help="With --api or --sqlite --changed-only: also delete RRsets that are not in the template",
+    )
+    parser.add_argument(
+        "--records",
+        action="append",
+        metavar="SOURCE",
+        help="Stream custom records from a .jsonl, .csv or .sqlite file ('-' for JSONL on stdin) "
+        "into a single zone file (repeatable)",
+    )
+    parser.add_argument(
+        "--sort-chunk",
+        type=int,
+        default=SORT_CHUNK,
+        help=f"With --records: records sorted in memory per temporary run (default: {SORT_CHUNK})",
+    )
 
     args = parser.parse_args()
+    if args.routing:
+        config_path = args.config or Path(__file__).parent.parent / "vars.yaml"
+        compile_routing(load_config(config_path), args.routing_dir or ROUTING_DIR)
+        return
+    if not args.all and not (args.zone_name and args.environment and args.zone_type):
+        parser.error("zone_name, environment and zone_type are required without --all")
+    if args.records and (args.all or args.sqlite or args.api):
+        parser.error("--records writes a single zone file (no --all, --sqlite or --api)")
+    if args.sqlite and args.dry_run:
+        parser.error("--dry-run does not apply to --sqlite (use --dry-run without --sqlite to see the zones)")
 
     # Set default paths relative to script location
     script_dir = Path(__file__).parent
@@ -164,39 +669,79 @@ def main():
     # Load configuration
     config = load_config(config_path)
 
-    # Generate zone
-    if args.dry_run:
-        print("=== DRY RUN - Zone file content ===")
-        # For dry run, just print the content
-        template_dir = Path(__file__).parent.parent / "templates"
-        env = Environment(loader=FileSystemLoader(template_dir))
-        template = env.get_template("zone.template.j2")
-
-        nameserver_host = "pdns2" if args.environment == "staging" else "pdns1"
-        template_vars = {
-            "zone_name": args.zone_name,
-            "environment": args.environment,
-            "serial": get_serial(),
-            "soa_nameserver": f"{nameserver_host}.runonflux.io.",
-            "nameservers": [f"{nameserver_host}.runonflux.io."],
-            "ansible_date_time": {"iso8601": datetime.now().isoformat()},
-        }
+    if args.api:
+        if args.all:
+            targets = [
+                (environment, config["powerdns"][environment].get("zone_configs", []))
+                for environment in args.env or ENVIRONMENTS
+            ]
+        else:
+            targets = [
+                (
+                    args.environment,
+                    [build_zone_config(args.zone_name, args.environment, args.zone_type, config)],
+                )
+            ]
+        for environment, zone_configs in targets:
+            api_key = (
+                args.api_key
+                or os.environ.get("PDNS_API_KEY")
+                or config["powerdns"][environment].get("api_key")
+            )
+            zones = [
+                build_db_zone(zone_config, environment, config, "master")
+                for zone_config in zone_configs
+            ]
+            publish_api(args.api, api_key, zones, args.prune, args.dry_run)
+        return
 
-        if args.zone_type == "app":
-            template_vars.update(
-                {
-                    "default_ttl": "3600",
-                    "lua_routing": True,
-                    "routing_script": "app_routing.lua",
-                    "routing_function": "appRouteCname",
-                    "debug_function": "appRouteDebug",
-                }
+    if args.sqlite:
+        if args.all:
+            zones = [
+                build_db_zone(zone_config, environment, config, args.role)
+                for environment in args.env or ENVIRONMENTS
+                for zone_config in config["powerdns"][environment].get("zone_configs", [])
+            ]
+        else:
+            zone_config = build_zone_config(
+                args.zone_name, args.environment, args.zone_type, config
             )
+            zones = [build_db_zone(zone_config, args.environment, config, args.role)]
+        load_sqlite(args.sqlite, zones, args.changed_only, args.schema, args.prune)
+        return
+
+    if args.all:
+        if args.dry_run:
+            for environment in args.env or ENVIRONMENTS:
+                for zone_config in config["powerdns"][environment].get("zone_configs", []):
+                    print(f"=== DRY RUN - {zone_config['domain']} ({environment}) ===")
+                    print(fill_placeholders(render_zone(zone_config, environment, config)))
+        else:
+            generate_all_zones(output_dir, config, args.env, args.force)
+        return
 
-        print(template.render(**template_vars))
+    # Generate zone
+    if args.dry_run:
+        print("=== DRY RUN - Zone file content ===")
+        zone_config = build_zone_config(
+            args.zone_name, args.environment, args.zone_type, config
+        )
+        if not args.records:
+            print(fill_placeholders(render_zone(zone_config, args.environment, config)))
+            return
+        head, tail = render_zone_around_records(zone_config, args.environment, config)
+        sys.stdout.write(fill_placeholders(head))
+        try:
+            records = streamed_records(zone_config, head, tail, args.records, args.sort_chunk)
+            write_records(records, sys.stdout)
+        except ValueError as e:
+            print(f"Error reading records for {zone_config['domain']}: {e}")
+            sys.exit(1)
+        print(tail)
     else:
         generate_zone(
-            args.zone_name, args.environment, args.zone_type, output_dir, config
+            args.zone_name, args.environment, args.zone_type, output_dir, config,
+            args.records, args.sort_chunk,
         )
 
 
@@ -0,0 +1,848 @@
+#!/usr/bin/env -S uv run --script
+# /// script
+# requires-python = ">=3.8"
+# dependencies = [
+#     "jinja2>=3.0",
+#     "numpy>=1.20",
+#     "pyyaml>=6.0",
+# ]
+# ///
+"""
+Offline GeoIP Coverage Map
+
+Shows which CDN node geoRoute() would hand each client prefix, and how
+that changes with a proposed geo_regions set, without sending a single
+DNS query. The GeoLite2-City database templates/pdns.conf.j2 points the
+geoip backend at is memory-mapped like PowerDNS does (mode=mmap) and read
+directly: the network addresses of all prefixes walk the MMDB search tree
+together as NumPy arrays, each distinct city record is decoded once, and
+the pickclosest choice among the CDN IPs (located through the same
+database) is made per city with vectorized distances.
+
+Prefix files hold one "prefix [count]" per line ('#' starts a comment),
+e.g. "198.51.100.0/24 1520"; bare addresses count as /32 (/128). With a
+count the shares are weighted by it (queries, clients...), otherwise
+every prefix counts once. A second field that is not a number is read as
+a label and ignored, so monitor_cdn_health.py --ecs-sweep files work too.
+
+The current regions are the geo_regions of every geo-routing zone of the
+environment, as templates/geo_routing.lua.j2 builds its server list.
+--proposed takes another vars.yaml, a {geo_regions: [...]} mapping or a
+plain list of regions; a region may carry latitude/longitude to place a
+node whose address is not in the database yet.
+
+pickclosest() compares squared degree differences of latitude and
+longitude (--distance degrees reproduces that, including the one-sided
+longitude wrap); the default great-circle distance is what it
+approximates. Prefixes and nodes the database cannot place are put at
+0,0 as PowerDNS does, and counted as unlocated. Ties go to the node
+listed first, where PowerDNS picks one of them at random.
+
+Usage:
+  ./geo_coverage.py clients.txt
+  ./geo_coverage.py clients.txt --proposed proposed-regions.yaml
+  ./geo_coverage.py clients.txt --proposed ../vars-new.yaml --down cdn-3.runonflux.io --json
+  ./geo_coverage.py clients.txt --mmdb GeoLite2-City.mmdb --output assignment.tsv
+"""
+
+import argparse
+import ipaddress
+import json
+import mmap
+import re
+import socket
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import yaml
+
+from generate_zone import ENVIRONMENTS
+
+TEMPLATES = Path(__file__).parent.parent / "templates"
+DEFAULT_MMDB = "/usr/share/GeoIP/GeoLite2-City.mmdb"
+
+METADATA_MARKER = b"\xab\xcd\xefMaxMind.com"
+# Extra bytes of the 29/30/31 size encodings add these bases
+SIZE_BASES = (29, 285, 65821)
+POINTER_BASES = (0, 2048, 526336, 0)
+
+# MMDB data types
+POINTER, UTF8, DOUBLE, BYTES, UINT16, UINT32, MAP, INT32, UINT64, UINT128, ARRAY = range(1, 12)
+CONTAINER, END_MARKER, BOOLEAN, FLOAT = range(12, 16)
+
+
+def configured_mmdb(templates: Path = TEMPLATES) -> str:
+    """The MMDB file the geoip backend loads (geoip-database-files in templates/pdns.conf.j2)."""
+    match = re.search(r"^geoip-database-files=mmdb:([^;\s]+)", (templates / "pdns.conf.j2").read_text(), re.M)
+    return match.group(1) if match else DEFAULT_MMDB
+
+
+class MMDBReader:
+    """Vectorized lookups in a memory-mapped MaxMind DB (GeoLite2-City and the like)."""
+
+    def __init__(self, path: Path):
+        with open(path, "rb") as f:
+            self.buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        marker = self.buf.rfind(METADATA_MARKER)
+        if marker < 0:
+            raise ValueError(f"{path}: not a MaxMind DB file (no metadata marker)")
+        metadata_start = marker + len(METADATA_MARKER)
+        self.metadata, _ = self._decode(metadata_start, metadata_start)
+        self.node_count = int(self.metadata["node_count"])
+        self.record_size = int(self.metadata["record_size"])
+        self.ip_version = int(self.metadata["ip_version"])
+        if self.record_size not in (24, 28, 32):
+            raise ValueError(f"{path}: unsupported record size {self.record_size}")
+        self.node_bytes = self.record_size // 4
+        tree_size = self.node_count * self.node_bytes
+        self.tree = np.frombuffer(self.buf, dtype=np.uint8, count=tree_size)
+        self.data_start = tree_size + 16
+        # IPv4 addresses live under ::/96 of IPv6 trees
+        self.ipv4_start = 0
+        if self.ip_version == 6:
+            for _ in range(96):
+                if self.ipv4_start >= self.node_count:
+                    break
+                self.ipv4_start = int(self._records(np.array([self.ipv4_start]), np.zeros(1, dtype=np.int64))[0])
+
+    def close(self) -> None:
+        del self.tree
+        self.buf.close()
+
+    @property
+    def description(self) -> str:
+        built = time.strftime("%Y-%m-%d", time.gmtime(int(self.metadata.get("build_epoch", 0))))
+        return f"{self.metadata.get('database_type', '?')}, built {built}, {self.node_count:,} nodes"
+
+    # -- search tree --
+
+    def _records(self, nodes: np.ndarray, bits: np.ndarray) -> np.ndarray:
+        """The left (bit 0) or right (bit 1) record of each node."""
+        t = self.tree
+        base = nodes.astype(np.int64) * self.node_bytes
+        if self.record_size == 24:
+            off = base + bits * 3
+            return (t[off].astype(np.int64) << 16) | (t[off + 1].astype(np.int64) << 8) | t[off + 2]
+        if self.record_size == 32:
+            off = base + bits * 4
+            return (
+                (t[off].astype(np.int64) << 24) | (t[off + 1].astype(np.int64) << 16)
+                | (t[off + 2].astype(np.int64) << 8) | t[off + 3]
+            )
+        # 28 bits: the middle byte holds the high nibble of both records
+        off = base + bits * 4
+        middle = t[base + 3].astype(np.int64)
+        high = np.where(bits == 0, middle >> 4, middle & 0x0F)
+        return (high << 24) | (t[off].astype(np.int64) << 16) | (t[off + 1].astype(np.int64) << 8) | t[off + 2]
+
+    def _walk(self, words: List[np.ndarray], bits: int, start: int) -> np.ndarray:
+        """Data section offsets for addresses given as 64-bit words, most significant first; -1 if not found."""
+        count = len(words[0])
+        result = np.full(count, -1, dtype=np.int64)
+        active = np.arange(count)
+        nodes = np.full(count, start, dtype=np.int64)
+        if start >= self.node_count:
+            result[:] = start - self.node_count - 16 if start > self.node_count else -1
+            return result
+        for depth in range(bits):
+            if not len(active):
+                break
+            word = words[depth // 64] if len(active) == count else words[depth // 64][active]
+            bit = ((word >> np.uint64(63 - depth % 64)) & np.uint64(1)).astype(np.int64)
+            nodes = self._records(nodes, bit)
+            done = nodes >= self.node_count
+            if done.any():
+                found = nodes[done]
+                result[active[done]] = np.where(found > self.node_count, found - self.node_count - 16, -1)
+                active, nodes = active[~done], nodes[~done]
+        return result
+
+    def lookup_ipv4(self, addresses: np.ndarray) -> np.ndarray:
+        """Data section offsets of the records covering IPv4 addresses (uint32 values); -1 if none."""
+        return self._walk([addresses.astype(np.uint64) << np.uint64(32)], 32, self.ipv4_start)
+
+    def lookup_ipv6(self, high: np.ndarray, low: np.ndarray) -> np.ndarray:
+        """Data section offsets of the records covering IPv6 addresses (two uint64 halves); -1 if none."""
+        if self.ip_version != 6:
+            return np.full(len(high), -1, dtype=np.int64)
+        return self._walk([high.astype(np.uint64), low.astype(np.uint64)], 128, 0)
+
+    # -- data section --
+
+    def _control(self, offset: int) -> Tuple[int, int, int]:
+        """Type, size (pointer: control byte) and payload offset of the field at offset."""
+        buf = self.buf
+        ctrl = buf[offset]
+        offset += 1
+        kind = ctrl >> 5
+        if kind == 0:
+            kind = 7 + buf[offset]
+            offset += 1
+        if kind == POINTER:
+            return kind, ctrl, offset
+        size = ctrl & 0x1F
+        if size >= 29:
+            extra = size - 28
+            size = SIZE_BASES[extra - 1] + int.from_bytes(buf[offset:offset + extra], "big")
+            offset += extra
+        return kind, size, offset
+
+    def _pointer(self, ctrl: int, offset: int) -> Tuple[int, int]:
+        """Target (relative to the data section) and end of a pointer."""
+        length = ((ctrl >> 3) & 0x3) + 1
+        value = int.from_bytes(self.buf[offset:offset + length], "big")
+        if length < 4:
+            value |= (ctrl & 0x7) << (8 * length)
+        return value + POINTER_BASES[length - 1], offset + length
+
+    def _decode(self, offset: int, base: Optional[int] = None) -> Tuple[Any, int]:
+        """Value at offset and the offset after it; pointers are relative to base."""
+        base = self.data_start if base is None else base
+        kind, size, offset = self._control(offset)
+        buf = self.buf
+        if kind == POINTER:
+            target, offset = self._pointer(size, offset)
+            return self._decode(base + target, base)[0], offset
+        if kind == MAP:
+            value = {}
+            for _ in range(size):
+                key, offset = self._decode(offset, base)
+                value[key], offset = self._decode(offset, base)
+            return value, offset
+        if kind == ARRAY:
+            items = []
+            for _ in range(size):
+                item, offset = self._decode(offset, base)
+                items.append(item)
+            return items, offset
+        if kind == BOOLEAN:
+            return bool(size), offset
+        end = offset + size
+        if kind == UTF8:
+            return buf[offset:end].decode("utf-8"), end
+        if kind == DOUBLE:
+            return struct.unpack(">d", buf[offset:end])[0], end
+        if kind == FLOAT:
+            return struct.unpack(">f", buf[offset:end])[0], end
+        if kind in (UINT16, UINT32, UINT64, UINT128):
+            return int.from_bytes(buf[offset:end], "big"), end
+        if kind == INT32:
+            return int.from_bytes(buf[offset:end], "big", signed=size == 4), end
+        if kind == BYTES:
+            return bytes(buf[offset:end]), end
+        raise ValueError(f"unsupported MMDB data type {kind} at offset {offset}")
+
+    def _skip(self, offset: int) -> int:
+        """Offset after the value at offset, without decoding it."""
+        kind, size, offset = self._control(offset)
+        if kind == POINTER:
+            return self._pointer(size, offset)[1]
+        if kind == MAP:
+            for _ in range(2 * size):
+                offset = self._skip(offset)
+            return offset
+        if kind == ARRAY:
+            for _ in range(size):
+                offset = self._skip(offset)
+            return offset
+        if kind == BOOLEAN:
+            return offset
+        return offset + size
+
+    def location(self, record: int) -> Optional[Tuple[float, float]]:
+        """location.latitude/longitude of the record at a data section offset (only that map is decoded)."""
+        offset = self.data_start + record
+        kind, size, offset = self._control(offset)
+        if kind == POINTER:
+            target, _ = self._pointer(size, offset)
+            kind, size, offset = self._control(self.data_start + target)
+        if kind != MAP:
+            return None
+        for _ in range(size):
+            key, offset = self._decode(offset)
+            if key == "location":
+                location, _ = self._decode(offset)
+                if isinstance(location, dict) and "latitude" in location and "longitude" in location:
+                    return float(location["latitude"]), float(location["longitude"])
+                return None
+            offset = self._skip(offset)
+        return None
+
+    def locations(self, records: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Latitude and longitude arrays for data section offsets (NaN where there is none)."""
+        latitude = np.full(len(records), np.nan)
+        longitude = np.full(len(records), np.nan)
+        for i, record in enumerate(records.tolist()):
+            if record >= 0:
+                found = self.location(record)
+                if found:
+                    latitude[i], longitude[i] = found
+        return latitude, longitude
+
+    def locate(self, address: str) -> Optional[Tuple[float, float]]:
+        """Coordinates of a single address."""
+        value = ipaddress.ip_address(address)
+        if value.version == 4:
+            record = self.lookup_ipv4(np.array([int(value)], dtype=np.uint64))[0]
+        else:
+            record = self.lookup_ipv6(
+                np.array([int(value) >> 64], dtype=np.uint64), np.array([int(value) & (2**64 - 1)], dtype=np.uint64)
+            )[0]
+        return self.location(int(record)) if record >= 0 else None
+
+
+# -- MMDB writer (test fixtures and what-if databases) --
+
+
+def _encode_control(kind: int, size: int) -> bytes:
+    if size < 29:
+        head, extra = size, b""
+    elif size < 285:
+        head, extra = 29, bytes([size - 29])
+    elif size < 65821:
+        head, extra = 30, (size - 285).to_bytes(2, "big")
+    else:
+        head, extra = 31, (size - 65821).to_bytes(3, "big")
+    if kind <= 7:
+        return bytes([(kind << 5) | head]) + extra
+    return bytes([head, kind - 7]) + extra
+
+
+def _encode_pointer(target: int) -> bytes:
+    if target < 2048:
+        return bytes([0x20 | target >> 8, target & 0xFF])
+    if target < 526336:
+        target -= 2048
+        return bytes([0x28 | target >> 16]) + (target & 0xFFFF).to_bytes(2, "big")
+    if target < 134744064:
+        target -= 526336
+        return bytes([0x30 | target >> 24]) + (target & 0xFFFFFF).to_bytes(3, "big")
+    return bytes([0x38]) + target.to_bytes(4, "big")
+
+
+def _encode_uint(kind: int, value: int) -> bytes:
+    raw = value.to_bytes((value.bit_length() + 7) // 8, "big")
+    return _encode_control(kind, len(raw)) + raw
+
+
+def encode_value(value: Any) -> bytes:
+    """MMDB data section encoding of a value (dict, list, str, float, bool, non-negative int)."""
+    if isinstance(value, dict):
+        return _encode_control(MAP, len(value)) + b"".join(
+            encode_value(str(key)) + encode_value(item) for key, item in value.items()
+        )
+    if isinstance(value, (list, tuple)):
+        return _encode_control(ARRAY, len(value)) + b"".join(encode_value(item) for item in value)
+    if isinstance(value, bool):
+        return _encode_control(BOOLEAN, int(value))
+    if isinstance(value, str):
+        raw = value.encode("utf-8")
+        return _encode_control(UTF8, len(raw)) + raw
+    if isinstance(value, float):
+        return _encode_control(DOUBLE, 8) + struct.pack(">d", value)
+    if isinstance(value, int) and value >= 0:
+        return _encode_uint(UINT32 if value < 2**32 else UINT64 if value < 2**64 else UINT128, value)
+    raise TypeError(f"cannot encode {value!r} in an MMDB")
+
+
+def write_mmdb(
+    path: Path,
+    networks: Iterable[Tuple[str, Dict[str, Any]]],
+    record_size: int = 28,
+    database_type: str = "GeoLite2-City",
+) -> None:
+    """Write an IPv6 MMDB (IPv4 under ::/96) mapping networks to records; more specific networks win."""
+    data = bytearray()
+    offsets: Dict[str, int] = {}
+
+    def store(value: Any) -> int:
+        """Offset of value in the data section; maps, arrays and strings are shared through pointers."""
+        key = json.dumps(value, sort_keys=True)
+        if key not in offsets:
+            if isinstance(value, dict):
+                encoded = _encode_control(MAP, len(value)) + b"".join(
+                    reference(str(k)) + reference(v) for k, v in value.items()
+                )
+            elif isinstance(value, (list, tuple)):
+                encoded = _encode_control(ARRAY, len(value)) + b"".join(reference(item) for item in value)
+            else:
+                encoded = encode_value(value)
+            offsets[key] = len(data)
+            data.extend(encoded)
+        return offsets[key]
+
+    def reference(value: Any) -> bytes:
+        if isinstance(value, (dict, list, tuple, str)):
+            return _encode_pointer(store(value))
+        return encode_value(value)
+
+    # A child is a node index, ("data", offset) or None
+    tree: List[List[Any]] = [[None, None]]
+    for network, record in sorted(
+        ((ipaddress.ip_network(network), record) for network, record in networks), key=lambda item: item[0].prefixlen
+    ):
+        offset = store(record)
+        bits = network.prefixlen + (96 if network.version == 4 else 0)
+        if bits == 0:
+            raise ValueError("the whole address space cannot be a network")
+        value = int(network.network_address)
+        node = 0
+        for depth in range(bits):
+            bit = (value >> (127 - depth)) & 1
+            if depth == bits - 1:
+                tree[node][bit] = ("data", offset)
+                break
+            child = tree[node][bit]
+            if not isinstance(child, int):
+                # Split a less specific network (or empty space) around the more specific one
+                tree.append([child, child])
+                child = tree[node][bit] = len(tree) - 1
+            node = child
+
+    node_count = len(tree)
+
+    def number(child: Any) -> int:
+        if child is None:
+            return node_count
+        if isinstance(child, int):
+            return child
+        return node_count + 16 + child[1]
+
+    limit = 1 << record_size
+    out = bytearray()
+    for left, right in tree:
+        left, right = number(left), number(right)
+        if max(left, right) >= limit:
+            raise ValueError(f"record size {record_size} too small for this database")
+        if record_size == 28:
+            out += left.to_bytes(4, "big")[1:] + bytes([(left >> 24) << 4 | right >> 24]) + right.to_bytes(4, "big")[1:]
+        else:
+            out += left.to_bytes(record_size // 8, "big") + right.to_bytes(record_size // 8, "big")
+    # Readers check the integer types of the metadata fields
+    metadata = [
+        ("binary_format_major_version", _encode_uint(UINT16, 2)),
+        ("binary_format_minor_version", _encode_uint(UINT16, 0)),
+        ("build_epoch", _encode_uint(UINT64, int(time.time()))),
+        ("database_type", encode_value(database_type)),
+        ("description", encode_value({"en": f"{database_type} test database"})),
+        ("ip_version", _encode_uint(UINT16, 6)),
+        ("languages", encode_value(["en"])),
+        ("node_count", _encode_uint(UINT32, node_count)),
+        ("record_size", _encode_uint(UINT16, record_size)),
+    ]
+    metadata_bytes = _encode_control(MAP, len(metadata)) + b"".join(encode_value(key) + value for key, value in metadata)
+    with open(path, "wb") as f:
+        f.write(bytes(out) + bytes(16) + bytes(data) + METADATA_MARKER + metadata_bytes)
+
+
+# -- prefixes --
+
+
+class Prefixes(NamedTuple):
+    count: int
+    weighted: bool
+    # Network addresses (uint32) and positions in the file of the IPv4 prefixes
+    ipv4: np.ndarray
+    ipv4_positions: np.ndarray
+    # Halves of the network addresses and positions of the IPv6 prefixes
+    ipv6_high: np.ndarray
+    ipv6_low: np.ndarray
+    ipv6_positions: np.ndarray
+    # Per prefix, in file order
+    weights: np.ndarray
+
+
+def prefix_lines(lines: Iterable[str]) -> Iterator[Tuple[int, List[str]]]:
+    """(line number, fields) of the non-empty lines of a prefix file."""
+    for number, line in enumerate(lines, 1):
+        if "#" in line:
+            line = line.split("#", 1)[0]
+        fields = line.split()
+        if fields:
+            yield number, fields
+
+
+def read_prefixes(lines: Iterable[str]) -> Prefixes:
+    """Parse "prefix [count]" lines into network addresses; raises ValueError on a bad prefix."""
+    ipv4: List[int] = []
+    ipv4_lengths: List[int] = []
+    ipv4_positions: List[int] = []
+    ipv6: List[int] = []
+    ipv6_lengths: List[int] = []
+    ipv6_positions: List[int] = []
+    weights: List[float] = []
+    weighted = False
+    inet_pton, AF_INET, AF_INET6 = socket.inet_pton, socket.AF_INET, socket.AF_INET6
+    position = 0
+    for number, fields in prefix_lines(lines):
+        address, _, length = fields[0].partition("/")
+        try:
+            if ":" in address:
+                ipv6.append(int.from_bytes(inet_pton(AF_INET6, address), "big"))
+                ipv6_lengths.append(int(length) if length else 128)
+                ipv6_positions.append(position)
+                if not 0 <= ipv6_lengths[-1] <= 128:
+                    raise ValueError
+            else:
+                ipv4.append(int.from_bytes(inet_pton(AF_INET, address), "big"))
+                ipv4_lengths.append(int(length) if length else 32)
+                ipv4_positions.append(position)
+                if not 0 <= ipv4_lengths[-1] <= 32:
+                    raise ValueError
+        except (OSError, ValueError):
+            raise ValueError(f"line {number}: invalid prefix {fields[0]!r}") from None
+        weight = 1.0
+        if len(fields) > 1:
+            try:
+                weight = float(fields[1])
+                weighted = True
+            except ValueError:
+                pass  # a label
+        weights.append(weight)
+        position += 1
+
+    # Network addresses: clear the host bits
+    v4 = np.array(ipv4, dtype=np.uint64)
+    v4_lengths = np.array(ipv4_lengths, dtype=np.uint64)
+    v4 &= (np.uint64(0xFFFFFFFF) << (np.uint64(32) - v4_lengths)) & np.uint64(0xFFFFFFFF)
+    mask64 = (1 << 64) - 1
+    high = np.array([value >> 64 for value in ipv6], dtype=np.uint64)
+    low = np.array([value & mask64 for value in ipv6], dtype=np.uint64)
+    v6_lengths = np.array(ipv6_lengths, dtype=np.int64)
+    ones = np.uint64(mask64)
+
+    def mask(bits: np.ndarray) -> np.ndarray:
+        # Shifting a uint64 by 64 is undefined: full and empty masks are set separately
+        shifted = ones << (np.uint64(64) - np.clip(bits, 1, 64).astype(np.uint64))
+        return np.where(bits <= 0, np.uint64(0), shifted)
+
+    high &= mask(v6_lengths)
+    low &= mask(v6_lengths - 64)
+    return Prefixes(
+        position, weighted,
+        v4.astype(np.uint32), np.array(ipv4_positions, dtype=np.int64),
+        high, low, np.array(ipv6_positions, dtype=np.int64),
+        np.array(weights, dtype=np.float64),
+    )
+
+
+def locate_prefixes(reader: MMDBReader, prefixes: Prefixes) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Per prefix the index of its location, plus the distinct latitudes and longitudes (NaN: unlocated)."""
+    records = np.full(prefixes.count, -1, dtype=np.int64)
+    if len(prefixes.ipv4):
+        unique, inverse = np.unique(prefixes.ipv4, return_inverse=True)
+        records[prefixes.ipv4_positions] = reader.lookup_ipv4(unique)[inverse.reshape(-1)]
+    if len(prefixes.ipv6_high):
+        pairs = np.stack([prefixes.ipv6_high, prefixes.ipv6_low], axis=1)
+        unique, inverse = np.unique(pairs, axis=0, return_inverse=True)
+        records[prefixes.ipv6_positions] = reader.lookup_ipv6(unique[:, 0], unique[:, 1])[inverse.reshape(-1)]
+    unique_records, index = np.unique(records, return_inverse=True)
+    latitude, longitude = reader.locations(unique_records)
+    return index.reshape(-1), latitude, longitude
+
+
+# -- regions --
+
+
+class Node(NamedTuple):
+    server: str
+    ip: str
+    name: str
+    latitude: float
+    longitude: float
+    located: bool
+
+
+def geo_regions(config: Dict[str, Any], environment: str) -> List[Dict[str, Any]]:
+    """geo_regions of every geo-routing zone, as templates/geo_routing.lua.j2 collects them."""
+    regions = []
+    for zone_config in config.get("powerdns", {}).get(environment, {}).get("zone_configs", []):
+        template_vars = zone_config.get("template_vars", {})
+        if template_vars.get("geo_routing", False):
+            regions.extend(template_vars.get("geo_regions", []))
+    return regions
+
+
+def load_regions(path: Path, environment: str) -> List[Dict[str, Any]]:
+    """Regions from a vars.yaml, a {geo_regions: [...]} mapping or a list of regions."""
+    with open(path, "r") as f:
+        data = yaml.safe_load(f)
+    if isinstance(data, dict) and "powerdns" in data:
+        regions = geo_regions(data, environment)
+    elif isinstance(data, dict) and "geo_regions" in data:
+        regions = data["geo_regions"]
+    elif isinstance(data, list):
+        regions = data
+    else:
+        raise ValueError(f"{path}: expected a vars.yaml, a geo_regions mapping or a list of regions")
+    for region in regions:
+        if not isinstance(region, dict) or "ip" not in region:
+            raise ValueError(f"{path}: region without an ip: {region!r}")
+    return regions
+
+
+def resolve_nodes(reader: MMDBReader, regions: List[Dict[str, Any]], down: Iterable[str] = ()) -> List[Node]:
+    """Located nodes of a region set, minus those that are down; explicit coordinates win over the database."""
+    down = set(down)
+    nodes = []
+    for region in regions:
+        server = region.get("server", region["ip"])
+        if server in down or region["ip"] in down:
+            continue
+        if "latitude" in region and "longitude" in region:
+            latitude, longitude, located = float(region["latitude"]), float(region["longitude"]), True
+        else:
+            found = reader.locate(str(region["ip"]))
+            located = found is not None
+            latitude, longitude = found or (0.0, 0.0)
+        nodes.append(Node(server, str(region["ip"]), region.get("name", server), latitude, longitude, located))
+    return nodes
+
+
+def closest(latitude: np.ndarray, longitude: np.ndarray, nodes: List[Node], distance: str) -> np.ndarray:
+    """Index of the closest node for each location; unlocated ones count as 0,0 like in PowerDNS."""
+    latitude = np.nan_to_num(latitude)[:, None]
+    longitude = np.nan_to_num(longitude)[:, None]
+    node_latitude = np.array([node.latitude for node in nodes])[None, :]
+    node_longitude = np.array([node.longitude for node in nodes])[None, :]
+    if distance == "degrees":
+        # pickclosest(): squared degree differences, longitude wrapped on one side only
+        latitude_diff = latitude - node_latitude
+        longitude_diff = longitude - node_longitude
+        longitude_diff = np.where(longitude_diff > 180, 360 - longitude_diff, longitude_diff)
+        score = latitude_diff**2 + longitude_diff**2
+    else:
+        # Haversine term; monotonic in the great-circle distance
+        lat1, lat2 = np.radians(latitude), np.radians(node_latitude)
+        score = (
+            np.sin((lat2 - lat1) / 2) ** 2
+            + np.cos(lat1) * np.cos(lat2) * np.sin(np.radians(node_longitude - longitude) / 2) ** 2
+        )
+    return np.argmin(score, axis=1)
+
+
+# -- report --
+
+
+def shares(choice: np.ndarray, weights: np.ndarray, nodes: List[Node]) -> Dict[str, Dict[str, Any]]:
+    total = float(weights.sum()) or 1.0
+    prefixes = np.bincount(choice, minlength=len(nodes))
+    weight = np.bincount(choice, weights=weights, minlength=len(nodes))
+    return {
+        node.server: {
+            "name": node.name,
+            "ip": node.ip,
+            "prefixes": int(prefixes[i]),
+            "weight": round(float(weight[i]), 3),
+            "share_pct": round(100 * float(weight[i]) / total, 3),
+        }
+        for i, node in enumerate(nodes)
+    }
+
+
+def coverage(
+    reader: MMDBReader,
+    prefixes: Prefixes,
+    current: List[Node],
+    proposed: Optional[List[Node]],
+    distance: str,
+) -> Tuple[Dict[str, Any], np.ndarray, Optional[np.ndarray]]:
+    """The coverage report and per-prefix node indexes for the current and proposed sets."""
+    started = time.perf_counter()
+    index, latitude, longitude = locate_prefixes(reader, prefixes)
+    located = time.perf_counter()
+    weights = prefixes.weights
+    total = float(weights.sum()) or 1.0
+    unlocated = np.isnan(latitude)[index]
+    report: Dict[str, Any] = {
+        "prefixes": prefixes.count,
+        "weighted": prefixes.weighted,
+        "weight": round(float(weights.sum()), 3),
+        "locations": int(len(latitude)),
+        "distance": distance,
+        "unlocated": {
+            "prefixes": int(unlocated.sum()),
+            "share_pct": round(100 * float(weights[unlocated].sum()) / total, 3),
+        },
+    }
+    current_choice = closest(latitude, longitude, current, distance)[index]
+    report["current"] = shares(current_choice, weights, current)
+    proposed_choice = None
+    if proposed is not None:
+        proposed_choice = closest(latitude, longitude, proposed, distance)[index]
+        report["proposed"] = shares(proposed_choice, weights, proposed)
+        # Traffic that changes node, by (current, proposed) server pair
+        current_servers = np.array([node.server for node in current])
+        proposed_servers = np.array([node.server for node in proposed])
+        pairs = current_choice * len(proposed) + proposed_choice
+        moved_prefixes = np.bincount(pairs, minlength=len(current) * len(proposed))
+        moved_weight = np.bincount(pairs, weights=weights, minlength=len(current) * len(proposed))
+        shifts = []
+        for pair in np.flatnonzero(moved_prefixes):
+            source, target = current_servers[pair // len(proposed)], proposed_servers[pair % len(proposed)]
+            if source != target:
+                shifts.append({
+                    "from": str(source),
+                    "to": str(target),
+                    "prefixes": int(moved_prefixes[pair]),
+                    "weight": round(float(moved_weight[pair]), 3),
+                    "share_pct": round(100 * float(moved_weight[pair]) / total, 3),
+                })
+        shifts.sort(key=lambda shift: -shift["weight"])
+        report["moved"] = {
+            "prefixes": sum(shift["prefixes"] for shift in shifts),
+            "share_pct": round(sum(100 * shift["weight"] / total for shift in shifts), 3),
+            "shifts": shifts,
+        }
+    report["elapsed_s"] = {
+        "lookup": round(located - started, 3),
+        "assign": round(time.perf_counter() - located, 3),
+    }
+    return report, current_choice, proposed_choice
+
+
+def write_assignment(
+    path: Path,
+    prefix_file: Path,
+    current: List[Node],
+    current_choice: np.ndarray,
+    proposed: Optional[List[Node]],
+    proposed_choice: Optional[np.ndarray],
+) -> None:
+    """Per-prefix TSV: prefix, current node[, proposed node]."""
+    current_servers = [node.server for node in current]
+    proposed_servers = [node.server for node in proposed] if proposed is not None else []
+    with open(prefix_file, "r") as f, open(path, "w") as out:
+        out.write("prefix\tcurrent" + ("\tproposed" if proposed is not None else "") + "\n")
+        batch = []
+        for position, (_, fields) in enumerate(prefix_lines(f)):
+            row = f"{fields[0]}\t{current_servers[current_choice[position]]}"
+            if proposed_choice is not None:
+                row += f"\t{proposed_servers[proposed_choice[position]]}"
+            batch.append(row)
+            if len(batch) >= 65536:
+                out.write("\n".join(batch) + "\n")
+                batch = []
+        if batch:
+            out.write("\n".join(batch) + "\n")
+
+
+def print_report(report: Dict[str, Any], current: List[Node], proposed: Optional[List[Node]]) -> None:
+    unit = "weight" if report["weighted"] else "prefixes"
+    print(
+        f"Coverage of {report['prefixes']:,} prefixes ({report['locations']:,} distinct locations), "
+        f"shares by {'count' if report['weighted'] else 'prefix'}, {report['distance']} distance"
+    )
+    print(f"MMDB: {report['mmdb']} ({report['mmdb_description']})")
+    print()
+    servers = list(report["current"])
+    if proposed is not None:
+        servers += [server for server in report["proposed"] if server not in report["current"]]
+    width = max([len(server) for server in servers] + [4])
+    header = f"{'Node':<{width}}  {'Location':<14} {'Current':>9} {unit:>12}"
+    if proposed is not None:
+        header += f"  {'Proposed':>9} {unit:>12} {'Change':>8}"
+    print(header)
+    print("-" * len(header))
+    for server in servers:
+        now = report["current"].get(server)
+        row = report["proposed"].get(server) if proposed is not None else None
+        name = (now or row)["name"]
+        line = f"{server:<{width}}  {name:<14} "
+        line += f"{now['share_pct']:>8.2f}% {now[unit]:>12,.0f}" if now else f"{'-':>9} {'-':>12}"
+        if proposed is not None:
+            line += f"  {row['share_pct']:>8.2f}% {row[unit]:>12,.0f}" if row else f"  {'-':>9} {'-':>12}"
+            change = (row["share_pct"] if row else 0.0) - (now["share_pct"] if now else 0.0)
+            line += f" {change:>+7.2f}%"
+        print(line)
+    print()
+    unlocated = report["unlocated"]
+    print(f"Unlocated (sent as if at 0,0): {unlocated['prefixes']:,} prefixes, {unlocated['share_pct']:.2f}%")
+    for node in dict.fromkeys(current + (proposed or [])):
+        if not node.located:
+            print(f"Warning: {node.server} ({node.ip}) is not in the database; PowerDNS places it at 0,0")
+    if proposed is not None:
+        moved = report["moved"]
+        print(f"Moving to another node: {moved['prefixes']:,} prefixes, {moved['share_pct']:.2f}%")
+        for shift in moved["shifts"]:
+            print(f"  {shift['from']} -> {shift['to']}: {shift['prefixes']:,} prefixes, {shift['share_pct']:.2f}%")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline map of the CDN node geoRoute() picks for client prefixes")
+    parser.add_argument("prefixes", type=Path, help='File of "prefix [count]" lines')
+    parser.add_argument("--mmdb", type=Path, help="MaxMind DB (default: geoip-database-files in templates/pdns.conf.j2)")
+    parser.add_argument("--environment", choices=ENVIRONMENTS, default="production", help="Environment (default: production)")
+    parser.add_argument("--proposed", type=Path, help="Proposed regions: vars.yaml, {geo_regions: [...]} or a list")
+    parser.add_argument(
+        "--down", action="append", default=[], metavar="SERVER",
+        help="Leave a node (server name or IP) out of both sets, as if its health check failed; repeatable",
+    )
+    parser.add_argument(
+        "--distance", choices=["great-circle", "degrees"], default="great-circle",
+        help="great-circle, or pickclosest()'s squared degree differences (default: great-circle)",
+    )
+    parser.add_argument("--output", type=Path, help="Write the node of every prefix to this TSV file")
+    parser.add_argument("--json", action="store_true", help="Output JSON")
+    parser.add_argument(
+        "-c",
+        "--config",
+        help="Configuration file path (default: ../vars.yaml from script location)",
+    )
+    args = parser.parse_args()
+
+    mmdb = args.mmdb or Path(configured_mmdb())
+    if not mmdb.is_file():
+        print(f"Error: MMDB file not found: {mmdb} (use --mmdb)")
+        sys.exit(1)
+    if not args.prefixes.is_file():
+        print(f"Error: prefix file not found: {args.prefixes}")
+        sys.exit(1)
+
+    config_path = args.config or Path(__file__).parent.parent / "vars.yaml"
+    with open(config_path, "r") as f:
+        config = yaml.safe_load(f)
+
+    started = time.perf_counter()
+    try:
+        reader = MMDBReader(mmdb)
+        with open(args.prefixes, "r") as f:
+            prefixes = read_prefixes(f)
+        current_regions = geo_regions(config, args.environment)
+        proposed_regions = load_regions(args.proposed, args.environment) if args.proposed else None
+    except (ValueError, OSError, yaml.YAMLError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    parsed = time.perf_counter()
+
+    current = resolve_nodes(reader, current_regions, args.down)
+    proposed = resolve_nodes(reader, proposed_regions, args.down) if proposed_regions is not None else None
+    if not current:
+        print(f"Error: no geo_regions left in {args.environment}")
+        sys.exit(1)
+    if proposed is not None and not proposed:
+        print(f"Error: no regions left in {args.proposed}")
+        sys.exit(1)
+
+    report, current_choice, proposed_choice = coverage(reader, prefixes, current, proposed, args.distance)
+    report["mmdb"] = str(mmdb)
+    report["mmdb_description"] = reader.description
+    report["elapsed_s"]["parse"] = round(parsed - started, 3)
+    if args.output:
+        write_assignment(args.output, args.prefixes, current, current_choice, proposed, proposed_choice)
+    elapsed = time.perf_counter() - started
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report, current, proposed)
+        print()
+        print(f"Mapped {prefixes.count:,} prefixes in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+CDN Health Result Wire Format
+
+Compact binary batches of probe results, pushed by monitor_cdn_health.py
+agents (--push) to cdn_health_aggregator.py over UDP or HTTP. One frame is
+one UDP datagram or one HTTP POST body:
+
+  header   !4sBBHQd  magic "CDNH", version, vantage name length,
+                     probe count, sequence, sent (agent's unix time)
+  vantage  UTF-8 name of the agent's vantage point
+  probes   !16sHBIII per probe: address (IPv6, or IPv4-mapped), port,
+                     flags (1 up, 2 degraded), age in ms at sending,
+                     connect and TTFB in microseconds (0xFFFFFFFF: none)
+  mac      first 16 bytes of HMAC-SHA256 over the frame, when a key is set
+
+A probe is 31 bytes, so a 1400-byte datagram carries about 40 of them.
+Sequences start at the agent's start time in microseconds and count up per
+frame, so they keep increasing across agent restarts; the aggregator uses
+them to drop duplicates and replays and to count lost datagrams.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import struct
+import time
+from typing import List, NamedTuple, Optional, Tuple
+from urllib.parse import urlsplit
+
+MAGIC = b"CDNH"
+VERSION = 1
+HEADER = struct.Struct("!4sBBHQd")
+PROBE = struct.Struct("!16sHBIII")
+MAC_SIZE = 16
+NO_VALUE = 0xFFFFFFFF
+FLAG_UP = 1
+FLAG_DEGRADED = 2
+# Keeps datagrams below the usual 1500-byte MTU
+MAX_DATAGRAM = 1400
+
+# (ip, port, up, degraded, timestamp, connect seconds, ttfb seconds)
+ProbeResult = Tuple[str, int, bool, bool, float, Optional[float], Optional[float]]
+
+
+class Frame(NamedTuple):
+    vantage: str
+    sequence: int
+    sent: float
+    # Raw PROBE tuples: (address, port, flags, age_ms, connect_us, ttfb_us)
+    probes: List[Tuple[bytes, int, int, int, int, int]]
+
+
+def pack_address(ip: str) -> bytes:
+    address = ipaddress.ip_address(ip)
+    if address.version == 4:
+        return b"\0" * 10 + b"\xff\xff" + address.packed
+    return address.packed
+
+
+def unpack_address(raw: bytes) -> str:
+    address = ipaddress.IPv6Address(raw)
+    return str(address.ipv4_mapped or address)
+
+
+def _micros(seconds: Optional[float]) -> int:
+    if seconds is None:
+        return NO_VALUE
+    return min(max(int(seconds * 1_000_000), 0), NO_VALUE - 1)
+
+
+def _sign(frame: bytes, key: Optional[bytes]) -> bytes:
+    if not key:
+        return frame
+    return frame + hmac.new(key, frame, hashlib.sha256).digest()[:MAC_SIZE]
+
+
+def encode_frames(
+    vantage: str,
+    sequence: int,
+    probes: List[ProbeResult],
+    key: Optional[bytes] = None,
+    max_size: Optional[int] = MAX_DATAGRAM,
+    now: Optional[float] = None,
+) -> List[bytes]:
+    """
+    Frames for the probes, numbered from sequence.
+
+    With max_size each frame fits in that many bytes (UDP); without, all
+    probes go into one frame (HTTP).
+    """
+    now = time.time() if now is None else now
+    name = vantage.encode()[:255]
+    overhead = HEADER.size + len(name) + (MAC_SIZE if key else 0)
+    per_frame = 0xFFFF if max_size is None else max(1, (max_size - overhead) // PROBE.size)
+    frames = []
+    for start in range(0, max(len(probes), 1), per_frame):
+        chunk = probes[start : start + per_frame]
+        body = b"".join(
+            PROBE.pack(
+                pack_address(ip),
+                port,
+                (FLAG_UP if up else 0) | (FLAG_DEGRADED if degraded else 0),
+                min(max(int((now - timestamp) * 1000), 0), NO_VALUE),
+                _micros(connect),
+                _micros(ttfb),
+            )
+            for ip, port, up, degraded, timestamp, connect, ttfb in chunk
+        )
+        header = HEADER.pack(MAGIC, VERSION, len(name), len(chunk), sequence + len(frames), now)
+        frames.append(_sign(header + name + body, key))
+    return frames
+
+
+def decode_frame(data: bytes, key: Optional[bytes] = None) -> Frame:
+    """Parse and authenticate one frame; ValueError says why it was rejected."""
+    if key:
+        data, mac = data[:-MAC_SIZE], data[-MAC_SIZE:]
+        if not hmac.compare_digest(hmac.new(key, data, hashlib.sha256).digest()[:MAC_SIZE], mac):
+            raise ValueError("bad mac")
+    if len(data) < HEADER.size:
+        raise ValueError("short")
+    magic, version, name_length, count, sequence, sent = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("bad version")
+    start = HEADER.size + name_length
+    if len(data) != start + count * PROBE.size:
+        raise ValueError("bad length")
+    vantage = data[HEADER.size : start].decode(errors="replace")
+    return Frame(vantage, sequence, sent, list(PROBE.iter_unpack(data[start:])))
+
+
+class _SendProtocol(asyncio.DatagramProtocol):
+    def __init__(self, pusher: "HealthPusher"):
+        self.pusher = pusher
+
+    def error_received(self, exc: Exception) -> None:
+        # ICMP port unreachable and the like: the aggregator is not listening (yet)
+        self.pusher.send_errors += 1
+
+
+class HealthPusher:
+    """
+    Agent side: collects probe results and pushes them every interval.
+
+    url is udp://host:port (one datagram per ~40 probes, fire and forget)
+    or http(s)://host:port[/path] (one POST per interval, to /ingest unless
+    a path is given).
+    """
+
+    def __init__(
+        self,
+        url: str,
+        vantage: str,
+        key: Optional[bytes] = None,
+        interval: float = 1.0,
+    ):
+        parts = urlsplit(url)
+        if parts.scheme not in ("udp", "http", "https") or not parts.hostname or not parts.port:
+            raise ValueError(f"push URL must be udp://host:port or http(s)://host:port, not {url}")
+        self.url = url
+        self.scheme = parts.scheme
+        self.address = (parts.hostname, parts.port)
+        self.ingest_url = url if parts.path not in ("", "/") else url.rstrip("/") + "/ingest"
+        self.vantage = vantage
+        self.key = key
+        self.interval = interval
+        self.sequence = time.time_ns() // 1000
+        self.pending: List[ProbeResult] = []
+        self.frames_sent = 0
+        self.probes_sent = 0
+        self.send_errors = 0
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self.session = None
+
+    def add(self, result: ProbeResult) -> None:
+        self.pending.append(result)
+
+    async def start(self) -> None:
+        if self.scheme == "udp":
+            self.transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+                lambda: _SendProtocol(self), remote_addr=self.address
+            )
+        else:
+            import aiohttp  # type: ignore[import-not-found]
+
+            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=max(self.interval, 2.0)))
+
+    async def flush(self) -> None:
+        """Send everything collected since the last flush (an empty frame doubles as a heartbeat)."""
+        probes, self.pending = self.pending, []
+        frames = encode_frames(
+            self.vantage, self.sequence, probes, self.key, MAX_DATAGRAM if self.transport else None
+        )
+        self.sequence += len(frames)
+        try:
+            if self.transport:
+                for frame in frames:
+                    self.transport.sendto(frame)
+            else:
+                assert self.session is not None
+                for frame in frames:
+                    async with self.session.post(
+                        self.ingest_url, data=frame, headers={"Content-Type": "application/octet-stream"}
+                    ) as response:
+                        if response.status >= 300:
+                            raise OSError(f"HTTP {response.status}")
+        except Exception as e:  # OSError, asyncio.TimeoutError, aiohttp.ClientError
+            self.send_errors += 1
+            # Keep probing while the aggregator is away, without flooding the log
+            if self.send_errors in (1, 10, 100) or self.send_errors % 1000 == 0:
+                print(f"Warning: push to {self.url} failed ({self.send_errors} so far): {e!r}")
+            return
+        self.frames_sent += len(frames)
+        self.probes_sent += len(probes)
+
+    async def run(self) -> None:
+        """Flush every interval until cancelled, then flush once more."""
+        loop = asyncio.get_running_loop()
+        next_flush = loop.time()
+        try:
+            while True:
+                next_flush += self.interval
+                await asyncio.sleep(max(0.0, next_flush - loop.time()))
+                await self.flush()
+        finally:
+            if self.pending:
+                await self.flush()
+
+    async def close(self) -> None:
+        if self.transport:
+            self.transport.close()
+        if self.session is not None:
+            await self.session.close()
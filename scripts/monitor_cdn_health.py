@@ -4,6 +4,8 @@
 # dependencies = [
 #     "aiodns>=3.0.0",
 #     "aiohttp>=3.8.0",
+#     "prometheus-client>=0.17.0",
+#     "pyyaml>=6.0",
 # ]
 # ///
 """
@@ -21,6 +23,31 @@ Usage with uv (recommended):
   uv run monitor_cdn_health.py               # Monitor localhost DNS
   uv run monitor_cdn_health.py --dns-server IP    # Monitor specific DNS server
   uv run monitor_cdn_health.py --json        # Single check with JSON output
+  uv run monitor_cdn_health.py --json --duration 600   # JSON with 10 min of history
+  uv run monitor_cdn_health.py --environment production --max-inflight 256
+  uv run monitor_cdn_health.py --metrics-port 9108   # Serve Prometheus /metrics
+  uv run monitor_cdn_health.py --ecs-sweep prefixes.txt --output sweep.jsonl
+  uv run monitor_cdn_health.py --failover-bench --trials 30 --output trials.jsonl
+  uv run monitor_cdn_health.py --push udp://aggregator:9109 --vantage eu-west --interval 1
+  uv run monitor_cdn_health.py --serve --environment production --interval 5
+
+Targets are the geo_regions of every geo zone in vars.yaml. Each target is
+probed on its own jittered timer, so a slow or timed-out target never
+delays the checks of the others.
+
+Besides the TCP connect that PowerDNS's ifportup() performs, each probe
+times an HTTPS request over a pooled keep-alive connection (TLS handshake
+when a new connection is made, time to first byte otherwise). An EWMA of
+the connect time and TTFB marks a server DEGRADED when it is up but slower
+than --degraded-connect-ms / --degraded-ttfb-ms.
+
+With --push the monitor runs headless as an agent of cdn_health_aggregator.py:
+every probe result is batched and pushed (UDP or HTTP) each --push-interval,
+and the aggregator merges the agents into a per-node, per-vantage matrix.
+
+With --serve it answers /health and /healthdetail (the JSON of the Node.js
+health checker) from a snapshot refreshed every --interval, so the DNS load
+on PowerDNS does not grow with the number of load balancers polling it.
 
 Usage with regular Python (requires manual pip install):
   ./monitor_cdn_health.py                    # Monitor localhost DNS
@@ -29,35 +56,344 @@ Usage with regular Python (requires manual pip install):
 """
 
 import asyncio
+import functools
+import hashlib
+import random
 import time
 import json
 import argparse
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
+import math
+import os
+import socket
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone
+from email.utils import formatdate
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Optional, Any, TextIO, Tuple
 import aiodns  # type: ignore[import-not-found]
 import aiohttp  # type: ignore[import-not-found]
+import yaml
+from app_routing import AppTable, find_table, load_routing_tables
+from dns_wire import UDPClient, build_query, parse_response
+from health_wire import HealthPusher
 
-# CDN Server Configuration
-CDN_SERVERS = [
-    {
-        "name": "cdn-6.runonflux.io",
-        "ip": "107.152.47.137",
-        "location": "West Coast USA",
-        "port": 443,
-    },
-    {
-        "name": "cdn-1.runonflux.io",
-        "ip": "5.39.57.50",
-        "location": "Dunkerque, EU",
-        "port": 443,
-    },
-    {
-        "name": "cdn-12.runonflux.io",
-        "ip": "114.29.237.116",
-        "location": "Hong Kong, East Asia",
-        "port": 443,
-    },
-]
+if TYPE_CHECKING:
+    # The aiohttp server and prometheus_client are only imported by the
+    # --serve and --metrics-port modes that use them
+    from aiohttp import web  # type: ignore[import-not-found]
+
+DEFAULT_CONFIG = Path(__file__).parent.parent / "vars.yaml"
+
+# Show every row in the status table up to this many servers; above it,
+# only servers that are not healthy are listed
+FULL_TABLE_LIMIT = 20
+
+
+def load_cdn_servers(
+    config_path: Path = DEFAULT_CONFIG,
+    environments: Optional[List[str]] = None,
+    port: int = 443,
+) -> List[Dict[str, Any]]:
+    """
+    Load CDN targets from the geo_regions of every geo zone in vars.yaml.
+
+    Targets shared by several zones or environments are probed once.
+    """
+    with open(config_path, "r") as f:
+        config = yaml.safe_load(f)
+
+    servers: Dict[str, Dict[str, Any]] = {}
+    for environment in environments or ["staging", "production"]:
+        for zone_config in config["powerdns"][environment].get("zone_configs", []):
+            template_vars = zone_config.get("template_vars", {})
+            if not template_vars.get("geo_routing", False):
+                continue
+            for region in template_vars.get("geo_regions", []):
+                if region["ip"] in servers:
+                    continue
+                servers[region["ip"]] = {
+                    "name": region["server"],
+                    "ip": region["ip"],
+                    "location": region.get("description", region["name"]),
+                    "region": region["name"],
+                    "environment": environment,
+                    "port": region.get("port", port),
+                }
+    return list(servers.values())
+
+
+class LatencyTracker:
+    """Exponentially weighted moving average of one server's probe latencies."""
+
+    def __init__(self, alpha: float = 0.3):
+        self.alpha = alpha
+        self.ewma: Optional[float] = None
+
+    def add(self, seconds: float) -> None:
+        if self.ewma is None:
+            self.ewma = seconds
+        else:
+            self.ewma += self.alpha * (seconds - self.ewma)
+
+
+class ProbeHistory:
+    """
+    Fixed-size ring buffer of one server's probe results.
+
+    Timestamps, connect times, TTFBs and outcome bits live in preallocated
+    ``array`` columns (17 bytes per probe), so memory stays flat however
+    long the monitor runs. Timestamps only grow, so both halves of the ring
+    are sorted and a time window is found with two bisections.
+    """
+
+    UP = 1
+    DEGRADED = 2
+    # bytes.translate table mapping an outcome byte to its UP bit
+    _UP_BIT = bytes(i & 1 for i in range(256))
+
+    def __init__(self, capacity: int = 3600):
+        self.capacity = capacity
+        self.timestamps = array("d", bytes(8 * capacity))
+        self.connect_ms = array("f", bytes(4 * capacity))
+        self.ttfb_ms = array("f", bytes(4 * capacity))
+        self.outcomes = array("B", bytes(capacity))
+        self.count = 0
+        self.head = 0  # next slot to write
+
+    def record(
+        self,
+        timestamp: float,
+        is_up: bool,
+        degraded: bool = False,
+        connect_ms: Optional[float] = None,
+        ttfb_ms: Optional[float] = None,
+    ) -> None:
+        i = self.head
+        self.timestamps[i] = timestamp
+        self.connect_ms[i] = math.nan if connect_ms is None else connect_ms
+        self.ttfb_ms[i] = math.nan if ttfb_ms is None else ttfb_ms
+        self.outcomes[i] = (self.UP if is_up else 0) | (self.DEGRADED if degraded else 0)
+        self.head = (i + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def _window(self, column: array, since: float) -> array:
+        """Values of ``column`` for probes at or after ``since``, oldest first."""
+        if self.count < self.capacity:
+            start = bisect_left(self.timestamps, since, 0, self.count)
+            return column[start : self.count]
+        head = self.head
+        older = bisect_left(self.timestamps, since, head, self.capacity)
+        if older < self.capacity:
+            return column[older:] + column[:head]
+        return column[bisect_left(self.timestamps, since, 0, head) : head]
+
+    @staticmethod
+    def _percentiles(values: array) -> Dict[str, float]:
+        ordered = sorted(v for v in values if v == v)  # drop NaN (no sample)
+        if not ordered:
+            return {}
+        count = len(ordered)
+        return {
+            name: round(ordered[min(count - 1, int(count * p))], 2)
+            for name, p in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99))
+        }
+
+    def stats(self, window_seconds: float, now: Optional[float] = None) -> Dict[str, Any]:
+        """Availability, latency percentiles and flaps over the last window."""
+        since = (now or time.time()) - window_seconds
+        outcomes = self._window(self.outcomes, since)
+        probes = len(outcomes)
+        if not probes:
+            return {"window_s": window_seconds, "probes": 0}
+        up_bits = outcomes.tobytes().translate(self._UP_BIT)
+        return {
+            "window_s": window_seconds,
+            "probes": probes,
+            "availability_pct": round(100.0 * up_bits.count(1) / probes, 3),
+            "degraded_pct": round(
+                100.0 * sum(1 for o in outcomes if o & self.DEGRADED) / probes, 3
+            ),
+            "flaps": sum(1 for a, b in zip(up_bits, up_bits[1:]) if a != b),
+            "connect_ms": self._percentiles(self._window(self.connect_ms, since)),
+            "ttfb_ms": self._percentiles(self._window(self.ttfb_ms, since)),
+        }
+
+
+async def _trace_mark(event: str, _session: Any, ctx: Any, _params: Any) -> None:
+    """aiohttp trace hook: record when ``event`` happened for this request."""
+    ctx.trace_request_ctx[event] = time.perf_counter()
+
+
+def phase_trace_config() -> aiohttp.TraceConfig:
+    """TraceConfig that timestamps the phases of each HTTPS probe."""
+    trace_config = aiohttp.TraceConfig()
+    for event in (
+        "request_start",
+        "connection_create_start",
+        "connection_create_end",
+        "connection_reuseconn",
+        "request_headers_sent",
+        "request_end",
+    ):
+        getattr(trace_config, f"on_{event}").append(
+            functools.partial(_trace_mark, event)
+        )
+    return trace_config
+
+
+class MonitorMetrics:
+    """
+    Prometheus metrics for the CDN health monitor.
+
+    Labelled children are resolved once per server and cached, so recording
+    a probe is a few lock-protected additions rather than a label lookup
+    per metric.
+    """
+
+    CONNECT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.15, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0)
+    DNS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+    def __init__(self) -> None:
+        from prometheus_client import (  # type: ignore[import-not-found]
+            CollectorRegistry,
+            Counter,
+            Gauge,
+            Histogram,
+            disable_created_metrics,
+        )
+
+        # *_created series would double the scrape size with hundreds of targets
+        disable_created_metrics()
+        self.registry = CollectorRegistry()
+        labels = ["server", "ip", "location"]
+        self.connect_seconds = Histogram(
+            "cdn_probe_connect_seconds",
+            "TCP connect time of successful check_port probes",
+            labels,
+            buckets=self.CONNECT_BUCKETS,
+            registry=self.registry,
+        )
+        self.probes = Counter(
+            "cdn_probes_total",
+            "check_port probes by result",
+            labels + ["result"],
+            registry=self.registry,
+        )
+        self.dns_seconds = Histogram(
+            "cdn_dns_resolution_seconds",
+            "check_dns_resolution latency",
+            ["domain", "result"],
+            buckets=self.DNS_BUCKETS,
+            registry=self.registry,
+        )
+        self.failure_transitions = Counter(
+            "cdn_consecutive_failures_transitions_total",
+            "consecutive_failures transitions (start: 0->1, pdns_down: reached 3, reset: back to 0)",
+            labels + ["transition"],
+            registry=self.registry,
+        )
+        self.state_changes = Counter(
+            "cdn_state_changes_total",
+            "Up/down state changes",
+            labels + ["to"],
+            registry=self.registry,
+        )
+        self.dns_healthy = Gauge(
+            "cdn_dns_healthy",
+            "1 if PowerDNS should hand out this server",
+            labels,
+            registry=self.registry,
+        )
+        self.is_recovering = Gauge(
+            "cdn_is_recovering",
+            "1 while the server is in its recovery period",
+            labels,
+            registry=self.registry,
+        )
+        self.consecutive_failures = Gauge(
+            "cdn_consecutive_failures",
+            "Current consecutive failed probes",
+            labels,
+            registry=self.registry,
+        )
+        self.https_phase_seconds = Histogram(
+            "cdn_https_phase_seconds",
+            "HTTPS probe phases (tls: handshake on new connections, ttfb: time to first byte)",
+            labels + ["phase"],
+            buckets=self.CONNECT_BUCKETS,
+            registry=self.registry,
+        )
+        self.degraded = Gauge(
+            "cdn_degraded",
+            "1 while the server is up but its latency EWMA is over the threshold",
+            labels,
+            registry=self.registry,
+        )
+        self._children: Dict[str, Dict[str, Any]] = {}
+
+    def _server(self, server: Dict[str, Any]) -> Dict[str, Any]:
+        children = self._children.get(server["ip"])
+        if children is None:
+            labels = (server["name"], server["ip"], server["location"])
+            children = {
+                "connect": self.connect_seconds.labels(*labels),
+                "up": self.probes.labels(*labels, "up"),
+                "down": self.probes.labels(*labels, "down"),
+                "start": self.failure_transitions.labels(*labels, "start"),
+                "pdns_down": self.failure_transitions.labels(*labels, "pdns_down"),
+                "reset": self.failure_transitions.labels(*labels, "reset"),
+                "to_up": self.state_changes.labels(*labels, "up"),
+                "to_down": self.state_changes.labels(*labels, "down"),
+                "dns_healthy": self.dns_healthy.labels(*labels),
+                "is_recovering": self.is_recovering.labels(*labels),
+                "failures": self.consecutive_failures.labels(*labels),
+                "tls": self.https_phase_seconds.labels(*labels, "tls"),
+                "ttfb": self.https_phase_seconds.labels(*labels, "ttfb"),
+                "degraded": self.degraded.labels(*labels),
+            }
+            self._children[server["ip"]] = children
+        return children
+
+    def observe_probe(self, server: Dict[str, Any], is_up: bool, seconds: float) -> None:
+        children = self._server(server)
+        if is_up:
+            children["up"].inc()
+            children["connect"].observe(seconds)
+        else:
+            children["down"].inc()
+
+    def observe_dns(self, domain: str, ok: bool, seconds: float) -> None:
+        self.dns_seconds.labels(domain, "ok" if ok else "error").observe(seconds)
+
+    def observe_status(self, server: Dict[str, Any], previous: Dict[str, Any], status: Dict[str, Any]) -> None:
+        children = self._server(server)
+        before = previous.get("consecutive_failures", 0)
+        after = status["consecutive_failures"]
+        if before == 0 and after > 0:
+            children["start"].inc()
+        elif before > 0 and after == 0:
+            children["reset"].inc()
+        if before < 3 <= after:
+            children["pdns_down"].inc()
+        if previous and status["state_changed"]:
+            children["to_up" if status["is_up"] else "to_down"].inc()
+        children["dns_healthy"].set(1 if status["dns_healthy"] else 0)
+        children["is_recovering"].set(1 if status["is_recovering"] else 0)
+        children["failures"].set(after)
+        children["degraded"].set(1 if status.get("degraded") else 0)
+        phases = status.get("latency") or {}
+        if phases.get("tls_ms") is not None:
+            children["tls"].observe(phases["tls_ms"] / 1000)
+        if phases.get("ttfb_ms") is not None:
+            children["ttfb"].observe(phases["ttfb_ms"] / 1000)
+
+    def render(self) -> bytes:
+        from prometheus_client import generate_latest  # type: ignore[import-not-found]
+
+        return generate_latest(self.registry)
 
 
 class AsyncCDNHealthMonitor:
@@ -68,9 +404,44 @@ class AsyncCDNHealthMonitor:
     is performed by PowerDNS internally using Lua scripts.
     """
 
-    def __init__(self, dns_server: str = "127.0.0.1", check_interval: int = 2):
+    def __init__(
+        self,
+        dns_server: str = "127.0.0.1",
+        check_interval: float = 2,
+        servers: Optional[List[Dict[str, Any]]] = None,
+        max_inflight: int = 256,
+        jitter: float = 0.1,
+        geo_domain: str = "cdn-geo.runonflux.io",
+        metrics: Optional[MonitorMetrics] = None,
+        https_probe: bool = True,
+        degraded_connect_ms: float = 250.0,
+        degraded_ttfb_ms: float = 1000.0,
+        history_size: int = 3600,
+        history_window: float = 900,
+        probe_log: Optional[TextIO] = None,
+        pusher: Optional[HealthPusher] = None,
+    ):
         self.dns_server = dns_server
         self.check_interval = check_interval
+        self.servers = servers if servers is not None else load_cdn_servers()
+        self.jitter = jitter
+        self.geo_domain = geo_domain
+        # Caps concurrent TCP connects; created lazily inside the event loop
+        self.max_inflight = max_inflight
+        self.connect_slots: Optional[asyncio.Semaphore] = None
+        self.resolved_ips: List[str] = []
+        self.metrics = metrics
+        self.https_probe = https_probe
+        self.degraded_connect = degraded_connect_ms / 1000
+        self.degraded_ttfb = degraded_ttfb_ms / 1000
+        self.latency: Dict[str, Dict[str, LatencyTracker]] = {}
+        self.history_size = history_size
+        self.history_window = history_window
+        self.history: Dict[str, ProbeHistory] = {}
+        # One JSON line per probe, for simulate_health_checks.py
+        self.probe_log = probe_log
+        # Batches probe results for cdn_health_aggregator.py (--push)
+        self.pusher = pusher
         self.server_status: Dict[str, Dict[str, Any]] = {}
         self.recovery_tracking: Dict[str, datetime] = {}
         self.resolver: Optional[aiodns.DNSResolver] = None
@@ -78,7 +449,19 @@ class AsyncCDNHealthMonitor:
 
     async def __aenter__(self) -> "AsyncCDNHealthMonitor":
         """Async context manager entry"""
-        self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=2))
+        self.connect_slots = asyncio.Semaphore(self.max_inflight)
+        # Keep one pooled connection per target so steady-state probes measure
+        # server latency, and time out connect and read separately
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=self.max_inflight,
+                limit_per_host=1,
+                keepalive_timeout=60,
+                ssl=False,  # Skip SSL verification for IP-based requests
+            ),
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=2, sock_read=2),
+            trace_configs=[phase_trace_config()],
+        )
         self.resolver = aiodns.DNSResolver(nameservers=[self.dns_server], timeout=5.0)
         return self
 
@@ -93,16 +476,32 @@ class AsyncCDNHealthMonitor:
 
         This simulates what PowerDNS's ifportup() function does internally.
         """
-        try:
-            # Create connection with timeout
-            _, writer = await asyncio.wait_for(
-                asyncio.open_connection(ip, port), timeout=timeout
-            )
-            writer.close()
-            await writer.wait_closed()
-            return True
-        except (asyncio.TimeoutError, ConnectionRefusedError, OSError):
-            return False
+        return await self.connect_time(ip, port, timeout) is not None
+
+    async def connect_time(
+        self, ip: str, port: int, timeout: float = 2.0
+    ) -> Optional[float]:
+        """
+        Time a TCP connect, returning None if the port is not reachable.
+
+        The timeout only starts once a connect slot is free, so a backlog of
+        probes is never mistaken for slow targets.
+        """
+        if self.connect_slots is None:
+            self.connect_slots = asyncio.Semaphore(self.max_inflight)
+        async with self.connect_slots:
+            try:
+                # Create connection with timeout
+                start = time.perf_counter()
+                _, writer = await asyncio.wait_for(
+                    asyncio.open_connection(ip, port), timeout=timeout
+                )
+                elapsed = time.perf_counter() - start
+                writer.close()
+                await writer.wait_closed()
+                return elapsed
+            except (asyncio.TimeoutError, ConnectionRefusedError, OSError):
+                return None
 
     async def check_dns_resolution(self, domain: str) -> List[str]:
         """
@@ -112,10 +511,15 @@ class AsyncCDNHealthMonitor:
         """
         if not self.resolver:
             return []
+        start = time.perf_counter()
         try:
             result = await self.resolver.query(domain, "A")
+            if self.metrics:
+                self.metrics.observe_dns(domain, True, time.perf_counter() - start)
             return [r.host for r in result]
         except Exception as e:
+            if self.metrics:
+                self.metrics.observe_dns(domain, False, time.perf_counter() - start)
             print(f"DNS resolution error for {domain}: {e}")
             return []
 
@@ -125,20 +529,48 @@ class AsyncCDNHealthMonitor:
 
         More thorough than port check - verifies HTTP/HTTPS response.
         """
+        return await self.probe_https(ip) is not None
+
+    async def probe_https(
+        self, ip: str, port: int = 443, tcp_connect: Optional[float] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Time an HTTPS request by phase, returning None if it failed.
+
+        Phases come from aiohttp tracing. A new connection's setup covers
+        TCP and TLS; given the separately measured ``tcp_connect`` the TLS
+        handshake is the remainder. Reused connections only contribute the
+        time to first byte.
+        """
         if not self.session:
-            return False
+            return None
 
-        url = f"https://{ip}"
+        marks: Dict[str, float] = {}
+        url = f"https://{ip}" if port == 443 else f"https://{ip}:{port}"
         try:
-            async with self.session.get(
+            # HEAD: no body to drain, so the connection goes back to the pool
+            async with self.session.head(
                 url,
-                ssl=False,  # Skip SSL verification for IP-based requests
                 allow_redirects=False,
-            ) as _response:
+                trace_request_ctx=marks,
+            ):
                 # Any HTTP response means the server is up
-                return True
+                pass
         except Exception:
-            return False
+            return None
+
+        sent = marks.get("request_headers_sent") or marks.get("request_start", 0.0)
+        phases: Dict[str, Any] = {
+            "reused_connection": "connection_reuseconn" in marks,
+            "tls_ms": None,
+            "ttfb_ms": round((marks.get("request_end", sent) - sent) * 1000, 3),
+        }
+        if "connection_create_end" in marks:
+            setup = marks["connection_create_end"] - marks["connection_create_start"]
+            phases["connection_ms"] = round(setup * 1000, 3)
+            if tcp_connect is not None:
+                phases["tls_ms"] = round(max(0.0, setup - tcp_connect) * 1000, 3)
+        return phases
 
     async def update_server_status(self, server: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -150,7 +582,8 @@ class AsyncCDNHealthMonitor:
         port = server["port"]
 
         # Check if port is reachable (what PowerDNS does)
-        is_up = await self.check_port(ip, port)
+        connect_seconds = await self.connect_time(ip, port)
+        is_up = connect_seconds is not None
 
         # Get previous status
         prev_status = self.server_status.get(ip, {})
@@ -197,25 +630,122 @@ class AsyncCDNHealthMonitor:
         # (matches the logic in geo_routing.lua)
         status["dns_healthy"] = is_up and not status["is_recovering"]
 
+        # Latency scoring: PowerDNS only sees up/down, but a server that is
+        # up and much slower than usual is flagged as degraded
+        trackers = self.latency.setdefault(
+            ip, {"connect": LatencyTracker(), "ttfb": LatencyTracker()}
+        )
+        phases: Dict[str, Any] = {"connect_ms": None}
+        if connect_seconds is not None:
+            trackers["connect"].add(connect_seconds)
+            phases["connect_ms"] = round(connect_seconds * 1000, 3)
+            if self.https_probe:
+                https = await self.probe_https(ip, port, connect_seconds)
+                if https is not None:
+                    trackers["ttfb"].add(https["ttfb_ms"] / 1000)
+                    phases.update(https)
+        ewma_connect = trackers["connect"].ewma
+        ewma_ttfb = trackers["ttfb"].ewma
+        status["latency"] = phases
+        status["ewma_ms"] = {
+            "connect": round(ewma_connect * 1000, 3) if ewma_connect else None,
+            "ttfb": round(ewma_ttfb * 1000, 3) if ewma_ttfb else None,
+        }
+        status["degraded"] = is_up and (
+            (ewma_connect or 0.0) > self.degraded_connect
+            or (ewma_ttfb or 0.0) > self.degraded_ttfb
+        )
+        if not is_up:
+            status["health"] = "down"
+        elif status["is_recovering"]:
+            status["health"] = "recovering"
+        else:
+            status["health"] = "degraded" if status["degraded"] else "healthy"
+
+        history = self.history.get(ip)
+        if history is None:
+            history = self.history[ip] = ProbeHistory(self.history_size)
+        timestamp = time.time()
+        history.record(
+            timestamp,
+            is_up,
+            status["degraded"],
+            phases["connect_ms"],
+            phases.get("ttfb_ms"),
+        )
+        if self.probe_log:
+            self.probe_log.write(
+                json.dumps(
+                    {"t": round(timestamp, 3), "server": server["name"], "ip": ip, "up": is_up}
+                )
+                + "\n"
+            )
+        if self.pusher:
+            ttfb_ms = phases.get("ttfb_ms")
+            self.pusher.add(
+                (
+                    ip,
+                    port,
+                    is_up,
+                    status["degraded"],
+                    timestamp,
+                    connect_seconds,
+                    None if ttfb_ms is None else ttfb_ms / 1000,
+                )
+            )
+
+        if self.metrics:
+            self.metrics.observe_probe(server, is_up, connect_seconds or 0.0)
+            self.metrics.observe_status(server, prev_status, status)
+
         return status
 
     async def check_all_servers(self) -> Dict[str, Dict[str, Any]]:
-        """Check all servers concurrently"""
-        tasks = [self.update_server_status(server) for server in CDN_SERVERS]
+        """Check all servers concurrently (one round, used for --json)"""
+        tasks = [self.update_server_status(server) for server in self.servers]
         results = await asyncio.gather(*tasks)
 
-        for server, status in zip(CDN_SERVERS, results):
+        for server, status in zip(self.servers, results):
             ip_key = str(server["ip"])  # Ensure string type
             self.server_status[ip_key] = status
 
         return self.server_status
 
+    def next_delay(self) -> float:
+        """Check interval with +/- jitter so targets drift apart instead of bunching up."""
+        return self.check_interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    async def probe_server_forever(self, server: Dict[str, Any]) -> None:
+        """
+        Probe one server on its own timer.
+
+        Each target is scheduled independently: the next check is due one
+        (jittered) interval after the previous one was due, not after the
+        slowest target of a round has finished.
+        """
+        loop = asyncio.get_running_loop()
+        # Spread the first checks over one interval
+        next_run = loop.time() + random.uniform(0, self.check_interval)
+        while True:
+            await asyncio.sleep(max(0.0, next_run - loop.time()))
+            self.server_status[str(server["ip"])] = await self.update_server_status(
+                server
+            )
+            next_run = max(next_run + self.next_delay(), loop.time())
+
+    async def resolve_forever(self) -> None:
+        """Resolve the geo domain on its own timer."""
+        while True:
+            self.resolved_ips = await self.check_dns_resolution(self.geo_domain)
+            await asyncio.sleep(self.next_delay())
+
     async def monitor_loop(self, duration: Optional[int] = None) -> None:
         """
         Main asynchronous monitoring loop.
 
         This provides real-time visibility into what PowerDNS should be
-        seeing internally when it performs health checks.
+        seeing internally when it performs health checks. Probes run in
+        per-target tasks; this loop only reports their latest results.
         """
         start_time = time.time()
         iteration = 0
@@ -228,26 +758,24 @@ class AsyncCDNHealthMonitor:
         print("=" * 80)
         print(f"DNS Server: {self.dns_server}")
         print(f"Check Interval: {self.check_interval} seconds")
-        print(f"Monitoring {len(CDN_SERVERS)} servers")
+        print(f"Monitoring {len(self.servers)} servers")
         print("-" * 80)
 
+        tasks = self.start_probes()
+
         try:
             while True:
+                # Wait for next report
+                await asyncio.sleep(self.check_interval)
                 iteration += 1
 
-                # Check all servers concurrently
-                await self.check_all_servers()
-
                 # Display status
                 self.display_status(iteration)
 
-                # Check DNS resolution concurrently
-                dns_task = self.check_dns_resolution("cdn-geo.runonflux.io")
-                resolved_ips = await dns_task
-
+                resolved_ips = self.resolved_ips
                 if resolved_ips:
                     print(
-                        f"\nDNS Resolution: cdn-geo.runonflux.io -> {', '.join(resolved_ips)}"
+                        f"\nDNS Resolution: {self.geo_domain} -> {', '.join(resolved_ips)}"
                     )
 
                     # Verify the resolved IP matches a healthy server
@@ -269,14 +797,100 @@ class AsyncCDNHealthMonitor:
 
                 # Check if we should exit
                 if duration and (time.time() - start_time) >= duration:
+                    self.print_summary()
                     break
 
-                # Wait for next check
-                await asyncio.sleep(self.check_interval)
-
-        except KeyboardInterrupt:
+        except (KeyboardInterrupt, asyncio.CancelledError):
             print("\n\nMonitoring stopped by user")
             self.print_summary()
+        finally:
+            await self.stop_probes(tasks)
+
+    def start_probes(self) -> List["asyncio.Future[None]"]:
+        """Start the per-target probe tasks and the DNS resolution task."""
+        tasks = [
+            asyncio.ensure_future(self.probe_server_forever(server))
+            for server in self.servers
+        ]
+        tasks.append(asyncio.ensure_future(self.resolve_forever()))
+        return tasks
+
+    async def stop_probes(self, tasks: List["asyncio.Future[None]"]) -> None:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def collect(self, duration: float) -> Dict[str, Any]:
+        """Probe silently for ``duration`` seconds, then return a JSON snapshot."""
+        tasks = self.start_probes()
+        try:
+            await asyncio.sleep(duration)
+        finally:
+            await self.stop_probes(tasks)
+        return self.snapshot(self.resolved_ips)
+
+    async def serve_metrics(
+        self, host: str, port: int, duration: Optional[int] = None
+    ) -> None:
+        """
+        Long-running mode: probe in the background and serve /metrics.
+
+        Nothing is printed per check; scrape the endpoint instead.
+        """
+        from aiohttp import web  # type: ignore[import-not-found]
+        from prometheus_client import CONTENT_TYPE_LATEST  # type: ignore[import-not-found]
+
+        assert self.metrics is not None
+        metrics = self.metrics
+
+        async def handle_metrics(_request: web.Request) -> web.Response:
+            return web.Response(
+                body=metrics.render(), headers={"Content-Type": CONTENT_TYPE_LATEST}
+            )
+
+        app = web.Application()
+        app.router.add_get("/metrics", handle_metrics)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        print(f"Serving metrics on http://{host}:{port}/metrics")
+        print(f"Monitoring {len(self.servers)} servers every {self.check_interval}s")
+
+        tasks = self.start_probes()
+        try:
+            if duration:
+                await asyncio.sleep(duration)
+            else:
+                await asyncio.gather(*tasks)
+        finally:
+            await self.stop_probes(tasks)
+            await runner.cleanup()
+
+    async def push_results(self, duration: Optional[int] = None) -> None:
+        """
+        Agent mode: probe in the background and push every result to the aggregator.
+
+        Nothing is printed per check; look at the aggregator's matrix instead.
+        """
+        assert self.pusher is not None
+        pusher = self.pusher
+        await pusher.start()
+        print(f"Pushing results as {pusher.vantage} to {pusher.url} every {pusher.interval}s")
+        print(f"Monitoring {len(self.servers)} servers every {self.check_interval}s")
+
+        tasks = self.start_probes()
+        push_task = asyncio.ensure_future(pusher.run())
+        try:
+            if duration:
+                await asyncio.sleep(duration)
+            else:
+                await asyncio.gather(*tasks)
+        finally:
+            await self.stop_probes(tasks)
+            # Cancelling run() flushes the last results
+            push_task.cancel()
+            await asyncio.gather(push_task, return_exceptions=True)
+            await pusher.close()
 
     def display_status(self, iteration: int) -> None:
         """Display current status of all servers"""
@@ -292,8 +906,15 @@ class AsyncCDNHealthMonitor:
             "State",
         ]
         rows = []
+        full_table = len(self.server_status) <= FULL_TABLE_LIMIT
+        healthy = 0
 
         for ip, status in self.server_status.items():
+            if status["health"] == "healthy":
+                healthy += 1
+                if not full_table:
+                    continue
+
             # Determine display status
             if status["is_up"]:
                 if status["is_recovering"]:
@@ -303,6 +924,10 @@ class AsyncCDNHealthMonitor:
                     )
                     state = f"RECOVERING ({minutes_left} min left)"
                     health = "⚠️"
+                elif status["degraded"]:
+                    ewma = status["ewma_ms"]
+                    state = f"DEGRADED (connect {ewma['connect']}ms, ttfb {ewma['ttfb']}ms)"
+                    health = "🐢"
                 else:
                     state = "HEALTHY"
                     health = "✅"
@@ -316,7 +941,8 @@ class AsyncCDNHealthMonitor:
                     downtime = datetime.now() - status["down_since"]
                     state += f" for {int(downtime.total_seconds())}s"
 
-            # PowerDNS considers server down after 3 failures (6 seconds)
+            # ifportup() drops a server after minimumFailures=3 failed checks;
+            # --failover-bench measures how long that really takes
             if status["consecutive_failures"] >= 3:
                 state += " [PDNS: DOWN]"
 
@@ -332,7 +958,13 @@ class AsyncCDNHealthMonitor:
             )
 
         # Print table
-        self.print_table(headers, rows)
+        if not full_table:
+            print(
+                f"{healthy}/{len(self.server_status)} servers healthy"
+                f" ({len(self.servers) - len(self.server_status)} not checked yet)"
+            )
+        if rows:
+            self.print_table(headers, rows)
 
     def print_table(self, headers: List[str], rows: List[List[str]]) -> None:
         """Print a formatted table"""
@@ -375,13 +1007,31 @@ class AsyncCDNHealthMonitor:
                     f"  Recovery Time Remaining: {int(remaining.total_seconds())} seconds"
                 )
 
+            if ip in self.history:
+                stats = self.history[ip].stats(self.history_window)
+                if stats["probes"]:
+                    print(
+                        f"  Last {int(self.history_window // 60)} min: "
+                        f"{stats['availability_pct']}% available over {stats['probes']} probes, "
+                        f"{stats['flaps']} flaps, {stats['degraded_pct']}% degraded"
+                    )
+                    for phase in ("connect_ms", "ttfb_ms"):
+                        if stats[phase]:
+                            p = stats[phase]
+                            print(
+                                f"  {phase[:-3].upper()} ms: p50 {p['p50']}  p95 {p['p95']}  p99 {p['p99']}"
+                            )
+
     async def single_check(self) -> Dict[str, Any]:
         """Perform a single check of all servers (for JSON output)"""
         await self.check_all_servers()
 
         # Add DNS resolution check
-        resolved_ips = await self.check_dns_resolution("cdn-geo.runonflux.io")
+        resolved_ips = await self.check_dns_resolution(self.geo_domain)
+        return self.snapshot(resolved_ips)
 
+    def snapshot(self, resolved_ips: List[str]) -> Dict[str, Any]:
+        """Current state of every server as JSON-serializable data"""
         # Convert datetime objects to strings for JSON serialization
         servers_output: Dict[str, Dict[str, Any]] = {}
 
@@ -393,13 +1043,15 @@ class AsyncCDNHealthMonitor:
             # Add PowerDNS interpretation
             server_data["pdns_should_use"] = status["dns_healthy"]
             server_data["pdns_marked_down"] = status["consecutive_failures"] >= 3
+            if ip in self.history:
+                server_data["history"] = self.history[ip].stats(self.history_window)
             servers_output[ip] = server_data
 
         output: Dict[str, Any] = {
             "timestamp": datetime.now().isoformat(),
             "dns_server": self.dns_server,
             "dns_resolution": {
-                "domain": "cdn-geo.runonflux.io",
+                "domain": self.geo_domain,
                 "resolved_ips": resolved_ips,
             },
             "servers": servers_output,
@@ -411,6 +1063,696 @@ class AsyncCDNHealthMonitor:
 
         return output
 
+    async def ecs_sweep(
+        self,
+        prefixes: List[Tuple[str, str]],
+        concurrency: int = 500,
+        sockets: int = 8,
+        timeout: float = 2.0,
+        retries: int = 1,
+        output: Optional[TextIO] = None,
+    ) -> Dict[str, Any]:
+        """
+        Ask the DNS server which CDN IP each client prefix is given.
+
+        Sends one geo domain query per prefix with an EDNS Client Subnet
+        option, keeping up to ``concurrency`` queries in flight (one per
+        worker) over a few pipelined UDP sockets. Per-prefix results are streamed to ``output``
+        as JSON lines; the return value is the aggregate.
+        """
+        host, _, port = self.dns_server.partition(":")
+        clients = [await UDPClient.connect(host, int(port or 53)) for _ in range(sockets)]
+        names = {server["ip"]: server["name"] for server in self.servers}
+
+        by_ip: Dict[str, int] = {}
+        by_label: Dict[str, Dict[str, int]] = {}
+        latencies: List[float] = []
+        errors: Dict[str, int] = {}
+
+        async def sweep_one(index: int, prefix: str, label: str) -> None:
+            packet = build_query(self.geo_domain, "A", ecs=prefix)
+            client = clients[index % sockets]
+            result: Dict[str, Any] = {"prefix": prefix}
+            if label:
+                result["label"] = label
+            for attempt in range(retries + 1):
+                start = time.perf_counter()
+                try:
+                    response = parse_response(await client.send(packet, timeout))
+                except asyncio.TimeoutError:
+                    if attempt < retries:
+                        continue
+                    result["error"] = "timeout"
+                    break
+                except (struct.error, IndexError, ValueError):
+                    # A short or garbled datagram fails this prefix, not the sweep
+                    result["error"] = "malformed"
+                    break
+                elapsed = time.perf_counter() - start
+                latencies.append(elapsed)
+                ips = sorted(r.data for r in response.answers if r.rtype == "A")
+                result.update(
+                    {
+                        "rcode": response.rcode,
+                        "ips": ips,
+                        "servers": [names.get(ip, "unknown") for ip in ips],
+                        "ecs_scope": response.ecs_scope,
+                        "latency_ms": round(elapsed * 1000, 3),
+                    }
+                )
+                break
+
+            if "error" in result or result["rcode"] != "NOERROR":
+                key = result.get("error") or result["rcode"]
+                errors[key] = errors.get(key, 0) + 1
+            else:
+                answer = ",".join(result["ips"]) or "empty"
+                by_ip[answer] = by_ip.get(answer, 0) + 1
+                if label:
+                    counts = by_label.setdefault(label, {})
+                    counts[answer] = counts.get(answer, 0) + 1
+            if output:
+                output.write(json.dumps(result) + "\n")
+
+        pending = iter(enumerate(prefixes))
+
+        async def worker() -> None:
+            for index, (prefix, label) in pending:
+                await sweep_one(index, prefix, label)
+
+        start = time.perf_counter()
+        try:
+            await asyncio.gather(
+                *(worker() for _ in range(max(1, min(concurrency, len(prefixes)))))
+            )
+        finally:
+            for client in clients:
+                client.close()
+        elapsed = time.perf_counter() - start
+
+        latencies.sort()
+        count = len(latencies)
+
+        def pct(p: float) -> Optional[float]:
+            return round(latencies[min(count - 1, int(count * p))] * 1000, 3) if count else None
+
+        answered = sum(by_ip.values())
+        return {
+            "timestamp": datetime.now().isoformat(),
+            "dns_server": self.dns_server,
+            "domain": self.geo_domain,
+            "prefixes": len(prefixes),
+            "elapsed_s": round(elapsed, 3),
+            "prefixes_per_minute": round(len(prefixes) / elapsed * 60) if elapsed else 0,
+            "latency_ms": {"p50": pct(0.5), "p95": pct(0.95), "p99": pct(0.99)},
+            "errors": errors,
+            "answers": {
+                answer: {
+                    "servers": [names.get(ip, "unknown") for ip in answer.split(",")],
+                    "prefixes": n,
+                    "share": round(n / answered, 4),
+                }
+                for answer, n in sorted(by_ip.items(), key=lambda item: -item[1])
+            },
+            "by_label": by_label,
+        }
+
+
+def _dns_error(error: BaseException) -> str:
+    """Short reason for a failed health check query (the rcode, or the exception)."""
+    if isinstance(error, asyncio.TimeoutError):
+        return "timeout"
+    return str(error) or repr(error)
+
+
+def _failed_check(name: str, error: BaseException) -> Dict[str, Any]:
+    """Result of a health check that raised instead of returning its own."""
+    return {"status": "fail", "errors": [f"{name} test failed: {_dns_error(error)}"]}
+
+
+class HealthSnapshot(NamedTuple):
+    """One pre-serialized health response."""
+
+    checked_at: float
+    status: int
+    body: bytes
+    headers: Dict[str, str]
+    etag: str
+
+
+class HealthService:
+    """
+    --serve: DNS health checks on a fixed schedule, answered from a snapshot.
+
+    The checks and JSON match templates/health.js.j2 (/healthdetail) and
+    templates/health-simple.js.j2 (/health), but run once per interval no
+    matter how often the endpoints are polled. A request only gets the
+    bytes serialized after the last round, with Age, Last-Modified and
+    ETag headers; once that round is older than stale_after the answer is
+    503 with X-Health-Stale: 1, so a wedged checker never looks healthy.
+
+    Queries go straight to the DNS server over dns_wire's UDP client:
+    aiodns (c-ares) caches answers for their TTL, which would hide changes.
+    """
+
+    # Sample app names, one per load balancer range in production (v-z, o-u, 0-9a-g, h-n)
+    TEST_APPS = ("web", "test", "app123", "hello")
+
+    def __init__(
+        self,
+        dns_server: str,
+        app_domain: str,
+        geo_domain: str,
+        app_table: Optional[AppTable],
+        cdn_ips: List[str],
+        regions: List[str],
+        interval: float = 2.0,
+        stale_after: Optional[float] = None,
+        timeout: float = 2.0,
+    ):
+        self.dns_server = dns_server
+        self.client: Optional[UDPClient] = None
+        self.timeout = timeout
+        self.app_domain = app_domain
+        self.geo_domain = geo_domain
+        self.app_table = app_table
+        self.cdn_ips = cdn_ips
+        self.regions = regions
+        self.interval = interval
+        self.stale_after = stale_after if stale_after is not None else 3 * interval
+        self.rounds = 0
+        self.detail: Optional[HealthSnapshot] = None
+        self.simple: Optional[HealthSnapshot] = None
+
+    async def query(self, name: str, rtype: str) -> List[str]:
+        """Answers of one type; raises LookupError with the rcode if the query failed."""
+        assert self.client is not None
+        reply = parse_response(await self.client.send(build_query(name, rtype), self.timeout))
+        if reply.rcode != "NOERROR":
+            raise LookupError(reply.rcode)
+        return [record.data for record in reply.answers if record.rtype == rtype]
+
+    async def check_app_routing(self) -> Tuple[Dict[str, Any], Any]:
+        """Wildcard CNAMEs and the _debug endpoint; also returns the answer for web.<app domain>."""
+        result: Dict[str, Any] = {
+            "status": "pass",
+            "tested_domains": len(self.TEST_APPS),
+            "passed": 0,
+            "failed": 0,
+            "samples": {},
+            "debug_endpoint": "pass",
+            "errors": [],
+        }
+        domains = [f"{app}.{self.app_domain}" for app in self.TEST_APPS]
+        *answers, debug = await asyncio.gather(
+            *(self.query(domain, "CNAME") for domain in domains),
+            self.query(f"_debug.{self.app_domain}", "TXT"),
+            return_exceptions=True,
+        )
+        for app, domain, answer in zip(self.TEST_APPS, domains, answers):
+            if isinstance(answer, BaseException):
+                result["failed"] += 1
+                result["errors"].append(f"{domain} failed: {_dns_error(answer)}")
+                continue
+            if not answer:
+                result["failed"] += 1
+                result["errors"].append(f"{domain} returned no CNAME records")
+                continue
+            target = answer[0].rstrip(".")
+            result["samples"][app] = target
+            # The exact load balancer app_routes picks, not just any of them
+            expected = self.app_table.route(domain) if self.app_table else target
+            if target == expected:
+                result["passed"] += 1
+            else:
+                result["failed"] += 1
+                result["errors"].append(f"{domain} resolved to unexpected target: {target} (expected {expected})")
+        if isinstance(debug, BaseException) or not debug:
+            result["debug_endpoint"] = "fail"
+            reason = f"failed: {_dns_error(debug)}" if isinstance(debug, BaseException) else "returned no TXT records"
+            result["errors"].append(f"_debug endpoint {reason}")
+        if result["failed"] or result["debug_endpoint"] == "fail":
+            result["status"] = "fail"
+        return result, answers[0]
+
+    async def check_geo_routing(self) -> Dict[str, Any]:
+        """The geo domain answers with a CDN IP, and every region has its _health TXT."""
+        result: Dict[str, Any] = {
+            "status": "pass",
+            "main_record": None,
+            "health_records": len(self.regions),
+            "health_passed": 0,
+            "errors": [],
+        }
+        main, *health = await asyncio.gather(
+            self.query(self.geo_domain, "A"),
+            *(self.query(f"_health.{region}.{self.geo_domain}", "TXT") for region in self.regions),
+            return_exceptions=True,
+        )
+        if isinstance(main, BaseException):
+            result["errors"].append(f"Main geo record failed: {_dns_error(main)}")
+            result["status"] = "fail"
+        elif not main:
+            result["errors"].append("Main geo record returned no A records")
+            result["status"] = "fail"
+        else:
+            result["main_record"] = main[0]
+            if main[0] not in self.cdn_ips:
+                result["errors"].append(f"Main geo record returned unexpected IP: {main[0]}")
+                result["status"] = "fail"
+        for region, answer in zip(self.regions, health):
+            if isinstance(answer, BaseException):
+                result["errors"].append(f"_health.{region} failed: {_dns_error(answer)}")
+            elif not answer:
+                result["errors"].append(f"_health.{region} returned no TXT records")
+            else:
+                result["health_passed"] += 1
+        if result["health_passed"] != result["health_records"]:
+            result["status"] = "fail"
+        return result
+
+    async def check_basic_dns(self) -> Dict[str, Any]:
+        """SOA and NS of the app zone, and how long they took."""
+        result: Dict[str, Any] = {
+            "status": "pass",
+            "response_time_ms": 0,
+            "soa_serial": None,
+            "nameservers": [],
+            "errors": [],
+        }
+        start = time.perf_counter()
+        try:
+            soa, ns = await asyncio.gather(
+                self.query(self.app_domain, "SOA"),
+                self.query(self.app_domain, "NS"),
+            )
+            if not soa:
+                raise LookupError("no SOA record")
+            result["soa_serial"] = int(soa[0].split()[2])
+            result["nameservers"] = [name.rstrip(".") for name in ns]
+            result["response_time_ms"] = round((time.perf_counter() - start) * 1000)
+        except (LookupError, asyncio.TimeoutError, struct.error, IndexError, ValueError) as e:
+            # A truncated reply or a malformed SOA is a failed check, not a crash
+            result["status"] = "fail"
+            result["errors"].append(f"Basic DNS test failed: {_dns_error(e)}")
+        return result
+
+    @staticmethod
+    def _snapshot(checked_at: float, status: int, payload: Any) -> HealthSnapshot:
+        body = json.dumps(payload).encode()
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()[:20]
+        headers = {
+            "Content-Type": "application/json",
+            "ETag": etag,
+            "Last-Modified": formatdate(checked_at, usegmt=True),
+        }
+        return HealthSnapshot(checked_at, status, body, headers, etag)
+
+    async def refresh(self) -> None:
+        """Run one round of checks and swap in the new snapshots."""
+        checked_at = time.time()
+        routing, geo, basic = await asyncio.gather(
+            self.check_app_routing(),
+            self.check_geo_routing(),
+            self.check_basic_dns(),
+            return_exceptions=True,
+        )
+        # A check that raises fails on its own instead of ending the round
+        # (the first round runs unguarded in serve())
+        if isinstance(routing, BaseException):
+            app, web = _failed_check("App routing", routing), routing
+        else:
+            app, web = routing
+        if isinstance(geo, BaseException):
+            geo = _failed_check("Geo routing", geo)
+        if isinstance(basic, BaseException):
+            basic = _failed_check("Basic DNS", basic)
+        checks = {"app_routing": app, "geo_routing": geo, "basic_dns": basic}
+        # app_routing and basic_dns are critical; a geo_routing failure only degrades
+        if app["status"] == "fail" or basic["status"] == "fail":
+            health, status = "unhealthy", 503
+        elif geo["status"] == "fail":
+            health, status = "degraded", 200
+        else:
+            health, status = "healthy", 200
+        detail = {
+            "status": health,
+            "timestamp": datetime.fromtimestamp(checked_at, timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z"),
+            "checks": checks,
+            "errors": [error for check in checks.values() for error in check["errors"]],
+        }
+        if isinstance(web, BaseException) or not web:
+            error = _dns_error(web) if isinstance(web, BaseException) else "no CNAME records"
+            simple = self._snapshot(checked_at, 500, {"error": error})
+        else:
+            simple = self._snapshot(checked_at, 200, [target.rstrip(".") for target in web])
+        self.detail = self._snapshot(checked_at, status, detail)
+        self.simple = simple
+        self.rounds += 1
+
+    async def refresh_forever(self) -> None:
+        """Refresh on a fixed schedule; a round that overruns delays the next, never stacks."""
+        loop = asyncio.get_running_loop()
+        next_round = loop.time()
+        while True:
+            next_round = max(next_round + self.interval, loop.time())
+            await asyncio.sleep(next_round - loop.time())
+            try:
+                await self.refresh()
+            except Exception as e:
+                # The snapshot ages and turns stale; keep trying
+                print(f"Health check round failed: {e!r}")
+
+    def respond(self, snapshot: Optional[HealthSnapshot], request: "web.Request") -> "web.Response":
+        from aiohttp import web  # type: ignore[import-not-found]
+
+        assert snapshot is not None
+        age = time.time() - snapshot.checked_at
+        stale = age > self.stale_after
+        headers = dict(snapshot.headers)
+        headers["Age"] = str(int(age))
+        headers["Cache-Control"] = f"max-age={int(self.interval)}"
+        headers["X-Health-Stale"] = "1" if stale else "0"
+        if stale:
+            return web.Response(status=503, body=snapshot.body, headers=headers)
+        # Only a healthy answer revalidates: a checker may take any 3xx as up
+        if snapshot.status == 200 and request.headers.get("If-None-Match") == snapshot.etag:
+            del headers["Content-Type"]
+            return web.Response(status=304, headers=headers)
+        return web.Response(status=snapshot.status, body=snapshot.body, headers=headers)
+
+    async def serve(self, host: str, port: int, duration: Optional[int] = None) -> None:
+        """Check once, then serve /health and /healthdetail while refreshing in the background."""
+        from aiohttp import web  # type: ignore[import-not-found]
+
+        host_dns, _, port_dns = self.dns_server.partition(":")
+        self.client = await UDPClient.connect(host_dns, int(port_dns or 53))
+        await self.refresh()
+
+        async def handle_simple(request: web.Request) -> web.Response:
+            return self.respond(self.simple, request)
+
+        async def handle_detail(request: web.Request) -> web.Response:
+            return self.respond(self.detail, request)
+
+        app = web.Application()
+        app.router.add_get("/health", handle_simple)
+        app.router.add_get("/healthdetail", handle_detail)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        print(f"Serving health on http://{host}:{port}/health and /healthdetail")
+        print(f"Checking {self.app_domain} and {self.geo_domain} every {self.interval}s")
+
+        task = asyncio.ensure_future(self.refresh_forever())
+        try:
+            if duration:
+                await asyncio.sleep(duration)
+            else:
+                await task
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await runner.cleanup()
+            self.client.close()
+
+
+def read_health_check_settings(config_path: Path = DEFAULT_CONFIG) -> Dict[str, Any]:
+    """ifportup() options and lua-health-checks-interval (powerdns.lua_health_checks in vars.yaml)."""
+    with open(config_path, "r") as f:
+        config = yaml.safe_load(f)
+    return dict(config["powerdns"].get("lua_health_checks", {}))
+
+
+def geo_check_table(config_path: Path, geo_domain: str) -> str:
+    """The geo_routing.lua ifportup() option table behind the A record of geo_domain."""
+    with open(config_path, "r") as f:
+        config = yaml.safe_load(f)
+    for environment in ("staging", "production"):
+        for zone_config in config["powerdns"][environment].get("zone_configs", []):
+            if zone_config.get("domain") == geo_domain:
+                selection = zone_config.get("template_vars", {}).get("geo_selection", "closest")
+                return "weighted_check" if selection == "weighted" else "geo_route_check"
+    return "geo_route_check"
+
+
+def distribution(values: List[float]) -> Dict[str, Any]:
+    """Count, mean and percentiles of a list of durations in seconds."""
+    ordered = sorted(values)
+    count = len(ordered)
+    if not count:
+        return {"count": 0}
+    return {
+        "count": count,
+        "min": round(ordered[0], 3),
+        "mean": round(sum(ordered) / count, 3),
+        **{
+            name: round(ordered[min(count - 1, int(count * p))], 3)
+            for name, p in (("p50", 0.50), ("p90", 0.90), ("p99", 0.99))
+        },
+        "max": round(ordered[-1], 3),
+    }
+
+
+class StandinNode:
+    """
+    Local TCP listener standing in for one CDN node.
+
+    It accepts and immediately closes connections, which is all ifportup()
+    needs to see the node as up. stop() closes the listening socket, so
+    connects are refused until start() is called again.
+    """
+
+    def __init__(self, server: Dict[str, Any], address: str, port: int):
+        self.server = server
+        self.address = address
+        self.port = port
+        self.listener: Optional[asyncio.AbstractServer] = None
+
+    @staticmethod
+    async def _accept(_reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        writer.close()
+
+    async def start(self) -> None:
+        if self.listener is None:
+            self.listener = await asyncio.start_server(
+                self._accept, self.address, self.port, reuse_address=True
+            )
+
+    async def stop(self) -> None:
+        if self.listener is not None:
+            self.listener.close()
+            await self.listener.wait_closed()
+            self.listener = None
+
+
+class FailoverBenchmark:
+    """
+    Measures how long PowerDNS keeps handing out a dead CDN node.
+
+    Every geo_regions node is replaced by a StandinNode listening on the
+    node's own IP (add the IPs to the loopback interface of the test box,
+    or render the test zone with local addresses). Each trial stops one
+    node, polls PowerDNS every poll_interval seconds until the node has
+    left the answers (time to evict), starts it again and polls until it is
+    back (time to restore). Nodes are taken down in turn.
+
+    With poll_type TXT the _status record (getServerStatus(), which lists
+    every node as <region>:UP/DOWN) is polled; with A, the geo domain
+    itself, and a node counts as in rotation while its IP is in the answer.
+    Polled answers include the packet cache, as clients see them.
+
+    Each ifportup() option table is health-checked separately, so the
+    trials measure the table behind the polled record: status_check for
+    _status, geo_route_check or weighted_check (geo_selection) for A. The
+    report names it next to the settings from config_path.
+    """
+
+    def __init__(
+        self,
+        dns_server: str,
+        servers: List[Dict[str, Any]],
+        geo_domain: str,
+        poll_type: str = "TXT",
+        poll_interval: float = 0.1,
+        restore_after: float = 0.0,
+        settle: float = 5.0,
+        trial_timeout: float = 600.0,
+        standin_port: Optional[int] = None,
+        config_path: Path = DEFAULT_CONFIG,
+    ):
+        self.dns_server = dns_server
+        self.geo_domain = geo_domain
+        self.poll_type = poll_type
+        self.poll_name = f"_status.{geo_domain}" if poll_type == "TXT" else geo_domain
+        self.config_path = config_path
+        self.check_table = (
+            "status_check" if poll_type == "TXT" else geo_check_table(config_path, geo_domain)
+        )
+        self.poll_interval = poll_interval
+        self.restore_after = restore_after
+        self.settle = settle
+        self.trial_timeout = trial_timeout
+        self.nodes = [
+            StandinNode(server, server["ip"], standin_port or server["port"])
+            for server in servers
+        ]
+        self.client: Optional[UDPClient] = None
+        self.polls = 0
+        self.poll_errors = 0
+
+    async def start(self) -> None:
+        for node in self.nodes:
+            try:
+                await node.start()
+            except OSError as e:
+                await self.stop()
+                raise OSError(
+                    f"cannot listen on {node.address}:{node.port} ({e.strerror}); "
+                    f"add the address with 'ip addr add {node.address}/32 dev lo'"
+                ) from None
+        host, _, port = self.dns_server.partition(":")
+        self.client = await UDPClient.connect(host, int(port or 53))
+
+    async def stop(self) -> None:
+        for node in self.nodes:
+            await node.stop()
+        if self.client:
+            self.client.close()
+
+    async def in_rotation(self, node: StandinNode) -> Optional[bool]:
+        """Whether PowerDNS currently hands out the node; None if the query failed."""
+        assert self.client is not None
+        self.polls += 1
+        try:
+            response = parse_response(
+                await self.client.send(build_query(self.poll_name, self.poll_type), 1.0)
+            )
+        except (asyncio.TimeoutError, struct.error, IndexError, ValueError):
+            # A lost, short or garbled reply fails this poll, not the benchmark
+            self.poll_errors += 1
+            return None
+        if response.rcode != "NOERROR":
+            self.poll_errors += 1
+            return None
+        if self.poll_type == "TXT":
+            status = " ".join(r.data.strip('"') for r in response.answers if r.rtype == "TXT")
+            return f"{node.server['region']}:UP" in status
+        return any(r.data == node.server["ip"] for r in response.answers if r.rtype == "A")
+
+    async def wait_for(self, node: StandinNode, wanted: bool, since: float) -> Optional[float]:
+        """Seconds after ``since`` until in_rotation() is ``wanted``; None on timeout."""
+        loop = asyncio.get_running_loop()
+        next_poll = loop.time()
+        while loop.time() - since < self.trial_timeout:
+            sent = loop.time()
+            if await self.in_rotation(node) is wanted:
+                # Upper bound: the change happened after the previous poll
+                return sent - since
+            next_poll += self.poll_interval
+            await asyncio.sleep(max(0.0, next_poll - loop.time()))
+        return None
+
+    async def trial(self, number: int) -> Dict[str, Any]:
+        node = self.nodes[number % len(self.nodes)]
+        loop = asyncio.get_running_loop()
+        result: Dict[str, Any] = {
+            "trial": number + 1,
+            "server": node.server["name"],
+            "ip": node.server["ip"],
+        }
+        if await self.wait_for(node, True, loop.time()) is None:
+            result["error"] = "not in rotation before the trial"
+            return result
+
+        killed = loop.time()
+        await node.stop()
+        result["evict_s"] = await self.wait_for(node, False, killed)
+        if self.restore_after:
+            await asyncio.sleep(self.restore_after)
+        restored = loop.time()
+        await node.start()
+        result["down_s"] = round(restored - killed, 3)
+        result["restore_s"] = await self.wait_for(node, True, restored)
+        for key in ("evict_s", "restore_s"):
+            if result[key] is not None:
+                result[key] = round(result[key], 3)
+        return result
+
+    async def run(self, trials: int, output: Optional[TextIO] = None) -> Dict[str, Any]:
+        await self.start()
+        results = []
+        try:
+            for number in range(trials):
+                result = await self.trial(number)
+                results.append(result)
+                if output:
+                    output.write(json.dumps(result) + "\n")
+                    output.flush()
+                print(
+                    f"Trial {number + 1}/{trials} {result['server']}: "
+                    + (
+                        result.get("error")
+                        or f"evict {result['evict_s']}s, restore {result['restore_s']}s"
+                    ),
+                    file=sys.stderr,
+                )
+                if number < trials - 1:
+                    await asyncio.sleep(self.settle)
+        finally:
+            await self.stop()
+
+        def measured(key: str) -> List[float]:
+            return [r[key] for r in results if r.get(key) is not None]
+
+        return {
+            "timestamp": datetime.now().isoformat(),
+            "dns_server": self.dns_server,
+            "poll": {
+                "name": self.poll_name,
+                "type": self.poll_type,
+                "interval_s": self.poll_interval,
+                "queries": self.polls,
+                "errors": self.poll_errors,
+            },
+            "configured": {
+                "check_table": self.check_table,
+                **read_health_check_settings(self.config_path),
+            },
+            "trials": len(results),
+            "skipped": sum(1 for r in results if "error" in r),
+            "evict_s": distribution(measured("evict_s")),
+            "evict_timeouts": sum(1 for r in results if "evict_s" in r and r["evict_s"] is None),
+            "restore_s": distribution(measured("restore_s")),
+            "restore_timeouts": sum(
+                1 for r in results if "restore_s" in r and r["restore_s"] is None
+            ),
+            "by_server": {
+                node.server["name"]: {
+                    "evict_s": distribution(
+                        [r["evict_s"] for r in results
+                         if r["server"] == node.server["name"] and r.get("evict_s") is not None]
+                    ),
+                    "restore_s": distribution(
+                        [r["restore_s"] for r in results
+                         if r["server"] == node.server["name"] and r.get("restore_s") is not None]
+                    ),
+                }
+                for node in self.nodes
+            },
+        }
+
+
+def load_prefixes(path: Path) -> List[Tuple[str, str]]:
+    """Read "prefix [label]" lines (e.g. "198.51.100.0/24 DE"); '#' starts a comment."""
+    prefixes = []
+    with open(path, "r") as f:
+        for line in f:
+            fields = line.split("#")[0].split()
+            if fields:
+                prefixes.append((fields[0], fields[1] if len(fields) > 1 else ""))
+    return prefixes
+
 
 async def main() -> None:
     parser = argparse.ArgumentParser(
@@ -424,10 +1766,38 @@ async def main() -> None:
     )
     parser.add_argument(
         "--interval",
-        type=int,
+        type=float,
         default=2,
         help="Check interval in seconds (default: 2)",
     )
+    parser.add_argument(
+        "--config",
+        type=Path,
+        default=DEFAULT_CONFIG,
+        help="vars.yaml to load geo_regions from (default: ../vars.yaml)",
+    )
+    parser.add_argument(
+        "--environment",
+        choices=["staging", "production"],
+        help="Only monitor this environment's geo_regions (default: all)",
+    )
+    parser.add_argument(
+        "--geo-domain",
+        default="cdn-geo.runonflux.io",
+        help="Geo-routed domain to resolve (default: cdn-geo.runonflux.io)",
+    )
+    parser.add_argument(
+        "--max-inflight",
+        type=int,
+        default=256,
+        help="Maximum concurrent TCP connects (default: 256)",
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        default=0.1,
+        help="Random +/- fraction applied to each target's interval (default: 0.1)",
+    )
     parser.add_argument(
         "--duration",
         type=int,
@@ -438,19 +1808,292 @@ async def main() -> None:
         action="store_true",
         help="Output single test result in JSON format",
     )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="Run headless and serve Prometheus metrics on this port",
+    )
+    parser.add_argument(
+        "--no-https-probe",
+        action="store_true",
+        help="Only check the TCP port (no HTTPS phase timing)",
+    )
+    parser.add_argument(
+        "--degraded-connect-ms",
+        type=float,
+        default=250.0,
+        help="Connect-time EWMA above which an up server is DEGRADED (default: 250)",
+    )
+    parser.add_argument(
+        "--degraded-ttfb-ms",
+        type=float,
+        default=1000.0,
+        help="Time-to-first-byte EWMA above which an up server is DEGRADED (default: 1000)",
+    )
+    parser.add_argument(
+        "--history-size",
+        type=int,
+        default=3600,
+        help="Probes kept per server in the ring buffer (default: 3600)",
+    )
+    parser.add_argument(
+        "--history-window",
+        type=float,
+        default=15,
+        help="Minutes covered by availability/percentile/flap stats (default: 15)",
+    )
+    parser.add_argument(
+        "--probe-log",
+        type=Path,
+        help="Append every probe result to this JSONL file (input for simulate_health_checks.py)",
+    )
+    parser.add_argument(
+        "--ecs-sweep",
+        type=Path,
+        metavar="PREFIX_FILE",
+        help="Query the geo domain once per client prefix (with ECS) and report the CDN chosen",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=500,
+        help="ECS sweep: queries in flight (default: 500)",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        help="ECS sweep / failover benchmark: write per-prefix / per-trial results to this JSONL file",
+    )
+    parser.add_argument(
+        "--failover-bench",
+        action="store_true",
+        help="Stand in for the CDN nodes locally, stop and restart them in turn and time"
+        " how long PowerDNS takes to evict and restore each",
+    )
+    parser.add_argument(
+        "--trials",
+        type=int,
+        default=10,
+        help="Failover benchmark: number of stop/restart trials (default: 10)",
+    )
+    parser.add_argument(
+        "--poll-type",
+        choices=["TXT", "A"],
+        default="TXT",
+        help="Failover benchmark: poll _status.<geo domain> TXT or the geo domain's A answers (default: TXT)",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=0.1,
+        help="Failover benchmark: seconds between DNS polls (default: 0.1)",
+    )
+    parser.add_argument(
+        "--restore-after",
+        type=float,
+        default=0.0,
+        help="Failover benchmark: keep a node down this long after its eviction (default: 0)",
+    )
+    parser.add_argument(
+        "--settle",
+        type=float,
+        default=5.0,
+        help="Failover benchmark: pause between trials in seconds (default: 5)",
+    )
+    parser.add_argument(
+        "--trial-timeout",
+        type=float,
+        default=600.0,
+        help="Failover benchmark: give up waiting for an eviction or restore after this long (default: 600)",
+    )
+    parser.add_argument(
+        "--standin-port",
+        type=int,
+        help="Failover benchmark: port for the stand-in listeners (default: the nodes' port, 443)",
+    )
+    parser.add_argument(
+        "--metrics-address",
+        default="0.0.0.0",
+        help="Address for the metrics endpoint (default: 0.0.0.0)",
+    )
+    parser.add_argument(
+        "--push",
+        metavar="URL",
+        help="Run headless as an aggregator agent: push results to udp://host:port"
+        " or http://host:port (see cdn_health_aggregator.py)",
+    )
+    parser.add_argument(
+        "--vantage",
+        default=socket.gethostname(),
+        help="Push: name of this agent's vantage point (default: hostname)",
+    )
+    parser.add_argument(
+        "--push-interval",
+        type=float,
+        default=1.0,
+        help="Push: seconds between batches (default: 1)",
+    )
+    parser.add_argument(
+        "--push-key",
+        help="Push: shared HMAC key to sign batches with (default: $CDN_HEALTH_KEY)",
+    )
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Run the app-routing, geo and SOA checks every --interval and serve"
+        " /health and /healthdetail from the latest results",
+    )
+    parser.add_argument(
+        "--serve-address",
+        default="127.0.0.1",
+        help="Serve: address to listen on (default: 127.0.0.1)",
+    )
+    parser.add_argument(
+        "--serve-port",
+        type=int,
+        default=3000,
+        help="Serve: port to listen on (default: 3000)",
+    )
+    parser.add_argument(
+        "--serve-stale-after",
+        type=float,
+        help="Serve: answer 503 once the last completed check is this many seconds old"
+        " (default: 3 x --interval)",
+    )
+    parser.add_argument(
+        "--app-domain",
+        default="app.runonflux.io",
+        help="Serve: app-routed zone to check (default: app.runonflux.io)",
+    )
 
     args = parser.parse_args()
 
+    metrics = None
+    if args.metrics_port:
+        try:
+            metrics = MonitorMetrics()
+        except ImportError as e:
+            print(f"Error: --metrics-port needs prometheus-client: {e}")
+            sys.exit(1)
+
+    servers = load_cdn_servers(
+        args.config, [args.environment] if args.environment else None
+    )
+
+    if args.failover_bench:
+        benchmark = FailoverBenchmark(
+            args.dns_server,
+            servers,
+            args.geo_domain,
+            poll_type=args.poll_type,
+            poll_interval=args.poll_interval,
+            restore_after=args.restore_after,
+            settle=args.settle,
+            trial_timeout=args.trial_timeout,
+            standin_port=args.standin_port,
+            config_path=args.config,
+        )
+        output = open(args.output, "w") if args.output else None
+        try:
+            result = await benchmark.run(args.trials, output)
+        except OSError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        finally:
+            if output:
+                output.close()
+        print(json.dumps(result, indent=2))
+        return
+
+    if args.serve:
+        with open(args.config, "r") as f:
+            config = yaml.safe_load(f)
+        environments = [args.environment] if args.environment else None
+        table = find_table(
+            load_routing_tables(config, environments), f"web.{args.app_domain}"
+        )
+        regions = [
+            region["name"]
+            for environment in environments or ["staging", "production"]
+            for zone_config in config["powerdns"][environment].get("zone_configs", [])
+            if zone_config.get("domain") == args.geo_domain
+            for region in zone_config.get("template_vars", {}).get("geo_regions", [])
+        ]
+        service = HealthService(
+            args.dns_server,
+            args.app_domain,
+            args.geo_domain,
+            table,
+            [server["ip"] for server in servers],
+            regions,
+            interval=args.interval,
+            stale_after=args.serve_stale_after,
+        )
+        try:
+            await service.serve(args.serve_address, args.serve_port, duration=args.duration)
+        except OSError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        return
+
+    pusher = None
+    if args.push:
+        key = args.push_key or os.environ.get("CDN_HEALTH_KEY")
+        try:
+            pusher = HealthPusher(
+                args.push, args.vantage, key.encode() if key else None, args.push_interval
+            )
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+
+    probe_log = open(args.probe_log, "a", buffering=1) if args.probe_log else None
     async with AsyncCDNHealthMonitor(
-        dns_server=args.dns_server, check_interval=args.interval
+        dns_server=args.dns_server,
+        check_interval=args.interval,
+        servers=servers,
+        max_inflight=args.max_inflight,
+        jitter=args.jitter,
+        geo_domain=args.geo_domain,
+        metrics=metrics,
+        https_probe=not args.no_https_probe,
+        degraded_connect_ms=args.degraded_connect_ms,
+        degraded_ttfb_ms=args.degraded_ttfb_ms,
+        history_size=args.history_size,
+        history_window=args.history_window * 60,
+        probe_log=probe_log,
+        pusher=pusher,
     ) as monitor:
-        if args.json:
-            # Single check with JSON output
-            result = await monitor.single_check()
+        if args.ecs_sweep:
+            prefixes = load_prefixes(args.ecs_sweep)
+            output = open(args.output, "w") if args.output else None
+            try:
+                result = await monitor.ecs_sweep(
+                    prefixes, concurrency=args.concurrency, output=output
+                )
+            finally:
+                if output:
+                    output.close()
+            print(json.dumps(result, indent=2))
+        elif args.push:
+            await monitor.push_results(duration=args.duration)
+        elif args.metrics_port:
+            await monitor.serve_metrics(
+                args.metrics_address, args.metrics_port, duration=args.duration
+            )
+        elif args.json:
+            if args.duration:
+                # Monitor for the duration, then report state and history
+                result = await monitor.collect(args.duration)
+            else:
+                # Single check with JSON output
+                result = await monitor.single_check()
             print(json.dumps(result, indent=2))
         else:
             # Interactive monitoring
             await monitor.monitor_loop(duration=args.duration)
+    if probe_log:
+        probe_log.close()
 
 
 if __name__ == "__main__":
@@ -463,7 +2106,8 @@ if __name__ == "__main__":
         print(
             "\nRecommended: Use 'uv run monitor_cdn_health.py' to automatically install dependencies"
         )
-        print("Alternative: Install manually with 'pip install aiodns aiohttp'")
+        print("Alternative: Install manually with 'pip install aiodns aiohttp pyyaml'")
+        print("(add prometheus-client for --metrics-port)")
         print(
             "\nNOTE: These libraries are only needed for testing. PowerDNS does not require them."
         )
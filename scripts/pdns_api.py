@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+PowerDNS HTTP API Client
+
+A small client for the authoritative server's REST API (see
+docs/DNS_API.md) and a publisher that pushes rendered zones through it.
+
+ZonePublisher compares each rendered zone with the live one on the master
+and PATCHes only the RRsets that differ, together with the SOA carrying
+next_serial() of the live serial. Unchanged zones are not touched, so
+secondaries only see a NOTIFY and transfer when something really changed,
+and the serial increases with every change, including several on one day.
+RRsets that exist only on the master (API overrides, ACME challenges) are
+left alone unless prune is set.
+
+Used by generate_zone.py --api; zones that do not exist on the master yet
+are reported and skipped (powerdns_setup.yaml imports them).
+
+RRsetBatcher coalesces many RRset changes (e.g. thousands of per-app
+overrides, see pdns_overrides.py) into PATCHes of up to batch_size RRsets,
+sent concurrently over the client's connection pool. Every PATCH is one
+transaction and one SOA-EDIT-API serial bump, instead of one per record.
+"""
+
+import http.client
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import quote, urlsplit
+
+from pdns_sqlite import (
+    NAME_FIELDS,
+    RRsets,
+    Zone,
+    bump_serial,
+    diff_rrsets,
+    group_rrsets,
+    soa_serial,
+)
+
+
+class PowerDNSAPIError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+
+
+class RateLimiter:
+    """Token bucket shared by all threads: at most rate requests per second, bursts of burst."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class PowerDNSAPI:
+    """
+    PowerDNS API over a pool of keep-alive HTTP connections.
+
+    At most pool_size requests are in flight (callers block for a free
+    connection), at most rate requests are started per second (0: no
+    limit), and idempotent requests are retried with exponential backoff on
+    connection errors and on 429/502/503/504 answers.
+    """
+
+    RETRY_STATUSES = (429, 502, 503, 504)
+
+    def __init__(
+        self,
+        url: str,
+        api_key: str,
+        server_id: str = "localhost",
+        timeout: float = 10.0,
+        pool_size: int = 4,
+        rate: float = 0,
+        retries: int = 3,
+        backoff: float = 0.5,
+    ):
+        parts = urlsplit(url if "://" in url else f"http://{url}")
+        self.https = parts.scheme == "https"
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or (443 if self.https else 8081)
+        self.prefix = parts.path.rstrip("/")
+        self.api_key = api_key
+        self.server_id = server_id
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.limiter = RateLimiter(rate, pool_size) if rate > 0 else None
+        # Free slots: None until a connection is opened for the slot
+        self._pool: "queue.LifoQueue[Optional[http.client.HTTPConnection]]" = queue.LifoQueue()
+        for _ in range(max(pool_size, 1)):
+            self._pool.put(None)
+        self._open: List[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+
+    def close(self) -> None:
+        with self._lock:
+            for conn in self._open:
+                conn.close()
+            self._open = []
+
+    def __enter__(self) -> "PowerDNSAPI":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def _new_connection(self) -> http.client.HTTPConnection:
+        cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        conn = cls(self.host, self.port, timeout=self.timeout)
+        with self._lock:
+            self._open.append(conn)
+        return conn
+
+    def _discard(self, conn: http.client.HTTPConnection) -> None:
+        conn.close()
+        with self._lock:
+            if conn in self._open:
+                self._open.remove(conn)
+
+    def _send(
+        self, method: str, path: str, data: Optional[bytes], headers: Dict[str, str], resend: bool
+    ) -> Tuple[int, str, bytes, Optional[str]]:
+        """One request on a pooled connection: (status, reason, body, Retry-After)."""
+        conn = self._pool.get()
+        try:
+            if conn is None:
+                conn = self._new_connection()
+            try:
+                conn.request(method, self.prefix + path, data, headers)
+                response = conn.getresponse()
+                payload = response.read()
+            except (ConnectionError, http.client.HTTPException):
+                # The server may have closed a kept-alive connection: resend once on a new one
+                if not resend:
+                    raise
+                self._discard(conn)
+                conn = self._new_connection()
+                conn.request(method, self.prefix + path, data, headers)
+                response = conn.getresponse()
+                payload = response.read()
+            if response.will_close:
+                self._discard(conn)
+                conn = None
+            return response.status, response.reason, payload, response.getheader("Retry-After")
+        except BaseException:
+            if conn is not None:
+                self._discard(conn)
+                conn = None
+            raise
+        finally:
+            self._pool.put(conn)
+
+    def request(self, method: str, path: str, body: Any = None, idempotent: Optional[bool] = None) -> Any:
+        """
+        Send a request and return the decoded JSON answer (None for 204).
+
+        idempotent defaults to True for everything but POST; only
+        idempotent requests are retried.
+        """
+        if idempotent is None:
+            idempotent = method != "POST"
+        headers = {"X-API-Key": self.api_key, "Accept": "application/json"}
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+
+        attempts = self.retries + 1 if idempotent else 1
+        for attempt in range(attempts):
+            if self.limiter is not None:
+                self.limiter.acquire()
+            delay = self.backoff * 2 ** attempt
+            try:
+                status, reason, payload, retry_after = self._send(
+                    method, path, data, headers, idempotent
+                )
+            except (OSError, http.client.HTTPException):
+                if attempt == attempts - 1:
+                    raise
+                time.sleep(delay)
+                continue
+            if status in self.RETRY_STATUSES and attempt < attempts - 1:
+                if retry_after and retry_after.isdigit():
+                    delay = max(delay, int(retry_after))
+                time.sleep(delay)
+                continue
+            break
+
+        if status >= 400:
+            try:
+                message = json.loads(payload).get("error", "")
+            except ValueError:
+                message = payload.decode(errors="replace")
+            raise PowerDNSAPIError(status, message or reason)
+        if not payload:
+            return None
+        return json.loads(payload)
+
+    def zone_path(self, zone: str) -> str:
+        return f"/api/v1/servers/{self.server_id}/zones/{quote(to_api_name(zone))}"
+
+    def get_zone(self, zone: str) -> Optional[Dict[str, Any]]:
+        """Zone with its RRsets, or None if the server does not have it."""
+        try:
+            return self.request("GET", self.zone_path(zone))
+        except PowerDNSAPIError as e:
+            # Older releases answer 422 for unknown zones
+            if e.status in (404, 422):
+                return None
+            raise
+
+    def patch_zone(self, zone: str, rrsets: List[Dict[str, Any]]) -> None:
+        self.request("PATCH", self.zone_path(zone), {"rrsets": rrsets})
+
+
+def to_api_name(name: str) -> str:
+    return name if name.endswith(".") else name + "."
+
+
+def api_content(rtype: str, content: str) -> str:
+    """Record content in API form (absolute names with a trailing dot)."""
+    indexes = NAME_FIELDS.get(rtype)
+    if not indexes:
+        return content
+    fields = content.split()
+    for index in indexes:
+        fields[index] = to_api_name(fields[index])
+    return " ".join(fields)
+
+
+def db_content(rtype: str, content: str) -> str:
+    """Record content in the form parse_zone() produces."""
+    indexes = NAME_FIELDS.get(rtype)
+    if not indexes:
+        return content
+    fields = content.split()
+    for index in indexes:
+        fields[index] = fields[index].rstrip(".").lower()
+    return " ".join(fields)
+
+
+def live_rrsets(api_zone: Dict[str, Any]) -> RRsets:
+    """Enabled records of an API zone, grouped like group_rrsets()."""
+    return group_rrsets(
+        [
+            (rrset["name"].rstrip(".").lower(), rrset["type"], db_content(rrset["type"], record["content"]), rrset["ttl"])
+            for rrset in api_zone.get("rrsets", [])
+            for record in rrset.get("records", [])
+            if not record.get("disabled")
+        ]
+    )
+
+
+def api_rrset(key: Tuple[str, str], rrset: Optional[List[Tuple[str, int]]]) -> Dict[str, Any]:
+    """PATCH entry replacing an RRset (or deleting it when rrset is None)."""
+    name, rtype = key
+    if rrset is None:
+        return {"name": to_api_name(name), "type": rtype, "changetype": "DELETE"}
+    return {
+        "name": to_api_name(name),
+        "type": rtype,
+        "ttl": rrset[0][1],
+        "changetype": "REPLACE",
+        "records": [
+            {"content": api_content(rtype, content), "disabled": False} for content, _ in rrset
+        ],
+    }
+
+
+class ZonePublisher:
+    """Pushes the RRset differences between rendered and live zones."""
+
+    def __init__(self, api: PowerDNSAPI, prune: bool = False):
+        self.api = api
+        self.prune = prune
+
+    def publish(self, zone: Zone, dry_run: bool = False) -> Dict[str, Any]:
+        """
+        Bring one zone up to date.
+
+        Returns the number of RRsets replaced and deleted (SOA included),
+        the resulting serial, the number of unmanaged RRsets and whether the
+        zone was missing on the server.
+        """
+        live = self.api.get_zone(zone.name)
+        if live is None:
+            return {"missing": True, "replaced": 0, "deleted": 0, "serial": None, "unmanaged": 0}
+
+        current = live_rrsets(live)
+        wanted = group_rrsets(zone.records)
+        changed, unmanaged = diff_rrsets(current, wanted, self.prune)
+        soa = [key for key in current if key[1] == "SOA"]
+        serial = soa_serial(current[soa[0]][0][0]) if soa else None
+        # What differs, SOA included when more than its serial changed
+        changes = [f"{name}/{rtype}" for name, rtype in changed]
+        if changed:
+            serial = bump_serial(current, wanted)
+            changed += [key for key in wanted if key[1] == "SOA" and key not in changed]
+            patch = [api_rrset(key, wanted.get(key)) for key in changed]
+            if not dry_run:
+                self.api.patch_zone(zone.name, patch)
+        return {
+            "missing": False,
+            "replaced": sum(1 for key in changed if key in wanted),
+            "deleted": sum(1 for key in changed if key not in wanted),
+            "serial": serial,
+            "unmanaged": len(unmanaged) if not self.prune else 0,
+            "changes": changes,
+        }
+
+
+class RRsetBatcher:
+    """
+    Coalesces RRset changes into few PATCH requests.
+
+    Changes are collected per zone; a later change to the same (name, type)
+    replaces an earlier pending one. A zone's pending changes are sent as
+    one PATCH once batch_size RRsets have collected (and by flush()), on up
+    to `concurrency` worker threads. A batch waits for any in-flight batch
+    of the same zone that touches the same RRsets, so changes to one RRset
+    are applied in the order they were added.
+    """
+
+    def __init__(self, api: PowerDNSAPI, batch_size: int = 500, concurrency: int = 4, dry_run: bool = False):
+        self.api = api
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.executor = ThreadPoolExecutor(max_workers=max(concurrency, 1))
+        self.pending: Dict[str, Dict[Tuple[str, str], Dict[str, Any]]] = {}
+        self.in_flight: Dict[str, List[Tuple[Set[Tuple[str, str]], "Future[None]"]]] = {}
+        self.patches = 0
+        self.rrsets = 0
+        self.errors: List[str] = []
+
+    def add(self, zone: str, change: Dict[str, Any]) -> None:
+        """Queue one API rrset change (REPLACE or DELETE) for a zone."""
+        zone = to_api_name(zone)
+        pending = self.pending.setdefault(zone, {})
+        pending[(to_api_name(change["name"]), change["type"])] = change
+        if len(pending) >= self.batch_size:
+            self._submit(zone)
+
+    def extend(self, zone: str, changes: Iterable[Dict[str, Any]]) -> None:
+        for change in changes:
+            self.add(zone, change)
+
+    def _patch(self, zone: str, rrsets: List[Dict[str, Any]]) -> None:
+        if not self.dry_run:
+            self.api.patch_zone(zone, rrsets)
+
+    def _submit(self, zone: str) -> None:
+        batch = self.pending.pop(zone, {})
+        if not batch:
+            return
+        keys = set(batch)
+        running = []
+        for batch_keys, future in self.in_flight.get(zone, []):
+            if future.done():
+                self._collect(zone, future)
+            elif batch_keys & keys:
+                # exception() waits for the batch to finish
+                future.exception()
+                self._collect(zone, future)
+            else:
+                running.append((batch_keys, future))
+        future = self.executor.submit(self._patch, zone, list(batch.values()))
+        running.append((keys, future))
+        self.in_flight[zone] = running
+        self.patches += 1
+        self.rrsets += len(batch)
+
+    def _collect(self, zone: str, future: "Future[None]") -> None:
+        error = future.exception()
+        if error is not None:
+            self.errors.append(f"{zone}: {error}")
+
+    def flush(self) -> Dict[str, Any]:
+        """Send everything pending, wait for all PATCHes and return counts and errors."""
+        for zone in list(self.pending):
+            self._submit(zone)
+        for zone, running in self.in_flight.items():
+            for _, future in running:
+                future.exception()
+                self._collect(zone, future)
+        self.in_flight = {}
+        return {"patches": self.patches, "rrsets": self.rrsets, "errors": list(self.errors)}
+
+    def close(self) -> None:
+        self.flush()
+        self.executor.shutdown()
+
+    def __enter__(self) -> "RRsetBatcher":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""
+PowerDNS API Stand-in
+
+An in-memory imitation of the parts of the PowerDNS authoritative API that
+pdns_api.py uses (GET/PATCH /api/v1/servers/localhost/zones/<zone>), for
+testing zone publishing without a PowerDNS server:
+
+  - X-API-Key is required
+  - zones are loaded from rendered zone files (--load DIR, <zone>.zone)
+  - PATCH applies REPLACE/DELETE changetypes; when a PATCH changes
+    something but carries no SOA, the serial is increased the way
+    SOA-EDIT-API=DEFAULT does
+  - GET /standin/patches returns every PATCH received, with the serial it
+    produced, so tests can check what was sent
+  - --fail-every N answers every Nth API request with 503 before looking
+    at it, and --delay adds latency to each one, for testing retries and
+    concurrency; GET /standin/stats counts requests, connections, injected
+    failures, DNS queries and the most requests handled at once
+  - --dns-port serves the zones over UDP, and each --secondary-delay adds a
+    secondary on the following ports that picks up a changed zone that
+    many seconds after the PATCH (standing in for NOTIFY and transfer)
+
+Usage:
+  ./pdns_api_standin.py --load ../zones --port 18081 --api-key test
+  ./pdns_api_standin.py --load ../zones --dns-port 15300 --secondary-delay 0.2,1.5
+"""
+
+import argparse
+import json
+import re
+import socketserver
+import struct
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import unquote
+
+from dns_wire import Record, build_response, parse_query
+from pdns_api import api_content, to_api_name
+from pdns_sqlite import next_serial, parse_zone, soa_serial, with_serial
+
+ZONE_PATH_RE = re.compile(r"^/api/v1/servers/localhost/zones/([^/]+)$")
+
+RRsetMap = Dict[Tuple[str, str], Dict[str, Any]]
+
+
+def zone_serial(zone: str, rrsets: Optional[RRsetMap]) -> int:
+    soa = (rrsets or {}).get((zone, "SOA"))
+    return soa_serial(soa["records"][0]["content"]) if soa else -1
+
+
+class ZoneStore:
+    """Zones keyed by API name: {(name, type): {"ttl": int, "records": [...]}}"""
+
+    def __init__(self) -> None:
+        self.zones: Dict[str, RRsetMap] = {}
+        self.patches: List[Dict[str, Any]] = []
+        self.lock = threading.Lock()
+        # Called with (zone, rrsets) after every PATCH
+        self.on_change: List[Callable[[str, RRsetMap], None]] = []
+
+    def load_dir(self, directory: Path) -> None:
+        for path in sorted(Path(directory).glob("*.zone")):
+            zone = path.name[: -len(".zone")]
+            rrsets: Dict[Tuple[str, str], Dict[str, Any]] = {}
+            for record in parse_zone(path.read_text(), zone):
+                rrset = rrsets.setdefault(
+                    (to_api_name(record.name), record.type), {"ttl": record.ttl, "records": []}
+                )
+                rrset["records"].append(
+                    {"content": api_content(record.type, record.content), "disabled": False}
+                )
+            self.zones[to_api_name(zone)] = rrsets
+
+    def soa_key(self, zone: str) -> Tuple[str, str]:
+        return (zone, "SOA")
+
+    def serial(self, zone: str) -> Optional[int]:
+        serial = zone_serial(zone, self.zones[zone])
+        return serial if serial >= 0 else None
+
+    def to_json(self, zone: str) -> Dict[str, Any]:
+        return {
+            "id": zone,
+            "name": zone,
+            "kind": "Master",
+            "serial": self.serial(zone),
+            "rrsets": [
+                {"name": name, "type": rtype, "ttl": rrset["ttl"], "records": rrset["records"]}
+                for (name, rtype), rrset in sorted(self.zones[zone].items())
+            ],
+        }
+
+    def patch(self, zone: str, rrsets: List[Dict[str, Any]]) -> None:
+        """Apply a PATCH; raises ValueError for malformed changes (nothing is applied)."""
+        records = dict(self.zones[zone])
+        changed = False
+        for change in rrsets:
+            name, rtype = change.get("name", ""), change.get("type", "")
+            if not name.endswith(".") or not (name == zone or name.endswith("." + zone)):
+                raise ValueError(f"RRset {name} IN {rtype}: Name is out of zone")
+            key = (name, rtype)
+            changetype = change.get("changetype", "").upper()
+            if changetype == "DELETE":
+                changed |= records.pop(key, None) is not None
+            elif changetype == "REPLACE":
+                if "ttl" not in change or "records" not in change:
+                    raise ValueError(f"RRset {name} IN {rtype}: ttl and records are required")
+                new = {"ttl": change["ttl"], "records": change["records"]}
+                if not new["records"]:
+                    changed |= records.pop(key, None) is not None
+                elif records.get(key) != new:
+                    records[key] = new
+                    changed = True
+            else:
+                raise ValueError(f"Changetype not understood: {changetype}")
+
+        soa_key = self.soa_key(zone)
+        soa_in_patch = any((c["name"], c["type"]) == soa_key for c in rrsets)
+        if changed and not soa_in_patch and soa_key in records:
+            # SOA-EDIT-API=DEFAULT
+            soa = records[soa_key]
+            content = soa["records"][0]["content"]
+            records[soa_key] = {
+                "ttl": soa["ttl"],
+                "records": [
+                    {"content": with_serial(content, next_serial(soa_serial(content))), "disabled": False}
+                ],
+            }
+        # The zone's dict is replaced, never changed in place, so readers
+        # (DNS threads, secondaries) can hold on to a snapshot
+        self.zones[zone] = records
+        self.patches.append({"zone": zone, "rrsets": rrsets, "serial": self.serial(zone)})
+        for callback in self.on_change:
+            callback(zone, records)
+
+
+class Secondary:
+    """Copy of a store's zones that takes each change `delay` seconds after the PATCH."""
+
+    def __init__(self, store: ZoneStore, delay: float):
+        self.zones: Dict[str, RRsetMap] = dict(store.zones)
+        self.delay = delay
+        store.on_change.append(self.notify)
+
+    def notify(self, zone: str, rrsets: RRsetMap) -> None:
+        timer = threading.Timer(self.delay, self.transfer, (zone, rrsets))
+        timer.daemon = True
+        timer.start()
+
+    def transfer(self, zone: str, rrsets: RRsetMap) -> None:
+        # A late transfer never replaces a newer copy
+        if zone_serial(zone, rrsets) >= zone_serial(zone, self.zones.get(zone)):
+            self.zones[zone] = rrsets
+
+
+class DNSHandler(socketserver.BaseRequestHandler):
+    server: "DNSStandin"
+
+    def handle(self) -> None:
+        data, sock = self.request
+        if self.server.count:
+            self.server.count("dns_queries")
+        try:
+            reply = self.server.answer(data)
+        except (ValueError, struct.error, IndexError):
+            return
+        sock.sendto(reply, self.client_address)
+
+
+class DNSStandin(socketserver.ThreadingUDPServer):
+    """Authoritative UDP answers from the zones of a ZoneStore or Secondary (no wildcards or LUA)."""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], source: Any, count: Optional[Callable[[str], int]] = None):
+        super().__init__(address, DNSHandler)
+        self.source = source
+        self.count = count
+
+    def answer(self, query: bytes) -> bytes:
+        _, _, qname, qtype, _ = parse_query(query)
+        qname = qname.lower()
+        zones: Dict[str, RRsetMap] = self.source.zones
+        zone = max(
+            (z for z in list(zones) if qname == z or qname.endswith("." + z)), key=len, default=None
+        )
+        if zone is None:
+            return build_response(query, 5, authoritative=False)  # REFUSED
+        rrsets = zones[zone]
+        rrset = rrsets.get((qname, qtype))
+        if rrset is None:
+            exists = any(name == qname for name, _ in rrsets)
+            return build_response(query, 0 if exists else 3)  # NODATA / NXDOMAIN
+        answers = [
+            Record(qname, qtype, rrset["ttl"], record["content"])
+            for record in rrset["records"]
+            if not record.get("disabled")
+        ]
+        return build_response(query, 0, answers)
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "StandinServer"
+
+    def setup(self) -> None:
+        super().setup()
+        self.server.count("connections")
+
+    def log_message(self, format: str, *args: Any) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status: int, body: Any = None) -> None:
+        payload = b"" if body is None else json.dumps(body).encode()
+        self.send_response(status)
+        if body is not None:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _body(self) -> Any:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"null")
+
+    def _zone(self, fail: bool = False) -> Optional[str]:
+        """Zone named by the path, after checking the API key; None if a reply was sent."""
+        if fail:
+            self._send(503, {"error": "Injected failure"})
+            return None
+        if self.headers.get("X-API-Key") != self.server.api_key:
+            self._send(401, {"error": "Unauthorized"})
+            return None
+        match = ZONE_PATH_RE.match(self.path)
+        if match is None:
+            self._send(404, {"error": "Not Found"})
+            return None
+        zone = to_api_name(unquote(match.group(1)).lower())
+        if zone not in self.server.store.zones:
+            self._send(404, {"error": "Could not find domain '%s'" % zone})
+            return None
+        return zone
+
+    def do_GET(self) -> None:
+        store = self.server.store
+        if self.path == "/standin/patches":
+            with store.lock:
+                self._send(200, store.patches)
+            return
+        if self.path == "/standin/stats":
+            with self.server.stats_lock:
+                self._send(200, self.server.stats)
+            return
+        with self.server.handling() as fail:
+            zone = self._zone(fail)
+            if zone is not None:
+                with store.lock:
+                    self._send(200, store.to_json(zone))
+
+    def do_PATCH(self) -> None:
+        store = self.server.store
+        try:
+            body = self._body()
+        except ValueError:
+            self._send(400, {"error": "Request body is not valid JSON"})
+            return
+        with self.server.handling() as fail:
+            zone = self._zone(fail)
+            if zone is None:
+                return
+            try:
+                with store.lock:
+                    store.patch(zone, (body or {}).get("rrsets", []))
+            except (ValueError, KeyError, TypeError) as e:
+                self._send(422, {"error": str(e)})
+                return
+            self._send(204)
+
+
+class StandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: Tuple[str, int],
+        api_key: str,
+        store: ZoneStore,
+        verbose: bool = False,
+        fail_every: int = 0,
+        delay: float = 0.0,
+    ):
+        super().__init__(address, StandinHandler)
+        self.api_key = api_key
+        self.store = store
+        self.verbose = verbose
+        self.fail_every = fail_every
+        self.delay = delay
+        self.stats = {
+            "connections": 0,
+            "requests": 0,
+            "failures": 0,
+            "in_flight": 0,
+            "max_in_flight": 0,
+            "dns_queries": 0,
+        }
+        self.stats_lock = threading.Lock()
+
+    def count(self, key: str, n: int = 1) -> int:
+        with self.stats_lock:
+            self.stats[key] += n
+            return self.stats[key]
+
+    @contextmanager
+    def handling(self) -> Iterator[bool]:
+        """Count an API request while it is handled; yields whether to fail it."""
+        with self.stats_lock:
+            self.stats["requests"] += 1
+            fail = self.fail_every > 0 and self.stats["requests"] % self.fail_every == 0
+            self.stats["failures"] += fail
+            self.stats["in_flight"] += 1
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.stats["in_flight"])
+        try:
+            if self.delay:
+                time.sleep(self.delay)
+            yield fail
+        finally:
+            self.count("in_flight", -1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="In-memory stand-in for the PowerDNS API")
+    parser.add_argument("--load", type=Path, required=True, help="Directory of <zone>.zone files")
+    parser.add_argument("--address", default="127.0.0.1", help="Listen address (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=18081, help="Listen port, 0 for any (default: 18081)")
+    parser.add_argument("--api-key", default="test", help="Expected X-API-Key (default: test)")
+    parser.add_argument(
+        "--fail-every", type=int, default=0, help="Answer every Nth API request with 503 (default: never)"
+    )
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds to wait before each API reply")
+    parser.add_argument("--dns-port", type=int, default=0, help="Serve the zones over UDP on this port")
+    parser.add_argument(
+        "--secondary-delay",
+        default="",
+        help="Comma-separated transfer delays in seconds; one secondary per value on the ports after --dns-port",
+    )
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log requests")
+    args = parser.parse_args()
+
+    store = ZoneStore()
+    store.load_dir(args.load)
+    if not store.zones:
+        print(f"Error: no .zone files in {args.load}")
+        sys.exit(1)
+
+    server = StandinServer(
+        (args.address, args.port), args.api_key, store, args.verbose, args.fail_every, args.delay
+    )
+    delays = [float(value) for value in args.secondary_delay.split(",") if value]
+    if delays and not args.dns_port:
+        print("Error: --secondary-delay needs --dns-port")
+        sys.exit(1)
+    if args.dns_port:
+        sources: List[Any] = [store] + [Secondary(store, delay) for delay in delays]
+        for number, source in enumerate(sources):
+            dns = DNSStandin((args.address, args.dns_port + number), source, server.count)
+            threading.Thread(target=dns.serve_forever, daemon=True).start()
+            role = f"secondary, {source.delay}s behind" if number else "primary"
+            print(f"DNS on {args.address}:{args.dns_port + number} ({role})", flush=True)
+    print(f"Listening on http://{args.address}:{server.server_address[1]} ({len(store.zones)} zones)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+PowerDNS Override Import/Export
+
+Overrides are RRsets added through the PowerDNS API on top of the zone
+template (see docs/DNS_API.md), e.g. an A record for
+ipshow.app.runonflux.io that takes precedence over the wildcard LUA CNAME.
+This tool moves them in bulk as JSON Lines, one RRset per line:
+
+  {"name": "ipshow", "type": "A", "ttl": 300, "records": ["1.2.3.4"]}
+  {"name": "web.app.runonflux.io.", "type": "A", "ttl": 60, "records": ["192.0.2.7", "192.0.2.8"]}
+  {"name": "oldapp", "type": "A", "changetype": "DELETE"}
+
+Names without a trailing dot are relative to --zone; "content" may stand
+in for a one-record "records" list, and "ttl" defaults to --ttl.
+
+export  writes every RRset of the zone that is not part of the zone
+        rendered from vars.yaml, in the import format
+import  checks every line first, so a malformed file sends nothing, then
+        streams it line by line into RRsetBatcher (pdns_api.py): changes
+        are coalesced into PATCHes of --batch-size RRsets, sent over a
+        pool of --concurrency keep-alive connections, at most --rate
+        requests per second, with retries
+
+The import is not atomic across PATCHes: one that still fails after its
+retries is reported while the others stay applied. Every line is a
+REPLACE or DELETE of a whole RRset, so running the same file again
+resumes it.
+
+Usage:
+  ./pdns_overrides.py export > overrides.jsonl
+  ./pdns_overrides.py import overrides.jsonl --zone app2.runonflux.io
+  ./pdns_overrides.py import overrides.jsonl --batch-size 1000 --concurrency 8 --rate 20
+  ./pdns_overrides.py import - --dry-run < overrides.jsonl
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import IO, Any, Dict, Iterable, Iterator, Optional, Set, Tuple
+
+import yaml
+
+from generate_zone import ENVIRONMENTS, build_db_zone
+from pdns_api import PowerDNSAPI, PowerDNSAPIError, RRsetBatcher, to_api_name
+
+DEFAULT_API_URL = "http://127.0.0.1:8081"
+
+
+def absolute_name(name: str, zone: str) -> str:
+    """API form of a name relative to the zone (or already absolute)."""
+    name = name.strip().lower()
+    if name.endswith("."):
+        return name
+    if name in ("", "@"):
+        return to_api_name(zone)
+    return to_api_name(f"{name}.{zone}")
+
+
+def parse_change(line: str, zone: str, default_ttl: int) -> Dict[str, Any]:
+    """One JSONL line as an API rrset change."""
+    item = json.loads(line)
+    if not isinstance(item, dict) or "name" not in item or "type" not in item:
+        raise ValueError("name and type are required")
+    name = absolute_name(item["name"], zone)
+    if name != to_api_name(zone) and not name.endswith("." + to_api_name(zone)):
+        raise ValueError(f"{name} is not in zone {zone}")
+    rtype = item["type"].upper()
+    changetype = item.get("changetype", "REPLACE").upper()
+    if changetype == "DELETE":
+        return {"name": name, "type": rtype, "changetype": "DELETE"}
+    if changetype != "REPLACE":
+        raise ValueError(f"unknown changetype {changetype}")
+    records = item.get("records")
+    if records is None and "content" in item:
+        records = [item["content"]]
+    if not records:
+        raise ValueError("records (or content) is required for REPLACE")
+    return {
+        "name": name,
+        "type": rtype,
+        "ttl": int(item.get("ttl", default_ttl)),
+        "changetype": "REPLACE",
+        "records": [{"content": str(content), "disabled": False} for content in records],
+    }
+
+
+def read_changes(lines: Iterable[str], zone: str, default_ttl: int) -> Iterator[Dict[str, Any]]:
+    """Stream changes from JSONL; blank lines and # comments are skipped."""
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            yield parse_change(line, zone, default_ttl)
+        except (ValueError, TypeError, KeyError) as e:
+            raise ValueError(f"line {number}: {e}") from None
+
+
+def export_overrides(api: PowerDNSAPI, zone: str, template: Set[Tuple[str, str]], out: IO[str]) -> int:
+    """Write the zone's RRsets that are not in the template as JSONL; returns the count."""
+    live = api.get_zone(zone)
+    if live is None:
+        raise PowerDNSAPIError(404, f"zone {zone} not found")
+    count = 0
+    for rrset in live.get("rrsets", []):
+        name = rrset["name"].rstrip(".").lower()
+        if (name, rrset["type"]) in template:
+            continue
+        records = [record["content"] for record in rrset.get("records", []) if not record.get("disabled")]
+        if not records:
+            continue
+        relative = name[: -len(zone) - 1] if name.endswith("." + zone) else "@"
+        out.write(
+            json.dumps({"name": relative, "type": rrset["type"], "ttl": rrset["ttl"], "records": records})
+            + "\n"
+        )
+        count += 1
+    return count
+
+
+def find_zone(config: Dict[str, Any], zone: Optional[str]) -> Tuple[str, Dict[str, Any]]:
+    """(environment, zone_config) of the zone, or of the production app zone by default."""
+    candidates = [
+        (environment, zone_config)
+        for environment in reversed(ENVIRONMENTS)
+        for zone_config in config["powerdns"][environment].get("zone_configs", [])
+        if (zone is None and zone_config.get("type") == "app") or zone_config["domain"] == zone
+    ]
+    if not candidates:
+        print(f"Error: zone {zone or '(app zone)'} not found in vars.yaml")
+        sys.exit(1)
+    return candidates[0]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bulk import/export of PowerDNS API overrides (JSONL)")
+    parser.add_argument("command", choices=["export", "import"], help="Direction")
+    parser.add_argument("file", nargs="?", default="-", help="JSONL file ('-' for stdin/stdout, the default)")
+    parser.add_argument("--zone", help="Zone (default: the production app zone)")
+    parser.add_argument(
+        "--api",
+        default=os.environ.get("PDNS_API_URL", DEFAULT_API_URL),
+        help=f"PowerDNS API URL (default: $PDNS_API_URL or {DEFAULT_API_URL})",
+    )
+    parser.add_argument("--api-key", help="API key (default: $PDNS_API_KEY, then api_key from vars.yaml)")
+    parser.add_argument("--ttl", type=int, default=300, help="TTL for lines without one (default: 300)")
+    parser.add_argument("--batch-size", type=int, default=500, help="RRsets per PATCH (default: 500)")
+    parser.add_argument(
+        "--concurrency", type=int, default=4, help="Connections / PATCHes in flight (default: 4)"
+    )
+    parser.add_argument(
+        "--rate", type=float, default=0, help="Maximum requests per second (default: unlimited)"
+    )
+    parser.add_argument("--retries", type=int, default=3, help="Retries per request (default: 3)")
+    parser.add_argument("--dry-run", action="store_true", help="Import: validate and count, send nothing")
+    parser.add_argument(
+        "-c",
+        "--config",
+        help="Configuration file path (default: ../vars.yaml from script location)",
+    )
+    args = parser.parse_args()
+
+    config_path = args.config or Path(__file__).parent.parent / "vars.yaml"
+    with open(config_path, "r") as f:
+        config = yaml.safe_load(f)
+    environment, zone_config = find_zone(config, args.zone)
+    zone = zone_config["domain"]
+    api_key = args.api_key or os.environ.get("PDNS_API_KEY") or config["powerdns"][environment].get("api_key")
+
+    api = PowerDNSAPI(
+        args.api, api_key, pool_size=args.concurrency, rate=args.rate, retries=args.retries
+    )
+    with api:
+        if args.command == "export":
+            template = {
+                (record.name, record.type)
+                for record in build_db_zone(zone_config, environment, config, "master").records
+            }
+            out = sys.stdout if args.file == "-" else open(args.file, "w")
+            try:
+                count = export_overrides(api, zone, template, out)
+            except (PowerDNSAPIError, OSError) as e:
+                print(f"Error exporting {zone}: {e}", file=sys.stderr)
+                sys.exit(1)
+            finally:
+                if out is not sys.stdout:
+                    out.close()
+            print(f"Exported {count} override RRset(s) from {zone}", file=sys.stderr)
+            return
+
+        if args.file == "-":
+            # Keep stdin so it can be read twice: checked first, imported second
+            source: IO[str] = tempfile.TemporaryFile("w+")
+            shutil.copyfileobj(sys.stdin, source)
+            source.seek(0)
+        else:
+            source = open(args.file, "r")
+        try:
+            try:
+                lines = sum(1 for _ in read_changes(source, zone, args.ttl))
+            except ValueError as e:
+                print(f"Error: {e} (nothing was sent)")
+                sys.exit(1)
+            source.seek(0)
+            started = time.perf_counter()
+            batcher = RRsetBatcher(api, args.batch_size, args.concurrency, args.dry_run)
+            for change in read_changes(source, zone, args.ttl):
+                batcher.add(zone, change)
+        finally:
+            source.close()
+        result = batcher.flush()
+        batcher.close()
+        elapsed = time.perf_counter() - started
+
+    action = "Validated" if args.dry_run else "Imported"
+    print(
+        f"{action} {lines} change(s) into {zone}: {result['rrsets']} RRset(s) "
+        f"in {result['patches']} PATCH(es), {elapsed:.1f}s"
+    )
+    if result["errors"]:
+        for error in result["errors"]:
+            print(f"Error: {error}")
+        print("The other PATCHes were applied; import the same file again to resume")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
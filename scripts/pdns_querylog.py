@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+PowerDNS Query Log Reader
+
+Parses the lines PowerDNS writes with ``log-dns-queries=yes`` (see
+templates/pdns.conf.j2) from the plain and gzip-rotated files under
+/var/log/pdns/ (see files/pdns_logrotate.conf), e.g.:
+
+  Oct 16 12:00:01 pdns1 pdns_server[812]: Remote 192.0.2.10 wants 'myapp.app.runonflux.io|A', do = 0, bufsize = 1232: packetcache MISS
+  2026-10-16T12:00:01.250+00:00 pdns1 pdns_server[812]: Remote 192.0.2.10<-198.51.100.0/24 wants 'cdn-geo.runonflux.io|A', ...
+
+Both traditional and RFC 3339 syslog timestamps are understood. Lines
+that are not query log lines are skipped.
+
+Files are never read into memory whole: plain files are mmapped and
+scanned in place, gzip files are decompressed in BLOCK_SIZE blocks, and
+the query regex runs over whole buffers rather than line by line. Plain
+files can be split into line-aligned byte ranges (split_log) so several
+processes can scan one large file (see analyze_querylog.py).
+"""
+
+import gzip
+import mmap
+import os
+import re
+from datetime import datetime
+from pathlib import Path
+from typing import IO, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+Buffer = Union[bytes, mmap.mmap]
+
+QUERY_RE = re.compile(
+    rb"Remote (?P<remote>[^ \n]+?)(?:<-(?P<ecs>[^ \n]+))? wants '(?P<qname>[^|'\n]*)\|(?P<qtype>[^'\n]+)'"
+)
+ISO_TS_RE = re.compile(rb"^(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d(?:\.\d+)?)([+-]\d\d:?\d\d|Z)?")
+SYSLOG_TS_RE = re.compile(rb"^([A-Z][a-z]{2} [ \d]\d \d\d:\d\d:\d\d)")
+
+# Decompressed bytes scanned at a time for gzip files
+BLOCK_SIZE = 16 << 20
+# Enough of a line to hold either timestamp format
+TIMESTAMP_BYTES = 40
+
+
+class QueryLogEntry(NamedTuple):
+    timestamp: float
+    remote: str
+    ecs: Optional[str]
+    qname: str
+    qtype: str
+
+
+class TimestampParser:
+    """Parses syslog timestamps, caching the last one (log lines arrive in order)."""
+
+    def __init__(self, year: Optional[int] = None):
+        self.year = year or datetime.now().year
+        self._last_raw = b""
+        self._last_value = 0.0
+
+    def __call__(self, line: bytes) -> float:
+        match = ISO_TS_RE.match(line)
+        if match:
+            raw = match.group(0)
+            if raw != self._last_raw:
+                text = raw.decode()
+                if text.endswith("Z"):
+                    text = text[:-1] + "+00:00"
+                self._last_raw = raw
+                self._last_value = datetime.fromisoformat(text).timestamp()
+            return self._last_value
+
+        match = SYSLOG_TS_RE.match(line)
+        if match:
+            raw = match.group(1)
+            if raw != self._last_raw:
+                self._last_raw = raw
+                self._last_value = datetime.strptime(
+                    "%d %s" % (self.year, raw.decode()), "%Y %b %d %H:%M:%S"
+                ).timestamp()
+            return self._last_value
+        return 0.0
+
+
+def is_gzip(path: Path) -> bool:
+    with open(path, "rb") as f:
+        return f.read(2) == b"\x1f\x8b"
+
+
+def open_log(path: Path) -> IO[bytes]:
+    """Open a plain or gzip-compressed log file for binary reading."""
+    if is_gzip(path):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def split_log(path: Path, part_size: int) -> List[Tuple[int, Optional[int]]]:
+    """
+    Split a log into (start, end) byte ranges of about part_size bytes.
+
+    Ranges of plain files end on line boundaries; gzip files cannot be
+    split and are returned as one range.
+    """
+    size = os.path.getsize(path)
+    if size <= part_size or is_gzip(path):
+        return [(0, None)]
+    ranges: List[Tuple[int, Optional[int]]] = []
+    with open(path, "rb") as f:
+        start = 0
+        while start < size:
+            f.seek(min(start + part_size, size))
+            f.readline()
+            end = min(f.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def iter_log_buffers(
+    path: Path, start: int = 0, end: Optional[int] = None, block_size: int = BLOCK_SIZE
+) -> Iterator[Tuple[Buffer, int, int]]:
+    """
+    Yield (buffer, pos, endpos) spans of whole lines from a log file.
+
+    A plain file is mmapped and its [start, end) range yielded as one span;
+    a gzip file is decompressed block by block, each block cut after its
+    last newline. Spans are only valid until the next one is requested.
+    """
+    if is_gzip(path):
+        with gzip.open(path, "rb") as f:
+            rest = b""
+            while True:
+                block = f.read(block_size)
+                if not block:
+                    break
+                cut = block.rfind(b"\n") + 1
+                if cut == 0:
+                    rest += block
+                    continue
+                buffer = rest + block[:cut]
+                rest = block[cut:]
+                yield buffer, 0, len(buffer)
+            if rest:
+                yield rest, 0, len(rest)
+        return
+
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        end = size if end is None else min(end, size)
+        if end <= start:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if hasattr(mapped, "madvise"):
+                mapped.madvise(mmap.MADV_SEQUENTIAL)
+            yield mapped, start, end
+
+
+def rotation_index(path: Path) -> int:
+    """Rotation number of a logrotate file: pdns.log -> 0, pdns.log.3.gz -> 3."""
+    for suffix in reversed(path.name.split(".")):
+        if suffix.isdigit():
+            return int(suffix)
+        if suffix not in ("gz",):
+            break
+    return 0
+
+
+def sort_rotated(paths: Iterable[Path]) -> List[Path]:
+    """Order rotated logs oldest first (pdns.log.7.gz ... pdns.log.1, pdns.log)."""
+    return sorted((Path(p) for p in paths), key=lambda p: (-rotation_index(p), str(p)))
+
+
+def line_start(buffer: Buffer, pos: int, offset: int) -> int:
+    """Offset of the start of the line containing offset, not before pos."""
+    return max(buffer.rfind(b"\n", pos, offset) + 1, pos)
+
+
+def iter_queries(paths: Iterable[Path], year: Optional[int] = None) -> Iterator[QueryLogEntry]:
+    """Stream query log entries from rotated logs in chronological order."""
+    parse_timestamp = TimestampParser(year)
+    for path in sort_rotated(paths):
+        for buffer, pos, endpos in iter_log_buffers(path):
+            for match in QUERY_RE.finditer(buffer, pos, endpos):
+                start = line_start(buffer, pos, match.start())
+                ecs = match.group("ecs")
+                yield QueryLogEntry(
+                    parse_timestamp(buffer[start : start + TIMESTAMP_BYTES]),
+                    match.group("remote").decode(),
+                    ecs.decode() if ecs else None,
+                    match.group("qname").decode("ascii", "replace"),
+                    match.group("qtype").decode(),
+                )
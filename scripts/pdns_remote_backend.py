@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+PowerDNS Remote Backend for App Routing
+
+Answers the wildcard CNAMEs for *.app.runonflux.io / *.app2.runonflux.io
+over the PowerDNS remote backend JSON protocol, as an alternative to the
+per-query Lua of the compiled app_routing.<zone>.lua modules. The routing table is compiled once from
+vars.yaml at startup (see app_routing.py) and every answer is kept,
+already serialized, in a bounded LRU of recent (qname, qtype) pairs. All
+connections are served from a single asyncio event loop.
+
+PowerDNS configuration (unix socket, one request per line):
+  launch=remote
+  remote-connection-string=unix:path=/var/run/pdns/app-routing.sock
+
+PowerDNS configuration (HTTP, JSON body):
+  launch=remote
+  remote-connection-string=http:url=http://127.0.0.1:8053/dnsapi,post=1,post_json=1
+
+Usage:
+  ./pdns_remote_backend.py --socket /var/run/pdns/app-routing.sock
+  ./pdns_remote_backend.py --http 127.0.0.1:8053
+  ./pdns_remote_backend.py --environment production --cache-size 200000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import yaml
+
+from app_routing import ENVIRONMENTS, AppTable, find_table, load_routing_tables
+
+RESULT_FALSE = b'{"result":false}\n'
+RESULT_TRUE = b'{"result":true}\n'
+RESULT_EMPTY = b'{"result":[]}\n'
+
+
+class AppRoutingBackend:
+    """
+    Remote backend request handler.
+
+    ``handle`` takes one raw JSON request and returns the raw JSON reply,
+    terminated by a newline, so the transports only move bytes around.
+    """
+
+    def __init__(self, config: Dict[str, Any], environments: List[str], cache_size: int):
+        self.tables = load_routing_tables(config, environments)
+        self.zone_records: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+        serial = datetime.now().strftime("%Y%m%d00")
+
+        for environment in environments:
+            env_config = config["powerdns"][environment]
+            for zone, table in self.tables.items():
+                if table.environment != environment:
+                    continue
+                ttl = int(self._template_vars(env_config, zone).get("default_ttl", 3600))
+                soa = "%s %s %s 3600 600 86400 %d" % (
+                    env_config["soa_nameserver"],
+                    env_config["soa_email"],
+                    serial,
+                    ttl,
+                )
+                self.zone_records[zone] = {
+                    "SOA": [self._record(zone, "SOA", soa, ttl)],
+                    "NS": [
+                        self._record(zone, "NS", ns, ttl)
+                        for ns in env_config["nameservers"]
+                    ],
+                }
+
+        self.answer: Callable[[str, str], bytes] = lru_cache(maxsize=cache_size)(
+            self._answer
+        )
+
+    @staticmethod
+    def _template_vars(env_config: Dict[str, Any], zone: str) -> Dict[str, Any]:
+        for zone_config in env_config.get("zone_configs", []):
+            if zone_config["domain"].rstrip(".").lower() == zone:
+                return zone_config.get("template_vars", {})
+        return {}
+
+    @staticmethod
+    def _record(qname: str, qtype: str, content: str, ttl: int) -> Dict[str, Any]:
+        return {"qtype": qtype, "qname": qname, "content": content, "ttl": ttl, "auth": True}
+
+    def _answer(self, qname: str, qtype: str) -> bytes:
+        """Build the serialized lookup reply for one (qname, qtype) pair."""
+        # Every record is named by the lowercase qname without the trailing dot
+        name = qname.rstrip(".").lower()
+
+        if name in self.zone_records:
+            apex = self.zone_records[name]
+            if qtype == "ANY":
+                records = apex["SOA"] + apex["NS"]
+            else:
+                records = apex.get(qtype, [])
+            return json.dumps({"result": records}).encode() + b"\n"
+
+        table: Optional[AppTable] = find_table(self.tables, name)
+        if table is None:
+            return RESULT_FALSE
+
+        ttl = int(self.zone_records[table.zone]["SOA"][0]["ttl"])
+        if name == "_debug." + table.zone:
+            if qtype not in ("TXT", "ANY"):
+                return RESULT_EMPTY
+            content = '"%s"' % table.debug(name)
+            record = self._record(name, "TXT", content, ttl)
+        else:
+            # Like the wildcard LUA CNAME, the CNAME answers every qtype
+            record = self._record(name, "CNAME", table.route(name) + ".", ttl)
+        return json.dumps({"result": [record]}).encode() + b"\n"
+
+    def handle(self, raw: bytes) -> bytes:
+        """Dispatch one remote backend request."""
+        try:
+            request = json.loads(raw)
+            method = request["method"]
+            parameters = request.get("parameters") or {}
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return RESULT_FALSE
+        if not isinstance(parameters, dict):
+            return RESULT_FALSE
+
+        if method == "lookup":
+            qname, qtype = parameters.get("qname", ""), parameters.get("qtype", "ANY")
+            if not isinstance(qname, str) or not isinstance(qtype, str):
+                return RESULT_FALSE
+            return self.answer(qname, qtype)
+        if method == "initialize":
+            return RESULT_TRUE
+        if method == "getAllDomains":
+            domains = [
+                {"id": i + 1, "zone": zone + ".", "kind": "native", "serial": 0}
+                for i, zone in enumerate(self.zone_records)
+            ]
+            return json.dumps({"result": domains}).encode() + b"\n"
+        return RESULT_FALSE
+
+
+async def serve_unix(backend: AppRoutingBackend, path: str) -> None:
+    """Serve newline-delimited JSON requests on a unix socket."""
+
+    async def handle_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                writer.write(backend.handle(line))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    if os.path.exists(path):
+        os.unlink(path)
+    server = await asyncio.start_unix_server(handle_client, path=path, limit=1 << 20)
+    os.chmod(path, 0o666)
+    print(f"Remote backend listening on unix:{path}")
+    async with server:
+        await server.serve_forever()
+
+
+async def serve_http(backend: AppRoutingBackend, host: str, port: int) -> None:
+    """Serve JSON POST requests (post=1,post_json=1) over HTTP/1.1 keep-alive."""
+
+    async def handle_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                length = 0
+                keep_alive = not request_line.endswith(b"HTTP/1.0\r\n")
+                while True:
+                    header = await reader.readline()
+                    if header in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = header.partition(b":")
+                    name = name.strip().lower()
+                    if name == b"content-length":
+                        length = int(value)
+                    elif name == b"connection":
+                        keep_alive = value.strip().lower() == b"keep-alive"
+                body = await reader.readexactly(length) if length else b""
+                reply = backend.handle(body)
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    b"Content-Length: %d\r\n\r\n%s" % (len(reply), reply)
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle_client, host, port)
+    print(f"Remote backend listening on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="PowerDNS remote backend for *.app.runonflux.io routing"
+    )
+    transport = parser.add_mutually_exclusive_group(required=True)
+    transport.add_argument("--socket", help="Unix socket path to listen on")
+    transport.add_argument("--http", help="HOST:PORT to listen on for HTTP")
+    parser.add_argument(
+        "-c",
+        "--config",
+        help="Configuration file path (default: ../vars.yaml from script location)",
+    )
+    parser.add_argument(
+        "--environment",
+        choices=ENVIRONMENTS,
+        help="Only serve this environment's app zones (default: all)",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=100000,
+        help="Number of recent (qname, qtype) answers to keep (default: 100000)",
+    )
+    args = parser.parse_args()
+
+    config_path = args.config or Path(__file__).parent.parent / "vars.yaml"
+    try:
+        with open(config_path, "r") as f:
+            config = yaml.safe_load(f)
+    except (OSError, yaml.YAMLError) as e:
+        print(f"Error loading configuration {config_path}: {e}")
+        sys.exit(1)
+
+    environments = [args.environment] if args.environment else list(ENVIRONMENTS)
+    backend = AppRoutingBackend(config, environments, args.cache_size)
+    if not backend.tables:
+        print("Error: no app zones with app_routes found in configuration")
+        sys.exit(1)
+
+    try:
+        if args.socket:
+            asyncio.run(serve_unix(backend, args.socket))
+        else:
+            host, _, port = args.http.rpartition(":")
+            asyncio.run(serve_http(backend, host or "127.0.0.1", int(port)))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+"""
+PowerDNS gsqlite3 Zone Loader
+
+Parses rendered zone files into the rows PowerDNS keeps in the stock
+gsqlite3 schema (domains, records, domainmetadata) and writes them into
+/var/lib/powerdns/pdns.sqlite3 in a single transaction, instead of one
+``pdnsutil load-zone`` per zone.
+
+Rows are stored the way the gsql backends store them: lower-case names and
+name targets without the trailing dot, MX/SRV priorities inside the content,
+LUA records as ``<type> "<code>"``.
+
+Load modes:
+  replace       every loaded zone's records are deleted and re-inserted
+  changed-only  only RRsets whose content or TTL differ are replaced; if
+                nothing but the SOA serial changed, the zone is left alone.
+                RRsets that are not in the loaded zone (API overrides,
+                ACME challenges) are kept unless prune is set
+
+When a zone that already exists changes, its serial becomes next_serial()
+of the stored one, so it always increases (YYYYMMDDnn, nn counting the
+changes of the day) and secondaries notice the change.
+
+Used by generate_zone.py --sqlite; it can be run against a scratch file
+created from the stock schema:
+
+  sqlite3 /tmp/pdns.sqlite3 < /usr/share/pdns-backend-sqlite3/schema/schema.sqlite3.sql
+
+Run on its own it loads rendered <zone>.zone files as master zones and
+prints the per-zone counts as JSON, with nothing but the standard library,
+so powerdns_setup.yaml can render the zones on the control node and apply
+them on the master:
+
+  ./pdns_sqlite.py /var/lib/powerdns/pdns.sqlite3 zones/*.zone --changed-only
+"""
+
+import argparse
+import json
+import sqlite3
+import sys
+from collections import defaultdict
+from datetime import date
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+STOCK_SCHEMA = Path("/usr/share/pdns-backend-sqlite3/schema/schema.sqlite3.sql")
+
+# Record types whose rdata holds domain names: {type: indexes of name fields}
+NAME_FIELDS = {
+    "NS": (0,),
+    "CNAME": (0,),
+    "DNAME": (0,),
+    "PTR": (0,),
+    "MX": (1,),
+    "SRV": (3,),
+    "SOA": (0, 1),
+}
+CLASSES = {"IN", "CH", "HS"}
+
+
+class ZoneRecord(NamedTuple):
+    name: str
+    type: str
+    content: str
+    ttl: int
+
+
+class Zone(NamedTuple):
+    """A zone ready to load: its domains row, records and metadata."""
+
+    name: str
+    records: List[ZoneRecord]
+    kind: str = "MASTER"
+    master: Optional[str] = None
+    metadata: Dict[str, List[str]] = {}
+
+
+def _tokens(text: str) -> Iterator[Tuple[bool, List[str]]]:
+    """
+    Split zone text into logical lines.
+
+    Yields (owner_omitted, tokens); comments are dropped, quoted strings are
+    kept whole (with their quotes) and parenthesised continuations joined.
+    """
+    tokens: List[str] = []
+    depth = 0
+    owner_omitted = False
+    for line in text.splitlines():
+        if depth == 0:
+            tokens = []
+            owner_omitted = line[:1] in (" ", "\t")
+        i = 0
+        while i < len(line):
+            char = line[i]
+            if char == ";":
+                break
+            if char in " \t":
+                i += 1
+            elif char == "(":
+                depth += 1
+                i += 1
+            elif char == ")":
+                depth -= 1
+                i += 1
+            elif char == '"':
+                end = i + 1
+                while end < len(line) and line[end] != '"':
+                    end += 2 if line[end] == "\\" else 1
+                tokens.append(line[i : end + 1])
+                i = end + 1
+            else:
+                end = i
+                while end < len(line) and line[end] not in ' \t;()"':
+                    end += 1
+                tokens.append(line[i:end])
+                i = end
+        if depth == 0 and tokens:
+            yield owner_omitted, tokens
+
+
+def _absolute(name: str, origin: str) -> str:
+    """Qualify a zone file name and return it in database form."""
+    if name == "@":
+        name = origin
+    elif not name.endswith("."):
+        name = f"{name}.{origin}"
+    return name.rstrip(".").lower()
+
+
+def parse_zone(text: str, origin: str, default_ttl: int = 3600) -> List[ZoneRecord]:
+    """Parse zone file text into records in PowerDNS database form."""
+    origin = origin.rstrip(".") + "."
+    ttl = default_ttl
+    owner = origin
+    records: List[ZoneRecord] = []
+
+    for owner_omitted, tokens in _tokens(text):
+        if tokens[0] == "$TTL":
+            ttl = int(tokens[1])
+            continue
+        if tokens[0] == "$ORIGIN":
+            origin = _absolute(tokens[1], origin) + "."
+            continue
+        if not owner_omitted:
+            owner = _absolute(tokens.pop(0), origin) + "."
+
+        record_ttl = ttl
+        while tokens and (tokens[0].isdigit() or tokens[0].upper() in CLASSES):
+            field = tokens.pop(0)
+            if field.isdigit():
+                record_ttl = int(field)
+        rtype = tokens.pop(0).upper()
+
+        for index in NAME_FIELDS.get(rtype, ()):
+            tokens[index] = _absolute(tokens[index], origin)
+        records.append(ZoneRecord(owner.rstrip(".").lower(), rtype, " ".join(tokens), record_ttl))
+    return records
+
+
+RRsets = Dict[Tuple[str, str], List[Tuple[str, int]]]
+
+
+def group_rrsets(rows: Sequence[Tuple[str, str, str, int]]) -> RRsets:
+    """Group (name, type, content, ttl) rows into sorted RRsets keyed by (name, type)."""
+    rrsets: RRsets = defaultdict(list)
+    for name, rtype, content, ttl in rows:
+        rrsets[(name, rtype)].append((content, ttl))
+    for rrset in rrsets.values():
+        rrset.sort()
+    return rrsets
+
+
+def next_serial(current: Optional[int], today: Optional[date] = None) -> int:
+    """Serial for a changed zone: today's YYYYMMDD00, or current + 1 if that is not higher."""
+    base = int((today or date.today()).strftime("%Y%m%d00"))
+    if current is None:
+        return base
+    return max(base, current + 1)
+
+
+def soa_serial(content: str) -> int:
+    return int(content.split()[2])
+
+
+def with_serial(content: str, serial: int) -> str:
+    """SOA content with its serial replaced."""
+    fields = content.split()
+    fields[2] = str(serial)
+    return " ".join(fields)
+
+
+def _without_serial(rrset: List[Tuple[str, int]]) -> List[Tuple[str, int]]:
+    return [(with_serial(content, 0), ttl) for content, ttl in rrset]
+
+
+def diff_rrsets(
+    current: RRsets, wanted: RRsets, prune: bool = False
+) -> Tuple[List[Tuple[str, str]], List[Tuple[str, str]]]:
+    """
+    Compare live RRsets with the wanted ones.
+
+    Returns (changed, unmanaged): the keys to replace or delete, ignoring
+    the SOA serial (any other SOA difference is a change), and the live
+    RRsets that are not wanted. Unmanaged keys are only included in
+    changed when prune is set.
+    """
+    changed = []
+    for key, rrset in wanted.items():
+        live = current.get(key)
+        if key[1] == "SOA" and live is not None:
+            if _without_serial(live) != _without_serial(rrset):
+                changed.append(key)
+        elif live != rrset:
+            changed.append(key)
+    unmanaged = [key for key in current if key not in wanted]
+    if prune:
+        changed += unmanaged
+    return changed, unmanaged
+
+
+def keep_serial(current: RRsets, wanted: RRsets) -> None:
+    """Give the wanted SOA the live serial (for a reload that changes nothing)."""
+    for key, rrset in wanted.items():
+        if key[1] == "SOA" and key in current:
+            serial = soa_serial(current[key][0][0])
+            wanted[key] = [(with_serial(content, serial), ttl) for content, ttl in rrset]
+
+
+def bump_serial(current: RRsets, wanted: RRsets, today: Optional[date] = None) -> Optional[int]:
+    """
+    Set the serial of the wanted SOA to next_serial() of the live one.
+
+    Returns the new serial (None if there is no SOA to update).
+    """
+    for (name, rtype), rrset in wanted.items():
+        if rtype != "SOA":
+            continue
+        live = current.get((name, rtype))
+        serial = next_serial(soa_serial(live[0][0]) if live else None, today)
+        wanted[(name, rtype)] = [(with_serial(content, serial), ttl) for content, ttl in rrset]
+        return serial
+    return None
+
+
+class ZoneDatabase:
+    """Bulk writer for a PowerDNS gsqlite3 database."""
+
+    INSERT_RECORD = (
+        "INSERT INTO records (domain_id, name, type, content, ttl, prio, disabled, auth)"
+        " VALUES (?, ?, ?, ?, ?, 0, 0, 1)"
+    )
+
+    def __init__(self, path: Path, schema: Optional[Path] = STOCK_SCHEMA):
+        self.path = Path(path)
+        self.conn = sqlite3.connect(str(self.path), isolation_level=None)
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        has_schema = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'domains'"
+        ).fetchone()
+        if not has_schema:
+            if schema is None or not Path(schema).exists():
+                self.conn.close()
+                raise FileNotFoundError(
+                    f"{self.path} has no PowerDNS schema and schema file {schema} was not found"
+                )
+            self.conn.executescript(Path(schema).read_text())
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> "ZoneDatabase":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def _domain_id(self, zone: Zone) -> int:
+        row = self.conn.execute("SELECT id FROM domains WHERE name = ?", (zone.name,)).fetchone()
+        if row is None:
+            cursor = self.conn.execute(
+                "INSERT INTO domains (name, master, type) VALUES (?, ?, ?)",
+                (zone.name, zone.master, zone.kind),
+            )
+            return cursor.lastrowid
+        self.conn.execute(
+            "UPDATE domains SET master = ?, type = ? WHERE id = ?",
+            (zone.master, zone.kind, row[0]),
+        )
+        return row[0]
+
+    def _current(self, domain_id: int) -> RRsets:
+        return group_rrsets(
+            self.conn.execute(
+                "SELECT name, type, content, ttl FROM records"
+                " WHERE domain_id = ? AND disabled = 0 AND type IS NOT NULL",
+                (domain_id,),
+            ).fetchall()
+        )
+
+    def _replace(self, domain_id: int, zone: Zone) -> Dict[str, int]:
+        current = self._current(domain_id)
+        wanted = group_rrsets(zone.records)
+        changed, _ = diff_rrsets(current, wanted, prune=True)
+        if changed or not current:
+            bump_serial(current, wanted)
+        else:
+            keep_serial(current, wanted)
+        deleted = self.conn.execute("DELETE FROM records WHERE domain_id = ?", (domain_id,)).rowcount
+        self.conn.executemany(
+            self.INSERT_RECORD,
+            (
+                (domain_id, name, rtype, content, ttl)
+                for (name, rtype), rrset in wanted.items()
+                for content, ttl in rrset
+            ),
+        )
+        return {"deleted": deleted, "inserted": len(zone.records), "rrsets_changed": -1}
+
+    def _replace_changed(self, domain_id: int, zone: Zone, prune: bool = False) -> Dict[str, int]:
+        current = self._current(domain_id)
+        wanted = group_rrsets(zone.records)
+        changed, _ = diff_rrsets(current, wanted, prune)
+        if changed:
+            # The SOA goes out with every change, with a higher serial
+            bump_serial(current, wanted)
+            changed += [key for key in wanted if key[1] == "SOA" and key not in changed]
+            self.conn.executemany(
+                "DELETE FROM records WHERE domain_id = ? AND name = ? AND type = ?",
+                ((domain_id, name, rtype) for name, rtype in changed),
+            )
+        rows = [
+            (domain_id, name, rtype, content, ttl)
+            for name, rtype in changed
+            for content, ttl in wanted.get((name, rtype), ())
+        ]
+        self.conn.executemany(self.INSERT_RECORD, rows)
+        return {
+            "deleted": sum(len(current.get(key, ())) for key in changed),
+            "inserted": len(rows),
+            "rrsets_changed": len(changed),
+        }
+
+    def _set_metadata(self, domain_id: int, zone: Zone) -> None:
+        for kind, values in zone.metadata.items():
+            existing = [
+                row[0]
+                for row in self.conn.execute(
+                    "SELECT content FROM domainmetadata WHERE domain_id = ? AND kind = ? ORDER BY id",
+                    (domain_id, kind),
+                )
+            ]
+            if existing == list(values):
+                continue
+            self.conn.execute(
+                "DELETE FROM domainmetadata WHERE domain_id = ? AND kind = ?", (domain_id, kind)
+            )
+            self.conn.executemany(
+                "INSERT INTO domainmetadata (domain_id, kind, content) VALUES (?, ?, ?)",
+                ((domain_id, kind, value) for value in values),
+            )
+
+    def load(
+        self, zones: Sequence[Zone], changed_only: bool = False, prune: bool = False
+    ) -> Dict[str, Dict[str, int]]:
+        """
+        Write zones in one transaction; nothing is written if any zone fails.
+
+        Returns per-zone counts of deleted and inserted records.
+        """
+        stats = {}
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            for zone in zones:
+                domain_id = self._domain_id(zone)
+                if changed_only:
+                    stats[zone.name] = self._replace_changed(domain_id, zone, prune)
+                else:
+                    stats[zone.name] = self._replace(domain_id, zone)
+                self._set_metadata(domain_id, zone)
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load rendered zone files into a PowerDNS gsqlite3 database")
+    parser.add_argument("database", type=Path, help="gsqlite3 database file")
+    parser.add_argument("zone_files", nargs="+", type=Path, help="Zone files named <zone>.zone")
+    parser.add_argument("--changed-only", action="store_true", help="Replace only RRsets that changed")
+    parser.add_argument(
+        "--prune",
+        action="store_true",
+        help="With --changed-only: also delete RRsets that are not in the zone files",
+    )
+    parser.add_argument(
+        "--schema",
+        type=Path,
+        default=STOCK_SCHEMA,
+        help=f"Schema used if the database is empty (default: {STOCK_SCHEMA})",
+    )
+    args = parser.parse_args()
+
+    zones = []
+    for path in args.zone_files:
+        if path.suffix != ".zone":
+            parser.error(f"{path}: zone files must be named <zone>.zone")
+        try:
+            zones.append(Zone(path.stem.lower(), parse_zone(path.read_text(), path.stem)))
+        except (OSError, IndexError, ValueError) as e:
+            print(f"Error reading {path}: {e}")
+            sys.exit(1)
+    try:
+        with ZoneDatabase(args.database, args.schema) as db:
+            stats = db.load(zones, args.changed_only, args.prune)
+    except (sqlite3.Error, OSError) as e:
+        print(f"Error writing {args.database}: {e}")
+        sys.exit(1)
+
+    print(
+        json.dumps(
+            {
+                "zones": stats,
+                "rrsets_changed": sum(max(counts["rrsets_changed"], 0) for counts in stats.values()),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
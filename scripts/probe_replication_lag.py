@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+"""
+PowerDNS Replication Lag Probe
+
+Measures how long a change made through the PowerDNS API on the master
+takes to be served by every nameserver. An ACME DNS-01 challenge has to
+wait that long before it can be validated (docs/DNS01_ARCHITECTURE.md).
+
+Each run REPLACEs a canary TXT record (_replication-canary.<zone>) with a
+new token through the API. It then queries every nameserver concurrently,
+every --poll-interval seconds, for the canary and the zone's SOA. For each
+nameserver it records when the SOA serial first went up (serial_s) and
+when the new token was first served (canary_s). Both are counted from the
+moment the PATCH returned, to the poll that first saw the change, so the
+resolution is the poll interval. After --runs runs, p50/p90/p99/max per
+nameserver are reported. --continuous keeps probing; with --metrics-port
+it serves Prometheus metrics (needs prometheus-client). The canary is
+deleted on exit unless --keep-canary is given.
+
+Nameservers default to master_ips and slave_ips of the zone's environment
+in vars.yaml. The API only answers locally on the primary and to the cert
+server (docs/PDNS_VERIFICATION.md), so run the probe from one of those.
+
+Usage:
+  ./probe_replication_lag.py --runs 20
+  ./probe_replication_lag.py --zone app2.runonflux.io --runs 50 --pause 2 --json
+  ./probe_replication_lag.py --continuous --pause 60 --metrics-port 9110 --output lag.jsonl
+  ./probe_replication_lag.py --api http://127.0.0.1:18081 --api-key test \\
+      --primary 127.0.0.1:15300 --secondary 127.0.0.1:15301 --secondary 127.0.0.1:15302
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import signal
+import socket
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, TextIO
+
+import yaml
+
+from dns_wire import UDPClient, build_query, parse_response
+from pdns_api import PowerDNSAPI, PowerDNSAPIError, to_api_name
+from pdns_overrides import DEFAULT_API_URL, find_zone
+from pdns_sqlite import soa_serial
+
+CANARY_LABEL = "_replication-canary"
+LAG_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+class Nameserver(NamedTuple):
+    name: str
+    host: str
+    port: int
+    role: str
+
+
+def parse_nameserver(text: str, role: str) -> Nameserver:
+    """IP or IP:PORT (IPv6 as [IP]:PORT)."""
+    host, port = text, 53
+    if text.startswith("["):
+        host, _, rest = text[1:].partition("]")
+        port = int(rest[1:]) if rest.startswith(":") else 53
+    elif text.count(":") == 1:
+        host, port_text = text.split(":")
+        port = int(port_text)
+    return Nameserver(text, host, port, role)
+
+
+def percentiles(values: List[float]) -> Dict[str, Any]:
+    ordered = sorted(values)
+    count = len(ordered)
+    if not count:
+        return {"count": 0}
+    return {
+        "count": count,
+        **{
+            name: round(ordered[min(count - 1, int(count * p))], 3)
+            for name, p in (("p50", 0.50), ("p90", 0.90), ("p99", 0.99))
+        },
+        "max": round(ordered[-1], 3),
+    }
+
+
+class LagMetrics:
+    """Prometheus metrics for --continuous runs."""
+
+    def __init__(self) -> None:
+        from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram
+
+        self.registry = CollectorRegistry()
+        labels = ["nameserver", "role", "signal"]
+        self.lag = Histogram(
+            "pdns_replication_lag_seconds",
+            "Seconds from the API PATCH until a nameserver served the change (signal: serial, canary)",
+            labels,
+            buckets=LAG_BUCKETS,
+            registry=self.registry,
+        )
+        self.last_lag = Gauge(
+            "pdns_replication_last_lag_seconds",
+            "Lag of the latest run",
+            labels,
+            registry=self.registry,
+        )
+        self.timeouts = Counter(
+            "pdns_replication_timeouts_total",
+            "Runs in which a nameserver did not serve the change within --timeout",
+            labels,
+            registry=self.registry,
+        )
+        self.api_seconds = Histogram(
+            "pdns_replication_api_seconds",
+            "Duration of the canary PATCH",
+            buckets=LAG_BUCKETS,
+            registry=self.registry,
+        )
+        self.runs = Counter(
+            "pdns_replication_runs_total", "Probe runs by result", ["result"], registry=self.registry
+        )
+
+    def serve(self, address: str, port: int) -> None:
+        from prometheus_client import start_http_server
+
+        start_http_server(port, address, registry=self.registry)
+
+    def observe(self, result: Dict[str, Any], nameservers: List[Nameserver]) -> None:
+        if "error" in result:
+            self.runs.labels("error").inc()
+            return
+        self.runs.labels("ok").inc()
+        self.api_seconds.observe(result["api_s"])
+        for ns in nameservers:
+            server = result["nameservers"][ns.name]
+            for sig in ("serial", "canary"):
+                lag = server[f"{sig}_s"]
+                if lag is None:
+                    self.timeouts.labels(ns.name, ns.role, sig).inc()
+                else:
+                    self.lag.labels(ns.name, ns.role, sig).observe(lag)
+                    self.last_lag.labels(ns.name, ns.role, sig).set(lag)
+
+
+class ReplicationProbe:
+    """Writes canary tokens through the API and times when each nameserver serves them."""
+
+    def __init__(
+        self,
+        api: PowerDNSAPI,
+        zone: str,
+        nameservers: List[Nameserver],
+        poll_interval: float = 0.05,
+        timeout: float = 120.0,
+        ttl: int = 60,
+    ):
+        self.api = api
+        self.zone = zone
+        self.canary = to_api_name(f"{CANARY_LABEL}.{zone}")
+        self.nameservers = nameservers
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.ttl = ttl
+        self.clients: Dict[str, UDPClient] = {}
+        self.soa_query = build_query(zone, "SOA")
+        self.canary_query = build_query(self.canary, "TXT")
+        self.query_errors = 0
+        # One thread for API calls: the canary DELETE on exit queues behind a PATCH still in flight
+        self.api_thread = ThreadPoolExecutor(max_workers=1)
+
+    async def connect(self) -> None:
+        for ns in self.nameservers:
+            self.clients[ns.name] = await UDPClient.connect(ns.host, ns.port)
+
+    def close(self) -> None:
+        for client in self.clients.values():
+            client.close()
+        self.api_thread.shutdown()
+
+    async def _call(self, function: Any, *args: Any) -> Any:
+        return await asyncio.wrap_future(self.api_thread.submit(function, *args))
+
+    async def _ask(self, client: UDPClient, packet: bytes) -> Optional[List[str]]:
+        """Answer data of one query; None if it timed out or failed."""
+        try:
+            response = parse_response(await client.send(packet, max(1.0, self.poll_interval)))
+        except (asyncio.TimeoutError, ConnectionError, ValueError):
+            self.query_errors += 1
+            return None
+        if response.rcode not in ("NOERROR", "NXDOMAIN"):
+            self.query_errors += 1
+            return None
+        return [record.data for record in response.answers]
+
+    async def watch(self, ns: Nameserver, token: str, serial_before: int, since: float) -> Dict[str, Any]:
+        """Poll one nameserver until it serves a newer serial and the token, or the timeout."""
+        client = self.clients[ns.name]
+        result: Dict[str, Any] = {"role": ns.role, "serial_s": None, "canary_s": None, "serial": None}
+        loop = asyncio.get_running_loop()
+        next_poll = loop.time()
+        quoted = f'"{token}"'
+        while time.perf_counter() - since < self.timeout:
+            sent = time.perf_counter()
+            soa, txt = await asyncio.gather(
+                self._ask(client, self.soa_query), self._ask(client, self.canary_query)
+            )
+            if soa:
+                serial = soa_serial(soa[0])
+                result["serial"] = serial
+                if result["serial_s"] is None and serial > serial_before:
+                    result["serial_s"] = round(max(0.0, sent - since), 4)
+            if txt and result["canary_s"] is None and quoted in txt:
+                result["canary_s"] = round(max(0.0, sent - since), 4)
+            if result["serial_s"] is not None and result["canary_s"] is not None:
+                break
+            next_poll += self.poll_interval
+            await asyncio.sleep(max(0.0, next_poll - loop.time()))
+        return result
+
+    async def run(self, number: int) -> Dict[str, Any]:
+        token = f"{socket.gethostname()}-{os.getpid()}-{number}-{time.time_ns()}"
+        result: Dict[str, Any] = {"run": number, "timestamp": datetime.now().isoformat(), "token": token}
+        change = {
+            "name": self.canary,
+            "type": "TXT",
+            "ttl": self.ttl,
+            "changetype": "REPLACE",
+            "records": [{"content": f'"{token}"', "disabled": False}],
+        }
+        try:
+            live = await self._call(self.api.get_zone, self.zone)
+            if live is None:
+                raise PowerDNSAPIError(404, f"zone {self.zone} not found")
+            serial_before = live.get("serial") or 0
+            started = time.perf_counter()
+            await self._call(self.api.patch_zone, self.zone, [change])
+        except (PowerDNSAPIError, OSError) as e:
+            result["error"] = str(e)
+            return result
+        acked = time.perf_counter()
+        result["api_s"] = round(acked - started, 4)
+        result["serial_before"] = serial_before
+        servers = await asyncio.gather(
+            *(self.watch(ns, token, serial_before, acked) for ns in self.nameservers)
+        )
+        result["nameservers"] = {ns.name: server for ns, server in zip(self.nameservers, servers)}
+        return result
+
+    async def remove_canary(self) -> None:
+        await self._call(
+            self.api.patch_zone, self.zone, [{"name": self.canary, "type": "TXT", "changetype": "DELETE"}]
+        )
+
+
+def summarize(results: List[Dict[str, Any]], nameservers: List[Nameserver], probe: ReplicationProbe) -> Dict[str, Any]:
+    completed = [r for r in results if "error" not in r]
+    summary: Dict[str, Any] = {
+        "timestamp": datetime.now().isoformat(),
+        "zone": probe.zone,
+        "canary": probe.canary,
+        "poll_interval_s": probe.poll_interval,
+        "runs": len(results),
+        "failed_runs": len(results) - len(completed),
+        "query_errors": probe.query_errors,
+        "api_s": percentiles([r["api_s"] for r in completed]),
+        "nameservers": {},
+    }
+    for ns in nameservers:
+        servers = [r["nameservers"][ns.name] for r in completed]
+        summary["nameservers"][ns.name] = {
+            "role": ns.role,
+            **{
+                f"{sig}_s": percentiles([s[f"{sig}_s"] for s in servers if s[f"{sig}_s"] is not None])
+                for sig in ("serial", "canary")
+            },
+            "timeouts": sum(1 for s in servers if s["serial_s"] is None or s["canary_s"] is None),
+        }
+    return summary
+
+
+def print_summary(summary: Dict[str, Any]) -> None:
+    print(
+        f"\nReplication lag of {summary['zone']} over {summary['runs']} run(s)"
+        f" ({summary['failed_runs']} failed), polled every {summary['poll_interval_s']}s"
+    )
+    api = summary["api_s"]
+    if api["count"]:
+        print(f"API PATCH: p50 {api['p50']}s  p90 {api['p90']}s  max {api['max']}s")
+    header = f"{'Nameserver':<24} {'Role':<9} {'Signal':<7} {'p50 s':>7} {'p90 s':>7} {'p99 s':>7} {'max s':>7} {'Timeouts':>8}"
+    print(header)
+    print("-" * len(header))
+    for name, server in summary["nameservers"].items():
+        for sig in ("serial", "canary"):
+            lag = server[f"{sig}_s"]
+            values = [f"{lag[p]:>7}" if lag["count"] else f"{'-':>7}" for p in ("p50", "p90", "p99", "max")]
+            print(f"{name:<24} {server['role']:<9} {sig:<7} {' '.join(values)} {server['timeouts']:>8}")
+
+
+async def probe_loop(
+    probe: ReplicationProbe,
+    runs: Optional[int],
+    pause: float,
+    output: Optional[TextIO],
+    metrics: Optional[LagMetrics],
+    keep_canary: bool,
+) -> List[Dict[str, Any]]:
+    results: List[Dict[str, Any]] = []
+    # SIGTERM (systemd, kill) stops a continuous probe like Ctrl-C, so the canary is still removed
+    task = asyncio.current_task()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        asyncio.get_running_loop().add_signal_handler(signum, task.cancel)
+    await probe.connect()
+    try:
+        for number in itertools.count(1) if runs is None else range(1, runs + 1):
+            result = await probe.run(number)
+            if runs is not None:
+                results.append(result)
+            if output:
+                output.write(json.dumps(result) + "\n")
+                output.flush()
+            if metrics:
+                metrics.observe(result, probe.nameservers)
+            if "error" in result:
+                line = f"error: {result['error']}"
+            else:
+                line = ", ".join(
+                    f"{name} {server['canary_s'] if server['canary_s'] is not None else 'timeout'}s"
+                    for name, server in result["nameservers"].items()
+                )
+            print(f"Run {number}: {line}", file=sys.stderr)
+            if runs is None or number < runs:
+                await asyncio.sleep(pause)
+    except asyncio.CancelledError:
+        pass
+    finally:
+        if not keep_canary:
+            try:
+                await probe.remove_canary()
+            except (PowerDNSAPIError, OSError) as e:
+                print(f"Warning: could not delete {probe.canary}: {e}", file=sys.stderr)
+        probe.close()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure master-to-secondary replication lag with a canary record")
+    parser.add_argument("--zone", help="Zone to write the canary to (default: the production app zone)")
+    parser.add_argument(
+        "--api",
+        default=os.environ.get("PDNS_API_URL", DEFAULT_API_URL),
+        help=f"PowerDNS API URL (default: $PDNS_API_URL or {DEFAULT_API_URL})",
+    )
+    parser.add_argument("--api-key", help="API key (default: $PDNS_API_KEY, then api_key from vars.yaml)")
+    parser.add_argument(
+        "--primary", action="append", default=[], help="Primary IP[:PORT] to poll (default: master_ips); repeatable"
+    )
+    parser.add_argument(
+        "--secondary", action="append", default=[], help="Secondary IP[:PORT] to poll (default: slave_ips); repeatable"
+    )
+    parser.add_argument("--runs", type=int, default=10, help="Canary changes to time (default: 10)")
+    parser.add_argument("--continuous", action="store_true", help="Probe until interrupted")
+    parser.add_argument("--pause", type=float, default=5.0, help="Seconds between runs (default: 5)")
+    parser.add_argument(
+        "--poll-interval", type=float, default=0.05, help="Seconds between polls of each nameserver (default: 0.05)"
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=120.0, help="Give up on a nameserver after this many seconds (default: 120)"
+    )
+    parser.add_argument("--ttl", type=int, default=60, help="TTL of the canary record (default: 60)")
+    parser.add_argument("--keep-canary", action="store_true", help="Leave the canary record in the zone on exit")
+    parser.add_argument("--output", type=Path, help="Append each run as a JSON line to this file")
+    parser.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics on this port")
+    parser.add_argument("--metrics-address", default="0.0.0.0", help="Address for the metrics endpoint (default: 0.0.0.0)")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+    parser.add_argument(
+        "-c",
+        "--config",
+        help="Configuration file path (default: ../vars.yaml from script location)",
+    )
+    args = parser.parse_args()
+
+    config_path = args.config or Path(__file__).parent.parent / "vars.yaml"
+    with open(config_path, "r") as f:
+        config = yaml.safe_load(f)
+    environment, zone_config = find_zone(config, args.zone)
+    env_config = config["powerdns"][environment]
+    zone = zone_config["domain"]
+
+    api_key = args.api_key or os.environ.get("PDNS_API_KEY") or env_config.get("api_key")
+    nameservers = [parse_nameserver(ns, "primary") for ns in args.primary or env_config.get("master_ips", [])] + [
+        parse_nameserver(ns, "secondary") for ns in args.secondary or env_config.get("slave_ips", [])
+    ]
+    if not nameservers:
+        print("Error: no nameservers to poll")
+        sys.exit(1)
+
+    metrics = None
+    if args.metrics_port:
+        try:
+            metrics = LagMetrics()
+        except ImportError:
+            print("Error: --metrics-port needs prometheus-client (pip install prometheus-client)")
+            sys.exit(1)
+        metrics.serve(args.metrics_address, args.metrics_port)
+        print(f"Serving metrics on http://{args.metrics_address}:{args.metrics_port}/metrics", file=sys.stderr)
+
+    output = open(args.output, "a") if args.output else None
+    with PowerDNSAPI(args.api, api_key, retries=2) as api:
+        probe = ReplicationProbe(api, zone, nameservers, args.poll_interval, args.timeout, args.ttl)
+        runs = None if args.continuous else args.runs
+        try:
+            results = asyncio.run(probe_loop(probe, runs, args.pause, output, metrics, args.keep_canary))
+        finally:
+            if output:
+                output.close()
+
+    if runs is None:
+        return
+    summary = summarize(results, nameservers, probe)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print_summary(summary)
+    if summary["failed_runs"] == len(results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,562 @@
+#!/usr/bin/env -S uv run --script
+# /// script
+# requires-python = ">=3.8"
+# dependencies = [
+#     "numpy>=1.20",
+#     "pyyaml>=6.0",
+# ]
+# ///
+"""
+PowerDNS Lua Health Check Simulator
+
+Replays CDN outage traces through a model of the authoritative server's
+health checker and predicts, for every combination of
+
+  interval                    ifportup() option: seconds between checks of a node
+  timeout                     ifportup() option: connect timeout
+  minimumFailures             ifportup() option: failed checks before a node is dropped
+  lua-health-checks-interval  pdns.conf: how often the checker thread wakes up
+
+the failover delay (how long an outage keeps receiving clients), the
+share of outages that end before they are noticed, how long a recovered
+node stays out, false evictions (a node dropped while it is reachable)
+and the probe load on each CDN node.
+
+The model follows the checker thread of PowerDNS 4.7+: every round it
+starts the checks that are due (last status update + interval), waits for
+all of them, and sleeps until gcd(lua-health-checks-interval, interval)
+seconds after the round started. Status updates carry time() at the end
+of the check, so a check that times out also delays the next one. A
+failed check increases the failure count; minimumFailures of them drop
+the node, one success brings it back. An unreachable node fails its
+checks after `timeout` seconds (--failure-mode timeout, packets dropped)
+or at once (refused, connection refused). --probe-loss adds independent
+check failures of reachable nodes.
+
+All combinations are simulated together on NumPy arrays, one round per
+step, so thousands of them take about as long as the finest interval.
+Packet cache and resolver TTLs come on top of the delays reported here;
+monitor_cdn_health.py --failover-bench measures them end to end.
+
+Traces (JSON Lines, combined from all files):
+  {"t": 1760000000.0, "server": "cdn-1.runonflux.io", "up": false}   probe results
+      (monitor_cdn_health.py --probe-log); an outage runs from the first
+      failed probe to the next successful one
+  {"server": "cdn-1.runonflux.io", "start": 1760000000, "end": 1760000300}   outages
+  {"span": [1759900000, 1760500000]}   traced period (default: first to last timestamp)
+Without traces, --synthetic-days generates outages with lognormal durations.
+
+Usage:
+  ./simulate_health_checks.py probes.jsonl
+  ./simulate_health_checks.py outages.jsonl --interval 5,10,15 --timeout 1,2 --minimum-failures 2,3
+  ./simulate_health_checks.py --synthetic-days 30 --outages-per-day 2 --probe-loss 0.01 --json
+"""
+
+import argparse
+import itertools
+import json
+import math
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import yaml
+
+DEFAULT_CONFIG = Path(__file__).parent.parent / "vars.yaml"
+CHECK_SETTINGS = ("interval", "timeout", "minimumFailures", "lua-health-checks-interval")
+# The same settings, as named in powerdns.lua_health_checks of vars.yaml
+CONFIG_KEYS = ("interval", "timeout", "minimumFailures", "checks_interval")
+
+# Combinations simulated together; bounds the per-outage arrays
+CHUNK_SIZE = 1024
+
+
+class Setting(NamedTuple):
+    interval: int
+    timeout: int
+    minimum_failures: int
+    checks_interval: int
+
+
+class Trace(NamedTuple):
+    nodes: List[str]
+    duration: float
+    # Per node: (n, 2) array of [start, end) seconds since the trace start
+    outages: List[np.ndarray]
+
+
+def read_current_settings(config_path: Path = DEFAULT_CONFIG) -> Optional[Setting]:
+    """The ifportup() options and lua-health-checks-interval deployed from vars.yaml."""
+    with open(config_path, "r") as f:
+        checks = yaml.safe_load(f)["powerdns"].get("lua_health_checks", {})
+    if not all(name in checks for name in CONFIG_KEYS):
+        return None
+    return Setting(*(int(checks[name]) for name in CONFIG_KEYS))
+
+
+def merge_intervals(intervals: List[Tuple[float, float]]) -> np.ndarray:
+    merged: List[List[float]] = []
+    for start, end in sorted(intervals):
+        if end <= start:
+            continue
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return np.array(merged, dtype=float).reshape(-1, 2)
+
+
+def read_traces(paths: List[Path]) -> Trace:
+    """Outages per node from probe results and outage lines."""
+    probes: Dict[str, List[Tuple[float, bool]]] = {}
+    outages: Dict[str, List[Tuple[float, float]]] = {}
+    span: Optional[Tuple[float, float]] = None
+    first, last = math.inf, -math.inf
+    for path in paths:
+        with open(path, "r") as f:
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    item = json.loads(line)
+                    if "span" in item:
+                        span = (float(item["span"][0]), float(item["span"][1]))
+                        continue
+                    node = item.get("server") or item["ip"]
+                    if "up" in item:
+                        t = float(item["t"])
+                        probes.setdefault(node, []).append((t, bool(item["up"])))
+                        first, last = min(first, t), max(last, t)
+                    else:
+                        start, end = float(item["start"]), float(item["end"])
+                        outages.setdefault(node, []).append((start, end))
+                        first, last = min(first, start), max(last, end)
+                except (ValueError, KeyError, TypeError, IndexError) as e:
+                    raise ValueError(f"{path}:{number}: {e}") from None
+
+    for node, samples in probes.items():
+        samples.sort()
+        down_since: Optional[float] = None
+        for t, up in samples:
+            if not up and down_since is None:
+                down_since = t
+            elif up and down_since is not None:
+                outages.setdefault(node, []).append((down_since, t))
+                down_since = None
+        if down_since is not None:
+            outages.setdefault(node, []).append((down_since, samples[-1][0]))
+        outages.setdefault(node, [])
+
+    start, end = span or (first, last)
+    if not outages or not end > start:
+        raise ValueError("no trace data")
+    nodes = sorted(outages)
+    return Trace(
+        nodes,
+        end - start,
+        [np.clip(merge_intervals(outages[node]) - start, 0, end - start) for node in nodes],
+    )
+
+
+def synthetic_trace(
+    nodes: int, days: float, per_day: float, median: float, sigma: float, rng: np.random.Generator
+) -> Trace:
+    """Poisson outage arrivals with lognormal durations."""
+    duration = days * 86400
+    outages = []
+    for _ in range(nodes):
+        count = rng.poisson(per_day * days)
+        starts = rng.uniform(0, duration, count)
+        lengths = rng.lognormal(math.log(median), sigma, count)
+        outages.append(
+            merge_intervals([(s, min(s + d, duration)) for s, d in zip(starts, lengths)])
+        )
+    return Trace([f"node-{i + 1}" for i in range(nodes)], duration, outages)
+
+
+class OutageIndex:
+    """
+    Outages of all nodes in one sorted array, for vectorized lookups.
+
+    Node n's times are shifted by n * stride, so one searchsorted() finds
+    the last outage that started before a time for every node at once.
+    """
+
+    def __init__(self, trace: Trace, margin: float):
+        nodes = len(trace.nodes)
+        self.stride = trace.duration + margin + 1
+        self.offsets = np.arange(nodes) * self.stride
+        counts = np.array([len(o) for o in trace.outages])
+        self.first = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        self.stop = self.first + counts
+        flat = np.concatenate([o + self.offsets[n] for n, o in enumerate(trace.outages)] + [np.empty((0, 2))])
+        self.count = len(flat)
+        # Outage start and length in trace time, in index order
+        self.begin = flat[:, 0] - np.repeat(self.offsets, counts)
+        self.length = flat[:, 1] - flat[:, 0]
+        # A sentinel outage at the end makes index -1 valid
+        self.starts = np.append(flat[:, 0], np.inf)
+        self.ends = np.append(flat[:, 1], np.inf)
+        self.lengths = np.append(self.length, 0.0)
+        self.prefix = np.concatenate([[0.0], np.cumsum(self.length), [0.0]])
+
+    def locate(self, t: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """For times (K, N): index of the node's last outage started by t, whether there is one, whether t is in it."""
+        x = t + self.offsets
+        j = np.searchsorted(self.starts, x, side="right") - 1
+        valid = j >= self.first
+        return j, valid, valid & (x < self.ends[j])
+
+    def downtime_before(self, t: np.ndarray) -> np.ndarray:
+        """Seconds each node was down before t."""
+        j, valid, _ = self.locate(t)
+        within = np.minimum(t + self.offsets - self.starts[j], self.lengths[j])
+        return np.where(valid, self.prefix[j] - self.prefix[self.first] + within, 0.0)
+
+    def next_start(self, t: np.ndarray) -> np.ndarray:
+        """Start of each node's first outage starting after t (inf if none)."""
+        x = t + self.offsets
+        j = np.searchsorted(self.starts, x, side="right")
+        return np.where(j < self.stop, self.starts[j] - self.offsets, np.inf)
+
+    def last_ended(self, t: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Index of the node's last outage that ended by t, and whether there is one."""
+        j = np.searchsorted(self.ends[:-1], t + self.offsets, side="right") - 1
+        return j, j >= self.first
+
+
+def simulate(
+    trace: Trace,
+    settings: List[Setting],
+    failure_mode: str,
+    probe_loss: float,
+    seed: int,
+) -> Dict[str, np.ndarray]:
+    """Simulate all settings over the trace; per-setting result arrays."""
+    grid = np.array(settings, dtype=np.int64).reshape(-1, 4)
+    interval, timeout, minimum_failures, checks_interval = (grid[:, i] for i in range(4))
+    index = OutageIndex(trace, float(timeout.max(initial=0)))
+    rng = np.random.default_rng(seed)
+    horizon = trace.duration
+    k, n = len(grid), len(trace.nodes)
+
+    wake = np.gcd(checks_interval, np.where(interval > 0, interval, checks_interval))
+    wake = np.maximum(wake, 1).astype(float)
+    due_after = interval[:, None].astype(float)
+    # Spacing of a node's checks while they succeed at once
+    period = np.maximum(np.ceil(due_after / wake[:, None]), 1) * wake[:, None]
+    limit = minimum_failures[:, None]
+    check_time = (timeout if failure_mode == "timeout" else np.zeros(k)).astype(float)[:, None]
+
+    t = np.zeros(k)
+    last_update = np.full((k, n), -np.inf)
+    failures = np.zeros((k, n), dtype=np.int64)
+    up = np.ones((k, n), dtype=bool)
+    changed_at = np.zeros((k, n))
+    checks = np.zeros((k, n), dtype=np.int64)
+    false_evictions = np.zeros(k, dtype=np.int64)
+    exposed = np.zeros(k)  # seconds in rotation while down
+    out_while_up = np.zeros(k)  # seconds out of rotation while reachable
+    first_evict = np.full((k, index.count), np.inf)
+    restored = np.full((k, index.count), np.inf)
+    rows = np.arange(k)[:, None].repeat(n, axis=1)
+    # Checks until (and including) the next lost probe of a reachable node
+    never = np.iinfo(np.int64).max // 2
+    loss_in = rng.geometric(probe_loss, (k, n)) if probe_loss else np.full((k, n), never)
+
+    def settle(mask: np.ndarray, until: np.ndarray) -> None:
+        """Account the time since the last change of the masked nodes, in their current state."""
+        a = np.minimum(changed_at, horizon)
+        b = np.minimum(until, horizon)
+        down = index.downtime_before(b) - index.downtime_before(a)
+        exposed[:] += np.where(mask & up, down, 0).sum(axis=1)
+        out_while_up[:] += np.where(mask & ~up, (b - a) - down, 0).sum(axis=1)
+
+    while True:
+        active = t < horizon
+        if not active.any():
+            break
+        now = t[:, None].repeat(n, axis=1)
+        _, _, down = index.locate(now)
+
+        # Fast-forward settings whose nodes are all up, reachable and
+        # without failures: every check succeeds at once until the next
+        # outage starts or the next probe is lost, so those rounds are counted
+        steady = active & (up & (failures == 0) & ~down).all(axis=1)
+        if steady.any():
+            first_due = now + np.ceil(np.maximum(0.0, last_update + due_after - now) / wake[:, None]) * wake[:, None]
+            quiet_until = np.minimum(index.next_start(now), first_due + (loss_in - 1) * period)
+            until = np.minimum(quiet_until.min(axis=1), horizon)
+            skipped = np.where(
+                steady[:, None] & (first_due < until[:, None]),
+                np.ceil((until[:, None] - first_due) / period),
+                0,
+            ).astype(np.int64)
+            checks += skipped
+            loss_in -= skipped
+            last_update = np.where(skipped > 0, first_due + (skipped - 1) * period, last_update)
+            t = np.where(steady, t + np.maximum(0.0, np.ceil((until - t) / wake)) * wake, t)
+            active = t < horizon
+            now = t[:, None].repeat(n, axis=1)
+            _, _, down = index.locate(now)
+
+        due = active[:, None] & (now >= last_update + due_after)
+        loss_in -= due
+        lost = due & (loss_in == 0)
+        if lost.any():
+            loss_in[lost] = rng.geometric(probe_loss, lost.sum())
+        down = down | lost
+        fail = due & down
+        ok = due & ~down
+        finished = now + np.where(fail, check_time, 0.0)
+        checks += due
+
+        failures = np.where(ok, 0, np.where(fail, np.minimum(failures + 1, limit), failures))
+        new_up = np.where(ok, True, np.where(fail & (failures >= limit), False, up))
+        flipped = new_up != up
+        if flipped.any():
+            settle(flipped, finished)
+            evicted = flipped & up
+            j, _, in_outage = index.locate(finished)
+            false_evictions += (evicted & ~in_outage).sum(axis=1)
+            hit = evicted & in_outage
+            first_evict[rows[hit], j[hit]] = np.minimum(first_evict[rows[hit], j[hit]], finished[hit])
+            back = flipped & ~up
+            j, ended = index.last_ended(finished)
+            hit = back & ended
+            if hit.any():
+                r, c = rows[hit], j[hit]
+                fresh = np.isfinite(first_evict[r, c]) & np.isinf(restored[r, c])
+                restored[r[fresh], c[fresh]] = finished[hit][fresh]
+            changed_at = np.where(flipped, finished, changed_at)
+            up = new_up
+        # time() is whole seconds
+        last_update = np.where(due, np.floor(finished), last_update)
+
+        round_end = t + np.maximum(wake, np.where(due, finished - now, 0.0).max(axis=1))
+        next_due = (last_update + due_after).min(axis=1)
+        gap = np.maximum(0.0, next_due - round_end)
+        t = np.where(active, round_end + np.ceil(gap / wake) * wake, t)
+
+    settle(np.ones((k, n), dtype=bool), np.full((k, n), horizon))
+
+    ends = index.begin + index.length
+    delay = np.minimum(first_evict, ends) - index.begin
+    recovered = np.isfinite(restored)
+    recoveries = recovered.sum(axis=1)
+    restore_total = np.where(recovered, restored - ends, 0.0).sum(axis=1)
+    total_down = index.length.sum()
+    none = np.full(k, np.nan)
+    return {
+        "failover_mean_s": delay.mean(axis=1) if index.count else none,
+        "failover_p95_s": np.percentile(delay, 95, axis=1) if index.count else none,
+        "missed_pct": 100.0 * np.isinf(first_evict).mean(axis=1) if index.count else np.zeros(k),
+        "restore_mean_s": np.divide(restore_total, recoveries, out=none.copy(), where=recoveries > 0),
+        "exposed_pct": 100.0 * exposed / total_down if total_down else np.zeros(k),
+        "false_evictions_per_node_day": false_evictions / (n * horizon / 86400),
+        "out_while_up_pct": 100.0 * out_while_up / (n * horizon - total_down),
+        "checks_per_node_min": checks.sum(axis=1) / n / (horizon / 60),
+    }
+
+
+def parse_list(text: str) -> List[int]:
+    """Comma-separated integers; 1e5 style values are accepted."""
+    return [int(float(value)) for value in text.split(",") if value]
+
+
+def run(
+    trace: Trace,
+    settings: List[Setting],
+    failure_mode: str,
+    probe_loss: float,
+    seed: int,
+) -> Dict[str, np.ndarray]:
+    """simulate() in chunks of similar settings, results in the order of ``settings``."""
+    # Settings with the same interval need the same number of rounds
+    order = sorted(range(len(settings)), key=lambda i: settings[i])
+    results: Dict[str, np.ndarray] = {}
+    for offset in range(0, len(order), CHUNK_SIZE):
+        chunk = order[offset : offset + CHUNK_SIZE]
+        for name, values in simulate(
+            trace, [settings[i] for i in chunk], failure_mode, probe_loss, seed
+        ).items():
+            results.setdefault(name, np.empty(len(settings)))[chunk] = values
+    return results
+
+
+def rows_for(
+    settings: List[Setting],
+    results: Dict[str, np.ndarray],
+    check_sets: int,
+    indices: List[int],
+    current: Optional[Setting],
+) -> List[Dict[str, Any]]:
+    rows = []
+    for i in indices:
+        row: Dict[str, Any] = dict(zip(CHECK_SETTINGS, settings[i]))
+        row["current"] = settings[i] == current
+        for name, values in results.items():
+            value = float(values[i])
+            if name == "checks_per_node_min":
+                value *= check_sets
+            row[name] = None if math.isnan(value) else round(value, 3)
+        rows.append(row)
+    return rows
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    trace = report["trace"]
+    print(
+        f"Trace: {trace['nodes']} nodes, {trace['days']} days, {trace['outages']} outages "
+        f"({trace['down_pct']}% down), failure mode {report['failure_mode']}, "
+        f"probe loss {report['probe_loss']}"
+    )
+    print(
+        f"{report['settings']} settings; ranked by failover delay with at most "
+        f"{report['max_false_per_day']} false evictions per node-day ({report['eligible']} eligible)"
+    )
+    print()
+    header = (
+        f"{'':1} {'interval':>8} {'timeout':>7} {'minFail':>7} {'luaInt':>6}  "
+        f"{'failover s':>10} {'p95 s':>7} {'missed%':>7} {'restore s':>9} "
+        f"{'false/day':>9} {'outUp%':>7} {'checks/min':>10}"
+    )
+    print(header)
+    print("-" * len(header))
+
+    def fmt(value: Optional[float], width: int, digits: int = 1) -> str:
+        return f"{'-':>{width}}" if value is None else f"{value:>{width}.{digits}f}"
+
+    rows = report["ranking"]
+    if report["current"] and not any(row["current"] for row in rows):
+        rows = rows + [report["current"]]
+    for row in rows:
+        mark = "*" if row["current"] else ""
+        print(
+            f"{mark:1} {row['interval']:>8} {row['timeout']:>7} {row['minimumFailures']:>7} "
+            f"{row['lua-health-checks-interval']:>6}  {fmt(row['failover_mean_s'], 10)} "
+            f"{fmt(row['failover_p95_s'], 7)} {fmt(row['missed_pct'], 7)} {fmt(row['restore_mean_s'], 9)} "
+            f"{fmt(row['false_evictions_per_node_day'], 9, 3)} {fmt(row['out_while_up_pct'], 7, 3)} "
+            f"{fmt(row['checks_per_node_min'], 10)}"
+        )
+    if report["current"]:
+        print("\n* = current settings (powerdns.lua_health_checks in vars.yaml)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Simulate PowerDNS Lua health checks over outage traces")
+    parser.add_argument("traces", nargs="*", type=Path, help="Probe logs / outage JSONL files")
+    parser.add_argument(
+        "--interval", type=parse_list, default=[5, 10, 15, 20, 30, 45, 60],
+        help="ifportup() interval values, 0 = every checker round (default: 5,10,15,20,30,45,60)",
+    )
+    parser.add_argument(
+        "--timeout", type=parse_list, default=[1, 2, 3, 5], help="ifportup() timeout values (default: 1,2,3,5)"
+    )
+    parser.add_argument(
+        "--minimum-failures", type=parse_list, default=[1, 2, 3, 4, 5],
+        help="ifportup() minimumFailures values (default: 1,2,3,4,5)",
+    )
+    parser.add_argument(
+        "--lua-health-checks-interval", type=parse_list, default=[1, 5, 10, 30, 60],
+        help="lua-health-checks-interval values (default: 1,5,10,30,60)",
+    )
+    parser.add_argument(
+        "--failure-mode", choices=["timeout", "refused"], default="timeout",
+        help="How checks of an unreachable node fail (default: timeout)",
+    )
+    parser.add_argument(
+        "--probe-loss", type=float, default=0.0, help="Chance a check of a reachable node fails (default: 0)"
+    )
+    parser.add_argument(
+        "--check-sets", type=int, default=1,
+        help="Distinct ifportup() option tables in use; each is checked separately (default: 1)",
+    )
+    parser.add_argument("--synthetic-days", type=float, help="Generate this many days of outages instead of reading traces")
+    parser.add_argument("--nodes", type=int, default=3, help="Synthetic: number of nodes (default: 3)")
+    parser.add_argument("--outages-per-day", type=float, default=1.0, help="Synthetic: outages per node-day (default: 1)")
+    parser.add_argument("--outage-median", type=float, default=120.0, help="Synthetic: median outage seconds (default: 120)")
+    parser.add_argument("--outage-sigma", type=float, default=1.5, help="Synthetic: lognormal sigma (default: 1.5)")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed (default: 1)")
+    parser.add_argument(
+        "--max-false-per-day", type=float, default=0.1,
+        help="Only rank settings with at most this many false evictions per node-day (default: 0.1)",
+    )
+    parser.add_argument("--top", type=int, default=15, help="Settings to show (default: 15)")
+    parser.add_argument(
+        "--config", type=Path, default=DEFAULT_CONFIG,
+        help="vars.yaml with the current settings (default: ../vars.yaml)",
+    )
+    parser.add_argument("--json", action="store_true", help="Output JSON")
+    args = parser.parse_args()
+
+    if args.synthetic_days:
+        trace = synthetic_trace(
+            args.nodes, args.synthetic_days, args.outages_per_day, args.outage_median, args.outage_sigma,
+            np.random.default_rng(args.seed),
+        )
+    elif args.traces:
+        try:
+            trace = read_traces(args.traces)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+    else:
+        print("Error: give trace files or --synthetic-days")
+        sys.exit(1)
+
+    try:
+        current = read_current_settings(args.config)
+    except (OSError, KeyError, TypeError, ValueError) as e:
+        print(f"Error: cannot read the current settings from {args.config}: {e}")
+        sys.exit(1)
+    settings = [
+        Setting(*values)
+        for values in itertools.product(
+            args.interval, args.timeout, args.minimum_failures, args.lua_health_checks_interval
+        )
+    ]
+    if current is not None and current not in settings:
+        settings.append(current)
+
+    results = run(trace, settings, args.failure_mode, args.probe_loss, args.seed)
+
+    false_rate = results["false_evictions_per_node_day"]
+    eligible = [i for i in range(len(settings)) if false_rate[i] <= args.max_false_per_day]
+    eligible.sort(
+        key=lambda i: (
+            np.nan_to_num(results["failover_mean_s"][i], nan=0.0),
+            results["checks_per_node_min"][i],
+        )
+    )
+    ranking = rows_for(settings, results, args.check_sets, eligible[: args.top], current)
+    current_row = None
+    if current is not None:
+        current_row = rows_for(settings, results, args.check_sets, [settings.index(current)], current)[0]
+
+    total_down = sum(float((o[:, 1] - o[:, 0]).sum()) for o in trace.outages)
+    report = {
+        "trace": {
+            "nodes": len(trace.nodes),
+            "days": round(trace.duration / 86400, 2),
+            "outages": sum(len(o) for o in trace.outages),
+            "down_pct": round(100.0 * total_down / (len(trace.nodes) * trace.duration), 3),
+        },
+        "failure_mode": args.failure_mode,
+        "probe_loss": args.probe_loss,
+        "check_sets": args.check_sets,
+        "settings": len(settings),
+        "max_false_per_day": args.max_false_per_day,
+        "eligible": len(eligible),
+        "current": current_row,
+        "ranking": ranking,
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+"""
+PowerDNS Cache Sizing Simulator
+
+Replays the queries in PowerDNS query logs (see pdns_querylog.py) through
+a model of the authoritative server's caches and predicts, for every
+combination of the cache settings in templates/pdns.conf.j2:
+
+  cache-ttl            packet cache lifetime (capped by the answer's TTL)
+  query-cache-ttl      query cache lifetime of backend lookups with records
+                       (capped by the records' TTL)
+  negquery-cache-ttl   query cache lifetime of lookups without records
+  max-cache-entries    size of each cache (least recently used evicted)
+
+the packet cache hit ratio, the query cache hit ratio of the remaining
+lookups, backend lookups and Lua evaluations per second (LUA records run
+on every packet cache miss, whatever the query cache holds) and the
+memory both caches need. Every combination is simulated in the same pass
+over the logs.
+
+Answers (TTL, NXDOMAIN/NODATA, LUA or not) come from the zones rendered
+from vars.yaml, as in analyze_querylog.py. Packet cache keys include the
+ECS subnet a query carried (--ignore-ecs drops it). Queries for names
+outside our zones are not simulated.
+
+For large traces, --sample-rate R simulates only the query names whose
+hash falls in a fraction R of the hash space, with cache sizes scaled by
+R (spatial sampling, as in SHARDS). Entry counts are scaled back up by
+1/R and query counts by the share of in-zone queries that were sampled.
+A handful of very popular names can dominate a sample, so keep R at 1 for
+traces with few distinct names; a warning is printed when fewer than
+MIN_SAMPLED_NAMES distinct names were sampled.
+
+Usage:
+  ./simulate_pdns_cache.py /var/log/pdns/pdns.log*
+  ./simulate_pdns_cache.py /var/log/pdns/pdns.log.1 --cache-ttl 20,60,300 --max-cache-entries 1e4,1e5,1e6
+  ./simulate_pdns_cache.py /var/log/pdns/pdns.log* --sample-rate 0.05 --json
+"""
+
+import argparse
+import itertools
+import json
+import re
+import sys
+import zlib
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import yaml
+
+from analyze_querylog import ANSWER, OUT_OF_ZONE, ZoneIndex
+from pdns_querylog import iter_queries
+
+PDNS_CONF_TEMPLATE = Path(__file__).parent.parent / "templates" / "pdns.conf.j2"
+CACHE_SETTINGS = ("cache-ttl", "query-cache-ttl", "negquery-cache-ttl", "max-cache-entries")
+
+# Expired entries are dropped this often (seconds of trace time)
+PURGE_INTERVAL = 60
+# Rough per-entry sizes for the memory estimate, in bytes
+PACKET_ENTRY_OVERHEAD = 200
+QUERY_ENTRY_OVERHEAD = 150
+RECORD_BYTES = 64
+ANSWER_RDATA_BYTES = 40
+# Below this many distinct sampled names, --sample-rate results are unreliable
+MIN_SAMPLED_NAMES = 10000
+
+LookupCache = Dict[Tuple[str, str], Tuple[str, int, bool]]
+
+
+class Setting(NamedTuple):
+    cache_ttl: int
+    query_cache_ttl: int
+    negquery_cache_ttl: int
+    max_cache_entries: int
+
+
+def read_current_settings(path: Path = PDNS_CONF_TEMPLATE) -> Optional[Setting]:
+    """The cache settings pdns.conf.j2 deploys, if they are all set there."""
+    values = {}
+    for line in path.read_text().splitlines():
+        match = re.match(r"^([a-z-]+)=(\d+)\s*$", line)
+        if match and match.group(1) in CACHE_SETTINGS:
+            values[match.group(1)] = int(match.group(2))
+    if len(values) != len(CACHE_SETTINGS):
+        return None
+    return Setting(*(values[name] for name in CACHE_SETTINGS))
+
+
+class TTLCache:
+    """Fixed-size LRU cache whose entries also expire."""
+
+    __slots__ = ("ttl", "size", "entries", "hits", "misses", "peak")
+
+    def __init__(self, ttl: int, size: int):
+        self.ttl = ttl
+        self.size = size
+        self.entries: "OrderedDict[Any, float]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.peak = 0
+
+    def lookup(self, key: Any, now: float, ttl: int) -> bool:
+        """Return True on a hit; on a miss, cache the key for min(ttl, cache TTL)."""
+        entries = self.entries
+        expires = entries.get(key)
+        if expires is not None and expires > now:
+            entries.move_to_end(key)
+            self.hits += 1
+            return True
+        self.misses += 1
+        ttl = min(ttl, self.ttl)
+        if ttl > 0:
+            entries[key] = now + ttl
+            entries.move_to_end(key)
+            if len(entries) > self.size:
+                entries.popitem(last=False)
+        return False
+
+    def purge(self, now: float) -> None:
+        self.peak = max(self.peak, len(self.entries))
+        expired = [key for key, expires in self.entries.items() if expires <= now]
+        for key in expired:
+            del self.entries[key]
+
+
+class CacheSimulator:
+    """Packet and query caches for a set of settings, fed one query at a time."""
+
+    def __init__(self, settings: List[Setting], sample_rate: float = 1.0):
+        self.settings = settings
+        self.sample_rate = sample_rate
+        self.sample_limit = int(sample_rate * (1 << 24))
+
+        def scaled(size: int) -> int:
+            return max(1, round(size * sample_rate))
+
+        # Settings that differ only in query cache TTLs share a packet cache
+        self.packet_caches: Dict[Tuple[int, int], TTLCache] = {}
+        self.query_caches: Dict[Setting, TTLCache] = {}
+        self.by_packet_cache: Dict[Tuple[int, int], List[Setting]] = {}
+        for setting in settings:
+            packet_key = (setting.cache_ttl, setting.max_cache_entries)
+            if packet_key not in self.packet_caches:
+                self.packet_caches[packet_key] = TTLCache(
+                    setting.cache_ttl, scaled(setting.max_cache_entries)
+                )
+            self.by_packet_cache.setdefault(packet_key, []).append(setting)
+            # Positive and negative lookups share one query cache
+            self.query_caches[setting] = TTLCache(
+                max(setting.query_cache_ttl, setting.negquery_cache_ttl),
+                scaled(setting.max_cache_entries),
+            )
+        self.lua: Dict[Tuple[int, int], Counter] = {key: Counter() for key in self.packet_caches}
+
+        self.queries = 0
+        self.sampled = 0
+        self.sampled_names: set = set()
+        self.out_of_zone = 0
+        self.packet_bytes = 0
+        self.query_bytes = 0
+        self.first: Optional[float] = None
+        self.last = 0.0
+        self.next_purge = 0.0
+
+    def sampled_key(self, qkey: str) -> bool:
+        return self.sample_limit >= 1 << 24 or (
+            zlib.crc32(qkey.encode()) & 0xFFFFFF
+        ) < self.sample_limit
+
+    def query(self, now: float, qname: str, qtype: str, ecs: Optional[str], answer: Tuple[str, int, bool]) -> None:
+        self.queries += 1
+        if self.first is None:
+            self.first = now
+            self.next_purge = now + PURGE_INTERVAL
+        self.last = max(self.last, now)
+        if now >= self.next_purge:
+            self.purge(now)
+
+        kind, ttl, lua = answer
+        if kind == OUT_OF_ZONE:
+            self.out_of_zone += 1
+            return
+        qkey = f"{qname}|{qtype}"
+        if not self.sampled_key(qkey):
+            return
+        self.sampled += 1
+        if self.sample_rate < 1:
+            self.sampled_names.add(qkey)
+        packet_key = f"{qkey}|{ecs}" if ecs else qkey
+        # Query and response packets (header, question, OPT/ECS, answer)
+        query_size = 12 + len(qname) + 6 + 11 + (12 if ecs else 0)
+        self.packet_bytes += 2 * query_size + (ANSWER_RDATA_BYTES if kind == ANSWER else 0)
+        self.query_bytes += len(qname) + (RECORD_BYTES if kind == ANSWER else 0)
+        minute = int(now) // 60
+
+        for cache_key, packet_cache in self.packet_caches.items():
+            if packet_cache.lookup(packet_key, now, ttl):
+                continue
+            if lua:
+                self.lua[cache_key][minute] += 1
+            for setting in self.by_packet_cache[cache_key]:
+                # Like the packet cache, positive entries live no longer than the records' TTL
+                self.query_caches[setting].lookup(
+                    qkey,
+                    now,
+                    min(ttl, setting.query_cache_ttl) if kind == ANSWER else setting.negquery_cache_ttl,
+                )
+
+    def purge(self, now: float) -> None:
+        for cache in self.packet_caches.values():
+            cache.purge(now)
+        for cache in self.query_caches.values():
+            cache.purge(now)
+        self.next_purge = now + PURGE_INTERVAL
+
+    def minute_seconds(self, minute: int) -> float:
+        """Seconds of the trace that fall into a minute bucket (the first and last are partial)."""
+        start = max(minute * 60, self.first or 0.0)
+        end = min(minute * 60 + 60, self.last + 1)
+        return max(end - start, 1.0)
+
+    def report(self, current: Optional[Setting]) -> Dict[str, Any]:
+        self.purge(self.last)
+        duration = max(self.last - (self.first or 0.0), 1.0)
+        # Queries scale by the sampled share, cache entries by the sample rate
+        scale = (self.queries - self.out_of_zone) / (self.sampled or 1)
+        entry_scale = 1 / self.sample_rate
+        packet_entry = PACKET_ENTRY_OVERHEAD + self.packet_bytes / (self.sampled or 1)
+        query_entry = QUERY_ENTRY_OVERHEAD + self.query_bytes / (self.sampled or 1)
+
+        rows = []
+        for setting in self.settings:
+            cache_key = (setting.cache_ttl, setting.max_cache_entries)
+            packet_cache = self.packet_caches[cache_key]
+            query_cache = self.query_caches[setting]
+            lookups = query_cache.hits + query_cache.misses
+            backend = query_cache.misses
+            lua = self.lua[cache_key]
+            rows.append(
+                {
+                    "cache_ttl": setting.cache_ttl,
+                    "query_cache_ttl": setting.query_cache_ttl,
+                    "negquery_cache_ttl": setting.negquery_cache_ttl,
+                    "max_cache_entries": setting.max_cache_entries,
+                    "current": setting == current,
+                    "packet_hit_pct": round(
+                        packet_cache.hits / ((packet_cache.hits + packet_cache.misses) or 1) * 100, 2
+                    ),
+                    "query_hit_pct": round((lookups - backend) / (lookups or 1) * 100, 2),
+                    "backend_lookups_per_s": round(backend * scale / duration, 2),
+                    "lua_per_s": round(sum(lua.values()) * scale / duration, 2),
+                    "lua_peak_per_s": round(
+                        max((count / self.minute_seconds(m) for m, count in lua.items()), default=0)
+                        * scale,
+                        2,
+                    ),
+                    "packet_entries": round(packet_cache.peak * entry_scale),
+                    "query_entries": round(query_cache.peak * entry_scale),
+                    "memory_mb": round(
+                        (packet_cache.peak * packet_entry + query_cache.peak * query_entry)
+                        * entry_scale
+                        / 1e6,
+                        1,
+                    ),
+                }
+            )
+        return {
+            "queries": self.queries,
+            "out_of_zone": self.out_of_zone,
+            "simulated": self.sampled,
+            "sample_rate": self.sample_rate,
+            **({"sampled_names": len(self.sampled_names)} if self.sample_rate < 1 else {}),
+            "duration_s": round(duration, 1),
+            "qps": round(self.queries / duration, 2),
+            "settings": rows,
+        }
+
+
+def replay(
+    paths: List[Path],
+    simulator: CacheSimulator,
+    index: ZoneIndex,
+    year: Optional[int],
+    ignore_ecs: bool,
+) -> None:
+    answers: LookupCache = {}
+    for entry in iter_queries(paths, year):
+        qname = entry.qname.rstrip(".").lower()
+        key = (qname, entry.qtype)
+        answer = answers.get(key)
+        if answer is None:
+            if len(answers) >= 1 << 18:
+                answers.clear()
+            answer = answers[key] = index.lookup(qname, entry.qtype)
+        simulator.query(
+            entry.timestamp, qname, entry.qtype, None if ignore_ecs else entry.ecs, answer
+        )
+
+
+def parse_list(text: str) -> List[int]:
+    """Comma-separated integers; 1e5 style values are accepted."""
+    return [int(float(value)) for value in text.split(",") if value]
+
+
+def build_settings(args: argparse.Namespace, current: Optional[Setting]) -> List[Setting]:
+    settings = [
+        Setting(*values)
+        for values in itertools.product(
+            args.cache_ttl, args.query_cache_ttl, args.negquery_cache_ttl, args.max_cache_entries
+        )
+    ]
+    if current is not None and current not in settings:
+        settings.append(current)
+    return sorted(settings)
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(
+        f"{report['queries']} queries over {report['duration_s']}s ({report['qps']} QPS), "
+        f"{report['out_of_zone']} out of zone, {report['simulated']} simulated "
+        f"(sample rate {report['sample_rate']}"
+        + (f", {report['sampled_names']} distinct names" if "sampled_names" in report else "")
+        + ")"
+    )
+    print()
+    print(
+        f"  {'cache':>6} {'query':>6} {'neg':>6} {'entries':>9} "
+        f"{'pkt hit%':>9} {'qc hit%':>8} {'backend/s':>10} {'lua/s':>9} {'lua peak/s':>11} {'MB':>8}"
+    )
+    for row in report["settings"]:
+        marker = " *" if row["current"] else ""
+        print(
+            f"  {row['cache_ttl']:>6} {row['query_cache_ttl']:>6} {row['negquery_cache_ttl']:>6} "
+            f"{row['max_cache_entries']:>9} {row['packet_hit_pct']:>9} {row['query_hit_pct']:>8} "
+            f"{row['backend_lookups_per_s']:>10} {row['lua_per_s']:>9} {row['lua_peak_per_s']:>11} "
+            f"{row['memory_mb']:>8}{marker}"
+        )
+    if any(row["current"] for row in report["settings"]):
+        print()
+        print("  * current settings in templates/pdns.conf.j2")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Predict PowerDNS packet/query cache behaviour from query logs"
+    )
+    parser.add_argument("logs", nargs="+", type=Path, help="Query logs (plain or .gz, rotated)")
+    parser.add_argument(
+        "--cache-ttl", type=parse_list, default=[0, 20, 60, 120, 300], help="cache-ttl values (default: 0,20,60,120,300)"
+    )
+    parser.add_argument(
+        "--query-cache-ttl", type=parse_list, default=[20, 60], help="query-cache-ttl values (default: 20,60)"
+    )
+    parser.add_argument(
+        "--negquery-cache-ttl", type=parse_list, default=[60], help="negquery-cache-ttl values (default: 60)"
+    )
+    parser.add_argument(
+        "--max-cache-entries",
+        type=parse_list,
+        default=[10000, 100000, 1000000],
+        help="max-cache-entries values (default: 10000,100000,1000000)",
+    )
+    parser.add_argument(
+        "--sample-rate",
+        type=float,
+        default=1.0,
+        help="Fraction of query names to simulate (default: 1.0)",
+    )
+    parser.add_argument("--ignore-ecs", action="store_true", help="Leave ECS out of packet cache keys")
+    parser.add_argument(
+        "--year",
+        type=int,
+        help="Year of traditional syslog timestamps (default: current year)",
+    )
+    parser.add_argument("--json", action="store_true", help="Output JSON")
+    parser.add_argument(
+        "-c",
+        "--config",
+        help="Configuration file path (default: ../vars.yaml from script location)",
+    )
+    args = parser.parse_args()
+
+    if not 0 < args.sample_rate <= 1:
+        parser.error("--sample-rate must be in (0, 1]")
+    missing = [str(path) for path in args.logs if not path.is_file()]
+    if missing:
+        print(f"Error: log file(s) not found: {', '.join(missing)}")
+        sys.exit(1)
+
+    config_path = args.config or Path(__file__).parent.parent / "vars.yaml"
+    with open(config_path, "r") as f:
+        config = yaml.safe_load(f)
+
+    current = read_current_settings()
+    simulator = CacheSimulator(build_settings(args, current), args.sample_rate)
+    replay(args.logs, simulator, ZoneIndex(config), args.year, args.ignore_ecs)
+    if simulator.queries == 0:
+        print("Error: no queries found in the logs")
+        sys.exit(1)
+
+    report = simulator.report(current)
+    sampled_names = report.get("sampled_names")
+    if sampled_names is not None and sampled_names < MIN_SAMPLED_NAMES:
+        print(
+            f"Warning: only {sampled_names} distinct names were sampled (fewer than {MIN_SAMPLED_NAMES}); "
+            "a few popular names can skew the hit ratios, rerun with a higher --sample-rate",
+            file=sys.stderr,
+        )
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
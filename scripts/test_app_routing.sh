@@ -16,94 +16,14 @@ NC='\033[0m' # No Color
 DNS_SERVER="${1:-127.0.0.1}"
 VERBOSE="${2:-false}"
 
-# Expected routing mappings (from original pipe backend)
-declare -A PRODUCTION_MAPPINGS=(
-    # Characters 0-9, a-g -> fdm-lb-1-1.runonflux.io
-    ["0"]="fdm-lb-1-1.runonflux.io"
-    ["1"]="fdm-lb-1-1.runonflux.io"
-    ["2"]="fdm-lb-1-1.runonflux.io"
-    ["3"]="fdm-lb-1-1.runonflux.io"
-    ["4"]="fdm-lb-1-1.runonflux.io"
-    ["5"]="fdm-lb-1-1.runonflux.io"
-    ["6"]="fdm-lb-1-1.runonflux.io"
-    ["7"]="fdm-lb-1-1.runonflux.io"
-    ["8"]="fdm-lb-1-1.runonflux.io"
-    ["9"]="fdm-lb-1-1.runonflux.io"
-    ["a"]="fdm-lb-1-1.runonflux.io"
-    ["b"]="fdm-lb-1-1.runonflux.io"
-    ["c"]="fdm-lb-1-1.runonflux.io"
-    ["d"]="fdm-lb-1-1.runonflux.io"
-    ["e"]="fdm-lb-1-1.runonflux.io"
-    ["f"]="fdm-lb-1-1.runonflux.io"
-    ["g"]="fdm-lb-1-1.runonflux.io"
-    
-    # Characters h-n -> fdm-lb-1-2.runonflux.io
-    ["h"]="fdm-lb-1-2.runonflux.io"
-    ["i"]="fdm-lb-1-2.runonflux.io"
-    ["j"]="fdm-lb-1-2.runonflux.io"
-    ["k"]="fdm-lb-1-2.runonflux.io"
-    ["l"]="fdm-lb-1-2.runonflux.io"
-    ["m"]="fdm-lb-1-2.runonflux.io"
-    ["n"]="fdm-lb-1-2.runonflux.io"
-    
-    # Characters o-u -> fdm-lb-1-3.runonflux.io
-    ["o"]="fdm-lb-1-3.runonflux.io"
-    ["p"]="fdm-lb-1-3.runonflux.io"
-    ["q"]="fdm-lb-1-3.runonflux.io"
-    ["r"]="fdm-lb-1-3.runonflux.io"
-    ["s"]="fdm-lb-1-3.runonflux.io"
-    ["t"]="fdm-lb-1-3.runonflux.io"
-    ["u"]="fdm-lb-1-3.runonflux.io"
-    
-    # Characters v-z -> fdm-lb-1-4.runonflux.io
-    ["v"]="fdm-lb-1-4.runonflux.io"
-    ["w"]="fdm-lb-1-4.runonflux.io"
-    ["x"]="fdm-lb-1-4.runonflux.io"
-    ["y"]="fdm-lb-1-4.runonflux.io"
-    ["z"]="fdm-lb-1-4.runonflux.io"
-)
-
-declare -A STAGING_MAPPINGS=(
-    # Characters 0-9, a-m -> fdm-lb-2-1.runonflux.io
-    ["0"]="fdm-lb-2-1.runonflux.io"
-    ["1"]="fdm-lb-2-1.runonflux.io"
-    ["2"]="fdm-lb-2-1.runonflux.io"
-    ["3"]="fdm-lb-2-1.runonflux.io"
-    ["4"]="fdm-lb-2-1.runonflux.io"
-    ["5"]="fdm-lb-2-1.runonflux.io"
-    ["6"]="fdm-lb-2-1.runonflux.io"
-    ["7"]="fdm-lb-2-1.runonflux.io"
-    ["8"]="fdm-lb-2-1.runonflux.io"
-    ["9"]="fdm-lb-2-1.runonflux.io"
-    ["a"]="fdm-lb-2-1.runonflux.io"
-    ["b"]="fdm-lb-2-1.runonflux.io"
-    ["c"]="fdm-lb-2-1.runonflux.io"
-    ["d"]="fdm-lb-2-1.runonflux.io"
-    ["e"]="fdm-lb-2-1.runonflux.io"
-    ["f"]="fdm-lb-2-1.runonflux.io"
-    ["g"]="fdm-lb-2-1.runonflux.io"
-    ["h"]="fdm-lb-2-1.runonflux.io"
-    ["i"]="fdm-lb-2-1.runonflux.io"
-    ["j"]="fdm-lb-2-1.runonflux.io"
-    ["k"]="fdm-lb-2-1.runonflux.io"
-    ["l"]="fdm-lb-2-1.runonflux.io"
-    ["m"]="fdm-lb-2-1.runonflux.io"
-    
-    # Characters n-z -> fdm-lb-2-2.runonflux.io
-    ["n"]="fdm-lb-2-2.runonflux.io"
-    ["o"]="fdm-lb-2-2.runonflux.io"
-    ["p"]="fdm-lb-2-2.runonflux.io"
-    ["q"]="fdm-lb-2-2.runonflux.io"
-    ["r"]="fdm-lb-2-2.runonflux.io"
-    ["s"]="fdm-lb-2-2.runonflux.io"
-    ["t"]="fdm-lb-2-2.runonflux.io"
-    ["u"]="fdm-lb-2-2.runonflux.io"
-    ["v"]="fdm-lb-2-2.runonflux.io"
-    ["w"]="fdm-lb-2-2.runonflux.io"
-    ["x"]="fdm-lb-2-2.runonflux.io"
-    ["y"]="fdm-lb-2-2.runonflux.io"
-    ["z"]="fdm-lb-2-2.runonflux.io"
-)
+# Expected routing mappings, compiled from app_routes in vars.yaml
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+FIXTURES="${ROUTING_FIXTURES:-$SCRIPT_DIR/../generated/app_routing_fixtures.sh}"
+if [ ! -f "$FIXTURES" ]; then
+    python3 "$SCRIPT_DIR/generate_zone.py" --routing > /dev/null
+fi
+# shellcheck source=/dev/null
+source "$FIXTURES"
 
 echo "========================================"
 echo "App Routing Test - Pipe → Bind Migration"
@@ -260,38 +180,39 @@ test_soa_queries() {
 
 # Main test execution
 main() {
-    # Test both environments
-    production_failures=0
-    staging_failures=0
-    
-    test_environment "Production" "app.runonflux.io" PRODUCTION_MAPPINGS
-    production_failures=$?
-    
-    test_environment "Staging" "app2.runonflux.io" STAGING_MAPPINGS  
-    staging_failures=$?
-    
+    # Test every app zone
+    total_failures=0
+    zone_failures=()
+
+    for zone in "${APP_ZONES[@]}"; do
+        failures=0
+        test_environment "${ZONE_ENVIRONMENTS[$zone]^}" "$zone" "${ZONE_MAPPINGS[$zone]}" || failures=$?
+        total_failures=$((total_failures + failures))
+        zone_failures+=("$zone: $failures")
+    done
+
     # Test additional endpoints
     test_debug_endpoints
     test_health_endpoints
     test_soa_queries
-    
+
     # Summary
     echo "========================================"
-    total_failures=$((production_failures + staging_failures))
-    
+
     if [ $total_failures -eq 0 ]; then
         echo -e "${GREEN}🎉 ALL TESTS PASSED!${NC}"
         echo -e "${GREEN}Migration from pipe backend to bind backend was successful!${NC}"
     else
         echo -e "${RED}❌ $total_failures tests failed${NC}"
-        echo -e "${RED}Production failures: $production_failures${NC}"
-        echo -e "${RED}Staging failures: $staging_failures${NC}"
+        for line in "${zone_failures[@]}"; do
+            echo -e "${RED}Failures in $line${NC}"
+        done
         echo ""
         echo "Please check the Lua script and zone file configuration."
     fi
-    
+
     echo "========================================"
-    
+
     exit $total_failures
 }
 
@@ -0,0 +1,163 @@
+#!/bin/bash
+
+# Test script for multi-vantage monitoring (monitor_cdn_health.py --push and
+# cdn_health_aggregator.py). Three agents on this box probe three stand-in
+# CDN nodes on 127.0.0.x; one agent sees node B on a closed port, as if its
+# path to B were broken, so the matrix must differ per vantage
+
+set -e
+
+# Colors for output
+RED='\033[0;31m'
+GREEN='\033[0;32m'
+NC='\033[0m' # No Color
+
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+AGG_PORT="${1:-19109}"
+NODE_PORT="${2:-18443}"
+AGG="http://127.0.0.1:$AGG_PORT"
+KEY="test-key"
+WORK_DIR="$(mktemp -d)"
+PIDS=()
+
+cleanup() {
+    for pid in "${PIDS[@]}"; do
+        kill "$pid" 2>/dev/null || true
+    done
+    rm -rf "$WORK_DIR"
+}
+trap cleanup EXIT
+
+echo "========================================"
+echo "Multi-Vantage Aggregator Test"
+echo "========================================"
+
+FAILURES=0
+
+check() {
+    local description=$1
+    local expected=$2
+    local actual=$3
+    if [ "$expected" == "$actual" ]; then
+        echo -e "${GREEN}✓ PASS${NC}: $description"
+    else
+        echo -e "${RED}✗ FAIL${NC}: $description (expected '$expected', got '$actual')"
+        FAILURES=$((FAILURES + 1))
+    fi
+}
+
+# vars.yaml with three nodes; the second argument is node B's port
+write_config() {
+    cat > "$1" <<EOF
+powerdns:
+  staging: {}
+  production:
+    zone_configs:
+      - zone: "cdn-geo.test"
+        template_vars:
+          geo_routing: true
+          geo_regions:
+            - {name: "a", server: "cdn-a.test", ip: "127.0.0.11", port: $NODE_PORT}
+            - {name: "b", server: "cdn-b.test", ip: "127.0.0.12", port: $2}
+            - {name: "c", server: "cdn-c.test", ip: "127.0.0.13", port: $NODE_PORT}
+EOF
+}
+write_config "$WORK_DIR/vars.yaml" "$NODE_PORT"
+write_config "$WORK_DIR/vars-broken-b.yaml" "$((NODE_PORT + 1))"
+
+# Nodes A and B accept connections, C is down
+python3 -c "
+import asyncio, sys
+async def main():
+    for host in sys.argv[2:]:
+        await asyncio.start_server(lambda reader, writer: writer.close(), host, int(sys.argv[1]))
+    await asyncio.Event().wait()
+asyncio.run(main())" "$NODE_PORT" 127.0.0.11 127.0.0.12 &
+PIDS+=($!)
+
+python3 "$SCRIPT_DIR/cdn_health_aggregator.py" --listen 127.0.0.1 --port "$AGG_PORT" --key "$KEY" \
+    --stale-after 2 --print-interval 0 --config "$WORK_DIR/vars.yaml" 2> /dev/null &
+PIDS+=($!)
+for _ in $(seq 50); do
+    curl -s "$AGG/matrix" > /dev/null 2>&1 && break
+    sleep 0.1
+done
+
+# Agents are started directly (not through a function) so that $! is the python process
+AGENT_ARGS=(--dns-server 127.0.0.1 --no-https-probe --interval 0.5 --jitter 0 --push-interval 0.5 --push-key "$KEY")
+python3 "$SCRIPT_DIR/monitor_cdn_health.py" "${AGENT_ARGS[@]}" --config "$WORK_DIR/vars.yaml" \
+    --vantage eu --push "udp://127.0.0.1:$AGG_PORT" > /dev/null 2>&1 &
+PIDS+=($!)
+python3 "$SCRIPT_DIR/monitor_cdn_health.py" "${AGENT_ARGS[@]}" --config "$WORK_DIR/vars.yaml" \
+    --vantage us --push "http://127.0.0.1:$AGG_PORT" > /dev/null 2>&1 &
+PIDS+=($!)
+python3 "$SCRIPT_DIR/monitor_cdn_health.py" "${AGENT_ARGS[@]}" --config "$WORK_DIR/vars-broken-b.yaml" \
+    --vantage asia --push "udp://127.0.0.1:$AGG_PORT" > /dev/null 2>&1 &
+ASIA_PID=$!
+PIDS+=($ASIA_PID)
+
+# Prints the python expression evaluated over the matrix as m
+matrix() {
+    curl -s "$AGG/matrix" > "$WORK_DIR/matrix.json"
+    python3 -c "
+import json
+m = json.load(open('$WORK_DIR/matrix.json'))
+nodes = {node['name']: node for node in m['nodes']}
+print($1)"
+}
+for _ in $(seq 100); do
+    [ "$(matrix "min([cell['probes'] for node in m['nodes'] for cell in node['vantages'].values()] or [0]) >= 3 and len(m['vantages']) == 3")" == "True" ] && break
+    sleep 0.1
+done
+
+echo ""
+echo "1. Per-node, per-vantage matrix"
+check "agents over UDP and HTTP" "asia,eu,us" "$(matrix "','.join(m['vantages'])")"
+check "node A up from every vantage" "up 3" "$(matrix "nodes['cdn-a.test']['verdict'], nodes['cdn-a.test']['up']")"
+check "node B down from asia only" "partial down up up" \
+    "$(matrix "nodes['cdn-b.test']['verdict'], *(nodes['cdn-b.test']['vantages'][v]['state'] for v in ('asia', 'eu', 'us'))")"
+check "node C down everywhere" "down 3" "$(matrix "nodes['cdn-c.test']['verdict'], nodes['cdn-c.test']['down']")"
+check "connect latency for up cells" "True" \
+    "$(matrix "nodes['cdn-a.test']['vantages']['eu']['connect_ms']['ewma'] > 0 and 'p95' in nodes['cdn-a.test']['vantages']['eu']['connect_ms']")"
+
+echo ""
+echo "2. Frame accounting and authentication"
+python3 - "$AGG_PORT" "$KEY" "$SCRIPT_DIR" <<'EOF'
+import socket, sys
+sys.path.insert(0, sys.argv[3])
+from health_wire import encode_frames
+port, key = int(sys.argv[1]), sys.argv[2].encode()
+sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+probe = [("127.0.0.11", 443, True, False, 0.0, 0.001, None)]
+# 11 never arrives, 12 arrives late, 10 twice, and 1 is too old
+for sequence in (10, 10, 13, 12, 1):
+    for frame in encode_frames("synthetic", sequence, probe, key):
+        sock.sendto(frame, ("127.0.0.1", port))
+for frame in encode_frames("intruder", 1, probe):
+    sock.sendto(frame, ("127.0.0.1", port))
+EOF
+sleep 0.2
+check "lost, late and dropped frames counted" "1 1 2" \
+    "$(matrix "m['vantages']['synthetic']['lost'], m['vantages']['synthetic']['late'], m['vantages']['synthetic']['dropped']")"
+check "unsigned frames rejected" "False" "$(matrix "'intruder' in m['vantages']")"
+METRICS="$(curl -s "$AGG/metrics")"
+check "rejections in metrics" "1" \
+    "$(echo "$METRICS" | grep -c '^cdn_aggregator_rejected_frames_total{reason="bad mac"} 1.0')"
+check "per-vantage state in metrics" "1" \
+    "$(echo "$METRICS" | grep -c '^cdn_vantage_up{ip="127.0.0.12",node="cdn-b.test",vantage="asia"} 0.0')"
+
+echo ""
+echo "3. A silent agent goes stale"
+kill "$ASIA_PID"
+sleep 2.5
+check "vantage marked stale" "True" "$(matrix "m['vantages']['asia']['stale']")"
+check "node B verdict from fresh vantages only" "up stale" \
+    "$(matrix "nodes['cdn-b.test']['verdict'], nodes['cdn-b.test']['vantages']['asia']['state']")"
+
+echo ""
+if [ "$FAILURES" -eq 0 ]; then
+    echo -e "${GREEN}All aggregator tests passed${NC}"
+else
+    echo -e "${RED}$FAILURES aggregator test(s) failed${NC}"
+    exit 1
+fi
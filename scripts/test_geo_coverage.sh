@@ -0,0 +1,161 @@
+#!/bin/bash
+
+# Test script for the offline GeoIP coverage map (geo_coverage.py)
+# Generates a small GeoLite2-City style MMDB with hand-placed cities for the
+# CDN nodes and a few client networks, and checks the node each prefix gets,
+# the weighted shares and the current-vs-proposed diff
+
+set -e
+
+# Colors for output
+RED='\033[0;31m'
+GREEN='\033[0;32m'
+NC='\033[0m' # No Color
+
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+WORK_DIR="$(mktemp -d)"
+
+cleanup() {
+    rm -rf "$WORK_DIR"
+}
+trap cleanup EXIT
+
+echo "========================================"
+echo "GeoIP Coverage Map Test"
+echo "========================================"
+
+FAILURES=0
+
+check() {
+    local description=$1
+    local expected=$2
+    local actual=$3
+    if [ "$expected" == "$actual" ]; then
+        echo -e "${GREEN}✓ PASS${NC}: $description"
+    else
+        echo -e "${RED}✗ FAIL${NC}: $description (expected '$expected', got '$actual')"
+        FAILURES=$((FAILURES + 1))
+    fi
+}
+
+python3 - "$WORK_DIR" "$SCRIPT_DIR" <<'EOF'
+import sys
+sys.path.insert(0, sys.argv[2])
+from geo_coverage import write_mmdb
+
+def city(name, latitude, longitude):
+    return {"city": {"names": {"en": name}}, "location": {"latitude": latitude, "longitude": longitude}}
+
+networks = [
+    # CDN nodes
+    ("89.58.0.0/16", city("Nuremberg", 49.45, 11.08)),
+    ("107.175.0.0/16", city("Buffalo", 42.89, -78.88)),
+    ("180.188.0.0/16", city("Hong Kong", 22.28, 114.16)),
+    ("103.1.0.0/16", city("Singapore", 1.29, 103.85)),
+    # Clients; the /25 inside the /24 is more specific
+    ("198.51.100.0/24", city("Frankfurt", 50.11, 8.68)),
+    ("198.51.100.128/25", city("Chicago", 41.88, -87.63)),
+    ("203.0.113.0/24", city("Jakarta", -6.2, 106.85)),
+    ("192.0.2.0/24", city("Tokyo", 35.68, 139.69)),
+    ("100.64.0.0/24", city("Date line", 0.0, -179.0)),
+    ("2001:db8::/32", city("Sydney", -33.87, 151.21)),
+]
+for record_size in (24, 28, 32):
+    write_mmdb(f"{sys.argv[1]}/city-{record_size}.mmdb", networks, record_size=record_size)
+EOF
+
+cat > "$WORK_DIR/vars.yaml" <<EOF
+powerdns:
+  staging: {}
+  production:
+    zone_configs:
+      - zone: "cdn-geo.test"
+        template_vars:
+          geo_routing: true
+          geo_regions:
+            - {name: "eu-central", server: "cdn-1.test", ip: "89.58.31.71"}
+            - {name: "us-west", server: "cdn-2.test", ip: "107.175.82.227"}
+            - {name: "as-east", server: "cdn-3.test", ip: "180.188.197.165"}
+EOF
+cat > "$WORK_DIR/proposed.yaml" <<EOF
+geo_regions:
+  - {name: "eu-central", server: "cdn-1.test", ip: "89.58.31.71"}
+  - {name: "us-west", server: "cdn-2.test", ip: "107.175.82.227"}
+  - {name: "as-east", server: "cdn-3.test", ip: "180.188.197.165"}
+  - {name: "as-south", server: "cdn-4.test", ip: "103.1.0.10"}
+EOF
+cat > "$WORK_DIR/prefixes.txt" <<EOF
+# prefix  queries
+198.51.100.0/24    100
+198.51.100.200/25  10   # Chicago
+203.0.113.0/24     40
+192.0.2.17         20
+2001:db8:1::/48    30
+10.0.0.0/8         5    # not in the database
+EOF
+
+# Prints the python expression evaluated over the JSON report of geo_coverage.py ARGS... as r
+coverage() {
+    local expression=$1
+    shift
+    python3 "$SCRIPT_DIR/geo_coverage.py" "$WORK_DIR/prefixes.txt" --mmdb "$WORK_DIR/city-28.mmdb" \
+        --config "$WORK_DIR/vars.yaml" --json "$@" > "$WORK_DIR/report.json"
+    python3 -c "import json; r = json.load(open('$WORK_DIR/report.json')); print($expression)"
+}
+
+echo ""
+echo "1. Node per prefix and weighted shares"
+check "prefixes per node (Frankfurt and 0,0 to EU, Chicago to US, Jakarta, Tokyo and Sydney to Asia)" "2 1 3" \
+    "$(coverage "*(r['current'][s]['prefixes'] for s in ('cdn-1.test', 'cdn-2.test', 'cdn-3.test'))")"
+check "shares weighted by query count" "51.220 4.878 43.902" \
+    "$(coverage "*('%.3f' % r['current'][s]['share_pct'] for s in ('cdn-1.test', 'cdn-2.test', 'cdn-3.test'))")"
+check "unlocated prefix counted" "1 2.439" "$(coverage "r['unlocated']['prefixes'], r['unlocated']['share_pct']")"
+for size in 24 32; do
+    check "same answer from a $size-bit record database" "2 1 3" "$(python3 "$SCRIPT_DIR/geo_coverage.py" \
+        "$WORK_DIR/prefixes.txt" --mmdb "$WORK_DIR/city-$size.mmdb" --config "$WORK_DIR/vars.yaml" --json |
+        python3 -c "import json, sys; r = json.load(sys.stdin)['current']; print(*(r[s]['prefixes'] for s in sorted(r)))")"
+done
+
+echo ""
+echo "2. Current vs proposed regions"
+check "new node takes Jakarta and Sydney" "2 34.146" \
+    "$(coverage "r['proposed']['cdn-4.test']['prefixes'], r['proposed']['cdn-4.test']['share_pct']" --proposed "$WORK_DIR/proposed.yaml")"
+check "moved traffic by node pair" "[('cdn-3.test', 'cdn-4.test', 2)]" \
+    "$(coverage "[(s['from'], s['to'], s['prefixes']) for s in r['moved']['shifts']]" --proposed "$WORK_DIR/proposed.yaml")"
+check "a node that is down serves nothing" "3 3" \
+    "$(coverage "r['current']['cdn-2.test']['prefixes'], r['current']['cdn-3.test']['prefixes']" --down cdn-1.test)"
+python3 "$SCRIPT_DIR/geo_coverage.py" "$WORK_DIR/prefixes.txt" --mmdb "$WORK_DIR/city-28.mmdb" \
+    --config "$WORK_DIR/vars.yaml" --proposed "$WORK_DIR/proposed.yaml" --output "$WORK_DIR/assignment.tsv" > /dev/null
+check "per-prefix assignment file" "203.0.113.0/24	cdn-3.test	cdn-4.test" "$(sed -n 4p "$WORK_DIR/assignment.tsv")"
+
+echo ""
+echo "3. pickclosest() distance"
+cat > "$WORK_DIR/date-line.yaml" <<EOF
+- {name: "west", server: "west.test", ip: "192.0.2.1", latitude: 0.0, longitude: 179.0}
+- {name: "east", server: "east.test", ip: "192.0.2.2", latitude: 0.0, longitude: -170.0}
+EOF
+echo "100.64.0.0/24" > "$WORK_DIR/date-line.txt"
+date_line() {
+    python3 "$SCRIPT_DIR/geo_coverage.py" "$WORK_DIR/date-line.txt" --mmdb "$WORK_DIR/city-28.mmdb" \
+        --config "$WORK_DIR/vars.yaml" --proposed "$WORK_DIR/date-line.yaml" --json "$@" |
+        python3 -c "import json, sys; r = json.load(sys.stdin)['proposed']; print([s for s in r if r[s]['prefixes']])"
+}
+check "great-circle: across the date line" "['west.test']" "$(date_line)"
+check "degrees: longitude wrapped on one side only" "['east.test']" "$(date_line --distance degrees)"
+
+echo ""
+echo "4. Errors"
+echo "300.1.2.0/24" > "$WORK_DIR/bad.txt"
+check "invalid prefix reported with its line" "Error: line 1: invalid prefix '300.1.2.0/24'" \
+    "$(python3 "$SCRIPT_DIR/geo_coverage.py" "$WORK_DIR/bad.txt" --mmdb "$WORK_DIR/city-28.mmdb" --config "$WORK_DIR/vars.yaml" || true)"
+check "not an MMDB" "True" \
+    "$(python3 "$SCRIPT_DIR/geo_coverage.py" "$WORK_DIR/prefixes.txt" --mmdb "$WORK_DIR/vars.yaml" --config "$WORK_DIR/vars.yaml" |
+        grep -q "not a MaxMind DB" && echo True || echo False)"
+
+echo ""
+if [ "$FAILURES" -eq 0 ]; then
+    echo -e "${GREEN}All coverage map tests passed${NC}"
+else
+    echo -e "${RED}$FAILURES coverage map test(s) failed${NC}"
+    exit 1
+fi
@@ -0,0 +1,155 @@
+#!/bin/bash
+
+# Test script for the health monitor's serve mode (monitor_cdn_health.py --serve)
+# Runs against pdns_api_standin.py serving the production zones over DNS, with
+# explicit records standing in for the LUA ones, and checks the /health and
+# /healthdetail answers, their cache headers, and that polling adds no DNS load
+
+set -e
+
+# Colors for output
+RED='\033[0;31m'
+GREEN='\033[0;32m'
+NC='\033[0m' # No Color
+
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+PORT="${1:-18084}"
+DNS_PORT="${2:-15310}"
+SERVE_PORT="${3:-13000}"
+API="http://127.0.0.1:$PORT"
+API_KEY="test"
+SERVE="http://127.0.0.1:$SERVE_PORT"
+WORK_DIR="$(mktemp -d)"
+STANDIN_PID=""
+SERVE_PID=""
+
+cleanup() {
+    for pid in "$SERVE_PID" "$STANDIN_PID"; do
+        if [ -n "$pid" ]; then
+            kill "$pid" 2>/dev/null || true
+        fi
+    done
+    rm -rf "$WORK_DIR"
+}
+trap cleanup EXIT
+
+echo "========================================"
+echo "Health Serve Mode Test"
+echo "========================================"
+
+FAILURES=0
+
+check() {
+    local description=$1
+    local expected=$2
+    local actual=$3
+    if [ "$expected" == "$actual" ]; then
+        echo -e "${GREEN}✓ PASS${NC}: $description"
+    else
+        echo -e "${RED}✗ FAIL${NC}: $description (expected '$expected', got '$actual')"
+        FAILURES=$((FAILURES + 1))
+    fi
+}
+
+# replace ZONE NAME TYPE CONTENT: one REPLACE through the stand-in API
+replace() {
+    curl -s -X PATCH -H "X-API-Key: $API_KEY" "$API/api/v1/servers/localhost/zones/$1." -d "{\"rrsets\": [
+        {\"name\": \"$2.\", \"type\": \"$3\", \"ttl\": 60, \"changetype\": \"REPLACE\",
+         \"records\": [{\"content\": $(python3 -c 'import json, sys; print(json.dumps(sys.argv[1]))' "$4"), \"disabled\": false}]}]}"
+}
+dns_queries() {
+    curl -s "$API/standin/stats" | python3 -c "import json, sys; print(json.load(sys.stdin)['dns_queries'])"
+}
+# serve ARGS...: start the monitor in serve mode and wait for its first snapshot
+serve() {
+    python3 "$SCRIPT_DIR/monitor_cdn_health.py" --serve --environment production --dns-server "127.0.0.1:$DNS_PORT" \
+        --serve-port "$SERVE_PORT" "$@" > /dev/null 2>&1 &
+    SERVE_PID=$!
+    for _ in $(seq 50); do
+        curl -s "$SERVE/health" > /dev/null 2>&1 && break
+        sleep 0.1
+    done
+}
+stop_serve() {
+    kill "$SERVE_PID"
+    wait "$SERVE_PID" 2>/dev/null || true
+    SERVE_PID=""
+}
+# Prints the python expression evaluated over the /healthdetail JSON as h
+detail() {
+    curl -s "$SERVE/healthdetail" | python3 -c "import json, sys; h = json.load(sys.stdin); print($1)"
+}
+
+python3 "$SCRIPT_DIR/generate_zone.py" --all --env production -o "$WORK_DIR/zones" > /dev/null
+python3 "$SCRIPT_DIR/pdns_api_standin.py" --load "$WORK_DIR/zones" --port "$PORT" --api-key "$API_KEY" \
+    --dns-port "$DNS_PORT" > /dev/null 2>&1 &
+STANDIN_PID=$!
+for _ in $(seq 50); do
+    curl -s "$API/standin/stats" > /dev/null 2>&1 && break
+    sleep 0.1
+done
+
+# The stand-in does not run LUA records: answer what PowerDNS would
+replace app.runonflux.io web.app.runonflux.io CNAME fdm-lb-1-4.runonflux.io.
+replace app.runonflux.io test.app.runonflux.io CNAME fdm-lb-1-3.runonflux.io.
+replace app.runonflux.io app123.app.runonflux.io CNAME fdm-lb-1-1.runonflux.io.
+replace app.runonflux.io hello.app.runonflux.io CNAME fdm-lb-1-2.runonflux.io.
+replace app.runonflux.io _debug.app.runonflux.io TXT '"Domain: _debug.app.runonflux.io"'
+replace cdn-geo.runonflux.io cdn-geo.runonflux.io A 89.58.31.71
+
+echo ""
+echo "1. Health answers match the Node.js health checker"
+serve --interval 0.5
+check "simple health is the web CNAME" '["fdm-lb-1-4.runonflux.io"]' "$(curl -s "$SERVE/health")"
+check "detailed health is healthy" "healthy 4 0 pass" \
+    "$(detail "h['status'], h['checks']['app_routing']['passed'], h['checks']['app_routing']['failed'], h['checks']['geo_routing']['status']")"
+check "every region's _health record checked" "3 3 89.58.31.71" \
+    "$(detail "h['checks']['geo_routing']['health_records'], h['checks']['geo_routing']['health_passed'], h['checks']['geo_routing']['main_record']")"
+check "SOA and NS checked" "True ['pdns1.runonflux.io']" \
+    "$(detail "h['checks']['basic_dns']['soa_serial'] > 0, h['checks']['basic_dns']['nameservers']")"
+
+echo ""
+echo "2. Cache and staleness headers"
+curl -s -D "$WORK_DIR/headers" -o /dev/null "$SERVE/healthdetail"
+header() {
+    grep -i "^$1:" "$WORK_DIR/headers" | cut -d' ' -f2- | tr -d '\r'
+}
+check "Cache-Control follows the interval" "max-age=0" "$(header Cache-Control)"
+check "not stale" "0" "$(header X-Health-Stale)"
+check "Age and Last-Modified present" "2" "$(grep -ci "^age:\|^last-modified:" "$WORK_DIR/headers")"
+check "ETag revalidates while unchanged" "304" \
+    "$(curl -s -o /dev/null -w '%{http_code}' -H "If-None-Match: $(header ETag)" "$SERVE/healthdetail")"
+
+echo ""
+echo "3. A misrouted app is picked up by the next round"
+replace app.runonflux.io hello.app.runonflux.io CNAME fdm-lb-1-1.runonflux.io.
+sleep 1.2
+check "unhealthy with 503" "503" "$(curl -s -o /dev/null -w '%{http_code}' "$SERVE/healthdetail")"
+check "error names the expected load balancer" \
+    "['hello.app.runonflux.io resolved to unexpected target: fdm-lb-1-1.runonflux.io (expected fdm-lb-1-2.runonflux.io)']" \
+    "$(detail "h['errors']")"
+curl -s -D "$WORK_DIR/headers" -o /dev/null "$SERVE/healthdetail"
+check "an unhealthy answer is not revalidated" "503" \
+    "$(curl -s -o /dev/null -w '%{http_code}' -H "If-None-Match: $(header ETag)" "$SERVE/healthdetail")"
+replace app.runonflux.io hello.app.runonflux.io CNAME fdm-lb-1-2.runonflux.io.
+stop_serve
+
+echo ""
+echo "4. Polling does not add DNS queries; old snapshots turn stale"
+serve --interval 60 --serve-stale-after 2
+BEFORE=$(dns_queries)
+curl -s "$SERVE/healthdetail?[1-200]" "$SERVE/health?[1-200]" > /dev/null
+check "400 requests, no DNS queries" "0" "$(($(dns_queries) - BEFORE))"
+sleep 2.2
+check "stale snapshot answered with 503" "503" "$(curl -s -o /dev/null -w '%{http_code}' "$SERVE/health")"
+curl -s -D "$WORK_DIR/headers" -o /dev/null "$SERVE/healthdetail"
+check "stale header set" "1" "$(header X-Health-Stale)"
+stop_serve
+
+echo ""
+if [ "$FAILURES" -eq 0 ]; then
+    echo -e "${GREEN}All health serve tests passed${NC}"
+else
+    echo -e "${RED}$FAILURES health serve test(s) failed${NC}"
+    exit 1
+fi
@@ -0,0 +1,140 @@
+#!/bin/bash
+
+# Test script for bulk override import/export (pdns_overrides.py)
+# Runs against pdns_api_standin.py with injected 503s and added latency, and
+# checks that many overrides go out in few PATCHes over a bounded connection
+# pool, that failed requests are retried, and that export round-trips
+
+set -e
+
+# Colors for output
+RED='\033[0;31m'
+GREEN='\033[0;32m'
+NC='\033[0m' # No Color
+
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+PORT="${1:-18082}"
+API="http://127.0.0.1:$PORT"
+API_KEY="test"
+WORK_DIR="$(mktemp -d)"
+STANDIN_PID=""
+OVERRIDES=1000
+BATCH_SIZE=200
+CONCURRENCY=3
+
+cleanup() {
+    if [ -n "$STANDIN_PID" ]; then
+        kill "$STANDIN_PID" 2>/dev/null || true
+    fi
+    rm -rf "$WORK_DIR"
+}
+trap cleanup EXIT
+
+echo "========================================"
+echo "Bulk Override Test (PowerDNS API stand-in)"
+echo "========================================"
+
+FAILURES=0
+
+check() {
+    local description=$1
+    local expected=$2
+    local actual=$3
+    if [ "$expected" == "$actual" ]; then
+        echo -e "${GREEN}✓ PASS${NC}: $description"
+    else
+        echo -e "${RED}✗ FAIL${NC}: $description (expected '$expected', got '$actual')"
+        FAILURES=$((FAILURES + 1))
+    fi
+}
+
+overrides() {
+    python3 "$SCRIPT_DIR/pdns_overrides.py" "$@" --zone "$ZONE" --api "$API" --api-key "$API_KEY" \
+        --batch-size "$BATCH_SIZE" --concurrency "$CONCURRENCY"
+}
+
+# Applied PATCHes, and a field of /standin/stats
+patch_count() {
+    curl -s "$API/standin/patches" | python3 -c "import json, sys; print(len(json.load(sys.stdin)))"
+}
+stat() {
+    curl -s "$API/standin/stats" | python3 -c "import json, sys; print(json.load(sys.stdin)['$1'])"
+}
+
+cp "$SCRIPT_DIR/../vars.yaml" "$WORK_DIR/vars.yaml"
+python3 "$SCRIPT_DIR/generate_zone.py" --all --env production -c "$WORK_DIR/vars.yaml" \
+    -o "$WORK_DIR/zones" > /dev/null
+python3 "$SCRIPT_DIR/pdns_api_standin.py" --load "$WORK_DIR/zones" --port "$PORT" --api-key "$API_KEY" \
+    --fail-every 4 --delay 0.05 &
+STANDIN_PID=$!
+for _ in $(seq 50); do
+    curl -s "$API/standin/stats" > /dev/null 2>&1 && break
+    sleep 0.1
+done
+
+ZONE=$(python3 -c "
+import yaml
+zones = yaml.safe_load(open('$WORK_DIR/vars.yaml'))['powerdns']['production']['zone_configs']
+print([z['domain'] for z in zones if z['type'] == 'app'][0])")
+
+python3 - "$WORK_DIR/overrides.jsonl" "$OVERRIDES" <<'EOF'
+import json, sys
+with open(sys.argv[1], "w") as f:
+    for i in range(int(sys.argv[2])):
+        f.write(json.dumps({"name": f"bulk{i}", "type": "A", "ttl": 300, "content": f"198.51.{i // 250}.{i % 250 + 1}"}) + "\n")
+EOF
+
+echo ""
+echo "1. Dry run sends nothing"
+overrides import "$WORK_DIR/overrides.jsonl" --dry-run -c "$WORK_DIR/vars.yaml" > /dev/null
+check "no requests" "0" "$(stat requests)"
+
+echo ""
+echo "2. Importing $OVERRIDES overrides"
+CONNECTIONS=$(stat connections)
+overrides import "$WORK_DIR/overrides.jsonl" -c "$WORK_DIR/vars.yaml"
+# Less the connection of the first stat call
+IMPORT_CONNECTIONS=$(($(stat connections) - CONNECTIONS - 1))
+check "PATCHes applied" "$((OVERRIDES / BATCH_SIZE))" "$(patch_count)"
+check "injected failures were retried" "1" "$([ "$(stat failures)" -ge 1 ] && echo 1 || echo 0)"
+echo "   $IMPORT_CONNECTIONS connection(s)"
+check "connections within the pool" "1" "$([ "$IMPORT_CONNECTIONS" -le "$CONCURRENCY" ] && echo 1 || echo 0)"
+check "concurrent PATCHes within the limit" "1" "$([ "$(stat max_in_flight)" -le "$CONCURRENCY" ] && echo 1 || echo 0)"
+
+echo ""
+echo "3. Export returns the overrides"
+overrides export "$WORK_DIR/exported.jsonl" -c "$WORK_DIR/vars.yaml" 2> /dev/null
+check "exported RRsets" "$OVERRIDES" "$(wc -l < "$WORK_DIR/exported.jsonl")"
+check "export matches the import" "" "$(python3 - "$WORK_DIR/overrides.jsonl" "$WORK_DIR/exported.jsonl" <<'EOF'
+import json, sys
+imported = {(r["name"], r["content"]) for r in map(json.loads, open(sys.argv[1]))}
+exported = {(r["name"], r["records"][0]) for r in map(json.loads, open(sys.argv[2]))}
+print(" ".join(sorted(str(x) for x in imported ^ exported)))
+EOF
+)"
+
+echo ""
+echo "4. Importing DELETEs removes the overrides"
+python3 -c "
+import json, sys
+for line in open('$WORK_DIR/exported.jsonl'):
+    r = json.loads(line)
+    print(json.dumps({'name': r['name'], 'type': r['type'], 'changetype': 'DELETE'}))" \
+    | overrides import - -c "$WORK_DIR/vars.yaml" > /dev/null
+overrides export "$WORK_DIR/after.jsonl" -c "$WORK_DIR/vars.yaml" 2> /dev/null
+check "no overrides left" "0" "$(wc -l < "$WORK_DIR/after.jsonl")"
+
+echo ""
+echo "5. A malformed line is reported"
+printf '{"name": "ok", "type": "A", "content": "192.0.2.1"}\n{"name": "bad"}\n' > "$WORK_DIR/bad.jsonl"
+PATCHES=$(patch_count)
+check "import fails" "1" "$(overrides import "$WORK_DIR/bad.jsonl" -c "$WORK_DIR/vars.yaml" > /dev/null && echo 0 || echo 1)"
+check "nothing sent before the bad line" "$PATCHES" "$(patch_count)"
+
+echo ""
+if [ "$FAILURES" -eq 0 ]; then
+    echo -e "${GREEN}All bulk override tests passed${NC}"
+else
+    echo -e "${RED}$FAILURES bulk override test(s) failed${NC}"
+    exit 1
+fi
@@ -0,0 +1,125 @@
+#!/bin/bash
+
+# Test script for the replication lag probe (probe_replication_lag.py)
+# Runs against pdns_api_standin.py serving DNS as a primary and two secondaries
+# that pick up changes 0.3s and 0.8s late, and checks the measured lag
+
+set -e
+
+# Colors for output
+RED='\033[0;31m'
+GREEN='\033[0;32m'
+NC='\033[0m' # No Color
+
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+PORT="${1:-18083}"
+DNS_PORT="${2:-15300}"
+METRICS_PORT="${3:-19110}"
+API="http://127.0.0.1:$PORT"
+API_KEY="test"
+WORK_DIR="$(mktemp -d)"
+STANDIN_PID=""
+PROBE_PID=""
+
+cleanup() {
+    for pid in "$PROBE_PID" "$STANDIN_PID"; do
+        if [ -n "$pid" ]; then
+            kill "$pid" 2>/dev/null || true
+        fi
+    done
+    rm -rf "$WORK_DIR"
+}
+trap cleanup EXIT
+
+echo "========================================"
+echo "Replication Lag Probe Test"
+echo "========================================"
+
+FAILURES=0
+
+check() {
+    local description=$1
+    local expected=$2
+    local actual=$3
+    if [ "$expected" == "$actual" ]; then
+        echo -e "${GREEN}✓ PASS${NC}: $description"
+    else
+        echo -e "${RED}✗ FAIL${NC}: $description (expected '$expected', got '$actual')"
+        FAILURES=$((FAILURES + 1))
+    fi
+}
+
+PROBE_ARGS=(--api "$API" --api-key "$API_KEY" --primary "127.0.0.1:$DNS_PORT"
+    --secondary "127.0.0.1:$((DNS_PORT + 1))" --secondary "127.0.0.1:$((DNS_PORT + 2))" --pause 0.1)
+probe() {
+    python3 "$SCRIPT_DIR/probe_replication_lag.py" "${PROBE_ARGS[@]}" "$@"
+}
+
+python3 "$SCRIPT_DIR/generate_zone.py" --all --env production -o "$WORK_DIR/zones" > /dev/null
+python3 "$SCRIPT_DIR/pdns_api_standin.py" --load "$WORK_DIR/zones" --port "$PORT" --api-key "$API_KEY" \
+    --dns-port "$DNS_PORT" --secondary-delay 0.3,0.8 2> /dev/null &
+STANDIN_PID=$!
+for _ in $(seq 50); do
+    curl -s "$API/standin/patches" > /dev/null 2>&1 && break
+    sleep 0.1
+done
+
+echo ""
+echo "1. Lag percentiles per nameserver"
+probe --runs 5 --json 2> /dev/null > "$WORK_DIR/summary.json"
+# Lag rounded to 0.1s, or "timeout" when a server missed the change
+lag_of() {
+    python3 -c "
+import json, sys
+server = json.load(open('$WORK_DIR/summary.json'))['nameservers']['127.0.0.1:$1']
+lag = server['$2_s']
+print('timeout' if server['timeouts'] else round(lag['p50'], 1), round(lag['max'], 1))"
+}
+check "primary serves the canary at once" "0.0 0.0" "$(lag_of "$DNS_PORT" canary)"
+check "first secondary is 0.3s behind" "0.3 0.3" "$(lag_of "$((DNS_PORT + 1))" canary)"
+check "second secondary is 0.8s behind" "0.8 0.8" "$(lag_of "$((DNS_PORT + 2))" canary)"
+check "serial follows the canary" "0.8 0.8" "$(lag_of "$((DNS_PORT + 2))" serial)"
+check "canary deleted on exit" "0" \
+    "$(curl -s -H "X-API-Key: $API_KEY" "$API/api/v1/servers/localhost/zones/app.runonflux.io." | grep -c _replication-canary || true)"
+
+echo ""
+echo "2. A secondary that never catches up times out"
+kill -STOP "$STANDIN_PID"
+if probe --runs 1 --timeout 0.5 > /dev/null 2>&1; then STATUS=0; else STATUS=$?; fi
+kill -CONT "$STANDIN_PID"
+check "probe fails when the API does not answer" "1" "$STATUS"
+probe --runs 1 --timeout 0.5 --json 2> /dev/null > "$WORK_DIR/summary.json"
+check "late secondary counted as a timeout" "timeout 0.3" \
+    "$(python3 -c "
+import json
+servers = json.load(open('$WORK_DIR/summary.json'))['nameservers']
+late, early = servers['127.0.0.1:$((DNS_PORT + 2))'], servers['127.0.0.1:$((DNS_PORT + 1))']
+print('timeout' if late['timeouts'] else 'ok', round(early['canary_s']['max'], 1))")"
+
+echo ""
+echo "3. Continuous mode serves Prometheus metrics"
+# Not through probe(): $! has to be the python process, not a subshell
+python3 "$SCRIPT_DIR/probe_replication_lag.py" "${PROBE_ARGS[@]}" --continuous \
+    --metrics-port "$METRICS_PORT" --metrics-address 127.0.0.1 --output "$WORK_DIR/runs.jsonl" 2> /dev/null &
+PROBE_PID=$!
+for _ in $(seq 100); do
+    [ -f "$WORK_DIR/runs.jsonl" ] && [ "$(wc -l < "$WORK_DIR/runs.jsonl")" -ge 2 ] && break
+    sleep 0.1
+done
+METRICS="$(curl -s "http://127.0.0.1:$METRICS_PORT/metrics")"
+check "lag histogram per nameserver" "1" \
+    "$(echo "$METRICS" | grep -c "pdns_replication_lag_seconds_count{nameserver=\"127.0.0.1:$((DNS_PORT + 2))\",role=\"secondary\",signal=\"canary\"}")"
+check "runs recorded as JSON lines" "1" "$([ "$(wc -l < "$WORK_DIR/runs.jsonl")" -ge 2 ] && echo 1 || echo 0)"
+kill -TERM "$PROBE_PID"
+wait "$PROBE_PID" 2>/dev/null || true
+PROBE_PID=""
+check "canary deleted on SIGTERM" "0" \
+    "$(curl -s -H "X-API-Key: $API_KEY" "$API/api/v1/servers/localhost/zones/app.runonflux.io." | grep -c _replication-canary || true)"
+
+echo ""
+if [ "$FAILURES" -eq 0 ]; then
+    echo -e "${GREEN}All replication lag tests passed${NC}"
+else
+    echo -e "${RED}$FAILURES replication lag test(s) failed${NC}"
+    exit 1
+fi
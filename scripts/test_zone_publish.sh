@@ -0,0 +1,167 @@
+#!/bin/bash
+
+# Test script for minimal-diff zone publishing (generate_zone.py --api)
+# Runs against pdns_api_standin.py, an in-memory stand-in for the PowerDNS API,
+# and checks that only changed RRsets are sent and that serials only go up
+
+set -e
+
+# Colors for output
+RED='\033[0;31m'
+GREEN='\033[0;32m'
+NC='\033[0m' # No Color
+
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+PORT="${1:-18081}"
+API="http://127.0.0.1:$PORT"
+API_KEY="test"
+WORK_DIR="$(mktemp -d)"
+STANDIN_PID=""
+
+cleanup() {
+    if [ -n "$STANDIN_PID" ]; then
+        kill "$STANDIN_PID" 2>/dev/null || true
+    fi
+    rm -rf "$WORK_DIR"
+}
+trap cleanup EXIT
+
+echo "========================================"
+echo "Zone Publish Test (PowerDNS API stand-in)"
+echo "========================================"
+
+FAILURES=0
+
+check() {
+    local description=$1
+    local expected=$2
+    local actual=$3
+    if [ "$expected" == "$actual" ]; then
+        echo -e "${GREEN}✓ PASS${NC}: $description"
+    else
+        echo -e "${RED}✗ FAIL${NC}: $description (expected '$expected', got '$actual')"
+        FAILURES=$((FAILURES + 1))
+    fi
+}
+
+publish() {
+    python3 "$SCRIPT_DIR/generate_zone.py" --all --env production -c "$WORK_DIR/vars.yaml" \
+        --api "$API" --api-key "$API_KEY" "$@"
+}
+
+# Number of PATCH requests the stand-in received, and RRsets in the last one
+patch_count() {
+    curl -s "$API/standin/patches" | python3 -c "import json, sys; print(len(json.load(sys.stdin)))"
+}
+last_patch() {
+    curl -s "$API/standin/patches" | python3 -c "
+import json, sys
+patch = json.load(sys.stdin)[-1]
+print(patch['zone'], patch['serial'], ' '.join(sorted(r['name'] + r['type'] for r in patch['rrsets'])))"
+}
+serial_of() {
+    curl -s -H "X-API-Key: $API_KEY" "$API/api/v1/servers/localhost/zones/$1." \
+        | python3 -c "import json, sys; print(json.load(sys.stdin)['serial'])"
+}
+
+# The live zones are what the playbook would have imported today
+cp "$SCRIPT_DIR/../vars.yaml" "$WORK_DIR/vars.yaml"
+python3 "$SCRIPT_DIR/generate_zone.py" --all --env production -c "$WORK_DIR/vars.yaml" \
+    -o "$WORK_DIR/zones" > /dev/null
+python3 "$SCRIPT_DIR/pdns_api_standin.py" --load "$WORK_DIR/zones" --port "$PORT" --api-key "$API_KEY" &
+STANDIN_PID=$!
+for _ in $(seq 50); do
+    curl -s "$API/standin/patches" > /dev/null 2>&1 && break
+    sleep 0.1
+done
+
+TODAY="$(date +%Y%m%d)00"
+GEO_ZONE=$(python3 -c "
+import yaml
+zones = yaml.safe_load(open('$WORK_DIR/vars.yaml'))['powerdns']['production']['zone_configs']
+print([z['domain'] for z in zones if z['type'] == 'geo'][0])")
+
+echo ""
+echo "1. Publishing unchanged zones"
+publish > /dev/null
+check "no PATCH for unchanged zones" "0" "$(patch_count)"
+
+echo ""
+echo "2. API override records are kept"
+curl -s -X PATCH -H "X-API-Key: $API_KEY" -H "Content-Type: application/json" \
+    -d "{\"rrsets\": [{\"name\": \"override.$GEO_ZONE.\", \"type\": \"A\", \"ttl\": 300,
+         \"changetype\": \"REPLACE\", \"records\": [{\"content\": \"192.0.2.1\", \"disabled\": false}]}]}" \
+    "$API/api/v1/servers/localhost/zones/$GEO_ZONE."
+OVERRIDE_SERIAL=$(serial_of "$GEO_ZONE")
+publish > /dev/null
+check "publishing leaves the override alone" "1" "$(patch_count)"
+
+echo ""
+echo "3. One changed region sends one RRset plus the SOA"
+python3 - "$WORK_DIR/vars.yaml" <<'EOF'
+import sys, yaml
+path = sys.argv[1]
+config = yaml.safe_load(open(path))
+for zone in config["powerdns"]["production"]["zone_configs"]:
+    if zone["type"] == "geo":
+        zone["template_vars"]["geo_regions"][0]["description"] += " (moved)"
+yaml.safe_dump(config, open(path, "w"), sort_keys=False)
+EOF
+publish > /dev/null
+read -r ZONE SERIAL RRSETS <<< "$(last_patch)"
+check "PATCH count" "2" "$(patch_count)"
+check "PATCHed zone" "$GEO_ZONE." "$ZONE"
+check "RRsets in PATCH" "2" "$(echo "$RRSETS" | wc -w)"
+check "serial increased" "$((OVERRIDE_SERIAL + 1))" "$SERIAL"
+
+echo ""
+echo "4. Publishing again changes nothing"
+publish > /dev/null
+check "no further PATCH" "2" "$(patch_count)"
+
+echo ""
+echo "5. A second change on the same day gets the next serial"
+sed -i 's/ (moved)/ (moved again)/' "$WORK_DIR/vars.yaml"
+publish > /dev/null
+read -r ZONE SERIAL RRSETS <<< "$(last_patch)"
+check "serial increased again" "$((OVERRIDE_SERIAL + 2))" "$SERIAL"
+check "serial is not below today's" "1" "$([ "$SERIAL" -ge "$TODAY" ] && echo 1 || echo 0)"
+
+echo ""
+echo "6. --prune deletes RRsets that are not in the template"
+publish --prune > /dev/null
+read -r ZONE SERIAL RRSETS <<< "$(last_patch)"
+check "override deleted with the SOA" "$GEO_ZONE.SOA override.$GEO_ZONE.A" "$RRSETS"
+
+echo ""
+echo "7. An SOA edit is published with a new serial"
+GEO_SERIAL=$(serial_of "$GEO_ZONE")
+PATCHES=$(patch_count)
+ZONES=$(python3 - "$WORK_DIR/vars.yaml" <<'EOF'
+import sys, yaml
+path = sys.argv[1]
+config = yaml.safe_load(open(path))
+config["powerdns"]["production"]["soa_email"] = "admin.runonflux.io."
+yaml.safe_dump(config, open(path, "w"), sort_keys=False)
+print(len(config["powerdns"]["production"]["zone_configs"]))
+EOF
+)
+publish > /dev/null
+check "one PATCH per zone" "$((PATCHES + ZONES))" "$(patch_count)"
+check "geo zone serial increased" "$((GEO_SERIAL + 1))" "$(serial_of "$GEO_ZONE")"
+check "new SOA email served" "admin.runonflux.io." "$(curl -s -H "X-API-Key: $API_KEY" \
+    "$API/api/v1/servers/localhost/zones/$GEO_ZONE." | python3 -c "
+import json, sys
+soa = [r for r in json.load(sys.stdin)['rrsets'] if r['type'] == 'SOA'][0]
+print(soa['records'][0]['content'].split()[1])")"
+PATCHES=$(patch_count)
+publish > /dev/null
+check "publishing again changes nothing" "$PATCHES" "$(patch_count)"
+
+echo ""
+if [ "$FAILURES" -eq 0 ]; then
+    echo -e "${GREEN}All zone publish tests passed${NC}"
+else
+    echo -e "${RED}$FAILURES zone publish test(s) failed${NC}"
+    exit 1
+fi
@@ -0,0 +1,135 @@
+#!/bin/bash
+
+# Test script for streamed zone records (generate_zone.py --records)
+# Streams small JSONL/CSV/SQLite sources into a zone and checks that the last
+# line of each RRset wins,
+# that the external merge sort matches the in-memory sort, and change tracking
+
+set -e
+
+# Colors for output
+RED='\033[0;31m'
+GREEN='\033[0;32m'
+NC='\033[0m' # No Color
+
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+WORK_DIR="$(mktemp -d)"
+ZONE="app.runonflux.io"
+ZONE_FILE="$WORK_DIR/zones/$ZONE.zone"
+trap 'rm -rf "$WORK_DIR"' EXIT
+
+echo "========================================"
+echo "Streamed Zone Records Test"
+echo "========================================"
+
+FAILURES=0
+
+check() {
+    local description=$1
+    local expected=$2
+    local actual=$3
+    if [ "$expected" == "$actual" ]; then
+        echo -e "${GREEN}✓ PASS${NC}: $description"
+    else
+        echo -e "${RED}✗ FAIL${NC}: $description (expected '$expected', got '$actual')"
+        FAILURES=$((FAILURES + 1))
+    fi
+}
+
+generate() {
+    python3 "$SCRIPT_DIR/generate_zone.py" "$ZONE" production app -o "$WORK_DIR/zones" "$@" 2> "$WORK_DIR/stderr"
+}
+# The streamed lines of the zone file, joined with "|"
+custom_records() {
+    sed -n '/^; Custom records/,/^$/p' "$ZONE_FILE" | sed '1d;/^$/d' | paste -sd'|'
+}
+serial() {
+    grep -m1 "; Serial" "$ZONE_FILE" | awk '{print $1}'
+}
+
+cat > "$WORK_DIR/overrides.jsonl" <<'EOF'
+{"name": "web", "type": "A", "ttl": 60, "records": ["192.0.2.8", "192.0.2.7"]}
+{"name": "ipshow.app.runonflux.io.", "type": "A", "content": "1.2.3.4"}
+# a later line replaces the whole RRset, as pdns_overrides.py import would
+{"name": "web", "type": "A", "ttl": 120, "records": ["192.0.2.7"]}
+{"name": "old", "type": "A", "records": ["192.0.2.5"]}
+{"name": "old", "type": "A", "changetype": "DELETE"}
+{"name": "_config", "type": "LUA", "content": "LUA \"dofile('/tmp/other.lua')\""}
+EOF
+printf 'name,type,ttl,value\nmail,MX,300,10 mx.example.com.\nmail,MX,300,20 mx2.example.com.\n' > "$WORK_DIR/extra.csv"
+printf 'name,type,ttl,value\nweb,A,60,192.0.2.9\n' > "$WORK_DIR/web.csv"
+
+echo ""
+echo "1. The last line of each RRset wins; CSV rows form RRsets together"
+generate --records "$WORK_DIR/overrides.jsonl" --records "$WORK_DIR/extra.csv" > /dev/null
+check "sorted RRsets, one TTL each" \
+    "ipshow    IN    A    1.2.3.4|mail    300    IN    MX    10 mx.example.com.|mail    300    IN    MX    20 mx2.example.com.|web    120    IN    A    192.0.2.7" \
+    "$(custom_records)"
+check "template RRsets are not overridden" "1 record(s) skipped, the template writes their RRsets: _config LUA" \
+    "$(cat "$WORK_DIR/stderr")"
+generate --records "$WORK_DIR/overrides.jsonl" --records "$WORK_DIR/web.csv" > /dev/null
+check "a later source replaces the RRset" "ipshow    IN    A    1.2.3.4|web    60    IN    A    192.0.2.9" "$(custom_records)"
+generate --records "$WORK_DIR/overrides.jsonl" --records "$WORK_DIR/extra.csv" > /dev/null
+SERIAL=$(serial)
+
+echo ""
+echo "2. Unchanged records leave the zone file alone"
+check "reported unchanged" "Zone file unchanged: $ZONE_FILE" \
+    "$(generate --records "$WORK_DIR/overrides.jsonl" --records "$WORK_DIR/extra.csv" | tail -1)"
+check "serial kept" "$SERIAL" "$(serial)"
+
+echo ""
+echo "3. The external merge sort matches the in-memory sort"
+python3 - "$WORK_DIR/many.jsonl" <<'EOF'
+import json, random, sys
+random.seed(7)
+with open(sys.argv[1], "w") as f:
+    for i in random.choices(range(3000), k=5000):
+        f.write(json.dumps({"name": f"app{i % 1000}", "type": "A", "ttl": 60 + i % 3,
+                            "records": [f"10.0.{i // 256}.{i % 256}"]}) + "\n")
+EOF
+generate --records "$WORK_DIR/many.jsonl" > /dev/null
+cp "$ZONE_FILE" "$WORK_DIR/in-memory.zone"
+rm -rf "$WORK_DIR/zones"
+generate --records "$WORK_DIR/many.jsonl" --sort-chunk 7 > /dev/null
+check "identical zone files" "" "$(diff <(grep -v "; Generated\|; Serial" "$WORK_DIR/in-memory.zone") <(grep -v "; Generated\|; Serial" "$ZONE_FILE"))"
+check "one TTL per RRset" "0" "$(custom_records | tr '|' '\n' | awk '{print $1, $2}' | sort -u | awk '{print $1}' | uniq -d | wc -l)"
+
+echo ""
+echo "4. Records from a PowerDNS gsqlite3 database"
+python3 - "$WORK_DIR/pdns.sqlite3" <<'EOF'
+import sqlite3, sys
+db = sqlite3.connect(sys.argv[1])
+db.executescript("""
+CREATE TABLE domains (id INTEGER PRIMARY KEY, name TEXT, type TEXT);
+CREATE TABLE records (id INTEGER PRIMARY KEY, domain_id INTEGER, name TEXT, type TEXT,
+                      content TEXT, ttl INTEGER, disabled BOOLEAN DEFAULT 0);
+INSERT INTO domains VALUES (1, 'app.runonflux.io', 'MASTER'), (2, 'other.example', 'MASTER');
+INSERT INTO records (domain_id, name, type, content, ttl, disabled) VALUES
+    (1, 'app.runonflux.io', 'NS', 'ns1.runonflux.io', 3600, 0),
+    (1, 'www.app.runonflux.io', 'CNAME', 'web.app.runonflux.io', 300, 0),
+    (1, 'old.app.runonflux.io', 'A', '192.0.2.1', 300, 1),
+    (2, 'www.other.example', 'A', '192.0.2.2', 300, 0);
+""")
+db.commit()
+EOF
+generate --records "$WORK_DIR/pdns.sqlite3" > /dev/null
+check "zone rows only, name targets absolute" "www    300    IN    CNAME    web.app.runonflux.io." "$(custom_records)"
+
+echo ""
+echo "5. Invalid records fail without touching the zone file"
+cp "$ZONE_FILE" "$WORK_DIR/before.zone"
+echo '{"name": "x.example.org.", "type": "A", "content": "192.0.2.1"}' > "$WORK_DIR/bad.jsonl"
+if generate --records "$WORK_DIR/bad.jsonl" > "$WORK_DIR/stdout"; then STATUS=0; else STATUS=$?; fi
+check "exit status" "1" "$STATUS"
+check "error names the line" "Error reading records for $ZONE: $WORK_DIR/bad.jsonl: line 1: x.example.org. is not in zone $ZONE" \
+    "$(cat "$WORK_DIR/stdout")"
+check "zone file kept" "" "$(diff "$WORK_DIR/before.zone" "$ZONE_FILE")"
+
+echo ""
+if [ "$FAILURES" -eq 0 ]; then
+    echo -e "${GREEN}All streamed zone record tests passed${NC}"
+else
+    echo -e "${RED}$FAILURES streamed zone record test(s) failed${NC}"
+    exit 1
+fi
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Streamed Zone Records
+
+Explicit per-app records (API overrides, custom records) can run into the
+millions, too many to pass to the zone template as a list and render into
+one string. This module reads them from files, sorts and de-duplicates them
+in bounded memory and emits zone file lines for generate_zone.py --records.
+
+Sources, picked by file extension:
+  .jsonl / .json / -   one RRset per line in the pdns_overrides.py format,
+                       {"name": "ipshow", "type": "A", "ttl": 300,
+                        "records": ["1.2.3.4"]} ("content" may stand in for
+                       a one-record list, "ttl" is optional), or
+                       {"name": "oldapp", "type": "A", "changetype": "DELETE"}
+  .csv                 header row with name, type, value (or content) and
+                       optionally ttl
+  .sqlite / .sqlite3 / .db
+                       the records table (name, type, content, ttl); in a
+                       PowerDNS gsqlite3 database only the zone's enabled
+                       rows
+
+Names are relative to the zone unless they end with a dot; "@" or "" is the
+apex. The records of one name and type form an RRset, and the last source
+that sets it wins, as when the lines are sent with pdns_overrides.py: every
+JSONL line replaces the RRset (a DELETE line removes it), and the rows of a
+CSV file or database together replace it. The values of the winning line
+are written together, each once (in sorted order) and all with the TTL
+given last.
+
+Sorting is an external merge sort: every chunk_size records are sorted and
+spilled to a temporary run file, and the runs are merged with heapq.merge,
+so memory stays bounded by chunk_size (plus the largest RRset) whatever the
+number of records.
+"""
+
+import csv
+import heapq
+import itertools
+import json
+import sqlite3
+import sys
+import tempfile
+from collections import Counter
+from operator import itemgetter
+from pathlib import Path
+from typing import IO, AbstractSet, Any, Iterable, Iterator, List, Optional, Tuple
+
+from pdns_sqlite import NAME_FIELDS
+
+# Records held in memory per sorted run
+SORT_CHUNK = 100_000
+# Lines joined per write
+WRITE_BATCH = 10_000
+
+# (name, type, ttl, value); ttl is "" when the zone's $TTL applies
+Record = Tuple[str, str, str, str]
+# (name, type, line, ttl, value): a record tagged with the source line that
+# set its RRset, counted across all sources; a DELETE line is one entry with
+# an empty value. value comes last so run files can split on the first four
+# tabs only.
+Entry = Tuple[str, str, int, str, str]
+RRSET_KEY = itemgetter(0, 1)
+
+_decode_json = json.JSONDecoder().decode
+
+
+def relative_name(name: str, zone: str) -> str:
+    """Owner name as written in the zone file: relative to the zone, "@" for the apex."""
+    name = name.strip().lower()
+    if name in ("", "@"):
+        return "@"
+    if not name.endswith("."):
+        return name
+    origin = zone.lower().rstrip(".") + "."
+    if name == origin:
+        return "@"
+    if name.endswith("." + origin):
+        return name[: -len(origin) - 1]
+    raise ValueError(f"{name} is not in zone {zone}")
+
+
+def make_record(name: str, rtype: str, value: Any, ttl: Any, zone: str) -> Record:
+    value = str(value).strip()
+    if not value or "\n" in value:
+        raise ValueError(f"invalid value {value!r}")
+    ttl = "" if ttl in (None, "") else str(int(ttl))
+    rtype = str(rtype).strip().upper()
+    if not rtype.isalnum():
+        raise ValueError(f"invalid type {rtype!r}")
+    name = relative_name(str(name), zone)
+    if len(name.split()) != 1:
+        raise ValueError(f"invalid name {name!r}")
+    return name, rtype, ttl, value
+
+
+def read_jsonl(lines: Iterable[str], zone: str) -> Iterator[Tuple[int, Record]]:
+    """(line number, record) per value; a DELETE line gives one record with an empty value."""
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            item = _decode_json(line)
+            changetype = item.get("changetype", "REPLACE").upper()
+            if changetype == "DELETE":
+                name, rtype, _, _ = make_record(item["name"], item["type"], "-", None, zone)
+                yield number, (name, rtype, "", "")
+                continue
+            if changetype != "REPLACE":
+                raise ValueError(f"unknown changetype {changetype!r}")
+            records = item.get("records")
+            if records is None and "content" in item:
+                records = [item["content"]]
+            if not records:
+                raise ValueError("records (or content) is required")
+            for value in records:
+                yield number, make_record(item["name"], item["type"], value, item.get("ttl"), zone)
+        except (ValueError, TypeError, KeyError, AttributeError) as e:
+            raise ValueError(f"line {number}: {e}") from None
+
+
+def read_csv(lines: Iterable[str], zone: str) -> Iterator[Tuple[int, Record]]:
+    """(0, record) per row: the rows of the file form its RRsets together."""
+    reader = csv.DictReader(lines)
+    for number, row in enumerate(reader, 2):
+        try:
+            value = row.get("value") or row.get("content")
+            yield 0, make_record(row["name"], row["type"], value, row.get("ttl"), zone)
+        except (ValueError, TypeError, KeyError) as e:
+            raise ValueError(f"line {number}: {e}") from None
+
+
+def _with_dots(rtype: str, content: str) -> str:
+    """gsql backends store name targets without the trailing dot; zone files need it."""
+    fields = NAME_FIELDS.get(rtype)
+    if not fields or rtype == "SOA":
+        return content
+    parts = content.split()
+    for index in fields:
+        if index < len(parts) and not parts[index].endswith("."):
+            parts[index] += "."
+    return " ".join(parts)
+
+
+def read_sqlite(path: str, zone: str) -> Iterator[Tuple[int, Record]]:
+    """(0, record) per row: the rows of the database form its RRsets together."""
+    db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        columns = {row[1] for row in db.execute("PRAGMA table_info(records)")}
+        if not columns:
+            raise ValueError(f"{path} has no records table")
+        if "domain_id" in columns:
+            # PowerDNS schema: absolute names without the trailing dot
+            origin = zone.lower().rstrip(".")
+            rows = db.execute(
+                "SELECT r.name, r.type, r.content, r.ttl FROM records r"
+                " JOIN domains d ON d.id = r.domain_id"
+                " WHERE d.name = ? AND r.type IS NOT NULL AND r.disabled = 0",
+                (origin,),
+            )
+            for name, rtype, content, ttl in rows:
+                yield 0, make_record(name + ".", rtype, _with_dots(rtype, content), ttl, zone)
+        else:
+            for name, rtype, content, ttl in db.execute("SELECT name, type, content, ttl FROM records"):
+                yield 0, make_record(name, rtype, content, ttl, zone)
+    except sqlite3.Error as e:
+        raise ValueError(f"{path}: {e}") from None
+    finally:
+        db.close()
+
+
+def read_source(source: str, zone: str) -> Iterator[Tuple[int, Record]]:
+    """(line, record) of one source file ("-" is JSONL on stdin); line tells which records set an RRset together."""
+    if source == "-":
+        yield from read_jsonl(sys.stdin, zone)
+        return
+    suffix = Path(source).suffix.lower()
+    if suffix in (".sqlite", ".sqlite3", ".db"):
+        yield from read_sqlite(source, zone)
+        return
+    if suffix not in (".jsonl", ".json", ".csv"):
+        raise ValueError(f"{source}: unknown record source type (use .jsonl, .csv or .sqlite)")
+    with open(source, "r", newline="") as f:
+        reader = read_csv if suffix == ".csv" else read_jsonl
+        try:
+            yield from reader(f, zone)
+        except ValueError as e:
+            raise ValueError(f"{source}: {e}") from None
+
+
+def _spill(chunk: List[Entry], directory: str) -> str:
+    chunk.sort(key=RRSET_KEY)
+    with tempfile.NamedTemporaryFile("w", dir=directory, delete=False, suffix=".run") as f:
+        f.writelines(f"{name}\t{rtype}\t{line}\t{ttl}\t{value}\n" for name, rtype, line, ttl, value in chunk)
+    return f.name
+
+
+def _read_run(path: str) -> Iterator[Entry]:
+    with open(path, "r") as f:
+        for row in f:
+            name, rtype, line, ttl, value = row[:-1].split("\t", 4)
+            yield name, rtype, int(line), ttl, value
+
+
+def _rrsets(entries: Iterable[Entry]) -> Iterator[Record]:
+    """Records grouped by RRset: the values of its last line, de-duplicated and sorted, with the TTL given last."""
+    for (name, rtype), group in itertools.groupby(entries, key=RRSET_KEY):
+        last = -1
+        values: set = set()
+        ttl = ""
+        for _, _, line, ttl, value in group:
+            if line != last:
+                last, values = line, set()
+            values.add(value)
+        values.discard("")
+        for value in sorted(values):
+            yield name, rtype, ttl, value
+
+
+def sorted_records(entries: Iterable[Entry], chunk_size: int = SORT_CHUNK) -> Iterator[Record]:
+    """
+    Sort entries into RRsets with at most chunk_size of them in memory.
+
+    Sorts are stable and heapq.merge prefers earlier runs on ties, so the
+    entries of an RRset stay in input order and its last line can win.
+    """
+    with tempfile.TemporaryDirectory(prefix="zone-records-") as directory:
+        runs: List[str] = []
+        chunk: List[Entry] = []
+        for entry in entries:
+            chunk.append(entry)
+            if len(chunk) >= chunk_size:
+                runs.append(_spill(chunk, directory))
+                chunk = []
+        if not runs:
+            chunk.sort(key=RRSET_KEY)
+            yield from _rrsets(chunk)
+            return
+        if chunk:
+            runs.append(_spill(chunk, directory))
+        del chunk
+        yield from _rrsets(heapq.merge(*(_read_run(run) for run in runs), key=RRSET_KEY))
+
+
+def zone_lines(records: Iterable[Record]) -> Iterator[str]:
+    """Zone file lines, laid out like the custom_records loop in zone.template.j2."""
+    for name, rtype, ttl, value in records:
+        if ttl:
+            yield f"{name}    {ttl}    IN    {rtype}    {value}\n"
+        else:
+            yield f"{name}    IN    {rtype}    {value}\n"
+
+
+def write_records(records: Iterable[Record], out: IO[str], hasher: Any = None) -> int:
+    """Write zone lines in batches, feeding them to hasher too; returns the record count."""
+    count = 0
+    batch: List[str] = []
+    for line in zone_lines(records):
+        batch.append(line)
+        if len(batch) >= WRITE_BATCH:
+            count += len(batch)
+            block = "".join(batch)
+            out.write(block)
+            if hasher is not None:
+                hasher.update(block.encode())
+            batch = []
+    if batch:
+        count += len(batch)
+        block = "".join(batch)
+        out.write(block)
+        if hasher is not None:
+            hasher.update(block.encode())
+    return count
+
+
+def stream_records(
+    sources: List[str],
+    zone: str,
+    chunk_size: int = SORT_CHUNK,
+    skip: AbstractSet[Tuple[str, str]] = frozenset(),
+    skipped: Optional[Counter] = None,
+) -> Iterator[Record]:
+    """
+    All records of the sources sorted into RRsets, the last line of each RRset winning.
+
+    Records of the (name, type) RRsets in skip are dropped and counted in skipped.
+    """
+
+    def chained() -> Iterator[Entry]:
+        line = 0
+        for source in sources:
+            previous = None
+            for number, (name, rtype, ttl, value) in read_source(source, zone):
+                if number != previous:
+                    line, previous = line + 1, number
+                if skip and (name, rtype) in skip:
+                    if skipped is not None:
+                        skipped[name, rtype] += 1
+                    continue
+                yield name, rtype, line, ttl, value
+
+    return sorted_records(chained(), chunk_size)
+